@@ -4,6 +4,7 @@ Processes Claude Code hooks (SessionStart, Stop, SessionEnd) to automatically tr
 Uses Claude's native hook system for reliable, incremental tracking.
 """
 
+import hashlib
 import json
 import os
 import sys
@@ -939,15 +940,17 @@ def create_clickhouse_spans_for_turn(
         stop_reason: Stop reason from Claude response
     """
     try:
-        tracestore = runtime.storage_runtime().tracestore
-        if not tracestore:
+        span_writer = runtime.storage_runtime().span_writer
+        if not span_writer:
             return
 
         # Parse timestamp
         base_timestamp = datetime.fromisoformat(user_timestamp.replace("Z", "+00:00"))
 
-        # Generate trace ID (shared across all spans in this turn)
-        trace_id = str(uuid.uuid4()).replace("-", "")
+        # Generate trace ID (shared across all spans in this turn). IDs are derived
+        # from the turn itself, so re-processing a turn replaces its spans in
+        # ClickHouse instead of duplicating them.
+        trace_id = stable_id(session_id, user_timestamp, length=32)
         service_name = agent_name
 
         # Build tool results map with timestamps and content
@@ -1076,7 +1079,9 @@ def create_clickhouse_spans_for_turn(
                     }
 
             # Generate span ID
-            span_id = str(uuid.uuid4()).replace("-", "")[:16]
+            span_id = stable_id(
+                trace_id, msg.get("uuid") or msg_timestamp_str, str(idx)
+            )
 
             # Determine semantic kind
             semantic_kind = determine_semantic_kind(msg_content)
@@ -1179,7 +1184,7 @@ def create_clickhouse_spans_for_turn(
                 processing_span = {
                     "Timestamp": prev_end,
                     "TraceId": trace_id,
-                    "SpanId": str(uuid.uuid4()).replace("-", "")[:16],
+                    "SpanId": stable_id(trace_id, "processing", prev_end.isoformat()),
                     "ParentSpanId": "",
                     "SpanName": "processing",
                     "SpanKind": "INTERNAL",
@@ -1227,7 +1232,7 @@ def create_clickhouse_spans_for_turn(
                 f"Run {run_id}: {operation_count} operations + {processing_count} \
                     processing gaps = {len(final_spans)} total spans"
             )
-            tracestore.insert_spans(final_spans)
+            span_writer.insert_spans(final_spans)
 
     except Exception as e:
         import logging
@@ -1235,6 +1240,11 @@ def create_clickhouse_spans_for_turn(
         logging.error(f"Failed to create ClickHouse spans: {e}", exc_info=True)
 
 
+def stable_id(*parts: str, length: int = 16) -> str:
+    """Derive a deterministic hex ID (16 chars for spans, 32 for traces) from parts."""
+    return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()[:length]
+
+
 def determine_semantic_kind(content_blocks: list) -> str:
     """Determine semantic kind of a message based on content blocks.
 
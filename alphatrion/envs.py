@@ -23,11 +23,46 @@ CLICKHOUSE_DATABASE = "ALPHATRION_CLICKHOUSE_DATABASE"
 CLICKHOUSE_USERNAME = "ALPHATRION_CLICKHOUSE_USERNAME"
 CLICKHOUSE_PASSWORD = "ALPHATRION_CLICKHOUSE_PASSWORD"
 CLICKHOUSE_ENABLE_BATCH = "ALPHATRION_CLICKHOUSE_ENABLE_BATCH"
+CLICKHOUSE_BUFFER_SIZE = "ALPHATRION_CLICKHOUSE_BUFFER_SIZE"
+CLICKHOUSE_CLUSTER_NAME = "ALPHATRION_CLICKHOUSE_CLUSTER_NAME"
+CLICKHOUSE_CONTENT_THRESHOLD = "ALPHATRION_CLICKHOUSE_CONTENT_THRESHOLD"
+CLICKHOUSE_MAX_CONCURRENT_QUERIES = "ALPHATRION_CLICKHOUSE_MAX_CONCURRENT_QUERIES"
+CLICKHOUSE_QUERY_SETTINGS = (
+    "ALPHATRION_CLICKHOUSE_QUERY_SETTINGS"  # JSON, by query kind
+)
+CLICKHOUSE_ORG_QUERY_SETTINGS = (
+    "ALPHATRION_CLICKHOUSE_ORG_QUERY_SETTINGS"  # JSON, by org ID
+)
+CLICKHOUSE_BREAKER_FAILURES = "ALPHATRION_CLICKHOUSE_BREAKER_FAILURES"
+CLICKHOUSE_BREAKER_RESET_TIMEOUT = "ALPHATRION_CLICKHOUSE_BREAKER_RESET_TIMEOUT"
+COST_PRICING = "ALPHATRION_COST_PRICING"  # "ingest" or "current"
+TRACE_DROP_AT_START = "ALPHATRION_TRACE_DROP_AT_START"
+TRACE_SAMPLE_RATE = "ALPHATRION_TRACE_SAMPLE_RATE"
+TRACE_SAMPLE_RATES = "ALPHATRION_TRACE_SAMPLE_RATES"  # JSON, by experiment or agent ID
+TRACE_TAIL_SAMPLE_RATE = "ALPHATRION_TRACE_TAIL_SAMPLE_RATE"
+TRACE_TAIL_LATENCY_THRESHOLD = "ALPHATRION_TRACE_TAIL_LATENCY_THRESHOLD"
+TRACE_TAIL_COST_THRESHOLD = "ALPHATRION_TRACE_TAIL_COST_THRESHOLD"
+TRACE_EXPORT_MODE = "ALPHATRION_TRACE_EXPORT_MODE"  # "thread", "process" or "server"
+
+# Query cache related envs
+QUERY_CACHE = "ALPHATRION_QUERY_CACHE"  # "memory", "redis" or "none"
+QUERY_CACHE_SIZE = "ALPHATRION_QUERY_CACHE_SIZE"
+QUERY_CACHE_TTL = "ALPHATRION_QUERY_CACHE_TTL"
+QUERY_CACHE_REDIS_URL = "ALPHATRION_QUERY_CACHE_REDIS_URL"
 
 # Prometheus push gateway related envs
 ENABLE_PROMETHEUS_EXPORTER = "ALPHATRION_ENABLE_PROMETHEUS_EXPORTER"
 PROMETHEUS_PUSHGATEWAY_URL = "ALPHATRION_PROMETHEUS_PUSHGATEWAY_URL"
 PROMETHEUS_JOB_NAME = "ALPHATRION_PROMETHEUS_JOB_NAME"
+PROMETHEUS_MODE = "ALPHATRION_PROMETHEUS_MODE"  # "push" or "pull"
+PROMETHEUS_PUSH_INTERVAL = "ALPHATRION_PROMETHEUS_PUSH_INTERVAL"
+PROMETHEUS_METRICS_PORT = "ALPHATRION_PROMETHEUS_METRICS_PORT"
+PROMETHEUS_LABELS = "ALPHATRION_PROMETHEUS_LABELS"  # comma separated
+PROMETHEUS_LABEL_ALLOWLISTS = (
+    "ALPHATRION_PROMETHEUS_LABEL_ALLOWLISTS"  # JSON, values by label
+)
+PROMETHEUS_LABEL_TOP_N = "ALPHATRION_PROMETHEUS_LABEL_TOP_N"  # JSON, by label
+PROMETHEUS_SERIES_TTL = "ALPHATRION_PROMETHEUS_SERIES_TTL"
 
 # Dashboard only related envs
 DASHBOARD_USER_ID = "ALPHATRION_DASHBOARD_USER_ID"
@@ -35,5 +70,9 @@ DASHBOARD_USER_ID = "ALPHATRION_DASHBOARD_USER_ID"
 # Runtime related envs
 ROOT_PATH = "ALPHATRION_ROOT_PATH"
 
+# Server the spans are sent to in the "server" trace export mode
+SERVER_URL = "ALPHATRION_SERVER_URL"
+SERVER_TOKEN = "ALPHATRION_SERVER_TOKEN"  # JWT from /api/auth/login
+
 ENABLE_AUTH = "ALPHATRION_ENABLE_AUTH"
 JWT_SECRET = "ALPHATRION_JWT_SECRET"
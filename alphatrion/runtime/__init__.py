@@ -1,6 +1,13 @@
-from alphatrion.runtime.contextvars import current_exp_id, current_run_id
+from alphatrion.runtime.contextvars import (
+    current_agent_id,
+    current_exp_id,
+    current_run_id,
+    current_session_id,
+)
 
 __all__ = [
+    "current_agent_id",
     "current_exp_id",
     "current_run_id",
+    "current_session_id",
 ]
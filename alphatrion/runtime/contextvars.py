@@ -3,3 +3,7 @@ import contextvars
 # Used in log/log.py to log params/metrics
 current_exp_id = contextvars.ContextVar("current_exp_id", default=None)
 current_run_id = contextvars.ContextVar("current_run_id", default=None)
+# Agent session the current code runs in, set by tracing.agent_session and
+# tracing.agent, added to spans by ContextAttributesSpanProcessor
+current_session_id = contextvars.ContextVar("current_session_id", default=None)
+current_agent_id = contextvars.ContextVar("current_agent_id", default=None)
@@ -1,15 +1,28 @@
 # ruff: noqa: E501
 # ruff: noqa: B904
 
+import asyncio
 import logging
+import os
 import uuid
+import zlib
 from importlib.metadata import version
 
-from fastapi import FastAPI, HTTPException, Request
+from fastapi import FastAPI, HTTPException, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from google.protobuf.message import DecodeError
+from graphql import GraphQLError
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
+    ExportTraceServiceRequest,
+    ExportTraceServiceResponse,
+)
+from opentelemetry.sdk.trace.export import SpanExportResult
+from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
 from pydantic import BaseModel
 from strawberry.fastapi import GraphQLRouter
+from strawberry.types import ExecutionResult
 
+from alphatrion import envs
 from alphatrion.server.auth import (
     create_access_token,
     decode_access_token,
@@ -19,10 +32,18 @@ from alphatrion.server.auth import (
 from alphatrion.server.graphql.context import get_context
 from alphatrion.server.graphql.schema import schema
 from alphatrion.storage import runtime
+from alphatrion.storage.query_guard import query_tag
+from alphatrion.tracing.clickhouse_exporter import ClickHouseSpanExporter
+from alphatrion.tracing.otlp import spans_from_otlp
+from alphatrion.utils.metrics import REGISTRY
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Max size of an OTLP export request as sent, and once decompressed
+OTLP_MAX_BODY_BYTES = 8 * 1024 * 1024
+OTLP_MAX_DECOMPRESSED_BYTES = 64 * 1024 * 1024
+
 app = FastAPI()
 
 # Add CORS middleware - allows frontend to access the API
@@ -85,12 +106,8 @@ async def log_graphql_requests(request: Request, call_next):
                 f"GraphQL {operation_type}: {operation_name} | Variables: {variable_keys if variable_keys else 'None'}"
             )
             logger.debug(f"GraphQL {operation_type} full query:\n{query}")
-
-            # Create a new request with the cached body
-            async def receive():
-                return {"type": "http.request", "body": body}
-
-            request._receive = receive
+            # The body is cached and replayed to the app by call_next, which
+            # still sees the client disconnecting afterwards.
 
         except Exception as e:
             logger.error(f"Failed to log GraphQL request: {e}")
@@ -127,8 +144,55 @@ async def get_context_with_error_handling(request: Request):
         raise HTTPException(status_code=400, detail=str(e))
 
 
+async def _wait_for_disconnect(request: Request) -> None:
+    # The body is read already, the next message is the client disconnecting
+    while (await request.receive())["type"] != "http.disconnect":
+        pass
+
+
+class CancellingGraphQLRouter(GraphQLRouter):
+    """GraphQL router cancelling the ClickHouse queries of abandoned requests.
+
+    Operations run as tasks on the server loop and their synchronous
+    resolvers on worker threads, see ThreadedResolvers, so the loop stays
+    free to notice clients disconnecting. The operation of a disconnected
+    client is cancelled and its queries are killed.
+    """
+
+    async def execute_single(self, *args, **kwargs):
+        tag = uuid.uuid4().hex
+        token = query_tag.set(tag)
+        try:
+            # The task and its resolver threads run in a copy of this context,
+            # tag included
+            operation = asyncio.create_task(super().execute_single(*args, **kwargs))
+        finally:
+            query_tag.reset(token)
+
+        disconnected = asyncio.create_task(_wait_for_disconnect(kwargs["request"]))
+        try:
+            done, _ = await asyncio.wait(
+                {operation, disconnected}, return_when=asyncio.FIRST_COMPLETED
+            )
+            if operation in done or disconnected.exception() is not None:
+                return await operation
+        finally:
+            disconnected.cancel()
+            operation.cancel()
+
+        tracestore = runtime.storage_runtime().tracestore
+        if tracestore is not None:
+            logger.info("Client disconnected, cancelling its queries")
+            # Resolver threads still wait on their queries, killing them
+            # frees ClickHouse and the threads
+            await asyncio.to_thread(tracestore.cancel_queries, tag)
+        return ExecutionResult(data=None, errors=[GraphQLError("Client disconnected")])
+
+
 # Create GraphQL router with context
-graphql_app = GraphQLRouter(schema, context_getter=get_context_with_error_handling)
+graphql_app = CancellingGraphQLRouter(
+    schema, context_getter=get_context_with_error_handling
+)
 
 # Mount /graphql endpoint
 app.include_router(graphql_app, prefix="/graphql")
@@ -146,6 +210,143 @@ def get_version():
     return {"version": version("alphatrion"), "status": "ok"}
 
 
+@app.get("/metrics")
+def metrics():
+    """Metrics for Prometheus to scrape: LLM metrics of the spans the server
+    receives when its Prometheus exporter is enabled, and its own health metrics."""
+    exporter = runtime.storage_runtime().prometheus_exporter
+    registry = exporter.registry if exporter is not None else REGISTRY
+    return Response(content=generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+# Exporter of the spans received over OTLP, created with the first export
+_otlp_exporter: ClickHouseSpanExporter | None = None
+
+
+def _otlp_principal(request: Request) -> tuple[str | None, str | None]:
+    """Org and user of the client exporting spans, None if it's trusted to set them.
+
+    Without auth they come from the x-org-id and x-user-id headers, if any,
+    like the GraphQL API does.
+    """
+    if os.getenv(envs.ENABLE_AUTH, "true").lower() != "true":
+        return request.headers.get("x-org-id"), request.headers.get("x-user-id")
+
+    auth_header = request.headers.get("Authorization")
+    if not auth_header or not auth_header.startswith("Bearer "):
+        raise HTTPException(
+            status_code=401, detail="Missing or invalid authorization header"
+        )
+    payload = decode_access_token(auth_header.replace("Bearer ", ""))
+    if not payload or not payload.get("org_id") or not payload.get("user_id"):
+        raise HTTPException(status_code=401, detail="Invalid or expired token")
+    return payload["org_id"], payload["user_id"]
+
+
+async def _read_otlp_body(request: Request) -> bytes:
+    """Body of an OTLP export request as sent, up to OTLP_MAX_BODY_BYTES."""
+    content_length = request.headers.get("Content-Length", "")
+    if content_length.isdigit() and int(content_length) > OTLP_MAX_BODY_BYTES:
+        raise HTTPException(status_code=413, detail="OTLP request too large")
+
+    chunks = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > OTLP_MAX_BODY_BYTES:
+            raise HTTPException(status_code=413, detail="OTLP request too large")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+def _gunzip_otlp_body(body: bytes) -> bytes:
+    """Decompress a gzip body, up to OTLP_MAX_DECOMPRESSED_BYTES."""
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    try:
+        # Stops at the limit, however much the body inflates
+        body = decompressor.decompress(body, OTLP_MAX_DECOMPRESSED_BYTES + 1)
+    except zlib.error as e:
+        raise HTTPException(status_code=400, detail=f"Invalid OTLP request: {e}")
+    if len(body) > OTLP_MAX_DECOMPRESSED_BYTES:
+        raise HTTPException(status_code=413, detail="OTLP request too large")
+    if not decompressor.eof:
+        raise HTTPException(
+            status_code=400, detail="Invalid OTLP request: truncated gzip body"
+        )
+    return body
+
+
+def _export_spans(
+    export_request: ExportTraceServiceRequest, principal: tuple[str | None, str | None]
+) -> SpanExportResult:
+    global _otlp_exporter  # noqa: PLW0603
+    if _otlp_exporter is None:
+        # Failed inserts answer 503 and are retried by the client, unless the
+        # span buffer took the spans
+        _otlp_exporter = ClickHouseSpanExporter(
+            runtime.storage_runtime().tracestore, raise_on_error=True
+        )
+
+    org_id, user_id = principal
+    overrides = {
+        name: value
+        for name, value in (("org_id", org_id), ("user_id", user_id))
+        if value
+    }
+    spans = spans_from_otlp(export_request, overrides)
+
+    if user_id:
+        # Spans may only be written to the teams of the user, like GraphQL reads
+        metadb = runtime.storage_runtime().metadb
+        teams = {span.attributes.get("team_id") for span in spans} - {None, ""}
+        for team_id in teams:
+            try:
+                accessible = metadb.team_is_accessible_to_user(
+                    team_id=uuid.UUID(str(team_id)), user_id=uuid.UUID(user_id)
+                )
+            except ValueError:
+                accessible = False
+            if not accessible:
+                raise HTTPException(
+                    status_code=403,
+                    detail=f"Not allowed to export spans of team {team_id}",
+                )
+
+    prometheus_exporter = runtime.storage_runtime().prometheus_exporter
+    if prometheus_exporter is not None:
+        prometheus_exporter.export(spans)
+    # TraceStore's span buffer batches the spans of all clients into large inserts
+    return _otlp_exporter.export(spans)
+
+
+@app.post("/v1/traces")
+async def export_traces(request: Request):
+    """Receive spans exported over OTLP/HTTP (protobuf) by SDK processes and hooks."""
+    principal = _otlp_principal(request)
+    if runtime.storage_runtime().tracestore is None:
+        raise HTTPException(status_code=503, detail="Tracing is disabled")
+    content_type = request.headers.get("Content-Type", "").split(";")[0].strip()
+    if content_type != "application/x-protobuf":
+        raise HTTPException(status_code=415, detail="Expected application/x-protobuf")
+
+    body = await _read_otlp_body(request)
+    if request.headers.get("Content-Encoding") == "gzip":
+        body = await asyncio.to_thread(_gunzip_otlp_body, body)
+    try:
+        export_request = ExportTraceServiceRequest.FromString(body)
+    except DecodeError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid OTLP request: {e}")
+
+    result = await asyncio.to_thread(_export_spans, export_request, principal)
+    if result != SpanExportResult.SUCCESS:
+        # Retried by OTLP exporters
+        raise HTTPException(status_code=503, detail="Failed to store spans")
+    return Response(
+        content=ExportTraceServiceResponse().SerializeToString(),
+        media_type="application/x-protobuf",
+    )
+
+
 # Auth endpoints
 class LoginRequest(BaseModel):
     email: str
@@ -20,7 +20,9 @@ from fastapi.staticfiles import StaticFiles
 from rich.console import Console
 from rich.text import Text
 
+from alphatrion import envs
 from alphatrion.storage import runtime
+from alphatrion.storage.query_cache import QUERY_CACHE_MEMORY
 from alphatrion.utils import log
 
 load_dotenv()
@@ -495,6 +497,17 @@ def run_server(args):
     log.configure_logging()
 
     runtime.init()
+    if os.getenv(envs.QUERY_CACHE, QUERY_CACHE_MEMORY).lower() == QUERY_CACHE_MEMORY:
+        # Its watermarks are per process, see alphatrion/storage/query_cache.py
+        console.print(
+            Text(
+                "Query cache is in memory: only spans sent to this server invalidate it, "
+                "spans written straight to ClickHouse show up after "
+                f"{os.getenv(envs.QUERY_CACHE_TTL, '60')}s. Set ALPHATRION_QUERY_CACHE=redis "
+                "to invalidate it on every write.",
+                style="yellow",
+            )
+        )
     uvicorn.run("alphatrion.server.cmd.app:app", host=args.host, port=args.port)
 
 
@@ -1,6 +1,7 @@
 import os
 import uuid
-from datetime import datetime
+from datetime import UTC, datetime, timedelta
+from zoneinfo import ZoneInfo
 
 import httpx
 import strawberry
@@ -16,13 +17,17 @@ from alphatrion.storage.sql_models import (
     Status,
     StatusMap,
 )
+from alphatrion.storage.tracestore import TimeWindow, encode_cursor
+from alphatrion.storage.tracetree import build_trace_trees
 
 from .types import (
     AddUserToTeamInput,
     Agent,
+    AggregatedUsage,
     ArtifactContent,
     ArtifactRepository,
     ArtifactTag,
+    CostUsage,
     CreateExperimentInput,
     CreateTeamInput,
     CreateUserInput,
@@ -32,8 +37,11 @@ from .types import (
     GraphQLAgentTypeEnum,
     GraphQLExperimentType,
     GraphQLExperimentTypeEnum,
+    GraphQLLatencyGroupBy,
     GraphQLStatusEnum,
+    GraphQLTimeBucket,
     Label,
+    LatencyStats,
     Metric,
     ModelDistribution,
     Organization,
@@ -41,15 +49,23 @@ from .types import (
     Run,
     Session,
     Span,
+    SpanProfileEntry,
     Team,
+    TeamOverview,
     TraceEvent,
     TraceLink,
+    TraceNode,
+    TraceStats,
+    TraceTree,
     UpdateExperimentInput,
     UpdateOrganizationInput,
     UpdateUserInput,
     User,
 )
 
+# Max number of spans returned by one page of search results
+MAX_SEARCH_LIMIT = 500
+
 
 class GraphQLResolvers:
     @staticmethod
@@ -617,7 +633,10 @@ class GraphQLResolvers:
 
     @staticmethod
     def aggregate_team_usage(
-        info: Info[GraphQLContext, None], team_id: strawberry.ID
+        info: Info[GraphQLContext, None],
+        team_id: strawberry.ID,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
     ) -> dict[str, int | float]:
         if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
             return {
@@ -638,7 +657,11 @@ class GraphQLResolvers:
             )
 
         trace_store = runtime.storage_runtime().tracestore
-        result = trace_store.get_llm_usage_by_team_id(org_id=org_id, team_id=team_id)
+        result = trace_store.get_llm_usage_by_team_id(
+            org_id=org_id,
+            team_id=team_id,
+            window=TimeWindow(start=start_time, end=end_time),
+        )
         if result and len(result) > 0:
             data = result[0]
             # Calculate totals from components
@@ -675,7 +698,10 @@ class GraphQLResolvers:
 
     @staticmethod
     def aggregate_agent_usage(
-        info: Info[GraphQLContext, None], agent_id: strawberry.ID
+        info: Info[GraphQLContext, None],
+        agent_id: strawberry.ID,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
     ) -> dict[str, int | float]:
         """Aggregate token usage from all spans for an agent."""
         if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
@@ -700,7 +726,10 @@ class GraphQLResolvers:
 
         trace_store = runtime.storage_runtime().tracestore
         result = trace_store.get_llm_usage_by_agent_id(
-            org_id=org_id, team_id=agent.team_id, agent_id=agent_id
+            org_id=org_id,
+            team_id=agent.team_id,
+            agent_id=agent_id,
+            window=TimeWindow(start=start_time, end=end_time),
         )
         if result and len(result) > 0:
             data = result[0]
@@ -738,7 +767,10 @@ class GraphQLResolvers:
 
     @staticmethod
     def aggregate_session_usage(
-        info: Info[GraphQLContext, None], session_id: strawberry.ID
+        info: Info[GraphQLContext, None],
+        session_id: strawberry.ID,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
     ) -> dict[str, int | float]:
         """Aggregate token usage from all spans for a session."""
         if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
@@ -765,7 +797,10 @@ class GraphQLResolvers:
 
         trace_store = runtime.storage_runtime().tracestore
         result = trace_store.get_llm_usage_by_session_id(
-            org_id=org_id, team_id=session.team_id, session_id=session.uuid
+            org_id=org_id,
+            team_id=session.team_id,
+            session_id=session.uuid,
+            window=TimeWindow(start=start_time, end=end_time),
         )
         if result and len(result) > 0:
             data = result[0]
@@ -805,6 +840,8 @@ class GraphQLResolvers:
     def aggregate_model_distributions(
         info: Info[GraphQLContext, None],
         team_id: strawberry.ID,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
     ) -> list[ModelDistribution]:
         if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
             return []
@@ -820,7 +857,9 @@ class GraphQLResolvers:
 
         trace_store = runtime.storage_runtime().tracestore
         result = trace_store.get_model_distributions_by_team_id(
-            org_id=org_id, team_id=team_id
+            org_id=org_id,
+            team_id=team_id,
+            window=TimeWindow(start=start_time, end=end_time),
         )
         return [
             ModelDistribution(model=item["model"], count=item["count"])
@@ -1302,9 +1341,18 @@ class GraphQLResolvers:
 
     @staticmethod
     def list_spans_by_run_id(
-        info: Info[GraphQLContext, None], run_id: strawberry.ID
+        info: Info[GraphQLContext, None],
+        run_id: strawberry.ID,
+        limit: int | None = None,
+        after: str | None = None,
+        summary: bool = False,
     ) -> list[Span]:
-        """List all spans for a specific run."""
+        """List spans for a specific run, a page at a time if limit is set.
+
+        Pass the cursor of the last span as `after` to fetch the next page. With
+        summary, large attributes like prompts and completions are left out and
+        can be loaded per span with the `span` query.
+        """
 
         # Check if tracing is enabled
         if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
@@ -1319,67 +1367,16 @@ class GraphQLResolvers:
 
             # Get traces from ClickHouse
             raw_spans = trace_store.get_spans_by_run_id(
-                org_id=org_id, team_id=run.team_id, run_id=uuid.UUID(run_id)
+                org_id=org_id,
+                team_id=run.team_id,
+                run_id=uuid.UUID(run_id),
+                limit=limit,
+                after=after,
+                summary=summary,
             )
             # Don't close - it's a shared singleton connection
 
-            # Convert to GraphQL Span objects
-            spans = []
-            for t in raw_spans:
-                # Convert events from ClickHouse flat arrays
-                events = []
-                event_timestamps = t.get("EventTimestamps", [])
-                event_names = t.get("EventNames", [])
-                event_attrs = t.get("EventAttributes", [])
-                for i in range(len(event_names)):
-                    events.append(
-                        TraceEvent(
-                            timestamp=event_timestamps[i]
-                            if i < len(event_timestamps)
-                            else datetime.now(),
-                            name=event_names[i],
-                            attributes=event_attrs[i] if i < len(event_attrs) else {},
-                        )
-                    )
-
-                # Convert links from ClickHouse flat arrays
-                links = []
-                link_trace_ids = t.get("LinkTraceIds", [])
-                link_span_ids = t.get("LinkSpanIds", [])
-                link_attrs = t.get("LinkAttributes", [])
-                for i in range(len(link_trace_ids)):
-                    links.append(
-                        TraceLink(
-                            trace_id=link_trace_ids[i],
-                            span_id=link_span_ids[i] if i < len(link_span_ids) else "",
-                            attributes=link_attrs[i] if i < len(link_attrs) else {},
-                        )
-                    )
-
-                spans.append(
-                    Span(
-                        timestamp=t["Timestamp"],
-                        trace_id=t["TraceId"],
-                        span_id=t["SpanId"],
-                        parent_span_id=t["ParentSpanId"],
-                        span_name=t["SpanName"],
-                        span_kind=t["SpanKind"],
-                        semantic_kind=t["SemanticKind"],
-                        service_name=t["ServiceName"],
-                        duration=t["Duration"],
-                        status_code=t["StatusCode"],
-                        status_message=t["StatusMessage"],
-                        team_id=t["TeamId"],
-                        run_id=t["RunId"],
-                        experiment_id=t["ExperimentId"],
-                        span_attributes=t["SpanAttributes"],
-                        resource_attributes=t["ResourceAttributes"],
-                        events=events,
-                        links=links,
-                    )
-                )
-
-            return spans
+            return [GraphQLResolvers._to_span(t) for t in raw_spans]
         except Exception as e:
             # Log error and return empty list - don't fail the GraphQL query
             print(f"Failed to fetch traces: {e}")
@@ -1387,9 +1384,13 @@ class GraphQLResolvers:
 
     @staticmethod
     def list_spans_by_session_id(
-        info: Info[GraphQLContext, None], session_id: strawberry.ID
+        info: Info[GraphQLContext, None],
+        session_id: strawberry.ID,
+        limit: int | None = None,
+        after: str | None = None,
+        summary: bool = False,
     ) -> list[Span]:
-        """List all spans for a specific session (agent runs)."""
+        """List spans for a specific session (agent runs), a page at a time if limit is set."""
 
         # Check if tracing is enabled
         if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
@@ -1409,72 +1410,248 @@ class GraphQLResolvers:
                 org_id=org_id,
                 team_id=session.team_id,
                 session_id=uuid.UUID(session.uuid),
+                limit=limit,
+                after=after,
+                summary=summary,
             )
             # Don't close - it's a shared singleton connection
 
-            # Convert to GraphQL Span objects
-            spans = []
-            for t in raw_spans:
-                # Convert events from ClickHouse flat arrays
-                events = []
-                event_timestamps = t.get("EventTimestamps", [])
-                event_names = t.get("EventNames", [])
-                event_attrs = t.get("EventAttributes", [])
-                for i in range(len(event_timestamps)):
-                    events.append(
-                        TraceEvent(
-                            timestamp=event_timestamps[i],
-                            name=event_names[i] if i < len(event_names) else "",
-                            attributes=event_attrs[i] if i < len(event_attrs) else {},
-                        )
-                    )
+            return [GraphQLResolvers._to_span(t) for t in raw_spans]
+        except Exception as e:
+            # Log error and return empty list - don't fail the GraphQL query
+            print(f"Failed to fetch traces for session: {e}")
+            return []
 
-                # Convert links from ClickHouse flat arrays
-                links = []
-                link_trace_ids = t.get("LinkTraceIds", [])
-                link_span_ids = t.get("LinkSpanIds", [])
-                link_attrs = t.get("LinkAttributes", [])
-                for i in range(len(link_trace_ids)):
-                    links.append(
-                        TraceLink(
-                            trace_id=link_trace_ids[i],
-                            span_id=link_span_ids[i] if i < len(link_span_ids) else "",
-                            attributes=link_attrs[i] if i < len(link_attrs) else {},
-                        )
-                    )
+    @staticmethod
+    def search_spans(
+        info: Info[GraphQLContext, None],
+        team_id: strawberry.ID,
+        query: str,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        *,
+        limit: int = 50,
+        after: str | None = None,
+    ) -> list[Span]:
+        """Search the spans of a team by status message, prompts and completions.
 
-                spans.append(
-                    Span(
-                        timestamp=t["Timestamp"],
-                        trace_id=t["TraceId"],
-                        span_id=t["SpanId"],
-                        parent_span_id=t["ParentSpanId"],
-                        span_name=t["SpanName"],
-                        span_kind=t["SpanKind"],
-                        semantic_kind=t["SemanticKind"],
-                        service_name=t["ServiceName"],
-                        duration=t["Duration"],
-                        status_code=t["StatusCode"],
-                        status_message=t["StatusMessage"],
-                        team_id=t["TeamId"],
-                        run_id=t["RunId"],
-                        experiment_id=t["ExperimentId"],
-                        span_attributes=t["SpanAttributes"],
-                        resource_attributes=t["ResourceAttributes"],
-                        events=events,
-                        links=links,
-                    )
-                )
+        Pass the cursor of the last span as `after` to fetch the next page.
+        """
 
-            return spans
+        # Check if tracing is enabled
+        if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
+            return []
+
+        ctx = info.context
+        org_id = uuid.UUID(ctx.org_id)
+        user_id = uuid.UUID(ctx.user_id)
+        metadb = runtime.storage_runtime().metadb
+        if not metadb.team_is_accessible_to_user(team_id=team_id, user_id=user_id):
+            return []
+
+        try:
+            trace_store = runtime.storage_runtime().tracestore
+            raw_spans = trace_store.search_spans(
+                org_id=org_id,
+                team_id=uuid.UUID(team_id),
+                query=query,
+                window=TimeWindow(start=start_time, end=end_time),
+                limit=min(limit, MAX_SEARCH_LIMIT),
+                after=after,
+            )
+            # Don't close - it's a shared singleton connection
+
+            return [GraphQLResolvers._to_span(t) for t in raw_spans]
         except Exception as e:
             # Log error and return empty list - don't fail the GraphQL query
-            print(f"Failed to fetch traces for session: {e}")
+            print(f"Failed to search spans: {e}")
+            return []
+
+    @staticmethod
+    def get_span(
+        info: Info[GraphQLContext, None],
+        team_id: strawberry.ID,
+        trace_id: str,
+        span_id: str,
+    ) -> Span | None:
+        """Get a single span with all its attributes."""
+
+        # Check if tracing is enabled
+        if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
+            return None
+
+        ctx = info.context
+        org_id = uuid.UUID(ctx.org_id)
+        user_id = uuid.UUID(ctx.user_id)
+        metadb = runtime.storage_runtime().metadb
+        if not metadb.team_is_accessible_to_user(team_id=team_id, user_id=user_id):
+            return None
+
+        try:
+            trace_store = runtime.storage_runtime().tracestore
+            raw_span = trace_store.get_span(
+                org_id=org_id,
+                team_id=uuid.UUID(team_id),
+                trace_id=trace_id,
+                span_id=span_id,
+            )
+            # Don't close - it's a shared singleton connection
+            return GraphQLResolvers._to_span(raw_span) if raw_span else None
+        except Exception as e:
+            # Log error and return None - don't fail the GraphQL query
+            print(f"Failed to fetch span {span_id}: {e}")
+            return None
+
+    @staticmethod
+    def list_trace_trees_by_run_id(
+        info: Info[GraphQLContext, None], run_id: strawberry.ID
+    ) -> list[TraceTree]:
+        """List the traces of a run as trees with self time and critical path."""
+
+        # Check if tracing is enabled
+        if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
+            return []
+
+        try:
+            ctx = info.context
+            org_id = uuid.UUID(ctx.org_id)
+            run = runtime.storage_runtime().metadb.get_run(run_id=run_id)
+
+            trace_store = runtime.storage_runtime().tracestore
+            rows = trace_store.get_trace_tree_spans(
+                org_id=org_id, team_id=run.team_id, run_id=uuid.UUID(run_id)
+            )
+            # Don't close - it's a shared singleton connection
+
+            return [GraphQLResolvers._to_trace_tree(t) for t in build_trace_trees(rows)]
+        except Exception as e:
+            # Log error and return empty list - don't fail the GraphQL query
+            print(f"Failed to fetch trace trees: {e}")
             return []
 
+    @staticmethod
+    def list_trace_trees_by_session_id(
+        info: Info[GraphQLContext, None], session_id: strawberry.ID
+    ) -> list[TraceTree]:
+        """List the traces of a session as trees with self time and critical path."""
+
+        # Check if tracing is enabled
+        if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
+            return []
+
+        try:
+            ctx = info.context
+            org_id = uuid.UUID(ctx.org_id)
+            session = runtime.storage_runtime().metadb.get_session(
+                session_id=session_id
+            )
+
+            trace_store = runtime.storage_runtime().tracestore
+            rows = trace_store.get_trace_tree_spans(
+                org_id=org_id,
+                team_id=session.team_id,
+                session_id=uuid.UUID(session.uuid),
+            )
+            # Don't close - it's a shared singleton connection
+
+            return [GraphQLResolvers._to_trace_tree(t) for t in build_trace_trees(rows)]
+        except Exception as e:
+            # Log error and return empty list - don't fail the GraphQL query
+            print(f"Failed to fetch trace trees for session: {e}")
+            return []
+
+    @staticmethod
+    def _to_trace_tree(tree: dict) -> TraceTree:
+        """Convert an assembled trace tree to a GraphQL TraceTree."""
+        return TraceTree(
+            trace_id=tree["trace_id"],
+            timestamp=tree["timestamp"],
+            duration=tree["duration"],
+            span_count=tree["span_count"],
+            total_tokens=tree["total_tokens"],
+            total_cost=tree["total_cost"],
+            critical_path=tree["critical_path"],
+            nodes=[
+                TraceNode(
+                    span_id=n["span_id"],
+                    parent_span_id=n["parent_span_id"],
+                    span_name=n["span_name"],
+                    semantic_kind=n["semantic_kind"],
+                    status_code=n["status_code"],
+                    timestamp=n["timestamp"],
+                    duration=n["duration"],
+                    self_time=n["self_time"],
+                    depth=n["depth"],
+                    child_span_ids=n["child_span_ids"],
+                    tokens=n["tokens"],
+                    cost=n["cost"],
+                    subtree_tokens=n["subtree_tokens"],
+                    subtree_cost=n["subtree_cost"],
+                    on_critical_path=n["on_critical_path"],
+                )
+                for n in tree["nodes"]
+            ],
+        )
+
+    @staticmethod
+    def _to_span(t: dict) -> Span:
+        """Convert a span row from ClickHouse to a GraphQL Span."""
+        # Convert events from ClickHouse flat arrays
+        events = []
+        event_timestamps = t.get("EventTimestamps", [])
+        event_names = t.get("EventNames", [])
+        event_attrs = t.get("EventAttributes", [])
+        for i in range(len(event_timestamps)):
+            events.append(
+                TraceEvent(
+                    timestamp=event_timestamps[i],
+                    name=event_names[i] if i < len(event_names) else "",
+                    attributes=event_attrs[i] if i < len(event_attrs) else {},
+                )
+            )
+
+        # Convert links from ClickHouse flat arrays
+        links = []
+        link_trace_ids = t.get("LinkTraceIds", [])
+        link_span_ids = t.get("LinkSpanIds", [])
+        link_attrs = t.get("LinkAttributes", [])
+        for i in range(len(link_trace_ids)):
+            links.append(
+                TraceLink(
+                    trace_id=link_trace_ids[i],
+                    span_id=link_span_ids[i] if i < len(link_span_ids) else "",
+                    attributes=link_attrs[i] if i < len(link_attrs) else {},
+                )
+            )
+
+        return Span(
+            timestamp=t["Timestamp"],
+            trace_id=t["TraceId"],
+            span_id=t["SpanId"],
+            parent_span_id=t["ParentSpanId"],
+            span_name=t["SpanName"],
+            span_kind=t["SpanKind"],
+            semantic_kind=t["SemanticKind"],
+            service_name=t["ServiceName"],
+            duration=t["Duration"],
+            status_code=t["StatusCode"],
+            status_message=t["StatusMessage"],
+            team_id=t["TeamId"],
+            run_id=t["RunId"],
+            experiment_id=t["ExperimentId"],
+            span_attributes=t["SpanAttributes"],
+            resource_attributes=t["ResourceAttributes"],
+            events=events,
+            links=links,
+            cursor=encode_cursor(t),
+        )
+
     @staticmethod
     def get_daily_cost_usage(
-        info: Info[GraphQLContext, None], team_id: strawberry.ID, days: int = 7
+        info: Info[GraphQLContext, None],
+        team_id: strawberry.ID,
+        days: int = 7,
+        timezone: str = "UTC",
     ) -> list[DailyCostUsage]:
         """Get daily cost usage from LLM calls for a team."""
 
@@ -1492,7 +1669,7 @@ class GraphQLResolvers:
         try:
             trace_store = runtime.storage_runtime().tracestore
             daily_cost = trace_store.get_daily_cost_usage(
-                org_id=org_id, team_id=team_id, days=days
+                org_id=org_id, team_id=team_id, days=days, timezone=timezone
             )
             # Don't close - it's a shared singleton connection
 
@@ -1500,8 +1677,8 @@ class GraphQLResolvers:
             return [
                 DailyCostUsage(
                     date=item["date"],
-                    total_cost=item["total_cost"],
-                    total_tokens=item.get("total_tokens", 0),
+                    total_cost=_total_cost(item),
+                    total_tokens=_total_tokens(item),
                     input_tokens=item.get("input_tokens", 0),
                     output_tokens=item.get("output_tokens", 0),
                     cache_read_input_tokens=item.get("cache_read_input_tokens", 0),
@@ -1516,9 +1693,144 @@ class GraphQLResolvers:
             print(f"Failed to fetch daily cost usage: {e}")
             return []
 
+    @staticmethod
+    def get_cost_usage(
+        info: Info[GraphQLContext, None],
+        team_id: strawberry.ID,
+        start_time: datetime,
+        end_time: datetime,
+        *,
+        bucket: GraphQLTimeBucket = GraphQLTimeBucket.DAY,
+        timezone: str = "UTC",
+    ) -> list[CostUsage]:
+        """Get cost usage from LLM calls for a team, per time bucket."""
+
+        # Check if tracing is enabled
+        if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
+            return []
+
+        ctx = info.context
+        org_id = uuid.UUID(ctx.org_id)
+        user_id = uuid.UUID(ctx.user_id)
+        metadb = runtime.storage_runtime().metadb
+        if not metadb.team_is_accessible_to_user(team_id=team_id, user_id=user_id):
+            return []
+
+        window = TimeWindow(
+            start=start_time, end=end_time, bucket=bucket.value, timezone=timezone
+        )
+        try:
+            trace_store = runtime.storage_runtime().tracestore
+            usage = trace_store.get_cost_usage(
+                org_id=org_id, team_id=team_id, window=window
+            )
+            # Don't close - it's a shared singleton connection
+            return [
+                CostUsage(
+                    bucket=item["bucket"],
+                    total_cost=_total_cost(item),
+                    total_tokens=_total_tokens(item),
+                    input_tokens=item["input_tokens"],
+                    output_tokens=item["output_tokens"],
+                    cache_read_input_tokens=item["cache_read_input_tokens"],
+                    cache_creation_input_tokens=item["cache_creation_input_tokens"],
+                )
+                for item in usage
+            ]
+        except Exception as e:
+            # Log error and return empty list - don't fail the GraphQL query
+            print(f"Failed to fetch cost usage: {e}")
+            return []
+
+    @staticmethod
+    def get_team_overview(
+        info: Info[GraphQLContext, None],
+        team_id: strawberry.ID,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        *,
+        days: int = 7,
+        bucket: GraphQLTimeBucket = GraphQLTimeBucket.DAY,
+        timezone: str = "UTC",
+    ) -> TeamOverview | None:
+        """Get usage, model distribution, cost series and trace stats of a team at once."""
+
+        # Check if tracing is enabled
+        if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
+            return None
+
+        ctx = info.context
+        org_id = uuid.UUID(ctx.org_id)
+        user_id = uuid.UUID(ctx.user_id)
+        metadb = runtime.storage_runtime().metadb
+        if not metadb.team_is_accessible_to_user(team_id=team_id, user_id=user_id):
+            return None
+
+        try:
+            # Without an explicit range, the last `days` days including today,
+            # from local midnight so refreshes share query cache entries.
+            if start_time is None:
+                today = datetime.now(ZoneInfo(timezone)).replace(
+                    hour=0, minute=0, second=0, microsecond=0
+                )
+                start_time = today - timedelta(days=days - 1)
+                end_time = end_time or today + timedelta(days=1)
+            elif end_time is None:
+                end_time = datetime.now(UTC)
+
+            window = TimeWindow(
+                start=start_time, end=end_time, bucket=bucket.value, timezone=timezone
+            )
+            trace_store = runtime.storage_runtime().tracestore
+            overview = trace_store.get_team_overview(
+                org_id=org_id, team_id=team_id, window=window
+            )
+            # Don't close - it's a shared singleton connection
+            if overview is None:
+                return None
+
+            usage = overview["usage"]
+            return TeamOverview(
+                usage=AggregatedUsage(
+                    total_tokens=_total_tokens(usage),
+                    input_tokens=usage["input_tokens"],
+                    output_tokens=usage["output_tokens"],
+                    cache_read_input_tokens=usage["cache_read_input_tokens"],
+                    cache_creation_input_tokens=usage["cache_creation_input_tokens"],
+                    total_cost=usage["input_cost"]
+                    + usage["output_cost"]
+                    + usage["cache_read_cost"]
+                    + usage["cache_creation_cost"],
+                ),
+                model_distributions=[
+                    ModelDistribution(model=item["model"], count=item["count"])
+                    for item in overview["model_distributions"]
+                ],
+                cost_usage=[
+                    CostUsage(
+                        bucket=item["bucket"],
+                        total_cost=_total_cost(item),
+                        total_tokens=_total_tokens(item),
+                        input_tokens=item["input_tokens"],
+                        output_tokens=item["output_tokens"],
+                        cache_read_input_tokens=item["cache_read_input_tokens"],
+                        cache_creation_input_tokens=item["cache_creation_input_tokens"],
+                    )
+                    for item in overview["cost_usage"]
+                ],
+                trace_stats=TraceStats(**overview["trace_stats"]),
+            )
+        except Exception as e:
+            # Log error and return nothing - don't fail the GraphQL query
+            print(f"Failed to fetch team overview: {e}")
+            return None
+
     @staticmethod
     def get_experiment_trace_stats(
-        info: Info[GraphQLContext, None], experiment_id: strawberry.ID
+        info: Info[GraphQLContext, None],
+        experiment_id: strawberry.ID,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
     ) -> dict[str, int]:
         """Get trace statistics (success/error counts) for an experiment."""
 
@@ -1535,7 +1847,10 @@ class GraphQLResolvers:
 
             trace_store = runtime.storage_runtime().tracestore
             stats = trace_store.get_trace_stats_by_exp_id(
-                org_id=org_id, team_id=exp.team_id, exp_id=experiment_id
+                org_id=org_id,
+                team_id=exp.team_id,
+                exp_id=experiment_id,
+                window=TimeWindow(start=start_time, end=end_time),
             )
             # Don't close - it's a shared singleton connection
             return stats
@@ -1548,6 +1863,132 @@ class GraphQLResolvers:
             )
             return {"total_spans": 0, "success_spans": 0, "error_spans": 0}
 
+    @staticmethod
+    def get_team_latency_percentiles(
+        info: Info[GraphQLContext, None],
+        team_id: strawberry.ID,
+        group_by: GraphQLLatencyGroupBy,
+        *,
+        semantic_kind: str | None = None,
+        bucket: GraphQLTimeBucket = GraphQLTimeBucket.HOUR,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        timezone: str = "UTC",
+        days: int = 7,
+    ) -> list[LatencyStats]:
+        """Get span latency percentiles of a team, grouped by a dimension."""
+
+        # Check if tracing is enabled
+        if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
+            return []
+
+        ctx = info.context
+        org_id = uuid.UUID(ctx.org_id)
+        user_id = uuid.UUID(ctx.user_id)
+        metadb = runtime.storage_runtime().metadb
+        if not metadb.team_is_accessible_to_user(team_id=team_id, user_id=user_id):
+            return []
+
+        try:
+            trace_store = runtime.storage_runtime().tracestore
+            stats = trace_store.get_latency_percentiles(
+                org_id=org_id,
+                team_id=team_id,
+                group_by=group_by.value,
+                semantic_kind=semantic_kind,
+                window=_latency_window(
+                    bucket, start_time, end_time, timezone=timezone, days=days
+                ),
+            )
+            # Don't close - it's a shared singleton connection
+            return [LatencyStats(**s) for s in stats]
+        except Exception as e:
+            # Log error and return empty list - don't fail the GraphQL query
+            print(f"Failed to fetch latency percentiles for team {team_id}: {e}")
+            return []
+
+    @staticmethod
+    def get_experiment_latency_percentiles(
+        info: Info[GraphQLContext, None],
+        experiment_id: strawberry.ID,
+        group_by: GraphQLLatencyGroupBy,
+        *,
+        semantic_kind: str | None = None,
+        bucket: GraphQLTimeBucket = GraphQLTimeBucket.HOUR,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        timezone: str = "UTC",
+        days: int = 7,
+    ) -> list[LatencyStats]:
+        """Get span latency percentiles of an experiment, grouped by a dimension."""
+
+        # Check if tracing is enabled
+        if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
+            return []
+
+        try:
+            ctx = info.context
+            org_id = uuid.UUID(ctx.org_id)
+            exp = runtime.storage_runtime().metadb.get_experiment(
+                experiment_id=experiment_id
+            )
+
+            trace_store = runtime.storage_runtime().tracestore
+            stats = trace_store.get_latency_percentiles(
+                org_id=org_id,
+                team_id=exp.team_id,
+                group_by=group_by.value,
+                experiment_id=experiment_id,
+                semantic_kind=semantic_kind,
+                window=_latency_window(
+                    bucket, start_time, end_time, timezone=timezone, days=days
+                ),
+            )
+            # Don't close - it's a shared singleton connection
+            return [LatencyStats(**s) for s in stats]
+        except Exception as e:
+            # Log error and return empty list - don't fail the GraphQL query
+            print(
+                f"Failed to fetch latency percentiles for experiment {experiment_id}: {e}"
+            )
+            return []
+
+    @staticmethod
+    def get_experiment_span_profile(
+        info: Info[GraphQLContext, None],
+        experiment_id: strawberry.ID,
+        limit: int = 200,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+    ) -> list[SpanProfileEntry]:
+        """Get the cross-run span profile of an experiment."""
+
+        # Check if tracing is enabled
+        if os.getenv(envs.ENABLE_TRACING, "false").lower() != "true":
+            return []
+
+        try:
+            ctx = info.context
+            org_id = uuid.UUID(ctx.org_id)
+            exp = runtime.storage_runtime().metadb.get_experiment(
+                experiment_id=experiment_id
+            )
+
+            trace_store = runtime.storage_runtime().tracestore
+            profile = trace_store.get_span_profile_by_exp_id(
+                org_id=org_id,
+                team_id=exp.team_id,
+                exp_id=experiment_id,
+                limit=limit,
+                window=TimeWindow(start=start_time, end=end_time),
+            )
+            # Don't close - it's a shared singleton connection
+            return [SpanProfileEntry(**entry) for entry in profile]
+        except Exception as e:
+            # Log error and return empty list - don't fail the GraphQL query
+            print(f"Failed to fetch span profile for experiment {experiment_id}: {e}")
+            return []
+
     @staticmethod
     def list_datasets(
         info: Info[GraphQLContext, None],
@@ -2083,3 +2524,39 @@ class GraphQLMutations:
             created_at=updated_exp.created_at,
             updated_at=updated_exp.updated_at,
         )
+
+
+def _total_cost(item: dict) -> float:
+    return (
+        item.get("input_cost", 0.0)
+        + item.get("output_cost", 0.0)
+        + item.get("cache_creation_input_cost", 0.0)
+        + item.get("cache_read_input_cost", 0.0)
+    )
+
+
+def _total_tokens(item: dict) -> int:
+    return (
+        item.get("input_tokens", 0)
+        + item.get("output_tokens", 0)
+        + item.get("cache_read_input_tokens", 0)
+        + item.get("cache_creation_input_tokens", 0)
+    )
+
+
+def _latency_window(
+    bucket: GraphQLTimeBucket,
+    start_time: datetime | None,
+    end_time: datetime | None,
+    *,
+    timezone: str,
+    days: int,
+) -> TimeWindow:
+    # Without an explicit range, look back `days` from now. Rounded to the
+    # minute so refreshes within a minute share query cache entries.
+    if start_time is None:
+        start_time = (end_time or datetime.now(UTC)) - timedelta(days=days)
+        start_time = start_time.replace(second=0, microsecond=0)
+    return TimeWindow(
+        start=start_time, end=end_time, bucket=bucket.value, timezone=timezone
+    )
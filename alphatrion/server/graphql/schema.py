@@ -1,4 +1,8 @@
+import asyncio
+from datetime import datetime
+
 import strawberry
+from strawberry.extensions import SchemaExtension
 from strawberry.types import Info
 
 from alphatrion.server.graphql.context import GraphQLContext
@@ -11,18 +15,23 @@ from alphatrion.server.graphql.types import (
     ArtifactFile,
     ArtifactRepository,
     ArtifactTag,
+    CostUsage,
     CreateExperimentInput,
     CreateTeamInput,
     CreateUserInput,
     DailyCostUsage,
     Dataset,
     Experiment,
+    GraphQLTimeBucket,
+    GraphQLTimeBucketEnum,
     Organization,
     RemoveUserFromTeamInput,
     Run,
     Session,
     Span,
     Team,
+    TeamOverview,
+    TraceTree,
     UpdateExperimentInput,
     UpdateOrganizationInput,
     UpdateUserInput,
@@ -115,15 +124,69 @@ class Query:
     # Span queries
     @strawberry.field
     def spans_by_run_id(
-        self, run_id: strawberry.ID, info: Info[GraphQLContext, None]
+        self,
+        run_id: strawberry.ID,
+        info: Info[GraphQLContext, None],
+        limit: int | None = None,
+        after: str | None = None,
+        summary: bool = False,
     ) -> list[Span]:
-        return GraphQLResolvers.list_spans_by_run_id(run_id=run_id, info=info)
+        return GraphQLResolvers.list_spans_by_run_id(
+            run_id=run_id, info=info, limit=limit, after=after, summary=summary
+        )
 
     @strawberry.field
     def spans_by_session_id(
-        self, session_id: strawberry.ID, info: Info[GraphQLContext, None]
+        self,
+        session_id: strawberry.ID,
+        info: Info[GraphQLContext, None],
+        limit: int | None = None,
+        after: str | None = None,
+        summary: bool = False,
     ) -> list[Span]:
         return GraphQLResolvers.list_spans_by_session_id(
+            session_id=session_id,
+            info=info,
+            limit=limit,
+            after=after,
+            summary=summary,
+        )
+
+    span: Span | None = strawberry.field(resolver=GraphQLResolvers.get_span)
+
+    @strawberry.field
+    def search_spans(
+        self,
+        team_id: strawberry.ID,
+        query: str,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        *,
+        limit: int = 50,
+        after: str | None = None,
+        info: Info[GraphQLContext, None] = None,
+    ) -> list[Span]:
+        return GraphQLResolvers.search_spans(
+            team_id=team_id,
+            query=query,
+            start_time=start_time,
+            end_time=end_time,
+            limit=limit,
+            after=after,
+            info=info,
+        )
+
+    @strawberry.field
+    def traces_by_run_id(
+        self, run_id: strawberry.ID, info: Info[GraphQLContext, None]
+    ) -> list[TraceTree]:
+        return GraphQLResolvers.list_trace_trees_by_run_id(run_id=run_id, info=info)
+
+    @strawberry.field
+    def traces_by_session_id(
+        self, session_id: strawberry.ID, info: Info[GraphQLContext, None]
+    ) -> list[TraceTree]:
+        return GraphQLResolvers.list_trace_trees_by_session_id(
             session_id=session_id, info=info
         )
 
@@ -132,10 +195,53 @@ class Query:
         self,
         team_id: strawberry.ID,
         days: int = 7,
+        timezone: str = "UTC",
         info: Info[GraphQLContext, None] = None,
     ) -> list[DailyCostUsage]:
         return GraphQLResolvers.get_daily_cost_usage(
-            team_id=team_id, days=days, info=info
+            team_id=team_id, days=days, timezone=timezone, info=info
+        )
+
+    @strawberry.field
+    def cost_usage(
+        self,
+        team_id: strawberry.ID,
+        start_time: datetime,
+        end_time: datetime,
+        *,
+        bucket: GraphQLTimeBucketEnum = GraphQLTimeBucket.DAY,
+        timezone: str = "UTC",
+        info: Info[GraphQLContext, None] = None,
+    ) -> list[CostUsage]:
+        return GraphQLResolvers.get_cost_usage(
+            team_id=team_id,
+            start_time=start_time,
+            end_time=end_time,
+            bucket=bucket,
+            timezone=timezone,
+            info=info,
+        )
+
+    @strawberry.field
+    def team_overview(
+        self,
+        team_id: strawberry.ID,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        *,
+        days: int = 7,
+        bucket: GraphQLTimeBucketEnum = GraphQLTimeBucket.DAY,
+        timezone: str = "UTC",
+        info: Info[GraphQLContext, None] = None,
+    ) -> TeamOverview | None:
+        return GraphQLResolvers.get_team_overview(
+            team_id=team_id,
+            start_time=start_time,
+            end_time=end_time,
+            days=days,
+            bucket=bucket,
+            timezone=timezone,
+            info=info,
         )
 
     # Artifact queries
@@ -308,4 +414,37 @@ class Mutation:
         return GraphQLMutations.abort_experiment(info=info, experiment_id=experiment_id)
 
 
-schema = strawberry.Schema(query=Query, mutation=Mutation)
+class ThreadedResolvers(SchemaExtension):
+    """Run the synchronous resolvers on worker threads.
+
+    Most resolvers block on the metadata DB or ClickHouse, on a thread they
+    leave the event loop free to serve other requests. Threads run in a copy
+    of the resolver's context, query tag included.
+    """
+
+    def resolve(self, _next, root, info, *args, **kwargs):
+        field = info.parent_type.fields.get(info.field_name)
+        definition = field.extensions.get("strawberry-definition") if field else None
+        # Plain attributes and async resolvers stay on the loop, and all
+        # resolvers of schema.execute_sync, which runs without one
+        if (
+            definition is None
+            or definition.base_resolver is None
+            or definition.is_async
+            or not _loop_running()
+        ):
+            return _next(root, info, *args, **kwargs)
+        return asyncio.to_thread(_next, root, info, *args, **kwargs)
+
+
+def _loop_running() -> bool:
+    try:
+        asyncio.get_running_loop()
+        return True
+    except RuntimeError:
+        return False
+
+
+schema = strawberry.Schema(
+    query=Query, mutation=Mutation, extensions=[ThreadedResolvers]
+)
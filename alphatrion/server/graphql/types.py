@@ -36,6 +36,19 @@ class DailyCostUsage:
     cache_creation_input_tokens: int
 
 
+@strawberry.type
+class CostUsage:
+    """Cost and tokens of the LLM calls within one time bucket."""
+
+    bucket: datetime  # start of the bucket
+    total_cost: float
+    total_tokens: int
+    input_tokens: int
+    output_tokens: int
+    cache_read_input_tokens: int
+    cache_creation_input_tokens: int
+
+
 @strawberry.type
 class TraceStats:
     total_spans: int
@@ -43,6 +56,67 @@ class TraceStats:
     error_spans: int
 
 
+@strawberry.type
+class TeamOverview:
+    """Everything the team dashboard shows for a time range, from one query."""
+
+    usage: AggregatedUsage
+    model_distributions: list[ModelDistribution]
+    cost_usage: list[CostUsage]
+    trace_stats: TraceStats
+
+
+@strawberry.type
+class SpanProfileEntry:
+    """Spans of the same name and kind under the same parent path, across runs."""
+
+    span_name: str
+    semantic_kind: str
+    parent_path: str  # names of the ancestors from the root, joined by ";"
+    count: int
+    total_duration: float  # nanoseconds
+    self_duration: float  # nanoseconds, not covered by direct children
+    p50: float
+    p95: float
+    p99: float
+
+
+class GraphQLLatencyGroupBy(Enum):
+    MODEL = "model"
+    SPAN_NAME = "span_name"
+    AGENT = "agent"
+    BUCKET = "bucket"
+
+
+GraphQLLatencyGroupByEnum = strawberry.enum(GraphQLLatencyGroupBy)
+
+
+class GraphQLTimeBucket(Enum):
+    MINUTE = "minute"
+    HOUR = "hour"
+    DAY = "day"
+    WEEK = "week"
+
+
+GraphQLTimeBucketEnum = strawberry.enum(GraphQLTimeBucket)
+
+
+@strawberry.type
+class LatencyStats:
+    """Latency distribution of the spans sharing a group key."""
+
+    key: str
+    count: int
+    error_count: int
+    avg: float  # nanoseconds
+    p50: float
+    p90: float
+    p95: float
+    p99: float
+    max: float
+    tokens_per_second: float  # output tokens per second of generation
+
+
 @strawberry.type
 class Organization:
     id: strawberry.ID
@@ -94,10 +168,17 @@ class Team:
         return GraphQLResolvers.total_sessions(info=info, team_id=self.id)
 
     @strawberry.field
-    def aggregated_usage(self, info: Info) -> AggregatedUsage:
+    def aggregated_usage(
+        self,
+        info: Info,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+    ) -> AggregatedUsage:
         from .resolvers import GraphQLResolvers
 
-        usage = GraphQLResolvers.aggregate_team_usage(info=info, team_id=self.id)
+        usage = GraphQLResolvers.aggregate_team_usage(
+            info=info, team_id=self.id, start_time=start_time, end_time=end_time
+        )
         return AggregatedUsage(
             total_tokens=usage["total_tokens"],
             input_tokens=usage["input_tokens"],
@@ -108,11 +189,43 @@ class Team:
         )
 
     @strawberry.field
-    def model_distributions(self, info: Info) -> list["ModelDistribution"]:
+    def latency_percentiles(
+        self,
+        info: Info,
+        group_by: GraphQLLatencyGroupByEnum,
+        *,
+        semantic_kind: str | None = None,
+        bucket: GraphQLTimeBucketEnum = GraphQLTimeBucket.HOUR,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        timezone: str = "UTC",
+        days: int = 7,
+    ) -> list[LatencyStats]:
+        from .resolvers import GraphQLResolvers
+
+        return GraphQLResolvers.get_team_latency_percentiles(
+            info=info,
+            team_id=self.id,
+            group_by=group_by,
+            semantic_kind=semantic_kind,
+            bucket=bucket,
+            start_time=start_time,
+            end_time=end_time,
+            timezone=timezone,
+            days=days,
+        )
+
+    @strawberry.field
+    def model_distributions(
+        self,
+        info: Info,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+    ) -> list["ModelDistribution"]:
         from .resolvers import GraphQLResolvers
 
         return GraphQLResolvers.aggregate_model_distributions(
-            info=info, team_id=self.id
+            info=info, team_id=self.id, start_time=start_time, end_time=end_time
         )
 
     @strawberry.field
@@ -232,11 +345,16 @@ class Experiment:
         )
 
     @strawberry.field
-    def trace_stats(self, info: Info) -> TraceStats:
+    def trace_stats(
+        self,
+        info: Info,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+    ) -> TraceStats:
         from .resolvers import GraphQLResolvers
 
         stats = GraphQLResolvers.get_experiment_trace_stats(
-            info=info, experiment_id=self.id
+            info=info, experiment_id=self.id, start_time=start_time, end_time=end_time
         )
         return TraceStats(
             total_spans=stats["total_spans"],
@@ -244,6 +362,52 @@ class Experiment:
             error_spans=stats["error_spans"],
         )
 
+    @strawberry.field
+    def latency_percentiles(
+        self,
+        info: Info,
+        group_by: GraphQLLatencyGroupByEnum,
+        *,
+        semantic_kind: str | None = None,
+        bucket: GraphQLTimeBucketEnum = GraphQLTimeBucket.HOUR,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+        timezone: str = "UTC",
+        days: int = 7,
+    ) -> list[LatencyStats]:
+        from .resolvers import GraphQLResolvers
+
+        return GraphQLResolvers.get_experiment_latency_percentiles(
+            info=info,
+            experiment_id=self.id,
+            group_by=group_by,
+            semantic_kind=semantic_kind,
+            bucket=bucket,
+            start_time=start_time,
+            end_time=end_time,
+            timezone=timezone,
+            days=days,
+        )
+
+    @strawberry.field
+    def span_profile(
+        self,
+        info: Info,
+        limit: int = 200,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+    ) -> list[SpanProfileEntry]:
+        """Aggregate spans of all runs by name, kind and parent path."""
+        from .resolvers import GraphQLResolvers
+
+        return GraphQLResolvers.get_experiment_span_profile(
+            info=info,
+            experiment_id=self.id,
+            limit=limit,
+            start_time=start_time,
+            end_time=end_time,
+        )
+
 
 @strawberry.type
 class Agent:
@@ -269,10 +433,17 @@ class Agent:
         )
 
     @strawberry.field
-    def aggregated_usage(self, info: Info) -> AggregatedUsage:
+    def aggregated_usage(
+        self,
+        info: Info,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+    ) -> AggregatedUsage:
         from .resolvers import GraphQLResolvers
 
-        usage = GraphQLResolvers.aggregate_agent_usage(info=info, agent_id=self.id)
+        usage = GraphQLResolvers.aggregate_agent_usage(
+            info=info, agent_id=self.id, start_time=start_time, end_time=end_time
+        )
         return AggregatedUsage(
             total_tokens=usage["total_tokens"],
             input_tokens=usage["input_tokens"],
@@ -303,10 +474,17 @@ class Session:
         )
 
     @strawberry.field
-    def aggregated_usage(self, info: Info) -> AggregatedUsage:
+    def aggregated_usage(
+        self,
+        info: Info,
+        start_time: datetime | None = None,
+        end_time: datetime | None = None,
+    ) -> AggregatedUsage:
         from .resolvers import GraphQLResolvers
 
-        usage = GraphQLResolvers.aggregate_session_usage(info=info, session_id=self.id)
+        usage = GraphQLResolvers.aggregate_session_usage(
+            info=info, session_id=self.id, start_time=start_time, end_time=end_time
+        )
         return AggregatedUsage(
             total_tokens=usage["total_tokens"],
             input_tokens=usage["input_tokens"],
@@ -350,11 +528,26 @@ class Run:
         ]
 
     @strawberry.field
-    def spans(self, info: Info) -> list["Span"]:
+    def spans(
+        self,
+        info: Info,
+        limit: int | None = None,
+        after: str | None = None,
+        summary: bool = False,
+    ) -> list["Span"]:
         """Get spans for this run."""
         from alphatrion.server.graphql.resolvers import GraphQLResolvers
 
-        return GraphQLResolvers.list_spans_by_run_id(info=info, run_id=self.id)
+        return GraphQLResolvers.list_spans_by_run_id(
+            info=info, run_id=self.id, limit=limit, after=after, summary=summary
+        )
+
+    @strawberry.field
+    def traces(self, info: Info) -> list["TraceTree"]:
+        """Get the assembled trace trees for this run."""
+        from .resolvers import GraphQLResolvers
+
+        return GraphQLResolvers.list_trace_trees_by_run_id(info=info, run_id=self.id)
 
     @strawberry.field
     def aggregated_usage(self, info: Info) -> AggregatedUsage:
@@ -574,3 +767,36 @@ class Span:
     resource_attributes: JSON
     events: list[TraceEvent]
     links: list[TraceLink]
+    # Opaque pagination cursor, pass as `after` to get the spans following this one
+    cursor: str
+
+
+@strawberry.type
+class TraceNode:
+    span_id: str
+    parent_span_id: str
+    span_name: str
+    semantic_kind: str
+    status_code: str
+    timestamp: datetime
+    duration: float  # nanoseconds
+    self_time: float  # nanoseconds not covered by child spans
+    depth: int
+    child_span_ids: list[str]
+    tokens: int
+    cost: float
+    subtree_tokens: int
+    subtree_cost: float
+    on_critical_path: bool
+
+
+@strawberry.type
+class TraceTree:
+    trace_id: str
+    timestamp: datetime
+    duration: float  # nanoseconds, from the first span start to the last span end
+    span_count: int
+    total_tokens: int
+    total_cost: float
+    critical_path: list[str]  # span ids, in execution order
+    nodes: list[TraceNode]  # depth-first order
@@ -0,0 +1,167 @@
+"""Circuit breaker in front of the ClickHouse TraceStore.
+
+When ClickHouse is unreachable, every call would wait for a connection
+timeout, piling up blocked workers. After failure_threshold consecutive
+failures the circuit opens and calls fail fast with CircuitOpenError, which
+TraceStore callers already handle by returning empty (or cached) results.
+After reset_timeout a single probe call is let through (half-open): its
+success closes the circuit, its failure opens it again.
+
+Only errors reaching ClickHouse count as failures. A query rejected by
+ClickHouse, e.g. for exceeding its limits, proves the server is up.
+"""
+
+import logging
+import threading
+import time
+from collections.abc import Callable
+
+from clickhouse_connect.driver.exceptions import DatabaseError, OperationalError
+from prometheus_client import Counter, Gauge
+
+from alphatrion.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+_STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+CIRCUIT_STATE = Gauge(
+    "alphatrion_circuit_breaker_state",
+    "State of the circuit breaker: 0 closed, 1 half-open, 2 open",
+    ["breaker"],
+    registry=REGISTRY,
+)
+CIRCUIT_OPENED = Counter(
+    "alphatrion_circuit_breaker_opened_total",
+    "Times the circuit breaker opened",
+    ["breaker"],
+    registry=REGISTRY,
+)
+CIRCUIT_REJECTED = Counter(
+    "alphatrion_circuit_breaker_rejected_total",
+    "Calls failed fast because the circuit breaker was open",
+    ["breaker"],
+    registry=REGISTRY,
+)
+
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling ClickHouse while the circuit is open."""
+
+
+def is_connection_error(error: Exception) -> bool:
+    """Whether an error means ClickHouse could not be reached."""
+    if isinstance(error, OperationalError):
+        return True
+    if isinstance(error, DatabaseError):
+        return False
+    return isinstance(error, OSError)
+
+
+class CircuitBreaker:
+    """Thread-safe circuit breaker counting consecutive failures."""
+
+    def __init__(
+        self,
+        name: str,
+        *,
+        failure_threshold: int = 5,
+        reset_timeout: float = 30.0,
+        is_failure: Callable[[Exception], bool] = is_connection_error,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        """
+        Args:
+            name: Label of the breaker metrics
+            failure_threshold: Consecutive failures opening the circuit,
+                0 disables the breaker
+            reset_timeout: Seconds the circuit stays open before a probe
+            is_failure: Whether an error counts as a failure
+            clock: Monotonic clock, for tests
+        """
+        self.name = name
+        self._failure_threshold = failure_threshold
+        self._reset_timeout = reset_timeout
+        self._is_failure = is_failure
+        self._clock = clock
+        self._state = CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._lock = threading.Lock()
+        CIRCUIT_STATE.labels(name).set(_STATE_VALUES[CLOSED])
+
+    @property
+    def state(self) -> str:
+        with self._lock:
+            return self._state
+
+    def before_call(self) -> None:
+        """Check a call may proceed.
+
+        Raises:
+            CircuitOpenError: If the circuit is open, or half-open with a
+                probe already in flight
+        """
+        if self._failure_threshold <= 0:
+            return
+        with self._lock:
+            if self._state == OPEN:
+                if self._clock() - self._opened_at < self._reset_timeout:
+                    CIRCUIT_REJECTED.labels(self.name).inc()
+                    raise CircuitOpenError(f"Circuit {self.name} is open")
+                self._set_state(HALF_OPEN)
+            if self._state == HALF_OPEN:
+                if self._probing:
+                    CIRCUIT_REJECTED.labels(self.name).inc()
+                    raise CircuitOpenError(f"Circuit {self.name} is half-open")
+                self._probing = True
+
+    def on_success(self) -> None:
+        if self._failure_threshold <= 0:
+            return
+        with self._lock:
+            self._failures = 0
+            self._probing = False
+            if self._state != CLOSED:
+                logger.info(f"Circuit {self.name} closed")
+                self._set_state(CLOSED)
+
+    def on_error(self, error: Exception) -> None:
+        if self._failure_threshold <= 0:
+            return
+        if not self._is_failure(error):
+            # The server answered, so it's reachable
+            self.on_success()
+            return
+        with self._lock:
+            self._failures += 1
+            self._probing = False
+            if self._state == HALF_OPEN or (
+                self._state == CLOSED and self._failures >= self._failure_threshold
+            ):
+                logger.warning(
+                    f"Circuit {self.name} opened after {self._failures} failures: {error}"
+                )
+                self._opened_at = self._clock()
+                self._set_state(OPEN)
+                CIRCUIT_OPENED.labels(self.name).inc()
+
+    def call[T](self, fn: Callable[[], T]) -> T:
+        """Call fn through the breaker."""
+        self.before_call()
+        try:
+            result = fn()
+        except Exception as e:
+            self.on_error(e)
+            raise
+        self.on_success()
+        return result
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        CIRCUIT_STATE.labels(self.name).set(_STATE_VALUES[state])
@@ -0,0 +1,138 @@
+"""Result cache for TraceStore aggregate queries.
+
+Entries are keyed by the query, its parameters and the ingest watermark of
+the queried team. Writing spans of a team advances its watermark, so cached
+results of the team become unreachable as soon as new spans arrive and are
+evicted later by LRU or TTL.
+
+The in-memory backend serves a single process, and only sees the watermarks
+that process advances: on the server, spans it receives over OTLP invalidate
+its cache, spans written straight to ClickHouse by SDK processes or hooks
+don't, and show up once the cached results expire after their TTL. Redis
+lets several server workers share hits, and lets every process writing
+spans advance the watermarks the others read, so invalidation on write
+needs it whenever spans bypass the server.
+"""
+
+import hashlib
+import os
+import pickle
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any
+
+from alphatrion import envs
+
+QUERY_CACHE_MEMORY = "memory"
+QUERY_CACHE_REDIS = "redis"
+
+
+class QueryCacheBackend(ABC):
+    """Storage for cached results and ingest watermarks."""
+
+    @abstractmethod
+    def get(self, key: str) -> Any | None:
+        """Get a cached result, None if missing or expired."""
+
+    @abstractmethod
+    def set(self, key: str, value: Any) -> None:
+        """Cache a result."""
+
+    @abstractmethod
+    def watermark(self, scope: str) -> int:
+        """Get the ingest watermark of a scope, 0 if never advanced."""
+
+    @abstractmethod
+    def advance_watermark(self, scope: str) -> None:
+        """Advance the ingest watermark of a scope."""
+
+
+class InMemoryQueryCache(QueryCacheBackend):
+    """Per-process LRU cache with a TTL, its watermarks are per process too."""
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0):
+        self._max_entries = max_entries
+        self._ttl = ttl
+        self._entries = OrderedDict()
+        self._watermarks = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any | None:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+
+    def watermark(self, scope: str) -> int:
+        with self._lock:
+            return self._watermarks.get(scope, 0)
+
+    def advance_watermark(self, scope: str) -> None:
+        with self._lock:
+            self._watermarks[scope] = self._watermarks.get(scope, 0) + 1
+
+
+class RedisQueryCache(QueryCacheBackend):
+    """Cache shared through Redis, size bounded by the Redis maxmemory policy.
+
+    Results are pickled, only point it at a Redis instance you trust.
+    """
+
+    def __init__(self, url: str, ttl: float = 60.0):
+        try:
+            import redis
+        except ImportError as e:
+            raise RuntimeError(
+                "redis is required for the redis query cache. Install it with: pip install redis"
+            ) from e
+
+        self._redis = redis.Redis.from_url(url)
+        self._ttl = max(int(ttl), 1)
+
+    def get(self, key: str) -> Any | None:
+        value = self._redis.get(f"alphatrion:query:{key}")
+        return pickle.loads(value) if value is not None else None
+
+    def set(self, key: str, value: Any) -> None:
+        self._redis.set(f"alphatrion:query:{key}", pickle.dumps(value), ex=self._ttl)
+
+    def watermark(self, scope: str) -> int:
+        return int(self._redis.get(f"alphatrion:watermark:{scope}") or 0)
+
+    def advance_watermark(self, scope: str) -> None:
+        self._redis.incr(f"alphatrion:watermark:{scope}")
+
+
+def cache_key(query: str, parameters: dict[str, Any] | None, watermark: int) -> str:
+    params = sorted((k, str(v)) for k, v in (parameters or {}).items())
+    return hashlib.sha256(repr((query, params, watermark)).encode()).hexdigest()
+
+
+def query_cache_from_env() -> QueryCacheBackend | None:
+    """Create the query cache configured by the environment, None if disabled."""
+    backend = os.getenv(envs.QUERY_CACHE, QUERY_CACHE_MEMORY).lower()
+    ttl = float(os.getenv(envs.QUERY_CACHE_TTL, "60"))
+    if backend == QUERY_CACHE_MEMORY:
+        return InMemoryQueryCache(
+            max_entries=int(os.getenv(envs.QUERY_CACHE_SIZE, "1024")), ttl=ttl
+        )
+    if backend == QUERY_CACHE_REDIS:
+        return RedisQueryCache(
+            os.getenv(envs.QUERY_CACHE_REDIS_URL, "redis://localhost:6379/0"), ttl=ttl
+        )
+    return None
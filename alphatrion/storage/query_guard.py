@@ -0,0 +1,99 @@
+"""Resource limits of TraceStore queries.
+
+Every query runs with the ClickHouse settings of its kind, so a heavy
+team-wide aggregation is cut off by ClickHouse instead of monopolizing its
+memory:
+- aggregate: dashboards and statistics, scanning many spans into few rows
+- spans: span listings, reading few granules but returning wide rows
+- search: full-text search, reading many granules of large attributes
+
+Defaults can be overridden per kind, and per org, e.g. to give a large tenant
+more headroom or to cap a noisy one. Org settings apply to every kind:
+
+    ALPHATRION_CLICKHOUSE_QUERY_SETTINGS='{"aggregate": {"max_execution_time": 60}}'
+    ALPHATRION_CLICKHOUSE_ORG_QUERY_SETTINGS='{"<org id>": {"max_memory_usage": 1000000000}}'
+
+Queries are tagged with the query tag of the current context, if any, so all
+queries issued on behalf of a request can be cancelled at once, see
+TraceStore.cancel_queries.
+"""
+
+import json
+import os
+import uuid
+from contextvars import ContextVar
+from typing import Any
+
+from alphatrion import envs
+
+QUERY_KIND_AGGREGATE = "aggregate"
+QUERY_KIND_SPANS = "spans"
+QUERY_KIND_SEARCH = "search"
+
+GIB = 1024**3
+
+DEFAULT_QUERY_SETTINGS = {
+    QUERY_KIND_AGGREGATE: {
+        "max_execution_time": 30,
+        "max_memory_usage": 4 * GIB,
+        # Partial aggregates spill to disk instead of failing the query
+        "max_bytes_before_external_group_by": 2 * GIB,
+    },
+    QUERY_KIND_SPANS: {
+        "max_execution_time": 15,
+        "max_memory_usage": 2 * GIB,
+        "max_result_rows": 1_000_000,
+    },
+    QUERY_KIND_SEARCH: {
+        "max_execution_time": 10,
+        "max_memory_usage": 2 * GIB,
+        "max_rows_to_read": 500_000_000,
+    },
+}
+
+# Tag of the queries issued in the current context, e.g. by one HTTP request
+query_tag: ContextVar[str | None] = ContextVar("alphatrion_query_tag", default=None)
+
+
+class QueryGuard:
+    """ClickHouse settings of TraceStore queries, by kind and org."""
+
+    def __init__(
+        self,
+        overrides: dict[str, dict[str, Any]] | None = None,
+        org_settings: dict[str, dict[str, Any]] | None = None,
+    ):
+        """
+        Args:
+            overrides: Settings by query kind, merged into the defaults
+            org_settings: Settings by org ID, applied over the kind settings
+        """
+        self._settings = {
+            kind: {**defaults, **(overrides or {}).get(kind, {})}
+            for kind, defaults in DEFAULT_QUERY_SETTINGS.items()
+        }
+        unknown = set(overrides or {}) - set(self._settings)
+        if unknown:
+            raise ValueError(f"Unknown query kinds: {', '.join(sorted(unknown))}")
+        self._org_settings = org_settings or {}
+
+    def settings(
+        self, kind: str, org_id: uuid.UUID | str | None = None
+    ) -> dict[str, Any]:
+        """Settings of a query, including its query_id when a query tag is set."""
+        settings = {**self._settings[kind]}
+        if org_id is not None:
+            settings.update(self._org_settings.get(str(org_id), {}))
+        tag = query_tag.get()
+        if tag:
+            settings["query_id"] = f"{tag}:{uuid.uuid4().hex}"
+        return settings
+
+    @classmethod
+    def from_env(cls) -> "QueryGuard":
+        return cls(
+            overrides=json.loads(os.getenv(envs.CLICKHOUSE_QUERY_SETTINGS) or "{}"),
+            org_settings=json.loads(
+                os.getenv(envs.CLICKHOUSE_ORG_QUERY_SETTINGS) or "{}"
+            ),
+        )
@@ -4,18 +4,33 @@ import os
 
 from opentelemetry import trace
 from opentelemetry.sdk.trace import TracerProvider
-from opentelemetry.sdk.trace.export import BatchSpanProcessor
+from opentelemetry.sdk.trace.export import BatchSpanProcessor, SimpleSpanProcessor
 from traceloop.sdk import Traceloop
 
 from alphatrion import envs
 from alphatrion.artifact.artifact import Artifact
+from alphatrion.storage.circuit_breaker import CircuitBreaker
+from alphatrion.storage.query_cache import query_cache_from_env
+from alphatrion.storage.query_guard import QueryGuard
 from alphatrion.storage.sqlstore import SQLStore
-from alphatrion.storage.tracestore import TraceStore
+from alphatrion.storage.tracestore import PRICING_INGEST, TraceStore
 from alphatrion.tracing.clickhouse_exporter import ClickHouseSpanExporter
 from alphatrion.tracing.cost_enrichment_processor import CostEnrichmentProcessor
+from alphatrion.tracing.export_worker import ProcessSpanExporter
+from alphatrion.tracing.metric_labels import LabelPolicy
 from alphatrion.tracing.noop_exporter import NoOpSpanExporter
-from alphatrion.tracing.prometheus_exporter import PrometheusExporter
+from alphatrion.tracing.otlp import ServerSpanWriter, server_exporter_from_env
+from alphatrion.tracing.prometheus_exporter import (
+    PULL_MODE,
+    PUSH_MODE,
+    PrometheusExporter,
+)
+from alphatrion.tracing.sampler import sampler_from_env
 from alphatrion.tracing.span_processor import ContextAttributesSpanProcessor
+from alphatrion.tracing.tail_sampling import (
+    SamplingSpanProcessor,
+    tail_sampling_policy_from_env,
+)
 
 __STORAGE_RUNTIME__ = None
 
@@ -23,6 +38,8 @@ __STORAGE_RUNTIME__ = None
 class StorageRuntime:
     _metadb = None
     _tracestore = None
+    _span_writer = None
+    _prometheus_exporter = None
     _artifact = None
     _otel_initialized = False
     _inited = False
@@ -41,15 +58,17 @@ class StorageRuntime:
             os.getenv(envs.ENABLE_PROMETHEUS_EXPORTER, "false").lower() == "true"
         )
 
+        export_mode = os.getenv(envs.TRACE_EXPORT_MODE, "thread").lower()
+
         # ClickHouse TraceStore (only when full tracing is on)
-        if enable_tracing:
+        if enable_tracing and export_mode == "server":
+            # The AlphaTrion server inserts the spans, no ClickHouse connection here
+            primary_exporter = server_exporter_from_env()
+            self._span_writer = ServerSpanWriter(primary_exporter)
+        elif enable_tracing:
             try:
-                self._tracestore = TraceStore(
-                    host=os.getenv(envs.CLICKHOUSE_URL, "localhost:8123"),
-                    database=os.getenv(envs.CLICKHOUSE_DATABASE, "alphatrion_traces"),
-                    username=os.getenv(envs.CLICKHOUSE_USERNAME, "alphatrion"),
-                    password=os.getenv(envs.CLICKHOUSE_PASSWORD, "alphatr1on"),
-                )
+                self._tracestore = tracestore_from_env()
+                self._span_writer = self._tracestore
                 primary_exporter = ClickHouseSpanExporter(self._tracestore)
             except Exception as e:
                 logger = logging.getLogger(__name__)
@@ -59,6 +78,7 @@ class StorageRuntime:
                     "or set ALPHATRION_ENABLE_TRACING=false to suppress this warning."
                 )
                 self._tracestore = None
+                self._span_writer = None
                 # Use a NoOp exporter when setting-up full tracing fails, since we may still
                 # want to enable to OTel pipeline for exporting to prometheus.
                 primary_exporter = NoOpSpanExporter()
@@ -69,14 +89,39 @@ class StorageRuntime:
 
         # OTel pipeline (when tracing OR prometheus is on)
         if enable_tracing or enable_prometheus:
+            # Conversion, cost enrichment and export run in a sidecar process
+            # rather than in a thread competing with the application
+            export_in_process = export_mode == "process"
+            if export_in_process:
+                primary_exporter = ProcessSpanExporter(
+                    clickhouse=self._tracestore is not None,
+                    prometheus=enable_prometheus,
+                )
+
             enable_batch = (
                 os.getenv(envs.CLICKHOUSE_ENABLE_BATCH, "true").lower() == "true"
             )
+            export_processors = [
+                BatchSpanProcessor(primary_exporter)
+                if enable_batch
+                else SimpleSpanProcessor(primary_exporter)
+            ]
+
+            # Add Prometheus exporter if enabled
+            if enable_prometheus and not export_in_process:
+                self._prometheus_exporter = prometheus_exporter_from_env()
+                # Use BatchSpanProcessor for better performance
+                export_processors.append(BatchSpanProcessor(self._prometheus_exporter))
+
+            # Spans no exporter keeps are dropped at start, the others are head
+            # and tail sampled, forwarding the token usage of dropped spans
             Traceloop.init(
                 app_name="alphatrion",
-                exporter=primary_exporter,
-                disable_batch=not enable_batch,
+                processor=SamplingSpanProcessor(
+                    export_processors, policy=tail_sampling_policy_from_env()
+                ),
                 telemetry_enabled=False,
+                sampler=sampler_from_env(),
             )
 
             # Add custom span processors
@@ -87,23 +132,8 @@ class StorageRuntime:
 
             # 2. Cost enrichment processor - calculates costs from tokens and adds to span attributes
             # This runs early so downstream processors/exporters can access cost data
-            tracer_provider.add_span_processor(CostEnrichmentProcessor())
-
-            # 3. Add Prometheus exporter if enabled
-            if enable_prometheus:
-                pushgateway_url = os.getenv(
-                    envs.PROMETHEUS_PUSHGATEWAY_URL, "localhost:9091"
-                )
-                job_name = os.getenv(envs.PROMETHEUS_JOB_NAME, "alphatrion")
-
-                prometheus_exporter = PrometheusExporter(
-                    pushgateway_url=pushgateway_url,
-                    job_name=job_name,
-                )
-                # Use BatchSpanProcessor for better performance
-                tracer_provider.add_span_processor(
-                    BatchSpanProcessor(prometheus_exporter)
-                )
+            if not export_in_process:
+                tracer_provider.add_span_processor(CostEnrichmentProcessor())
 
             self._otel_initialized = True
         else:
@@ -123,6 +153,16 @@ class StorageRuntime:
     def tracestore(self):
         return self._tracestore
 
+    @property
+    def span_writer(self):
+        """Where span rows are inserted, the TraceStore or the AlphaTrion server."""
+        return self._span_writer
+
+    @property
+    def prometheus_exporter(self):
+        """The Prometheus exporter of this process, None if disabled or in the export worker."""
+        return self._prometheus_exporter
+
     def flush(self):
         if self._otel_initialized:
             tracer_provider = trace.get_tracer_provider()
@@ -156,3 +196,48 @@ def storage_runtime() -> StorageRuntime:
 
 def artifact_storage_enabled() -> bool:
     return os.getenv(envs.ENABLE_ARTIFACT_STORAGE, "true").lower() == "true"
+
+
+def tracestore_from_env() -> TraceStore:
+    """Create the ClickHouse TraceStore configured by the environment."""
+    return TraceStore(
+        host=os.getenv(envs.CLICKHOUSE_URL, "localhost:8123"),
+        database=os.getenv(envs.CLICKHOUSE_DATABASE, "alphatrion_traces"),
+        username=os.getenv(envs.CLICKHOUSE_USERNAME, "alphatrion"),
+        password=os.getenv(envs.CLICKHOUSE_PASSWORD, "alphatr1on"),
+        buffer_size=int(os.getenv(envs.CLICKHOUSE_BUFFER_SIZE, "0")),
+        spill_dir=os.path.join(
+            os.getenv(envs.ROOT_PATH, os.path.expanduser("~/.alphatrion")),
+            "spans",
+        ),
+        cluster_name=os.getenv(envs.CLICKHOUSE_CLUSTER_NAME) or None,
+        content_threshold=int(os.getenv(envs.CLICKHOUSE_CONTENT_THRESHOLD, "1024")),
+        query_cache=query_cache_from_env(),
+        query_guard=QueryGuard.from_env(),
+        max_concurrent_queries=int(
+            os.getenv(envs.CLICKHOUSE_MAX_CONCURRENT_QUERIES, "8")
+        ),
+        circuit_breaker=CircuitBreaker(
+            "clickhouse",
+            failure_threshold=int(os.getenv(envs.CLICKHOUSE_BREAKER_FAILURES, "5")),
+            reset_timeout=float(os.getenv(envs.CLICKHOUSE_BREAKER_RESET_TIMEOUT, "30")),
+        ),
+        pricing=os.getenv(envs.COST_PRICING, PRICING_INGEST),
+    )
+
+
+def prometheus_exporter_from_env() -> PrometheusExporter:
+    """Create the Prometheus exporter configured by the environment."""
+    mode = os.getenv(envs.PROMETHEUS_MODE, PUSH_MODE).lower()
+    if mode not in (PUSH_MODE, PULL_MODE):
+        raise ValueError(f"Unsupported Prometheus mode: {mode}")
+    metrics_port = int(os.getenv(envs.PROMETHEUS_METRICS_PORT, "9464"))
+    return PrometheusExporter(
+        pushgateway_url=os.getenv(envs.PROMETHEUS_PUSHGATEWAY_URL, "localhost:9091")
+        if mode == PUSH_MODE
+        else None,
+        job_name=os.getenv(envs.PROMETHEUS_JOB_NAME, "alphatrion"),
+        push_interval=float(os.getenv(envs.PROMETHEUS_PUSH_INTERVAL, "15")),
+        metrics_port=metrics_port if mode == PULL_MODE and metrics_port else None,
+        label_policy=LabelPolicy.from_env(),
+    )
@@ -0,0 +1,420 @@
+"""Durable span buffer in front of the ClickHouse TraceStore.
+
+Spans are queued in a bounded in-memory buffer and written by a background
+thread. Failed writes are retried with exponential backoff; when the buffer
+is full (or the process exits while ClickHouse is unavailable) spans are
+spilled to append-only segment files and replayed once writes succeed again.
+"""
+
+import atexit
+import json
+import logging
+import os
+import random
+import threading
+import time
+from collections import deque
+from collections.abc import Callable
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+from prometheus_client import Counter, Gauge
+
+from alphatrion.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_SUFFIX = ".jsonl"
+OPEN_SEGMENT_SUFFIX = ".jsonl.open"
+REPLAY_SEGMENT_SUFFIX = ".jsonl.replay"
+
+BUFFER_DEPTH = Gauge(
+    "alphatrion_span_buffer_depth",
+    "Number of spans waiting in the in-memory span buffer",
+    registry=REGISTRY,
+)
+BUFFER_SPILL_SEGMENTS = Gauge(
+    "alphatrion_span_buffer_spill_segments",
+    "Number of sealed spill segments waiting to be replayed",
+    registry=REGISTRY,
+)
+BUFFER_DROPPED = Counter(
+    "alphatrion_span_buffer_dropped_total",
+    "Spans dropped because neither memory nor disk could hold them",
+    registry=REGISTRY,
+)
+BUFFER_SPILLED = Counter(
+    "alphatrion_span_buffer_spilled_total",
+    "Spans spilled to disk segments",
+    registry=REGISTRY,
+)
+BUFFER_REPLAYED = Counter(
+    "alphatrion_span_buffer_replayed_total",
+    "Spans replayed from disk segments",
+    registry=REGISTRY,
+)
+BUFFER_WRITE_FAILURES = Counter(
+    "alphatrion_span_buffer_write_failures_total",
+    "Failed attempts to write a span batch to the trace store",
+    registry=REGISTRY,
+)
+
+
+class SpanBuffer:
+    """Bounded, retrying and disk-backed buffer for span inserts."""
+
+    def __init__(
+        self,
+        writer: Callable[[list[dict[str, Any]]], None],
+        spill_dir: str,
+        *,
+        max_spans: int = 50_000,
+        batch_size: int = 5_000,
+        flush_interval: float = 0.2,
+        initial_backoff: float = 0.5,
+        max_backoff: float = 60.0,
+        max_segment_bytes: int = 64 * 1024 * 1024,
+        max_spill_bytes: int = 1024 * 1024 * 1024,
+    ):
+        """Initialize the span buffer and start its writer thread.
+
+        Args:
+            writer: Callable that writes a batch of spans and raises on failure
+            spill_dir: Directory for spill segment files
+            max_spans: Maximum number of spans kept in memory
+            batch_size: Maximum number of spans per write
+            flush_interval: Seconds to linger for more spans before a partial write
+            initial_backoff: First retry delay in seconds after a failed write
+            max_backoff: Upper bound of the retry delay in seconds
+            max_segment_bytes: Size after which a spill segment is sealed
+            max_spill_bytes: Total size of spill segments before dropping spans
+        """
+        self._writer = writer
+        self._spill_dir = Path(spill_dir)
+        self._max_spans = max_spans
+        self._batch_size = batch_size
+        self._flush_interval = flush_interval
+        self._initial_backoff = initial_backoff
+        self._max_backoff = max_backoff
+        self._max_segment_bytes = max_segment_bytes
+        self._max_spill_bytes = max_spill_bytes
+
+        self._queue: deque[dict[str, Any]] = deque()
+        self._cond = threading.Condition()
+        self._spill_lock = threading.Lock()
+        self._segment_file = None
+        self._segment_path: Path | None = None
+        self._in_flight = 0
+        self._backoff = 0.0
+        self._flush_requested = False
+        self._closed = False
+
+        self._spill_dir.mkdir(parents=True, exist_ok=True)
+        self._seal_orphaned_segments()
+        self._replay_pending = self._has_spilled()
+        BUFFER_SPILL_SEGMENTS.set(len(self._sealed_segments()))
+
+        self._thread = threading.Thread(
+            target=self._run, name="alphatrion-span-buffer", daemon=True
+        )
+        self._thread.start()
+        atexit.register(self.close)
+
+    @property
+    def depth(self) -> int:
+        """Number of spans currently held in memory."""
+        return len(self._queue)
+
+    def put(self, spans: list[dict[str, Any]]) -> None:
+        """Queue spans for writing. Never blocks on the trace store.
+
+        Spans that don't fit into memory are spilled to disk, and dropped
+        only if the spill fails as well.
+        """
+        if not spans:
+            return
+
+        with self._cond:
+            if self._closed:
+                overflow = spans
+            else:
+                room = max(self._max_spans - len(self._queue), 0)
+                self._queue.extend(spans[:room])
+                BUFFER_DEPTH.inc(min(room, len(spans)))
+                overflow = spans[room:]
+                self._cond.notify()
+
+        if overflow:
+            self._spill(overflow)
+
+    def flush(self, timeout: float = 30.0) -> bool:
+        """Wait until all queued spans are written.
+
+        Args:
+            timeout: Maximum number of seconds to wait
+
+        Returns:
+            True if the buffer drained within the timeout, False otherwise
+        """
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            self._flush_requested = True
+            self._cond.notify_all()
+            try:
+                while self._queue or self._in_flight:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0 or self._closed:
+                        return False
+                    self._cond.wait(min(remaining, 0.1))
+            finally:
+                self._flush_requested = False
+        return True
+
+    def close(self, timeout: float = 5.0) -> None:
+        """Stop the writer thread and spill whatever could not be written."""
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+
+        self._thread.join(timeout)
+
+        with self._cond:
+            remaining = list(self._queue)
+            self._queue.clear()
+            BUFFER_DEPTH.dec(len(remaining))
+        if remaining:
+            self._spill(remaining)
+        self._seal_segment()
+        atexit.unregister(self.close)
+
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                while not self._queue and not self._closed and not self._replay_pending:
+                    self._cond.wait(1.0)
+                # Linger briefly so small puts coalesce into one large insert
+                deadline = time.monotonic() + self._flush_interval
+                while (
+                    0 < len(self._queue) < self._batch_size
+                    and not self._closed
+                    and not self._flush_requested
+                ):
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+                closing = self._closed
+                batch = self._take_batch()
+
+            if closing:
+                # Give queued spans one last chance, without retries. Whatever
+                # fails is spilled by close().
+                if batch:
+                    self._write_batch(batch)
+                return
+
+            if batch and not self._write_batch(batch):
+                self._wait_backoff()
+                continue
+            if self._replay_pending and not self._queue:
+                self._replay_segments()
+
+    def _take_batch(self) -> list[dict[str, Any]]:
+        # Must be called with self._cond held
+        batch = []
+        while self._queue and len(batch) < self._batch_size:
+            batch.append(self._queue.popleft())
+        self._in_flight = len(batch)
+        return batch
+
+    def _write_batch(self, batch: list[dict[str, Any]]) -> bool:
+        try:
+            self._writer(batch)
+        except Exception as e:
+            BUFFER_WRITE_FAILURES.inc()
+            logger.warning(f"Failed to write {len(batch)} spans, will retry: {e}")
+            with self._cond:
+                # Put the batch back in front so ordering is preserved, the
+                # newest spans beyond max_spans are spilled
+                self._queue.extendleft(reversed(batch))
+                self._in_flight = 0
+                overflow = [
+                    self._queue.pop()
+                    for _ in range(max(len(self._queue) - self._max_spans, 0))
+                ]
+                overflow.reverse()
+                BUFFER_DEPTH.dec(len(overflow))
+            if overflow:
+                self._spill(overflow)
+            return False
+
+        with self._cond:
+            self._in_flight = 0
+            BUFFER_DEPTH.dec(len(batch))
+            self._backoff = 0.0
+            self._cond.notify_all()
+        if not self._replay_pending:
+            self._replay_pending = self._has_spilled()
+        return True
+
+    def _wait_backoff(self) -> None:
+        self._backoff = (
+            self._initial_backoff
+            if self._backoff == 0
+            else min(self._backoff * 2, self._max_backoff)
+        )
+        delay = self._backoff * random.uniform(0.8, 1.2)
+        with self._cond:
+            if not self._closed:
+                self._cond.wait(delay)
+
+    def _spill(self, spans: list[dict[str, Any]]) -> None:
+        with self._spill_lock:
+            try:
+                if self._spill_size() >= self._max_spill_bytes:
+                    raise OSError("spill directory is full")
+                if self._segment_file is None:
+                    self._open_segment()
+                for span in spans:
+                    self._segment_file.write(
+                        json.dumps(span, default=_encode_value) + "\n"
+                    )
+                self._segment_file.flush()
+                BUFFER_SPILLED.inc(len(spans))
+                if self._segment_file.tell() >= self._max_segment_bytes:
+                    self._seal_segment_locked()
+            except Exception as e:
+                BUFFER_DROPPED.inc(len(spans))
+                logger.error(f"Failed to spill {len(spans)} spans, dropping: {e}")
+
+    def _open_segment(self) -> None:
+        name = f"segment-{time.time_ns()}-{os.getpid()}{OPEN_SEGMENT_SUFFIX}"
+        self._segment_path = self._spill_dir / name
+        self._segment_file = open(self._segment_path, "a", encoding="utf-8")  # noqa: SIM115
+
+    def _seal_segment(self) -> None:
+        with self._spill_lock:
+            self._seal_segment_locked()
+
+    def _seal_segment_locked(self) -> None:
+        if self._segment_file is None:
+            return
+        self._segment_file.close()
+        sealed = self._segment_path.with_name(
+            self._segment_path.name.removesuffix(OPEN_SEGMENT_SUFFIX) + SEGMENT_SUFFIX
+        )
+        os.replace(self._segment_path, sealed)
+        self._segment_file = None
+        self._segment_path = None
+        self._replay_pending = True
+        BUFFER_SPILL_SEGMENTS.set(len(self._sealed_segments()))
+
+    def _replay_segments(self) -> None:
+        # Seal the segment this process is writing, so it's replayed as well
+        self._seal_segment()
+
+        for segment in self._sealed_segments():
+            # Claim the segment by renaming it, so concurrent processes sharing
+            # the spill directory never replay the same file twice.
+            claimed = segment.with_name(
+                f"{segment.name.removesuffix(SEGMENT_SUFFIX)}{REPLAY_SEGMENT_SUFFIX}-{os.getpid()}"
+            )
+            try:
+                os.replace(segment, claimed)
+            except FileNotFoundError:
+                continue
+
+            with open(claimed, encoding="utf-8") as f:
+                lines = [line for line in f if line.strip()]
+            spans = [json.loads(line, object_hook=_decode_value) for line in lines]
+
+            for start in range(0, len(spans), self._batch_size):
+                chunk = spans[start : start + self._batch_size]
+                try:
+                    self._writer(chunk)
+                except Exception as e:
+                    BUFFER_WRITE_FAILURES.inc()
+                    logger.warning(f"Failed to replay spill segment {segment}: {e}")
+                    # Keep what's left for the next replay and back off
+                    self._release_segment(
+                        claimed, segment, lines[start:] if start else None
+                    )
+                    self._wait_backoff()
+                    return
+                BUFFER_REPLAYED.inc(len(chunk))
+
+            claimed.unlink(missing_ok=True)
+            logger.info(f"Replayed {len(spans)} spans from spill segment {segment}")
+
+        self._replay_pending = False
+        BUFFER_SPILL_SEGMENTS.set(len(self._sealed_segments()))
+
+    def _release_segment(
+        self, claimed: Path, segment: Path, remaining: list[str] | None
+    ) -> None:
+        """Seal a claimed segment again, with only its remaining lines if given.
+
+        It's never re-spilled, which would count it against max_spill_bytes
+        twice and drop it when the spill directory is full.
+        """
+        try:
+            if remaining is not None:
+                # Written aside then renamed, so the segment is never truncated
+                rewritten = self._spill_dir / f".rewrite-{claimed.name}"
+                with open(rewritten, "w", encoding="utf-8") as f:
+                    f.writelines(remaining)
+                os.replace(rewritten, claimed)
+            os.replace(claimed, segment)
+        except OSError as e:
+            logger.error(f"Failed to release spill segment {segment}: {e}")
+
+    def _has_spilled(self) -> bool:
+        return self._segment_file is not None or bool(self._sealed_segments())
+
+    def _sealed_segments(self) -> list[Path]:
+        return sorted(self._spill_dir.glob(f"segment-*{SEGMENT_SUFFIX}"))
+
+    def _spill_size(self) -> int:
+        return sum(p.stat().st_size for p in self._spill_dir.glob("segment-*"))
+
+    def _seal_orphaned_segments(self) -> None:
+        """Seal segments left open or half-replayed by processes that died."""
+        for path in self._spill_dir.glob("segment-*"):
+            name = path.name
+            if name.endswith(OPEN_SEGMENT_SUFFIX):
+                pid = int(name.removesuffix(OPEN_SEGMENT_SUFFIX).rsplit("-", 1)[1])
+                base = name.removesuffix(OPEN_SEGMENT_SUFFIX)
+            elif REPLAY_SEGMENT_SUFFIX in name:
+                base, pid = name.rsplit(f"{REPLAY_SEGMENT_SUFFIX}-", 1)
+                pid = int(pid)
+            else:
+                continue
+            if not _pid_alive(pid):
+                os.replace(path, path.with_name(base + SEGMENT_SUFFIX))
+
+
+def _pid_alive(pid: int) -> bool:
+    if pid == os.getpid():
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, datetime):
+        return {"$datetime": value.isoformat()}
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _decode_value(obj: dict[str, Any]) -> Any:
+    if len(obj) == 1 and "$datetime" in obj:
+        return datetime.fromisoformat(obj["$datetime"])
+    return obj
@@ -0,0 +1,90 @@
+"""Content-addressed storage of large span attribute values.
+
+Prompts, completions and system prompts are repeated across many spans, e.g.
+every LLM span of a Claude turn carries the full user message. Values longer
+than a threshold are stored once per team in the span_contents table, keyed
+by their hash, and spans only hold a reference to them:
+
+    "alphatrion.content:<32 hex chars>"
+
+TraceStore replaces the values on write and restores them on read. It writes
+referenced contents again every CONTENT_REFRESH_SECONDS, so the TTL of
+span_contents (migration 008) only deletes contents no full span uses.
+"""
+
+import hashlib
+import re
+from typing import Any
+
+CONTENT_REF_PREFIX = "alphatrion.content:"
+_CONTENT_REF = re.compile(rf"^{re.escape(CONTENT_REF_PREFIX)}([0-9a-f]{{32}})$")
+
+
+def content_hash(value: str) -> str:
+    return hashlib.blake2b(value.encode(), digest_size=16).hexdigest()
+
+
+def extract_contents(
+    spans: list[dict[str, Any]], threshold: int
+) -> tuple[list[dict[str, Any]], dict[tuple[str, str, str], str]]:
+    """Replace span attribute values longer than threshold with references.
+
+    The given spans are left untouched, so they can be retried as is.
+
+    Args:
+        spans: Span dicts as passed to TraceStore.insert_spans
+        threshold: Min length of the values to replace
+
+    Returns:
+        The spans with references, and the contents keyed by (OrgId, TeamId, hash)
+    """
+    contents = {}
+    result = []
+    for span in spans:
+        attributes = span.get("SpanAttributes")
+        if not attributes:
+            result.append(span)
+            continue
+
+        replaced = None
+        for key, value in attributes.items():
+            if not isinstance(value, str) or len(value) < threshold:
+                continue
+            if replaced is None:
+                replaced = dict(attributes)
+            digest = content_hash(value)
+            contents[(span.get("OrgId", ""), span.get("TeamId", ""), digest)] = value
+            replaced[key] = CONTENT_REF_PREFIX + digest
+
+        result.append(
+            span if replaced is None else {**span, "SpanAttributes": replaced}
+        )
+    return result, contents
+
+
+def content_refs(spans: list[dict[str, Any]]) -> set[str]:
+    """Hashes referenced by the SpanAttributes of spans."""
+    refs = set()
+    for span in spans:
+        for value in (span.get("SpanAttributes") or {}).values():
+            if value.startswith(CONTENT_REF_PREFIX):
+                match = _CONTENT_REF.match(value)
+                if match:
+                    refs.add(match.group(1))
+    return refs
+
+
+def rehydrate(spans: list[dict[str, Any]], contents: dict[str, str]) -> None:
+    """Replace references in the SpanAttributes of spans with their contents, in place.
+
+    References without content (e.g. deleted by hand) are left as is.
+    """
+    for span in spans:
+        attributes = span.get("SpanAttributes")
+        if not attributes:
+            continue
+        for key, value in attributes.items():
+            if value.startswith(CONTENT_REF_PREFIX):
+                match = _CONTENT_REF.match(value)
+                if match and match.group(1) in contents:
+                    attributes[key] = contents[match.group(1)]
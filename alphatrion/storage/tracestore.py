@@ -1,14 +1,370 @@
 # ruff: noqa: E501
 
+import base64
+import hashlib
+import json
 import logging
 import threading
+import time
 import uuid
+from collections import OrderedDict
+from collections.abc import Callable
+from datetime import UTC, datetime, timedelta
 from typing import Any
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
 import clickhouse_connect
+from clickhouse_connect.driver import httputil
+from clickhouse_connect.driver.query import QueryResult
+
+from alphatrion.storage.circuit_breaker import CircuitBreaker
+from alphatrion.storage.query_cache import QueryCacheBackend, cache_key
+from alphatrion.storage.query_guard import (
+    QUERY_KIND_AGGREGATE,
+    QUERY_KIND_SEARCH,
+    QUERY_KIND_SPANS,
+    QueryGuard,
+)
+from alphatrion.storage.span_buffer import SpanBuffer
+from alphatrion.storage.span_contents import (
+    CONTENT_REF_PREFIX,
+    content_refs,
+    extract_contents,
+    rehydrate,
+)
+from alphatrion.storage.tracetree import build_span_profile
+from alphatrion.utils.pricing import RELEASE_SUFFIX_PATTERN
 
 logger = logging.getLogger(__name__)
 
+# Columns written by TraceStore.write_spans, with the value of spans missing them
+SPAN_INSERT_COLUMNS = (
+    ("Timestamp", None),
+    ("TraceId", ""),
+    ("SpanId", ""),
+    ("ParentSpanId", ""),
+    ("SpanName", ""),
+    ("SpanKind", ""),
+    ("SemanticKind", ""),
+    ("ServiceName", ""),
+    ("Duration", 0),
+    ("StatusCode", ""),
+    ("StatusMessage", ""),
+    ("OrgId", ""),
+    ("TeamId", ""),
+    ("UserId", ""),
+    ("RunId", ""),
+    ("ExperimentId", ""),
+    ("SessionId", ""),
+    ("AgentId", ""),
+    ("AgentType", ""),
+    ("SpanAttributes", {}),
+    ("ResourceAttributes", {}),
+    ("Events.Timestamp", []),
+    ("Events.Name", []),
+    ("Events.Attributes", []),
+    ("Links.TraceId", []),
+    ("Links.SpanId", []),
+    ("Links.Attributes", []),
+)
+
+# Attributes kept by the summary projection: everything needed to render token,
+# cost and model info, but none of the prompts/completions.
+SUMMARY_ATTRIBUTE_PREFIXES = (
+    "gen_ai.usage.",
+    "alphatrion.cost.",
+    "gen_ai.system",
+    "gen_ai.request.model",
+    "gen_ai.response.model",
+    "llm.request.type",
+    "traceloop.span.kind",
+    "traceloop.entity.name",
+    "traceloop.workflow.name",
+)
+
+# Model of an LLM span, empty for other spans
+MODEL_EXPR = (
+    "if(SpanAttributes['gen_ai.response.model'] != '', "
+    "SpanAttributes['gen_ai.response.model'], SpanAttributes['gen_ai.request.model'])"
+)
+
+# Model name of an LLM span as priced, the key alphatrion.utils.pricing.model_keys
+# gives it without organization: lowercase, without any release suffix. Names
+# only priced as an extension of a priced model, see PricingIndex, aren't keyed.
+_RELEASE_SUFFIXES_SQL = f"(?:{RELEASE_SUFFIX_PATTERN.removesuffix('$')})+$".replace(
+    "\\", "\\\\"
+)
+PRICED_MODEL_EXPR = (
+    f"replaceRegexpOne(replaceRegexpOne(lower(trimBoth({MODEL_EXPR})), "
+    f"'{_RELEASE_SUFFIXES_SQL}', ''), '^.*/', '')"
+)
+
+# Dictionary of model prices by priced model name and effective date, see
+# migrations/clickhouse/pricing.py
+PRICES_DICT = "model_prices_dict"
+
+# Cost components, by token type, with their price in PRICES_DICT
+COST_COMPONENTS = {
+    "input_tokens": "InputPrice",
+    "output_tokens": "OutputPrice",
+    "cache_read_input_tokens": "CacheReadPrice",
+    "cache_creation_input_tokens": "CacheCreationPrice",
+}
+
+# Prices costs are aggregated at: the ones of the alphatrion.cost.* attributes
+# set at ingest, or the current ones of PRICES_DICT for the day of each span
+PRICING_INGEST = "ingest"
+PRICING_CURRENT = "current"
+
+
+def cost_expr(database: str, component: str, pricing: str = PRICING_INGEST) -> str:
+    """Cost of a span for a token type, at ingest or current prices.
+
+    Spans whose model isn't in PRICES_DICT keep their ingest cost.
+    """
+    ingest = f"toFloat64OrZero(SpanAttributes['alphatrion.cost.{component}'])"
+    if pricing == PRICING_INGEST:
+        return ingest
+    price = (
+        f"dictGetOrNull('{database}.{PRICES_DICT}', '{COST_COMPONENTS[component]}', "
+        f"tuple({PRICED_MODEL_EXPR}), toDate(Timestamp))"
+    )
+    tokens = f"toInt64OrZero(SpanAttributes['gen_ai.usage.{component}'])"
+    return f"ifNull({tokens} / 1000000 * {price}, {ingest})"
+
+
+# Dimensions latency percentiles can be grouped by
+LATENCY_GROUP_BY = {
+    "model": MODEL_EXPR,
+    "span_name": "SpanName",
+    "agent": "AgentId",
+    "bucket": None,  # time bucket of the TimeWindow
+}
+
+# Max number of recently written contents remembered per TraceStore
+MAX_WRITTEN_CONTENTS = 100_000
+
+# Contents still referenced are written again after this many seconds, so
+# their InsertedAt tells when they were last used, see span_contents TTL
+CONTENT_REFRESH_SECONDS = 86400
+
+# Bucket sizes of aggregate series, by interval unit
+TIME_BUCKETS = {
+    "minute": "MINUTE",
+    "hour": "HOUR",
+    "day": "DAY",
+    "week": "WEEK",
+}
+
+_SPAN_BASE_COLUMNS = """
+    Timestamp,
+    toUnixTimestamp64Nano(Timestamp) as TimestampNs,
+    TraceId,
+    SpanId,
+    ParentSpanId,
+    SpanName,
+    SpanKind,
+    SemanticKind,
+    ServiceName,
+    Duration,
+    StatusCode,
+    StatusMessage,
+    OrgId,
+    TeamId,
+    UserId,
+    RunId,
+    ExperimentId,
+    SessionId,
+    AgentId,
+    AgentType,
+    ResourceAttributes,
+    Events.Timestamp as EventTimestamps,
+    Events.Name as EventNames,
+    Links.TraceId as LinkTraceIds,
+    Links.SpanId as LinkSpanIds"""
+
+SPAN_COLUMNS = f"""{_SPAN_BASE_COLUMNS},
+    SpanAttributes,
+    Events.Attributes as EventAttributes,
+    Links.Attributes as LinkAttributes
+"""
+
+_SUMMARY_ATTRIBUTE_FILTER = " OR ".join(
+    f"startsWith(k, '{prefix}')" for prefix in SUMMARY_ATTRIBUTE_PREFIXES
+)
+SPAN_SUMMARY_COLUMNS = f"""{_SPAN_BASE_COLUMNS},
+    mapFilter((k, v) -> {_SUMMARY_ATTRIBUTE_FILTER}, SpanAttributes) as SummaryAttributes
+"""
+
+
+# Attribute values searched by search_spans, along with StatusMessage
+SEARCHABLE_ATTRIBUTE_PREFIXES = (
+    "gen_ai.prompt.",
+    "gen_ai.completion.",
+    "traceloop.entity.input",
+    "traceloop.entity.output",
+    "exception.message",
+)
+
+# Text searched by search_spans. The ngram skip index of migration 006 is
+# built on this exact expression, keep them in sync.
+SEARCH_TEXT_EXPR = (
+    "lowerUTF8(concat(StatusMessage, ' ', arrayStringConcat(mapValues(mapFilter((k, v) -> "
+    + " OR ".join(f"startsWith(k, '{p}')" for p in SEARCHABLE_ATTRIBUTE_PREFIXES)
+    + ", SpanAttributes)), ' ')))"
+)
+
+# Values moved to span_contents, indexed by migration 006 too
+CONTENT_REFS_EXPR = f"arrayFilter(v -> startsWith(v, '{CONTENT_REF_PREFIX}'), mapValues(SpanAttributes))"
+
+# Max number of matching span_contents looked up by search_spans
+MAX_SEARCH_CONTENTS = 1000
+
+
+class TimeWindow:
+    """Time range and optional bucketing of an aggregate query.
+
+    The range is half-open, [start, end). Both bounds are compared against
+    Timestamp, the partition key, so ClickHouse only reads the monthly
+    partitions overlapping the range. With a bucket, aggregates are returned
+    as a series, one row per bucket aligned to the timezone, and buckets
+    without spans are filled in when the query isn't grouped by anything else.
+    """
+
+    def __init__(
+        self,
+        start: datetime | None = None,
+        end: datetime | None = None,
+        bucket: str | None = None,
+        timezone: str = "UTC",
+    ):
+        if bucket is not None and bucket not in TIME_BUCKETS:
+            raise ValueError(f"Unsupported bucket: {bucket}")
+        try:
+            ZoneInfo(timezone)
+        except (ZoneInfoNotFoundError, ValueError) as e:
+            raise ValueError(f"Unknown timezone: {timezone}") from e
+
+        # Naive datetimes are taken as UTC, like the timestamps of the spans
+        self.start = _as_utc(start)
+        self.end = _as_utc(end)
+        if self.start and self.end and self.start >= self.end:
+            raise ValueError("start must be before end")
+        self.bucket = bucket
+        self.timezone = timezone
+
+    def parameters(self) -> dict[str, Any]:
+        """Server side parameters referenced by the SQL fragments."""
+        params = {"tz": self.timezone}
+        if self.start:
+            params["start_ns"] = _to_ns(self.start)
+        if self.end:
+            params["end_ns"] = _to_ns(self.end)
+        return params
+
+    def conditions(self) -> str:
+        """Range conditions, to be appended to a WHERE clause."""
+        conditions = ""
+        if self.start:
+            conditions += " AND Timestamp >= fromUnixTimestamp64Nano({start_ns:Int64})"
+        if self.end:
+            conditions += " AND Timestamp < fromUnixTimestamp64Nano({end_ns:Int64})"
+        return conditions
+
+    def bucket_select(self) -> str:
+        """Bucket column, to be prepended to a SELECT list."""
+        if not self.bucket:
+            return ""
+        return f"{self.align('Timestamp')} as bucket,"
+
+    def group_by(self, *keys: str) -> str:
+        columns = (["bucket"] if self.bucket else []) + list(keys)
+        return f"GROUP BY {', '.join(columns)}" if columns else ""
+
+    def order_by(self, *keys: str) -> str:
+        columns = list(keys)
+        if self.bucket:
+            # Filled rows would carry empty keys, so only pure series are filled
+            columns.insert(0, "bucket ASC" if keys else f"bucket ASC {self._fill()}")
+        return f"ORDER BY {', '.join(columns)}" if columns else ""
+
+    def bucket_of(self, row: dict[str, Any]) -> dict[str, Any]:
+        return {"bucket": row["bucket"]} if self.bucket else {}
+
+    def bucket_starts(self) -> list[datetime]:
+        """Starts of the buckets covering the range, in the timezone.
+
+        Aligned like toStartOfInterval, weeks start on Monday. Empty without
+        a bucket or an unbounded range.
+        """
+        if not self.bucket or not self.start or not self.end:
+            return []
+
+        tz = ZoneInfo(self.timezone)
+        if self.bucket in ("minute", "hour"):
+            # Fixed length, stepped in UTC so DST changes can't skip or repeat one
+            step = (
+                timedelta(minutes=1) if self.bucket == "minute" else timedelta(hours=1)
+            )
+            local = self.start.astimezone(tz)
+            current = local.replace(second=0, microsecond=0)
+            if self.bucket == "hour":
+                current = current.replace(minute=0)
+            current = current.astimezone(UTC)
+            starts = []
+            while current < self.end:
+                starts.append(current.astimezone(tz))
+                current += step
+            return starts
+
+        # Days and weeks follow the wall clock, whatever their length
+        day = self.start.astimezone(tz).date()
+        if self.bucket == "week":
+            day -= timedelta(days=day.weekday())
+        step = timedelta(days=7 if self.bucket == "week" else 1)
+        starts = []
+        while True:
+            current = datetime(day.year, day.month, day.day, tzinfo=tz)
+            if current >= self.end:
+                return starts
+            starts.append(current)
+            day += step
+
+    def align(self, expr: str) -> str:
+        """Start of the bucket of a timestamp expression, in the timezone."""
+        if not self.bucket:
+            raise ValueError("align needs a bucket")
+        return (
+            f"toStartOfInterval(toDateTime({expr}, {{tz:String}}), "
+            f"INTERVAL 1 {TIME_BUCKETS[self.bucket]})"
+        )
+
+    def _fill(self) -> str:
+        fill = "WITH FILL"
+        if self.start:
+            fill += f" FROM {self.align('fromUnixTimestamp64Nano({start_ns:Int64})')}"
+        if self.end:
+            fill += (
+                " TO toDateTime(fromUnixTimestamp64Nano({end_ns:Int64}), {tz:String})"
+            )
+        return f"{fill} STEP INTERVAL 1 {TIME_BUCKETS[self.bucket]}"
+
+
+def _as_utc(value: datetime | None) -> datetime | None:
+    if value is not None and value.tzinfo is None:
+        return value.replace(tzinfo=UTC)
+    return value
+
+
+def _like_pattern(term: str) -> str:
+    """LIKE pattern matching term anywhere, its wildcards taken literally."""
+    escaped = term.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def _to_ns(value: datetime) -> int:
+    return int(value.timestamp()) * 1_000_000_000 + value.microsecond * 1_000
+
 
 class TraceStore:
     """ClickHouse-backed storage for OpenTelemetry traces and spans."""
@@ -19,6 +375,16 @@ class TraceStore:
         database: str,
         username: str,
         password: str,
+        *,
+        buffer_size: int = 0,
+        spill_dir: str | None = None,
+        cluster_name: str | None = None,
+        content_threshold: int = 0,
+        query_cache: QueryCacheBackend | None = None,
+        query_guard: QueryGuard | None = None,
+        max_concurrent_queries: int = 8,
+        circuit_breaker: CircuitBreaker | None = None,
+        pricing: str = PRICING_INGEST,
     ):
         """Initialize ClickHouse TraceStore.
 
@@ -27,10 +393,39 @@ class TraceStore:
             database: Database name
             username: Database username
             password: Database password
-            init_tables: If True, create tables on initialization
+            buffer_size: Max spans held in memory when ClickHouse is slow or down,
+                0 disables buffering and writes spans synchronously
+            spill_dir: Directory for spilling buffered spans to disk, required
+                when buffer_size > 0
+            cluster_name: ClickHouse cluster, otel_spans is then a Distributed
+                table sharded by team (see migration 003)
+            content_threshold: Attribute values of at least this length are
+                stored once in span_contents (see span_contents.py), 0 disables it
+            query_cache: Cache for the results of aggregate queries, invalidated
+                per team by the spans written through any TraceStore sharing it
+            query_guard: Settings limiting the resources of queries, by kind
+                and org (see query_guard.py), defaults if None
+            max_concurrent_queries: Max number of queries run at once, writes
+                aren't counted so slow queries can't hold up ingestion
+            circuit_breaker: Breaker failing reads and writes fast while
+                ClickHouse is unreachable (see circuit_breaker.py)
+            pricing: Prices cost aggregates are computed at, PRICING_INGEST or
+                PRICING_CURRENT to re-price spans with PRICES_DICT
         """
+        if pricing not in (PRICING_INGEST, PRICING_CURRENT):
+            raise ValueError(f"Unsupported pricing: {pricing}")
+        self._pricing = pricing
         self.database = database
-        self._lock = threading.Lock()  # Protect concurrent access to ClickHouse client
+        self._cluster_name = cluster_name
+        self._lock = threading.Lock()  # Serialize writes
+        self._query_slots = threading.BoundedSemaphore(max_concurrent_queries)
+        self._query_guard = query_guard or QueryGuard()
+        self._breaker = circuit_breaker or CircuitBreaker("clickhouse")
+        self.content_threshold = content_threshold
+        # Contents written lately, to not send them again for every span,
+        # with the monotonic time they were written at
+        self._written_contents: OrderedDict[tuple[str, str, str], float] = OrderedDict()
+        self._query_cache = query_cache
 
         # Parse host and port, stripping protocol if present
         # Handle URLs like "http://localhost:8123" or "localhost:8123"
@@ -44,152 +439,393 @@ class TraceStore:
         ch_host = host_parts[0]
         ch_port = int(host_parts[1]) if len(host_parts) > 1 else 8123
 
-        # Create ClickHouse client
+        # Create ClickHouse client. Without a session, queries can run
+        # concurrently over the connection pool.
         self.client = clickhouse_connect.get_client(
             host=ch_host,
             port=ch_port,
             username=username,
             password=password,
+            settings=client_settings(cluster_name),
+            autogenerate_session_id=False,
+            pool_mgr=httputil.get_pool_manager(maxsize=max_concurrent_queries + 2),
         )
 
-    def insert_spans(self, spans: list[dict[str, Any]]) -> None:
+        self._buffer = None
+        if buffer_size > 0:
+            if not spill_dir:
+                raise ValueError("spill_dir is required when buffering spans")
+            self._buffer = SpanBuffer(
+                self.write_spans, spill_dir=spill_dir, max_spans=buffer_size
+            )
+
+    def insert_spans(
+        self, spans: list[dict[str, Any]], *, raise_on_error: bool = False
+    ) -> None:
         """Insert spans into ClickHouse.
 
+        With buffering enabled, spans are queued and written in the background
+        with retries; otherwise they're written synchronously and dropped on error.
+
+        Args:
+            spans: List of span dictionaries with OpenTelemetry fields
+            raise_on_error: Raise when writing synchronously fails, for callers
+                able to retry, instead of dropping the spans
+
+        Raises:
+            Exception: With raise_on_error, if the spans couldn't be written
+        """
+        if not spans:
+            return
+
+        if self._buffer is not None:
+            self._buffer.put(spans)
+            return
+
+        try:
+            self.write_spans(spans)
+        except Exception as e:
+            if raise_on_error:
+                raise
+            logger.error(f"Failed to insert spans: {e}")
+            # Don't raise - we don't want to crash the application if tracing fails
+
+    def write_spans(self, spans: list[dict[str, Any]]) -> None:
+        """Write spans to ClickHouse synchronously.
+
         Args:
             spans: List of span dictionaries with OpenTelemetry fields
+
+        Raises:
+            CircuitOpenError: If ClickHouse failed repeatedly, without trying it
+            Exception: If the insert fails
         """
         if not spans:
             return
 
+        self._breaker.call(lambda: self._write_batch(spans))
+
+        if self._query_cache is not None:
+            teams = {(span.get("OrgId", ""), span.get("TeamId", "")) for span in spans}
+            try:
+                for org_id, team_id in teams:
+                    self._query_cache.advance_watermark(f"{org_id}:{team_id}")
+            except Exception as e:
+                # Cached results of these teams are stale until they expire
+                logger.warning(f"Failed to advance ingest watermark: {e}")
+
+    def _write_batch(self, spans: list[dict[str, Any]]) -> None:
+        token = dedup_token(spans)
         with self._lock:  # Protect concurrent access to ClickHouse client
+            if self.content_threshold > 0:
+                spans, contents = extract_contents(spans, self.content_threshold)
+                # Contents first, so spans never reference missing contents
+                self._write_contents(contents)
+
+            # Insert into ClickHouse, one array per column
+            self.client.insert(
+                f"{self.database}.otel_spans",
+                [
+                    [span.get(name, default) for span in spans]
+                    for name, default in SPAN_INSERT_COLUMNS
+                ],
+                column_names=[name for name, _ in SPAN_INSERT_COLUMNS],
+                column_oriented=True,
+                # Retrying the same batch is a no-op for ClickHouse
+                settings={"insert_deduplication_token": token},
+            )
+            logger.debug(f"Inserted {len(spans)} spans into ClickHouse")
+
+    def _cost(self, component: str) -> str:
+        return cost_expr(self.database, component, self._pricing)
+
+    def _query_cached(
+        self,
+        query: str,
+        parameters: dict[str, Any],
+        *,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        reduce: Callable[[QueryResult], list[dict[str, Any]]] | None = None,
+    ) -> list[dict[str, Any]]:
+        """Run an aggregate query of a team, using the query cache if any.
+
+        Cached rows are shared, callers must not modify them.
+
+        Args:
+            reduce: Turns the query result into the rows returned and cached,
+                all rows of the result by default
+        """
+        reduce = reduce or (lambda result: list(result.named_results()))
+        if self._query_cache is None:
+            return reduce(
+                self._query(query, parameters, kind=QUERY_KIND_AGGREGATE, org_id=org_id)
+            )
+
+        key = None
+        try:
+            watermark = self._query_cache.watermark(f"{org_id}:{team_id}")
+            key = cache_key(query, parameters, watermark)
+            rows = self._query_cache.get(key)
+            if rows is not None:
+                return rows
+        except Exception as e:
+            logger.warning(f"Query cache unavailable: {e}")
+
+        rows = reduce(
+            self._query(query, parameters, kind=QUERY_KIND_AGGREGATE, org_id=org_id)
+        )
+        if key is not None:
+            try:
+                self._query_cache.set(key, rows)
+            except Exception as e:
+                logger.warning(f"Failed to cache query result: {e}")
+        return rows
+
+    def _query(
+        self,
+        query: str,
+        parameters: dict[str, Any] | None = None,
+        *,
+        kind: str,
+        org_id: uuid.UUID,
+    ) -> QueryResult:
+        """Run a read query with the settings of its kind and org.
+
+        Fails fast with CircuitOpenError while ClickHouse is unreachable.
+        """
+        settings = self._query_guard.settings(kind, org_id)
+        return self._breaker.call(
+            lambda: self.client.query(query, parameters=parameters, settings=settings)
+        )
+
+    def cancel_queries(self, tag: str) -> None:
+        """Cancel the running queries issued with the given query tag.
+
+        Cancelled queries fail, so their callers return empty results.
+        """
+        on_cluster = f"ON CLUSTER {self._cluster_name}" if self._cluster_name else ""
+        try:
+            self.client.command(
+                f"KILL QUERY {on_cluster} WHERE startsWith(query_id, {{prefix:String}}) ASYNC",
+                parameters={"prefix": f"{tag}:"},
+            )
+        except Exception as e:
+            logger.warning(f"Failed to cancel queries {tag}: {e}")
+
+    def _write_contents(self, contents: dict[tuple[str, str, str], str]) -> None:
+        now = time.monotonic()
+        new = [
+            key
+            for key in contents
+            if now - self._written_contents.get(key, -CONTENT_REFRESH_SECONDS)
+            >= CONTENT_REFRESH_SECONDS
+        ]
+        if new:
+            # Retries dedup within a refresh period, refreshes are written
+            period = int(time.time() // CONTENT_REFRESH_SECONDS)
+            self.client.insert(
+                f"{self.database}.span_contents",
+                [(*key, contents[key]) for key in new],
+                column_names=["OrgId", "TeamId", "Hash", "Content"],
+                settings={
+                    "insert_deduplication_token": hashlib.sha256(
+                        "\n".join(
+                            [str(period), *sorted(":".join(key) for key in new)]
+                        ).encode()
+                    ).hexdigest()
+                },
+            )
+            logger.debug(f"Inserted {len(new)} span contents into ClickHouse")
+
+        for key in new:
+            self._written_contents[key] = now
+        for key in contents:
+            self._written_contents.move_to_end(key)
+        while len(self._written_contents) > MAX_WRITTEN_CONTENTS:
+            self._written_contents.popitem(last=False)
+
+    def _rehydrate(
+        self, org_id: uuid.UUID, team_id: uuid.UUID, spans: list[dict[str, Any]]
+    ) -> list[dict[str, Any]]:
+        """Restore attribute values stored in span_contents."""
+        refs = content_refs(spans)
+        if not refs:
+            return spans
+
+        with self._query_slots:
             try:
-                # Prepare data for insertion
-                data = []
-                for span in spans:
-                    data.append(
-                        (
-                            span.get("Timestamp"),
-                            span.get("TraceId", ""),
-                            span.get("SpanId", ""),
-                            span.get("ParentSpanId", ""),
-                            span.get("SpanName", ""),
-                            span.get("SpanKind", ""),
-                            span.get("SemanticKind", ""),
-                            span.get("ServiceName", ""),
-                            span.get("Duration", 0),
-                            span.get("StatusCode", ""),
-                            span.get("StatusMessage", ""),
-                            span.get("OrgId", ""),
-                            span.get("TeamId", ""),
-                            span.get("UserId", ""),
-                            span.get("RunId", ""),
-                            span.get("ExperimentId", ""),
-                            span.get("SessionId", ""),
-                            span.get("AgentId", ""),
-                            span.get("AgentType", ""),
-                            span.get("SpanAttributes", {}),
-                            span.get("ResourceAttributes", {}),
-                            span.get("Events.Timestamp", []),
-                            span.get("Events.Name", []),
-                            span.get("Events.Attributes", []),
-                            span.get("Links.TraceId", []),
-                            span.get("Links.SpanId", []),
-                            span.get("Links.Attributes", []),
-                        )
-                    )
-
-                # Insert into ClickHouse
-                self.client.insert(
-                    f"{self.database}.otel_spans",
-                    data,
-                    column_names=[
-                        "Timestamp",
-                        "TraceId",
-                        "SpanId",
-                        "ParentSpanId",
-                        "SpanName",
-                        "SpanKind",
-                        "SemanticKind",
-                        "ServiceName",
-                        "Duration",
-                        "StatusCode",
-                        "StatusMessage",
-                        "OrgId",
-                        "TeamId",
-                        "UserId",
-                        "RunId",
-                        "ExperimentId",
-                        "SessionId",
-                        "AgentId",
-                        "AgentType",
-                        "SpanAttributes",
-                        "ResourceAttributes",
-                        "Events.Timestamp",
-                        "Events.Name",
-                        "Events.Attributes",
-                        "Links.TraceId",
-                        "Links.SpanId",
-                        "Links.Attributes",
-                    ],
+                result = self._query(
+                    f"""
+                    SELECT Hash, Content
+                    FROM {self.database}.span_contents FINAL
+                    WHERE OrgId = {{org_id:String}} AND TeamId = {{team_id:String}}
+                      AND has({{hashes:Array(String)}}, Hash)
+                    """,
+                    parameters={
+                        "org_id": str(org_id),
+                        "team_id": str(team_id),
+                        "hashes": sorted(refs),
+                    },
+                    kind=QUERY_KIND_SPANS,
+                    org_id=org_id,
                 )
-                logger.debug(f"Inserted {len(spans)} spans into ClickHouse")
+                contents = dict(result.result_rows)
             except Exception as e:
-                logger.error(f"Failed to insert spans: {e}")
-                # Don't raise - we don't want to crash the application if tracing fails
+                logger.error(f"Failed to get span contents: {e}")
+                return spans
+
+        rehydrate(spans, contents)
+        return spans
 
     def get_spans_by_run_id(
-        self, org_id: uuid.UUID, team_id: uuid.UUID, run_id: uuid.UUID
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        run_id: uuid.UUID,
+        *,
+        limit: int | None = None,
+        after: str | None = None,
+        summary: bool = False,
     ) -> list[dict[str, Any]]:
-        """Get all spans for a specific run_id.
+        """Get spans for a specific run_id, ordered by (Timestamp, SpanId).
 
         Args:
             org_id: The organization ID for efficient index usage
             team_id: The team ID for efficient index usage
             run_id: The run ID to filter by
+            limit: Max number of spans to return, None for all
+            after: Cursor of the last span of the previous page
+            summary: If True, only return small attributes (see SUMMARY_ATTRIBUTE_PREFIXES)
 
         Returns:
             List of span dictionaries from ClickHouse
         """
-        with self._lock:  # Protect concurrent access to ClickHouse client
-            try:
-                query = f"""
-                SELECT
-                    Timestamp,
-                    TraceId,
-                    SpanId,
-                    ParentSpanId,
-                    SpanName,
-                    SpanKind,
-                    SemanticKind,
-                    ServiceName,
-                    Duration,
-                    StatusCode,
-                    StatusMessage,
-                    OrgId,
-                    TeamId,
-                    UserId,
-                    RunId,
-                    ExperimentId,
-                    SessionId,
-                    AgentId,
-                    AgentType,
-                    SpanAttributes,
-                    ResourceAttributes,
-                    Events.Timestamp as EventTimestamps,
-                    Events.Name as EventNames,
-                    Events.Attributes as EventAttributes,
-                    Links.TraceId as LinkTraceIds,
-                    Links.SpanId as LinkSpanIds,
-                    Links.Attributes as LinkAttributes
-                FROM {self.database}.otel_spans
-                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' AND RunId = '{run_id}'
-                ORDER BY Timestamp ASC
-                """
+        return self._query_spans(
+            org_id=org_id,
+            team_id=team_id,
+            condition="RunId = {run_id:String}",
+            parameters={"run_id": str(run_id)},
+            limit=limit,
+            after=after,
+            summary=summary,
+        )
 
-                result = self.client.query(query)
-                return list(result.named_results())
+    def search_spans(
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        query: str,
+        *,
+        window: TimeWindow | None = None,
+        limit: int = 50,
+        after: str | None = None,
+    ) -> list[dict[str, Any]]:
+        """Search spans by StatusMessage and prompt/completion attributes.
+
+        Spans match when they contain every whitespace separated term of the
+        query, case-insensitively, either in their own attribute values or in
+        a value moved to span_contents. Both are searched by separate queries,
+        merged here, so each is pruned by its skip index of migration 006:
+        terms are matched with LIKE against the ngram index, references to
+        matching contents against the bloom filter of content references.
+
+        Args:
+            org_id: The organization ID for efficient index usage
+            team_id: The team ID for efficient index usage
+            query: Terms to search for
+            window: Optional time range, the bucket is ignored
+            limit: Max number of spans to return
+            after: Cursor of the last span of the previous page
+
+        Returns:
+            List of span dictionaries ordered by (Timestamp, SpanId)
+        """
+        terms = query.lower().split()
+        if not terms:
+            return []
+        window = window or TimeWindow()
+
+        parameters = {
+            **window.parameters(),
+            **{f"term_{i}": _like_pattern(term) for i, term in enumerate(terms)},
+        }
+        matches = " AND ".join(
+            f"{SEARCH_TEXT_EXPR} LIKE {{term_{i}:String}}" for i in range(len(terms))
+        )
+        spans = self._query_spans(
+            org_id=org_id,
+            team_id=team_id,
+            condition=f"{matches}{window.conditions()}",
+            parameters=parameters,
+            limit=limit,
+            after=after,
+            kind=QUERY_KIND_SEARCH,
+        )
+
+        refs = self._search_contents(org_id, team_id, parameters, len(terms), window)
+        if not refs:
+            return spans
+        by_refs = self._query_spans(
+            org_id=org_id,
+            team_id=team_id,
+            condition=f"hasAny({CONTENT_REFS_EXPR}, {{refs:Array(String)}}){window.conditions()}",
+            parameters={**parameters, "refs": refs},
+            limit=limit,
+            after=after,
+            kind=QUERY_KIND_SEARCH,
+        )
+        found = {(span["TraceId"], span["SpanId"]) for span in spans}
+        spans.extend(
+            span for span in by_refs if (span["TraceId"], span["SpanId"]) not in found
+        )
+        spans.sort(key=lambda span: (span["Timestamp"], span["SpanId"]))
+        return spans[:limit]
+
+    def _search_contents(
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        parameters: dict[str, Any],
+        terms: int,
+        window: TimeWindow,
+    ) -> list[str]:
+        """References to the span_contents of a team containing every term.
+
+        Contents are written again every CONTENT_REFRESH_SECONDS while spans
+        reference them, so the contents of spans in the window were last
+        written at most that long before its start.
+        """
+        matches = " AND ".join(
+            f"lowerUTF8(Content) LIKE {{term_{i}:String}}" for i in range(terms)
+        )
+        if window.start:
+            matches += (
+                " AND InsertedAt >= toDateTime(intDiv({start_ns:Int64}, 1000000000)) "
+                f"- {CONTENT_REFRESH_SECONDS}"
+            )
+        with self._query_slots:
+            try:
+                result = self._query(
+                    f"""
+                    SELECT Hash
+                    FROM {self.database}.span_contents FINAL
+                    WHERE OrgId = {{org_id:String}} AND TeamId = {{team_id:String}}
+                      AND {matches}
+                    LIMIT {MAX_SEARCH_CONTENTS}
+                    """,
+                    parameters={
+                        **parameters,
+                        "org_id": str(org_id),
+                        "team_id": str(team_id),
+                    },
+                    kind=QUERY_KIND_SEARCH,
+                    org_id=org_id,
+                )
+                return [CONTENT_REF_PREFIX + row[0] for row in result.result_rows]
             except Exception as e:
-                logger.error(f"Failed to get spans by run_id: {e}")
+                # Still search the values stored in the spans
+                logger.error(f"Failed to search span contents: {e}")
                 return []
 
     def get_llm_spans_by_run_id(
@@ -205,7 +841,7 @@ class TraceStore:
         Returns:
             List of LLM span dictionaries
         """
-        with self._lock:  # Protect concurrent access to ClickHouse client
+        with self._query_slots:
             try:
                 query = f"""
                 SELECT
@@ -236,72 +872,202 @@ class TraceStore:
                     Links.TraceId as LinkTraceIds,
                     Links.SpanId as LinkSpanIds,
                     Links.Attributes as LinkAttributes
-                FROM {self.database}.otel_spans
+                FROM {self.database}.otel_spans FINAL
                 WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' AND RunId = '{run_id}'
                 ORDER BY Timestamp ASC
                 """
 
-                result = self.client.query(query)
-                return list(result.named_results())
+                result = self._query(query, kind=QUERY_KIND_SPANS, org_id=org_id)
+                spans = list(result.named_results())
             except Exception as e:
                 logger.error(f"Failed to get traces by run_id: {e}")
                 return []
+        return self._rehydrate(org_id, team_id, spans)
 
     def get_spans_by_session_id(
-        self, org_id: uuid.UUID, team_id: uuid.UUID, session_id: uuid.UUID
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        session_id: uuid.UUID,
+        *,
+        limit: int | None = None,
+        after: str | None = None,
+        summary: bool = False,
     ) -> list[dict[str, Any]]:
-        """Get all spans for a specific session_id (agent runs).
+        """Get spans for a specific session_id (agent runs), ordered by (Timestamp, SpanId).
 
         Args:
             org_id: The organization ID for efficient index usage
             team_id: The team ID for efficient index usage
             session_id: The session ID to filter by
+            limit: Max number of spans to return, None for all
+            after: Cursor of the last span of the previous page
+            summary: If True, only return small attributes (see SUMMARY_ATTRIBUTE_PREFIXES)
 
         Returns:
             List of span dictionaries from ClickHouse
         """
-        with self._lock:
+        return self._query_spans(
+            org_id=org_id,
+            team_id=team_id,
+            condition="SessionId = {session_id:String}",
+            parameters={"session_id": str(session_id)},
+            limit=limit,
+            after=after,
+            summary=summary,
+        )
+
+    def get_span(
+        self, org_id: uuid.UUID, team_id: uuid.UUID, trace_id: str, span_id: str
+    ) -> dict[str, Any] | None:
+        """Get a single span with all its attributes.
+
+        Used to load prompts, completions and other large attributes on demand
+        after listing spans with the summary projection.
+
+        Args:
+            org_id: The organization ID for efficient index usage
+            team_id: The team ID for efficient index usage
+            trace_id: The trace ID of the span
+            span_id: The span ID
+
+        Returns:
+            Span dictionary, or None if not found
+        """
+        spans = self._query_spans(
+            org_id=org_id,
+            team_id=team_id,
+            condition="TraceId = {trace_id:String} AND SpanId = {span_id:String}",
+            parameters={"trace_id": trace_id, "span_id": span_id},
+            limit=1,
+        )
+        return spans[0] if spans else None
+
+    def get_trace_tree_spans(
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        *,
+        run_id: uuid.UUID | None = None,
+        session_id: uuid.UUID | None = None,
+    ) -> list[dict[str, Any]]:
+        """Get compact span rows for assembling trace trees of a run or session.
+
+        Only ids, timing, status and per-span token/cost totals are returned,
+        extracted from the attributes by ClickHouse. See tracetree.build_trace_trees.
+
+        Args:
+            org_id: The organization ID for efficient index usage
+            team_id: The team ID for efficient index usage
+            run_id: The run ID to filter by
+            session_id: The session ID to filter by, if run_id isn't set
+
+        Returns:
+            List of span rows ordered by trace and start time
+        """
+        parameters = {"org_id": str(org_id), "team_id": str(team_id)}
+        if run_id is not None:
+            condition = "RunId = {run_id:String}"
+            parameters["run_id"] = str(run_id)
+        elif session_id is not None:
+            condition = "SessionId = {session_id:String}"
+            parameters["session_id"] = str(session_id)
+        else:
+            raise ValueError("run_id or session_id is required")
+
+        with self._query_slots:
             try:
                 query = f"""
                 SELECT
-                    Timestamp,
                     TraceId,
                     SpanId,
                     ParentSpanId,
                     SpanName,
-                    SpanKind,
                     SemanticKind,
-                    ServiceName,
-                    Duration,
                     StatusCode,
-                    StatusMessage,
-                    OrgId,
-                    TeamId,
-                    UserId,
-                    RunId,
-                    ExperimentId,
-                    SessionId,
-                    AgentId,
-                    AgentType,
-                    SpanAttributes,
-                    ResourceAttributes,
-                    Events.Timestamp as EventTimestamps,
-                    Events.Name as EventNames,
-                    Events.Attributes as EventAttributes,
-                    Links.TraceId as LinkTraceIds,
-                    Links.SpanId as LinkSpanIds,
-                    Links.Attributes as LinkAttributes
-                FROM {self.database}.otel_spans
-                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' AND SessionId = '{session_id}'
-                ORDER BY Timestamp ASC
+                    Timestamp,
+                    toUnixTimestamp64Nano(Timestamp) as StartNs,
+                    Duration,
+                    toInt64OrZero(SpanAttributes['gen_ai.usage.input_tokens'])
+                        + toInt64OrZero(SpanAttributes['gen_ai.usage.output_tokens'])
+                        + toInt64OrZero(SpanAttributes['gen_ai.usage.cache_read_input_tokens'])
+                        + toInt64OrZero(SpanAttributes['gen_ai.usage.cache_creation_input_tokens']) as Tokens,
+                    toFloat64OrZero(SpanAttributes['alphatrion.cost.input_tokens'])
+                        + toFloat64OrZero(SpanAttributes['alphatrion.cost.output_tokens'])
+                        + toFloat64OrZero(SpanAttributes['alphatrion.cost.cache_read_input_tokens'])
+                        + toFloat64OrZero(SpanAttributes['alphatrion.cost.cache_creation_input_tokens']) as Cost
+                FROM {self.database}.otel_spans FINAL
+                WHERE OrgId = {{org_id:String}} AND TeamId = {{team_id:String}} AND {condition}
+                ORDER BY TraceId, Timestamp
                 """
 
-                result = self.client.query(query)
+                result = self._query(
+                    query, parameters, kind=QUERY_KIND_SPANS, org_id=org_id
+                )
                 return list(result.named_results())
             except Exception as e:
-                logger.error(f"Failed to get spans by session_id: {e}")
+                logger.error(f"Failed to get trace tree spans: {e}")
+                return []
+
+    def _query_spans(
+        self,
+        *,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        condition: str,
+        parameters: dict[str, Any],
+        limit: int | None = None,
+        after: str | None = None,
+        summary: bool = False,
+        kind: str = QUERY_KIND_SPANS,
+    ) -> list[dict[str, Any]]:
+        """Query spans matching condition with keyset pagination on (Timestamp, SpanId)."""
+        parameters = {**parameters, "org_id": str(org_id), "team_id": str(team_id)}
+        where = [
+            "OrgId = {org_id:String}",
+            "TeamId = {team_id:String}",
+            condition,
+        ]
+        if after:
+            try:
+                after_ns, after_span_id = decode_cursor(after)
+            except ValueError as e:
+                logger.error(f"Invalid span cursor {after!r}: {e}")
+                return []
+            # The plain Timestamp bound lets ClickHouse skip granules by primary key
+            where.append(
+                "Timestamp >= fromUnixTimestamp64Nano({after_ns:Int64}) AND "
+                "(toUnixTimestamp64Nano(Timestamp), SpanId) > ({after_ns:Int64}, {after_span_id:String})"
+            )
+            parameters["after_ns"] = after_ns
+            parameters["after_span_id"] = after_span_id
+
+        columns = SPAN_SUMMARY_COLUMNS if summary else SPAN_COLUMNS
+        where_clause = " AND ".join(where)
+        query = f"""
+        SELECT {columns}
+        FROM {self.database}.otel_spans FINAL
+        WHERE {where_clause}
+        ORDER BY Timestamp ASC, SpanId ASC
+        """
+        if limit is not None:
+            query += f"LIMIT {int(limit)}"
+
+        with self._query_slots:
+            try:
+                result = self._query(query, parameters, kind=kind, org_id=org_id)
+                spans = list(result.named_results())
+            except Exception as e:
+                logger.error(f"Failed to query spans: {e}")
                 return []
 
+        if summary:
+            # Aliased differently in SQL to not shadow the column it's derived from
+            for span in spans:
+                span["SpanAttributes"] = span.pop("SummaryAttributes")
+            return spans
+        return self._rehydrate(org_id, team_id, spans)
+
     def get_llm_spans_by_exp_id(
         self, org_id: uuid.UUID, team_id: uuid.UUID, experiment_id: uuid.UUID
     ) -> list[dict[str, Any]]:
@@ -315,7 +1081,7 @@ class TraceStore:
         Returns:
             List of LLM span dictionaries
         """
-        with self._lock:  # Protect concurrent access to ClickHouse client
+        with self._query_slots:
             try:
                 query = f"""
                 SELECT
@@ -346,66 +1112,45 @@ class TraceStore:
                     Links.TraceId as LinkTraceIds,
                     Links.SpanId as LinkSpanIds,
                     Links.Attributes as LinkAttributes
-                FROM {self.database}.otel_spans
+                FROM {self.database}.otel_spans FINAL
                 WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' AND ExperimentId = '{experiment_id}'
                 ORDER BY Timestamp ASC
                 """
 
-                result = self.client.query(query)
-                return list(result.named_results())
+                result = self._query(query, kind=QUERY_KIND_SPANS, org_id=org_id)
+                spans = list(result.named_results())
             except Exception as e:
                 logger.error(f"Failed to get spans by exp_id: {e}")
                 return []
+        return self._rehydrate(org_id, team_id, spans)
 
     def get_llm_usage_by_team_id(
-        self, org_id: uuid.UUID, team_id: uuid.UUID
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        *,
+        window: TimeWindow | None = None,
     ) -> list[dict[str, Any]]:
         """Get aggregated tokens and cost for a team.
 
         Args:
             org_id: The organization ID to filter by
             team_id: The team ID to filter by
+            window: Optional time range, and bucket to return a series
         Returns:
-            List with one dict containing tokens and cost
+            List with one dict containing tokens and cost, or one per bucket
         """
-        with self._lock:
-            try:
-                query = f"""
-                SELECT
-                    SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.input_tokens'])) as input_tokens,
-                    SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.output_tokens'])) as output_tokens,
-                    SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.cache_read_input_tokens'])) as cache_read_input_tokens,
-                    SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.cache_creation_input_tokens'])) as cache_creation_input_tokens,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.input_tokens'])) as input_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.output_tokens'])) as output_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.cache_read_input_tokens'])) as cache_read_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.cache_creation_input_tokens'])) as cache_creation_cost
-                FROM {self.database}.otel_spans
-                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}'
-                """
-
-                result = self.client.query(query)
-                return [
-                    {
-                        "input_tokens": int(row["input_tokens"]),
-                        "output_tokens": int(row["output_tokens"]),
-                        "cache_read_input_tokens": int(row["cache_read_input_tokens"]),
-                        "cache_creation_input_tokens": int(
-                            row["cache_creation_input_tokens"]
-                        ),
-                        "input_cost": float(row["input_cost"]),
-                        "output_cost": float(row["output_cost"]),
-                        "cache_read_cost": float(row["cache_read_cost"]),
-                        "cache_creation_cost": float(row["cache_creation_cost"]),
-                    }
-                    for row in result.named_results()
-                ]
-            except Exception as e:
-                logger.error(f"Failed to get tokens and cost by team: {e}")
-                return []
+        return self._get_llm_usage(
+            org_id, team_id, scope="", window=window, what="tokens and cost by team"
+        )
 
     def get_llm_usage_by_agent_id(
-        self, org_id: uuid.UUID, team_id: uuid.UUID, agent_id: uuid.UUID
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        agent_id: uuid.UUID,
+        *,
+        window: TimeWindow | None = None,
     ) -> list[dict[str, Any]]:
         """Get aggregated LLM token usage and cost for a specific agent.
 
@@ -413,47 +1158,25 @@ class TraceStore:
             org_id: The organization ID to filter by
             team_id: The team ID to filter by
             agent_id: The agent ID to filter by
+            window: Optional time range, and bucket to return a series
         Returns:
-            List with one dict containing input_tokens, output_tokens
+            List with one dict containing tokens and cost, or one per bucket
         """
-        with self._lock:
-            try:
-                query = f"""
-                SELECT
-                    SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.input_tokens'])) as input_tokens,
-                    SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.output_tokens'])) as output_tokens,
-                    SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.cache_read_input_tokens'])) as cache_read_input_tokens,
-                    SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.cache_creation_input_tokens'])) as cache_creation_input_tokens,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.input_tokens'])) as input_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.output_tokens'])) as output_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.cache_read_input_tokens'])) as cache_read_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.cache_creation_input_tokens'])) as cache_creation_cost
-                FROM {self.database}.otel_spans
-                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' AND AgentId = '{agent_id}'
-                """
-
-                result = self.client.query(query)
-                return [
-                    {
-                        "input_tokens": int(row["input_tokens"]),
-                        "output_tokens": int(row["output_tokens"]),
-                        "cache_read_input_tokens": int(row["cache_read_input_tokens"]),
-                        "cache_creation_input_tokens": int(
-                            row["cache_creation_input_tokens"]
-                        ),
-                        "input_cost": float(row["input_cost"]),
-                        "output_cost": float(row["output_cost"]),
-                        "cache_read_cost": float(row["cache_read_cost"]),
-                        "cache_creation_cost": float(row["cache_creation_cost"]),
-                    }
-                    for row in result.named_results()
-                ]
-            except Exception as e:
-                logger.error(f"Failed to get agent token usage: {e}")
-                return []
+        return self._get_llm_usage(
+            org_id,
+            team_id,
+            scope=f"AND AgentId = '{agent_id}'",
+            window=window,
+            what="agent token usage",
+        )
 
     def get_llm_usage_by_session_id(
-        self, org_id: uuid.UUID, team_id: uuid.UUID, session_id: uuid.UUID
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        session_id: uuid.UUID,
+        *,
+        window: TimeWindow | None = None,
     ) -> list[dict[str, Any]]:
         """Get aggregated LLM token usage and cost for a specific session.
 
@@ -461,28 +1184,53 @@ class TraceStore:
             org_id: The organization ID to filter by
             team_id: The team ID to filter by
             session_id: The session ID to filter by
+            window: Optional time range, and bucket to return a series
         Returns:
             List with one dict containing input_tokens, output_tokens, cache_read_input_tokens, cache_creation_input_tokens, input_cost, output_cost, cache_read_cost, cache_creation_cost
         """
-        with self._lock:
+        return self._get_llm_usage(
+            org_id,
+            team_id,
+            scope=f"AND SessionId = '{session_id}'",
+            window=window,
+            what="session token usage",
+        )
+
+    def _get_llm_usage(
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        *,
+        scope: str,
+        window: TimeWindow | None,
+        what: str,
+    ) -> list[dict[str, Any]]:
+        window = window or TimeWindow()
+        with self._query_slots:
             try:
                 query = f"""
                 SELECT
+                    {window.bucket_select()}
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.input_tokens'])) as input_tokens,
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.output_tokens'])) as output_tokens,
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.cache_read_input_tokens'])) as cache_read_input_tokens,
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.cache_creation_input_tokens'])) as cache_creation_input_tokens,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.input_tokens'])) as input_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.output_tokens'])) as output_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.cache_read_input_tokens'])) as cache_read_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.cache_creation_input_tokens'])) as cache_creation_cost
-                FROM {self.database}.otel_spans
-                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' AND SessionId = '{session_id}'
+                    SUM({self._cost("input_tokens")}) as input_cost,
+                    SUM({self._cost("output_tokens")}) as output_cost,
+                    SUM({self._cost("cache_read_input_tokens")}) as cache_read_cost,
+                    SUM({self._cost("cache_creation_input_tokens")}) as cache_creation_cost
+                FROM {self.database}.otel_spans FINAL
+                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' {scope} {window.conditions()}
+                {window.group_by()}
+                {window.order_by()}
                 """
 
-                result = self.client.query(query)
+                rows = self._query_cached(
+                    query, window.parameters(), org_id=org_id, team_id=team_id
+                )
                 return [
                     {
+                        **window.bucket_of(row),
                         "input_tokens": int(row["input_tokens"]),
                         "output_tokens": int(row["output_tokens"]),
                         "cache_read_input_tokens": int(row["cache_read_input_tokens"]),
@@ -494,41 +1242,52 @@ class TraceStore:
                         "cache_read_cost": float(row["cache_read_cost"]),
                         "cache_creation_cost": float(row["cache_creation_cost"]),
                     }
-                    for row in result.named_results()
+                    for row in rows
                 ]
             except Exception as e:
-                logger.error(f"Failed to get session token usage: {e}")
+                logger.error(f"Failed to get {what}: {e}")
                 return []
 
     def get_token_distribution_by_semantic_kind(
-        self, org_id: uuid.UUID, team_id: uuid.UUID
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        *,
+        window: TimeWindow | None = None,
     ) -> list[dict[str, Any]]:
         """Get token usage distribution grouped by semantic kind.
 
         Args:
             org_id: The organization ID to filter by
             team_id: The team ID to filter by
+            window: Optional time range, and bucket to return a series
 
         Returns:
             List of dicts with keys: semantic_kind, input_tokens, output_tokens, cache_read_input_tokens, cache_creation_input_tokens
         """
-        with self._lock:
+        window = window or TimeWindow()
+        with self._query_slots:
             try:
                 query = f"""
                 SELECT
+                    {window.bucket_select()}
                     SemanticKind as semantic_kind,
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.input_tokens'])) as input_tokens,
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.output_tokens'])) as output_tokens,
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.cache_read_input_tokens'])) as cache_read_input_tokens,
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.cache_creation_input_tokens'])) as cache_creation_input_tokens
-                FROM {self.database}.otel_spans
-                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}'
-                GROUP BY SemanticKind
+                FROM {self.database}.otel_spans FINAL
+                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' {window.conditions()}
+                {window.group_by("semantic_kind")}
+                {window.order_by("semantic_kind")}
                 """
 
-                result = self.client.query(query)
+                rows = self._query_cached(
+                    query, window.parameters(), org_id=org_id, team_id=team_id
+                )
                 return [
                     {
+                        **window.bucket_of(row),
                         "semantic_kind": row["semantic_kind"],
                         "input_tokens": int(row["input_tokens"]),
                         "output_tokens": int(row["output_tokens"]),
@@ -537,92 +1296,109 @@ class TraceStore:
                             row["cache_creation_input_tokens"]
                         ),
                     }
-                    for row in result.named_results()
+                    for row in rows
                 ]
             except Exception as e:
                 logger.error(f"Failed to get token distribution: {e}")
                 return []
 
     def get_model_distributions_by_team_id(
-        self, org_id: uuid.UUID, team_id: uuid.UUID
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        *,
+        window: TimeWindow | None = None,
     ) -> list[dict[str, Any]]:
         """Get model distribution (count of requests per model) for a specific team.
 
         Args:
             org_id: The organization ID to filter by
             team_id: The team ID to filter by
+            window: Optional time range, and bucket to return a series
 
         Returns:
             List of dicts with keys: model, count
         """
-        with self._lock:
+        window = window or TimeWindow()
+        with self._query_slots:
             try:
                 query = f"""
                 SELECT
-                    coalesce(
-                        SpanAttributes['gen_ai.request.model'],
-                        SpanAttributes['gen_ai.response.model'],
-                        'unknown'
-                    ) as model,
+                    {window.bucket_select()}
+                    {MODEL_EXPR} as model,
                     COUNT(*) as count
-                FROM {self.database}.otel_spans
-                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}'
-                GROUP BY model
-                ORDER BY count DESC
+                FROM {self.database}.otel_spans FINAL
+                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' {window.conditions()}
+                {window.group_by("model")}
+                {window.order_by("count DESC") if window.bucket else "ORDER BY count DESC"}
                 """
 
-                result = self.client.query(query)
+                rows = self._query_cached(
+                    query, window.parameters(), org_id=org_id, team_id=team_id
+                )
                 # ignore empty models
                 return [
                     {
+                        **window.bucket_of(row),
                         "model": row["model"],
                         "count": int(row["count"]),
                     }
-                    for row in result.named_results()
+                    for row in rows
                     if row["model"] is not None and row["model"] != ""
                 ]
             except Exception as e:
                 logger.error(f"Failed to get model distributions: {e}")
                 return []
 
-    def get_daily_cost_usage(
-        self, org_id: uuid.UUID, team_id: uuid.UUID, days: int = 30
+    def get_cost_usage(
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        *,
+        window: TimeWindow,
     ) -> list[dict[str, Any]]:
-        """Get daily cost and token usage from LLM calls for a team.
+        """Get cost and token usage from LLM calls for a team, per time bucket.
+
+        Buckets without usage are filled with zeros.
 
         Args:
             org_id: The organization ID to filter by
             team_id: The team ID to filter by
-            days: Number of days to look back (default: 30)
+            window: Time range and bucket, bucket is required
 
         Returns:
-            List of dicts with keys: date, input_cost, output_cost,  input_tokens, output_tokens
+            List of dicts with keys: bucket, input_cost, output_cost,
+            cache_creation_input_cost, cache_read_input_cost, input_tokens,
+            output_tokens, cache_read_input_tokens, cache_creation_input_tokens
         """
-        with self._lock:
+        if not window.bucket:
+            raise ValueError("bucket is required for cost usage")
+
+        with self._query_slots:
             try:
                 query = f"""
                 SELECT
-                    toDate(Timestamp) as date,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.input_tokens'])) as input_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.output_tokens'])) as output_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.cache_creation_input_tokens'])) as cache_creation_input_cost,
-                    SUM(toFloat64OrZero(SpanAttributes['alphatrion.cost.cache_read_input_tokens'])) as cache_read_input_cost,
+                    {window.bucket_select()}
+                    SUM({self._cost("input_tokens")}) as input_cost,
+                    SUM({self._cost("output_tokens")}) as output_cost,
+                    SUM({self._cost("cache_creation_input_tokens")}) as cache_creation_input_cost,
+                    SUM({self._cost("cache_read_input_tokens")}) as cache_read_input_cost,
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.input_tokens'])) as input_tokens,
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.output_tokens'])) as output_tokens,
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.cache_read_input_tokens'])) as cache_read_input_tokens,
                     SUM(toInt64OrZero(SpanAttributes['gen_ai.usage.cache_creation_input_tokens'])) as cache_creation_input_tokens
-                FROM {self.database}.otel_spans
-                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}'
-                  AND Timestamp >= now() - INTERVAL {days} DAY
-                GROUP BY date
-                ORDER BY date ASC
+                FROM {self.database}.otel_spans FINAL
+                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' {window.conditions()}
+                {window.group_by()}
+                {window.order_by()}
                 """
 
-                result = self.client.query(query)
-                # Convert date to string format
+                rows = self._query_cached(
+                    query, window.parameters(), org_id=org_id, team_id=team_id
+                )
                 return [
                     {
-                        "date": row["date"].strftime("%Y-%m-%d"),
+                        **window.bucket_of(row),
                         "input_cost": float(row["input_cost"]),
                         "output_cost": float(row["output_cost"]),
                         "cache_creation_input_cost": float(
@@ -636,14 +1412,192 @@ class TraceStore:
                             row["cache_creation_input_tokens"]
                         ),
                     }
-                    for row in result.named_results()
+                    for row in rows
                 ]
             except Exception as e:
-                logger.error(f"Failed to get daily cost usage: {e}")
+                logger.error(f"Failed to get cost usage: {e}")
                 return []
 
+    def get_daily_cost_usage(
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        days: int = 30,
+        timezone: str = "UTC",
+    ) -> list[dict[str, Any]]:
+        """Get daily cost and token usage from LLM calls for a team.
+
+        Args:
+            org_id: The organization ID to filter by
+            team_id: The team ID to filter by
+            days: Number of days to look back, including today (default: 30)
+            timezone: Timezone the days are aligned to
+
+        Returns:
+            List of dicts with keys: date, input_cost, output_cost,  input_tokens, output_tokens
+        """
+        today = datetime.now(ZoneInfo(timezone)).replace(
+            hour=0, minute=0, second=0, microsecond=0
+        )
+        window = TimeWindow(
+            start=today - timedelta(days=days - 1),
+            end=today + timedelta(days=1),
+            bucket="day",
+            timezone=timezone,
+        )
+        usage = self.get_cost_usage(org_id, team_id, window=window)
+        for item in usage:
+            item["date"] = item.pop("bucket").strftime("%Y-%m-%d")
+        return usage
+
+    def get_team_overview(
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        *,
+        window: TimeWindow,
+    ) -> dict[str, Any] | None:
+        """Get usage, model distribution, cost series and trace stats of a team.
+
+        Computes in a single scan what get_llm_usage_by_team_id,
+        get_model_distributions_by_team_id, get_cost_usage and the trace stats
+        compute in one scan each: plain aggregates for the totals, and sumMap
+        keyed by model and by bucket for the distribution and the series.
+        Buckets without usage are filled with zeros.
+
+        Args:
+            org_id: The organization ID to filter by
+            team_id: The team ID to filter by
+            window: Time range and bucket, bucket is required
+
+        Returns:
+            Dict with keys: usage (as get_llm_usage_by_team_id),
+            model_distributions (as get_model_distributions_by_team_id),
+            cost_usage (as get_cost_usage) and trace_stats (total_spans,
+            success_spans, error_spans), None if the query failed
+        """
+        if not window.bucket:
+            raise ValueError("bucket is required for the team overview")
+
+        with self._query_slots:
+            try:
+                query = f"""
+                SELECT
+                    count() as total_spans,
+                    countIf(StatusCode = 'OK' OR StatusCode = 'UNSET') as success_spans,
+                    countIf(StatusCode = 'ERROR') as error_spans,
+                    sum(input_tokens) as input_tokens,
+                    sum(output_tokens) as output_tokens,
+                    sum(cache_read_input_tokens) as cache_read_input_tokens,
+                    sum(cache_creation_input_tokens) as cache_creation_input_tokens,
+                    sum(input_cost) as input_cost,
+                    sum(output_cost) as output_cost,
+                    sum(cache_read_cost) as cache_read_cost,
+                    sum(cache_creation_cost) as cache_creation_cost,
+                    sumMap([model], [toUInt64(1)]) as models,
+                    sumMap(
+                        [bucket],
+                        [input_cost], [output_cost], [cache_creation_cost], [cache_read_cost],
+                        [input_tokens], [output_tokens], [cache_read_input_tokens], [cache_creation_input_tokens]
+                    ) as series
+                FROM (
+                    SELECT
+                        StatusCode,
+                        {MODEL_EXPR} as model,
+                        toUnixTimestamp({window.align("Timestamp")}) as bucket,
+                        toInt64OrZero(SpanAttributes['gen_ai.usage.input_tokens']) as input_tokens,
+                        toInt64OrZero(SpanAttributes['gen_ai.usage.output_tokens']) as output_tokens,
+                        toInt64OrZero(SpanAttributes['gen_ai.usage.cache_read_input_tokens']) as cache_read_input_tokens,
+                        toInt64OrZero(SpanAttributes['gen_ai.usage.cache_creation_input_tokens']) as cache_creation_input_tokens,
+                        {self._cost("input_tokens")} as input_cost,
+                        {self._cost("output_tokens")} as output_cost,
+                        {self._cost("cache_read_input_tokens")} as cache_read_cost,
+                        {self._cost("cache_creation_input_tokens")} as cache_creation_cost
+                    FROM {self.database}.otel_spans FINAL
+                    WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' {window.conditions()}
+                )
+                """
+
+                rows = self._query_cached(
+                    query, window.parameters(), org_id=org_id, team_id=team_id
+                )
+                row = rows[0]
+            except Exception as e:
+                logger.error(f"Failed to get team overview: {e}")
+                return None
+
+        model_keys, model_counts = row["models"]
+        # ignore empty models
+        models = [
+            {"model": model, "count": int(count)}
+            for model, count in zip(model_keys, model_counts, strict=True)
+            if model
+        ]
+        models.sort(key=lambda item: item["count"], reverse=True)
+
+        bucket_keys, *values = row["series"]
+        series = {
+            int(key): [value[i] for value in values]
+            for i, key in enumerate(bucket_keys)
+        }
+        starts = window.bucket_starts()
+        if not starts:
+            tz = ZoneInfo(window.timezone)
+            starts = [datetime.fromtimestamp(key, tz) for key in sorted(series)]
+
+        cost_usage = []
+        for start in starts:
+            (
+                input_cost,
+                output_cost,
+                cache_creation_cost,
+                cache_read_cost,
+                input_tokens,
+                output_tokens,
+                cache_read_tokens,
+                cache_creation_tokens,
+            ) = series.get(int(start.timestamp()), [0.0] * 4 + [0] * 4)
+            cost_usage.append(
+                {
+                    "bucket": start,
+                    "input_cost": float(input_cost),
+                    "output_cost": float(output_cost),
+                    "cache_creation_input_cost": float(cache_creation_cost),
+                    "cache_read_input_cost": float(cache_read_cost),
+                    "input_tokens": int(input_tokens),
+                    "output_tokens": int(output_tokens),
+                    "cache_read_input_tokens": int(cache_read_tokens),
+                    "cache_creation_input_tokens": int(cache_creation_tokens),
+                }
+            )
+
+        return {
+            "usage": {
+                "input_tokens": int(row["input_tokens"]),
+                "output_tokens": int(row["output_tokens"]),
+                "cache_read_input_tokens": int(row["cache_read_input_tokens"]),
+                "cache_creation_input_tokens": int(row["cache_creation_input_tokens"]),
+                "input_cost": float(row["input_cost"]),
+                "output_cost": float(row["output_cost"]),
+                "cache_read_cost": float(row["cache_read_cost"]),
+                "cache_creation_cost": float(row["cache_creation_cost"]),
+            },
+            "model_distributions": models,
+            "cost_usage": cost_usage,
+            "trace_stats": {
+                "total_spans": int(row["total_spans"]),
+                "success_spans": int(row["success_spans"]),
+                "error_spans": int(row["error_spans"]),
+            },
+        }
+
     def get_trace_stats_by_exp_id(
-        self, org_id: uuid.UUID, team_id: uuid.UUID, exp_id: uuid.UUID
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        exp_id: uuid.UUID,
+        *,
+        window: TimeWindow | None = None,
     ) -> dict[str, int]:
         """Get trace statistics (success/error counts) for a specific experiment_id.
 
@@ -651,23 +1605,26 @@ class TraceStore:
             org_id: The organization ID to filter by
             team_id: The team ID to filter by
             exp_id: The experiment ID to filter by
+            window: Optional time range, the bucket is ignored
 
         Returns:
             Dict with keys: total_spans, success_spans, error_spans
         """
-        with self._lock:
+        window = window or TimeWindow()
+        with self._query_slots:
             try:
                 query = f"""
                 SELECT
                     COUNT(*) as total_spans,
                     countIf(StatusCode = 'OK' OR StatusCode = 'UNSET') as success_spans,
                     countIf(StatusCode = 'ERROR') as error_spans
-                FROM {self.database}.otel_spans
-                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' AND ExperimentId = '{exp_id}'
+                FROM {self.database}.otel_spans FINAL
+                WHERE OrgId = '{org_id}' AND TeamId = '{team_id}' AND ExperimentId = '{exp_id}' {window.conditions()}
                 """
 
-                result = self.client.query(query)
-                rows = list(result.named_results())
+                rows = self._query_cached(
+                    query, window.parameters(), org_id=org_id, team_id=team_id
+                )
                 if rows and len(rows) > 0:
                     row = rows[0]
                     return {
@@ -680,10 +1637,262 @@ class TraceStore:
                 logger.error(f"Failed to get trace stats by exp_id: {e}")
                 return {"total_spans": 0, "success_spans": 0, "error_spans": 0}
 
+    def get_latency_percentiles(
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        group_by: str,
+        *,
+        experiment_id: uuid.UUID | None = None,
+        semantic_kind: str | None = None,
+        window: TimeWindow | None = None,
+    ) -> list[dict[str, Any]]:
+        """Get span latency percentiles and LLM throughput, grouped by a dimension.
+
+        Args:
+            org_id: The organization ID to filter by
+            team_id: The team ID to filter by
+            group_by: One of LATENCY_GROUP_BY (model, span_name, agent, bucket)
+            experiment_id: Only include spans of this experiment
+            semantic_kind: Only include spans of this semantic kind
+            window: Optional time range, the bucket is required to group by bucket
+
+        Returns:
+            List of dicts with keys: key, count, error_count, avg, p50, p90, p95,
+            p99, max (durations in ns) and tokens_per_second, the output tokens
+            generated per second of LLM time
+        """
+        if group_by not in LATENCY_GROUP_BY:
+            raise ValueError(f"Unsupported group_by: {group_by}")
+        window = window or TimeWindow()
+        if group_by == "bucket" and not window.bucket:
+            raise ValueError("bucket is required to group by bucket")
+
+        where = [
+            "OrgId = {org_id:String}",
+            "TeamId = {team_id:String}",
+        ]
+        parameters = {"org_id": str(org_id), "team_id": str(team_id)}
+        if experiment_id is not None:
+            where.append("ExperimentId = {experiment_id:String}")
+            parameters["experiment_id"] = str(experiment_id)
+        if semantic_kind is not None:
+            where.append("SemanticKind = {semantic_kind:String}")
+            parameters["semantic_kind"] = semantic_kind
+        if group_by == "model":
+            where.append(f"{MODEL_EXPR} != ''")
+        where_clause = " AND ".join(where)
+        parameters.update(window.parameters())
+
+        if group_by == "bucket":
+            key_select = window.bucket_select()
+            group_and_order = f"{window.group_by()} {window.order_by()}"
+        else:
+            key_select = f"{LATENCY_GROUP_BY[group_by]} as key,"
+            group_and_order = "GROUP BY key ORDER BY key ASC"
+
+        with self._query_slots:
+            try:
+                query = f"""
+                SELECT
+                    {key_select}
+                    count() as count,
+                    countIf(StatusCode = 'ERROR') as error_count,
+                    avg(Duration) as avg,
+                    quantilesTDigest(0.5, 0.9, 0.95, 0.99)(Duration) as percentiles,
+                    max(Duration) as max,
+                    sumIf(OutputTokens, OutputTokens > 0) as output_tokens,
+                    sumIf(Duration, OutputTokens > 0) as generation_duration
+                FROM (
+                    SELECT
+                        Timestamp,
+                        SpanName,
+                        AgentId,
+                        SpanAttributes,
+                        Duration,
+                        StatusCode,
+                        toInt64OrZero(SpanAttributes['gen_ai.usage.output_tokens']) as OutputTokens
+                    FROM {self.database}.otel_spans FINAL
+                    WHERE {where_clause} {window.conditions()}
+                )
+                {group_and_order}
+                """
+
+                rows = self._query_cached(
+                    query, parameters, org_id=org_id, team_id=team_id
+                )
+                return [
+                    {
+                        "key": str(
+                            row["bucket"] if group_by == "bucket" else row["key"]
+                        ),
+                        "count": int(row["count"]),
+                        "error_count": int(row["error_count"]),
+                        # avg of an empty (filled) bucket is nan
+                        "avg": float(row["avg"]) if row["count"] else 0.0,
+                        "p50": float(row["percentiles"][0]) if row["count"] else 0.0,
+                        "p90": float(row["percentiles"][1]) if row["count"] else 0.0,
+                        "p95": float(row["percentiles"][2]) if row["count"] else 0.0,
+                        "p99": float(row["percentiles"][3]) if row["count"] else 0.0,
+                        "max": float(row["max"]),
+                        "tokens_per_second": (
+                            row["output_tokens"] / (row["generation_duration"] / 1e9)
+                            if row["generation_duration"]
+                            else 0.0
+                        ),
+                    }
+                    for row in rows
+                ]
+            except Exception as e:
+                logger.error(f"Failed to get latency percentiles: {e}")
+                return []
+
+    def get_span_profile_by_exp_id(
+        self,
+        org_id: uuid.UUID,
+        team_id: uuid.UUID,
+        exp_id: uuid.UUID,
+        limit: int = 200,
+        *,
+        window: TimeWindow | None = None,
+    ) -> list[dict[str, Any]]:
+        """Aggregate spans of all runs of an experiment into a flame-graph style profile.
+
+        Spans are grouped by (SpanName, SemanticKind, ParentPath), ParentPath
+        being the names of their ancestors from the root, and their self time
+        is the part of their duration not covered by their children. Both need
+        the whole trace, so ClickHouse returns the timing of the spans in one
+        scan and build_span_profile aggregates them (see tracetree.py).
+
+        Args:
+            org_id: The organization ID to filter by
+            team_id: The team ID to filter by
+            exp_id: The experiment ID to filter by
+            limit: Max number of groups, heaviest total duration first
+            window: Optional time range, the bucket is ignored
+
+        Returns:
+            List of dicts with span_name, semantic_kind, parent_path, count,
+            total_duration, self_duration, p50, p95 and p99 (durations in ns)
+        """
+        window = window or TimeWindow()
+        with self._query_slots:
+            try:
+                query = f"""
+                SELECT
+                    TraceId,
+                    SpanId,
+                    ParentSpanId,
+                    SpanName,
+                    SemanticKind,
+                    toUnixTimestamp64Nano(Timestamp) as StartNs,
+                    Duration
+                FROM {self.database}.otel_spans FINAL
+                WHERE OrgId = {{org_id:String}}
+                  AND TeamId = {{team_id:String}}
+                  AND ExperimentId = {{exp_id:String}}
+                  {window.conditions()}
+                """
+                profile = self._query_cached(
+                    query,
+                    {
+                        **window.parameters(),
+                        "org_id": str(org_id),
+                        "team_id": str(team_id),
+                        "exp_id": str(exp_id),
+                    },
+                    org_id=org_id,
+                    team_id=team_id,
+                    reduce=lambda result: build_span_profile(result.named_results()),
+                )
+                return profile[: int(limit)]
+            except Exception as e:
+                logger.error(f"Failed to get span profile by exp_id: {e}")
+                return []
+
+    def flush(self, timeout_millis: int = 30000) -> bool:
+        """Wait until buffered spans are written to ClickHouse.
+
+        Args:
+            timeout_millis: Timeout in milliseconds
+
+        Returns:
+            True if all buffered spans were written, False otherwise
+        """
+        if self._buffer is None:
+            return True
+        return self._buffer.flush(timeout=timeout_millis / 1000)
+
     def close(self) -> None:
-        """Close the ClickHouse connection."""
+        """Flush buffered spans and close the ClickHouse connection."""
+        if self._buffer is not None:
+            self._buffer.close()
         try:
             self.client.close()
             logger.debug("ClickHouse client closed")
         except Exception as e:
             logger.error(f"Failed to close ClickHouse client: {e}")
+
+
+def client_settings(cluster_name: str | None = None) -> dict[str, Any]:
+    """ClickHouse settings for the TraceStore client."""
+    settings = {
+        # Duplicates of a span share its Timestamp and thus its partition,
+        # so FINAL never needs to merge across partitions.
+        "do_not_merge_across_partitions_select_final": 1,
+    }
+    if cluster_name:
+        settings.update(
+            {
+                # Every query filters on OrgId and TeamId, the sharding key, so
+                # it's sent to the team's shard only and aggregated there.
+                "optimize_skip_unused_shards": 1,
+                "optimize_distributed_group_by_sharding_key": 1,
+                # Spans of the shard of the connected node are written locally,
+                # and the insert is only acknowledged once every shard has its
+                # spans, so the buffer retries failed ones with the same
+                # deduplication token.
+                "prefer_localhost_replica": 1,
+                "insert_distributed_sync": 1,
+            }
+        )
+    return settings
+
+
+def dedup_token(spans: list[dict[str, Any]]) -> str:
+    """Build an insert deduplication token for a batch of spans.
+
+    The token depends on the inserted columns of every span, not just their
+    (TraceId, SpanId): retrying the same batch yields the same token whatever
+    its ordering, while re-sending a span with new content (e.g. an agent hook
+    updating a turn) is written, and replaces the earlier version.
+    """
+    rows = sorted(
+        json.dumps(
+            [span.get(name, default) for name, default in SPAN_INSERT_COLUMNS],
+            sort_keys=True,
+            default=str,
+        )
+        for span in spans
+    )
+    return hashlib.sha256("\n".join(rows).encode()).hexdigest()
+
+
+def encode_cursor(span: dict[str, Any]) -> str:
+    """Build an opaque pagination cursor pointing at span."""
+    raw = f"{span['TimestampNs']}:{span['SpanId']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple[int, str]:
+    """Decode a pagination cursor into (timestamp in ns, span id).
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        timestamp_ns, span_id = raw.split(":", 1)
+        return int(timestamp_ns), span_id
+    except Exception as e:
+        raise ValueError("malformed cursor") from e
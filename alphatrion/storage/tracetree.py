@@ -0,0 +1,277 @@
+"""Assemble flat span rows into trace trees.
+
+Works on the compact rows returned by TraceStore.get_trace_tree_spans (ids,
+timing, tokens and cost per span) and derives, per trace:
+- the parent/child structure, flattened in depth-first order
+- self time per span, i.e. the part of its duration not covered by children
+- token and cost totals per subtree
+- the critical path, the chain of spans that determined the end-to-end latency
+
+build_span_profile aggregates the same rows across many traces instead, into
+a flame-graph style profile.
+"""
+
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import Any
+
+# Separator of the span names of a parent path, as in folded stacks
+PATH_SEPARATOR = ";"
+
+
+def build_trace_trees(spans: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Build one tree per trace from span rows.
+
+    Args:
+        spans: Rows with TraceId, SpanId, ParentSpanId, SpanName, SemanticKind,
+            StatusCode, Timestamp, StartNs, Duration, Tokens and Cost
+
+    Returns:
+        List of trace dicts ordered by start time, each with its nodes in
+        depth-first order
+    """
+    by_trace = defaultdict(list)
+    for span in spans:
+        by_trace[span["TraceId"]].append(span)
+
+    trees = [_build_tree(trace_id, rows) for trace_id, rows in by_trace.items()]
+    trees.sort(key=lambda t: t["start_ns"])
+    return trees
+
+
+def _build_tree(trace_id: str, rows: list[dict[str, Any]]) -> dict[str, Any]:
+    nodes = {}
+    for row in rows:
+        start = int(row["StartNs"])
+        duration = int(row["Duration"])
+        nodes[row["SpanId"]] = {
+            "span_id": row["SpanId"],
+            "parent_span_id": row["ParentSpanId"],
+            "span_name": row["SpanName"],
+            "semantic_kind": row["SemanticKind"],
+            "status_code": row["StatusCode"],
+            "timestamp": row["Timestamp"],
+            "start_ns": start,
+            "end_ns": start + duration,
+            "duration": duration,
+            "self_time": duration,
+            "tokens": int(row["Tokens"]),
+            "cost": float(row["Cost"]),
+            "subtree_tokens": 0,
+            "subtree_cost": 0.0,
+            "depth": 0,
+            "child_span_ids": [],
+            "on_critical_path": False,
+        }
+
+    # Spans whose parent wasn't exported (or is in another trace) become roots
+    roots = []
+    for node in sorted(nodes.values(), key=lambda n: n["start_ns"]):
+        parent = nodes.get(node["parent_span_id"])
+        if parent is None or parent is node:
+            roots.append(node)
+        else:
+            parent["child_span_ids"].append(node["span_id"])
+
+    # Depth-first order, iterative so deep traces can't hit the recursion limit
+    ordered = []
+    stack = [(root, 0) for root in reversed(roots)]
+    while stack:
+        node, depth = stack.pop()
+        node["depth"] = depth
+        ordered.append(node)
+        for child_id in reversed(node["child_span_ids"]):
+            stack.append((nodes[child_id], depth + 1))
+
+    # Children come after their parent in DFS order, so walking it backwards
+    # sees every subtree complete before its root.
+    for node in reversed(ordered):
+        children = [nodes[c] for c in node["child_span_ids"]]
+        node["subtree_tokens"] = node["tokens"] + sum(
+            c["subtree_tokens"] for c in children
+        )
+        node["subtree_cost"] = node["cost"] + sum(c["subtree_cost"] for c in children)
+        node["self_time"] = node["duration"] - _covered_ns(node, children)
+
+    critical_path = []
+    if roots:
+        # The root that finished last bounds the trace latency
+        last_root = max(roots, key=lambda n: n["end_ns"])
+        critical_path = _critical_path(last_root, nodes)
+        for span_id in critical_path:
+            nodes[span_id]["on_critical_path"] = True
+
+    start_ns = min(n["start_ns"] for n in ordered)
+    end_ns = max(n["end_ns"] for n in ordered)
+    return {
+        "trace_id": trace_id,
+        "timestamp": min(ordered, key=lambda n: n["start_ns"])["timestamp"],
+        "start_ns": start_ns,
+        "duration": end_ns - start_ns,
+        "span_count": len(ordered),
+        "total_tokens": sum(n["tokens"] for n in ordered),
+        "total_cost": sum(n["cost"] for n in ordered),
+        "critical_path": critical_path,
+        "nodes": ordered,
+    }
+
+
+def _covered_ns(node: dict[str, Any], children: list[dict[str, Any]]) -> int:
+    """Length of the union of child intervals, clipped to the node's interval."""
+    intervals = sorted(
+        (max(c["start_ns"], node["start_ns"]), min(c["end_ns"], node["end_ns"]))
+        for c in children
+    )
+    covered = 0
+    cur_start = cur_end = None
+    for start, end in intervals:
+        if end <= start:
+            continue
+        if cur_end is None or start > cur_end:
+            if cur_end is not None:
+                covered += cur_end - cur_start
+            cur_start, cur_end = start, end
+        else:
+            cur_end = max(cur_end, end)
+    if cur_end is not None:
+        covered += cur_end - cur_start
+    return covered
+
+
+def _critical_path(root: dict[str, Any], nodes: dict[str, dict[str, Any]]) -> list[str]:
+    """Walk back from the end of each span through the children it waited on.
+
+    Starting at the span's end, the child finishing last is on the critical
+    path; the walk then continues from that child's start with the children
+    that finished before it, so children overlapping a chosen one are skipped.
+    Returns span ids in DFS order.
+    """
+    path = []
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        path.append(node["span_id"])
+
+        chosen = []
+        cursor = node["end_ns"]
+        children = sorted(
+            (nodes[c] for c in node["child_span_ids"]),
+            key=lambda n: n["end_ns"],
+            reverse=True,
+        )
+        for child in children:
+            # Children outliving their parent count up to the parent's end
+            if min(child["end_ns"], node["end_ns"]) > cursor:
+                continue
+            chosen.append(child)
+            cursor = child["start_ns"]
+
+        # chosen runs from the latest child backwards, push so the earliest pops first
+        stack.extend(chosen)
+    return path
+
+
+def build_span_profile(spans: Iterable[dict[str, Any]]) -> list[dict[str, Any]]:
+    """Aggregate spans of many traces by name, semantic kind and parent path.
+
+    The parent path of a span is the names of its ancestors, from the root
+    down to its parent, joined by PATH_SEPARATOR. Self time is computed like
+    in trace trees, durations are in ns.
+
+    Args:
+        spans: Rows with TraceId, SpanId, ParentSpanId, SpanName, SemanticKind,
+            StartNs and Duration
+
+    Returns:
+        List of dicts with span_name, semantic_kind, parent_path, count,
+        total_duration, self_duration, p50, p95 and p99, heaviest total
+        duration first
+    """
+    by_trace = defaultdict(list)
+    for span in spans:
+        by_trace[span["TraceId"]].append(span)
+
+    groups = defaultdict(lambda: {"self_duration": 0, "durations": []})
+    for rows in by_trace.values():
+        nodes = {}
+        for row in rows:
+            start = int(row["StartNs"])
+            nodes[row["SpanId"]] = {
+                "span_name": row["SpanName"],
+                "semantic_kind": row["SemanticKind"],
+                "parent_span_id": row["ParentSpanId"],
+                "start_ns": start,
+                "end_ns": start + int(row["Duration"]),
+                "children": [],
+            }
+        for span_id, node in nodes.items():
+            if node["parent_span_id"] in nodes and node["parent_span_id"] != span_id:
+                nodes[node["parent_span_id"]]["children"].append(node)
+
+        paths = {}
+        for span_id, node in nodes.items():
+            duration = node["end_ns"] - node["start_ns"]
+            group = groups[
+                (
+                    node["span_name"],
+                    node["semantic_kind"],
+                    _parent_path(span_id, nodes, paths),
+                )
+            ]
+            group["self_duration"] += duration - _covered_ns(node, node["children"])
+            group["durations"].append(duration)
+
+    profile = []
+    for (span_name, semantic_kind, parent_path), group in groups.items():
+        durations = sorted(group["durations"])
+        profile.append(
+            {
+                "span_name": span_name,
+                "semantic_kind": semantic_kind,
+                "parent_path": parent_path,
+                "count": len(durations),
+                "total_duration": sum(durations),
+                "self_duration": group["self_duration"],
+                "p50": _percentile(durations, 0.5),
+                "p95": _percentile(durations, 0.95),
+                "p99": _percentile(durations, 0.99),
+            }
+        )
+    profile.sort(key=lambda entry: entry["total_duration"], reverse=True)
+    return profile
+
+
+def _parent_path(
+    span_id: str, nodes: dict[str, dict[str, Any]], paths: dict[str, str]
+) -> str:
+    """Names of the ancestors of a span joined by PATH_SEPARATOR, memoized in paths."""
+    # Walk up to the first ancestor with a known path, or the root
+    chain = []
+    current = span_id
+    while current not in paths:
+        chain.append(current)
+        parent_id = nodes[current]["parent_span_id"]
+        # A parent cycle in broken data ends the path like a root does
+        if parent_id not in nodes or parent_id in chain:
+            paths[current] = ""
+            chain.pop()
+            break
+        current = parent_id
+    for node_id in reversed(chain):
+        parent_id = nodes[node_id]["parent_span_id"]
+        parent_path = paths[parent_id]
+        parent_name = nodes[parent_id]["span_name"]
+        paths[node_id] = (
+            f"{parent_path}{PATH_SEPARATOR}{parent_name}"
+            if parent_path
+            else parent_name
+        )
+    return paths[span_id]
+
+
+def _percentile(values: list[int], q: float) -> float:
+    """Percentile of sorted values, interpolated linearly."""
+    position = (len(values) - 1) * q
+    lower = int(position)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (position - lower)
@@ -1,8 +1,9 @@
-from alphatrion.tracing.tracing import agent, task, tool, workflow
+from alphatrion.tracing.tracing import agent, agent_session, task, tool, workflow
 
 __all__ = [
     "task",
     "workflow",
     "tool",
     "agent",
+    "agent_session",
 ]
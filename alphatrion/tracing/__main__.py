@@ -0,0 +1,5 @@
+"""Span export worker, started by ProcessSpanExporter."""
+
+from alphatrion.tracing.export_worker import main
+
+main()
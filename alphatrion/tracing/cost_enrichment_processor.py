@@ -7,6 +7,8 @@ access pre-calculated costs from span attributes.
 """
 
 import logging
+from collections.abc import Mapping
+from typing import Any
 
 from opentelemetry.context import Context
 from opentelemetry.sdk.trace import ReadableSpan
@@ -39,73 +41,27 @@ class CostEnrichmentProcessor(SpanProcessor):
             span: The completed span
         """
         try:
-            # Only process spans with attributes
-            if not span.attributes:
+            costs = cost_attributes(span.attributes)
+            if not costs:
                 return
 
-            # Check if costs are already present
-            if "alphatrion.cost.input_tokens" in span.attributes:
-                # Costs already calculated (e.g., in claude.py)
-                return
-
-            # Check if this is an LLM span with token usage
-            if "gen_ai.usage.input_tokens" not in span.attributes:
-                # Not an LLM span, skip
-                return
-
-            # Extract token usage
-            attributes = span.attributes
-            # Keep getting the provider from api_base first because some providers (like DeepInfra)
-            # don't set the provider name in the attributes, it's still OPENAI, which is not correct.
-            provider = determine_provider(
-                str(
-                    attributes.get("gen_ai.openai.api_base")
-                    or attributes.get("gen_ai.provider.name")
-                    # Being deprecated in favor of `gen_ai.provider.name`
-                    or attributes.get("gen_ai.system")
-                )
-            )
-            model = str(
-                attributes.get("gen_ai.request.model")
-                or attributes.get("gen_ai.response.model", "")
-            )
-            input_tokens = int(attributes.get("gen_ai.usage.input_tokens", 0))
-            output_tokens = int(attributes.get("gen_ai.usage.output_tokens", 0))
-            cache_creation_input_tokens = int(
-                attributes.get("gen_ai.usage.cache_creation_input_tokens", 0)
-            )
-            cache_read_input_tokens = int(
-                attributes.get("gen_ai.usage.cache_read_input_tokens", 0)
-            )
-
-            # Calculate costs
-            cost_result = calculate_cost(
-                provider=provider,
-                model=model,
-                input_tokens=input_tokens,
-                output_tokens=output_tokens,
-                cache_creation_input_tokens=cache_creation_input_tokens,
-                cache_read_input_tokens=cache_read_input_tokens,
-            )
-
             # Add cost attributes to span (individual types only, not total)
             # Note: We can't modify ReadableSpan.attributes directly after span ends,
             # but we can modify the underlying _attributes dict that will be read
             # by exporters. This is a bit of a hack but it's the only way to enrich
             # spans post-creation without modifying OpenTelemetry internals.
             if hasattr(span, "_attributes"):
-                span._attributes["alphatrion.cost.input_tokens"] = str(
-                    cost_result["input_cost"]
-                )
-                span._attributes["alphatrion.cost.output_tokens"] = str(
-                    cost_result["output_cost"]
-                )
-                span._attributes["alphatrion.cost.cache_creation_input_tokens"] = str(
-                    cost_result["cache_creation_input_cost"]
-                )
-                span._attributes["alphatrion.cost.cache_read_input_tokens"] = str(
-                    cost_result["cache_read_input_cost"]
-                )
+                # Span.end() freezes the attributes before calling processors
+                attributes = span._attributes
+                immutable = getattr(attributes, "_immutable", False)
+                if immutable:
+                    attributes._immutable = False
+                try:
+                    for key, value in costs.items():
+                        attributes[key] = value
+                finally:
+                    if immutable:
+                        attributes._immutable = True
 
         except Exception as e:
             logger.warning(f"Failed to enrich span with cost: {e}", exc_info=True)
@@ -127,6 +83,70 @@ class CostEnrichmentProcessor(SpanProcessor):
         return True
 
 
+def cost_attributes(attributes: Mapping[str, Any] | None) -> dict[str, str] | None:
+    """Cost attributes of an LLM span, calculated from its token usage.
+
+    Returns:
+        The alphatrion.cost.* attributes, None if the span isn't an LLM span
+        or already has costs (e.g. set in claude.py)
+    """
+    # Only process spans with attributes
+    if not attributes:
+        return None
+
+    # Check if costs are already present
+    if "alphatrion.cost.input_tokens" in attributes:
+        return None
+
+    # Check if this is an LLM span with token usage
+    if "gen_ai.usage.input_tokens" not in attributes:
+        # Not an LLM span, skip
+        return None
+
+    # Keep getting the provider from api_base first because some providers (like DeepInfra)
+    # don't set the provider name in the attributes, it's still OPENAI, which is not correct.
+    provider = determine_provider(
+        str(
+            attributes.get("gen_ai.openai.api_base")
+            or attributes.get("gen_ai.provider.name")
+            # Being deprecated in favor of `gen_ai.provider.name`
+            or attributes.get("gen_ai.system")
+        )
+    )
+    model = str(
+        attributes.get("gen_ai.request.model")
+        or attributes.get("gen_ai.response.model", "")
+    )
+    input_tokens = int(attributes.get("gen_ai.usage.input_tokens", 0))
+    output_tokens = int(attributes.get("gen_ai.usage.output_tokens", 0))
+    cache_creation_input_tokens = int(
+        attributes.get("gen_ai.usage.cache_creation_input_tokens", 0)
+    )
+    cache_read_input_tokens = int(
+        attributes.get("gen_ai.usage.cache_read_input_tokens", 0)
+    )
+
+    # Calculate costs
+    cost_result = calculate_cost(
+        provider=provider,
+        model=model,
+        input_tokens=input_tokens,
+        output_tokens=output_tokens,
+        cache_creation_input_tokens=cache_creation_input_tokens,
+        cache_read_input_tokens=cache_read_input_tokens,
+    )
+    return {
+        "alphatrion.cost.input_tokens": str(cost_result["input_cost"]),
+        "alphatrion.cost.output_tokens": str(cost_result["output_cost"]),
+        "alphatrion.cost.cache_creation_input_tokens": str(
+            cost_result["cache_creation_input_cost"]
+        ),
+        "alphatrion.cost.cache_read_input_tokens": str(
+            cost_result["cache_read_input_cost"]
+        ),
+    }
+
+
 def determine_provider(api_base: str) -> str:
     """Determine provider from API base URL.
 
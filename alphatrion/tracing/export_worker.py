@@ -0,0 +1,448 @@
+"""Span export in a sidecar process.
+
+By default spans are converted, enriched with costs and written to
+ClickHouse and Prometheus by the BatchSpanProcessor thread of the traced
+process, competing for the GIL with the agent or training loop it traces.
+With ALPHATRION_TRACE_EXPORT_MODE=process, ProcessSpanExporter only packs
+each batch into tuples of plain values and pickles it to the stdin of a
+worker process (python -m alphatrion.tracing), which does
+the rest.
+
+Frames on the pipe are a 4 bytes length followed by a pickle:
+- ("spans", resources, packed spans), resources by the key packed spans
+  refer to
+- ("flush", seq), acknowledged by writing seq to the worker's stdout once
+  its exporters are flushed
+
+The worker exits at EOF, i.e. when the traced process shuts down or dies.
+A worker that died is restarted at the next batch, at most once per
+restart_interval, the batches in between are dropped. Frames are written
+without blocking for more than write_timeout: a batch the stalled worker
+doesn't start reading by then is dropped, the rest of a frame it started
+reading is written before the next one.
+"""
+
+import argparse
+import contextlib
+import logging
+import os
+import pickle
+import select
+import struct
+import subprocess
+import sys
+import threading
+import time
+from collections.abc import Sequence
+from typing import Any, BinaryIO
+
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import Event, ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter, SpanExportResult
+from opentelemetry.trace import (
+    Link,
+    SpanContext,
+    SpanKind,
+    Status,
+    StatusCode,
+    TraceFlags,
+)
+from prometheus_client import Counter
+
+from alphatrion.tracing.cost_enrichment_processor import cost_attributes
+from alphatrion.tracing.span_encoder import attribute_items
+from alphatrion.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+_LENGTH = struct.Struct("!I")
+_SEQ = struct.Struct("!Q")
+
+_SAMPLED = TraceFlags(TraceFlags.SAMPLED)
+
+DROPPED_SPANS = Counter(
+    "alphatrion_export_worker_dropped_spans_total",
+    "Spans dropped because the export worker process wasn't running or stalled",
+    registry=REGISTRY,
+)
+STALLED_BATCHES = Counter(
+    "alphatrion_export_worker_stalled_batches_total",
+    "Batches dropped because the export worker didn't read them in time",
+    registry=REGISTRY,
+)
+STARTS = Counter(
+    "alphatrion_export_worker_starts_total",
+    "Export worker processes started",
+    registry=REGISTRY,
+)
+
+
+def pack_spans(
+    spans: Sequence[ReadableSpan],
+) -> tuple[dict[int, dict[str, Any]], list[tuple]]:
+    """Pack spans into plain values.
+
+    Returns:
+        The attributes of the spans' resources by key, and the packed spans
+    """
+    resources = {}
+    packed = []
+    for span in spans:
+        resource = span.resource
+        key = id(resource)
+        if key not in resources:
+            resources[key] = dict(attribute_items(resource.attributes))
+        context = span.context
+        parent = span.parent
+        status = span.status
+        packed.append(
+            (
+                span.name,
+                context.trace_id,
+                context.span_id,
+                parent.span_id if parent else 0,
+                bool(parent and parent.is_remote),
+                span.kind.value,
+                status.status_code.value,
+                status.description,
+                span.start_time,
+                span.end_time,
+                dict(attribute_items(span._attributes)),
+                key,
+                [
+                    (
+                        event.name,
+                        event.timestamp,
+                        dict(attribute_items(event.attributes)),
+                    )
+                    for event in span.events
+                ],
+                [
+                    (
+                        link.context.trace_id,
+                        link.context.span_id,
+                        dict(attribute_items(link.attributes)),
+                    )
+                    for link in span.links
+                ],
+            )
+        )
+    return resources, packed
+
+
+def unpack_spans(
+    resources: dict[int, dict[str, Any]], packed: list[tuple]
+) -> list[ReadableSpan]:
+    """Rebuild the spans packed by pack_spans."""
+    rebuilt = {key: Resource(attributes) for key, attributes in resources.items()}
+    spans = []
+    for (
+        name,
+        trace_id,
+        span_id,
+        parent_span_id,
+        parent_is_remote,
+        kind,
+        status_code,
+        description,
+        start_time,
+        end_time,
+        attributes,
+        resource_key,
+        events,
+        links,
+    ) in packed:
+        spans.append(
+            ReadableSpan(
+                name=name,
+                context=SpanContext(
+                    trace_id, span_id, is_remote=False, trace_flags=_SAMPLED
+                ),
+                parent=SpanContext(trace_id, parent_span_id, is_remote=parent_is_remote)
+                if parent_span_id
+                else None,
+                resource=rebuilt[resource_key],
+                attributes=attributes,
+                events=[
+                    Event(event_name, event_attributes, timestamp=timestamp)
+                    for event_name, timestamp, event_attributes in events
+                ],
+                links=[
+                    Link(
+                        SpanContext(link_trace_id, link_span_id, is_remote=True),
+                        link_attributes,
+                    )
+                    for link_trace_id, link_span_id, link_attributes in links
+                ],
+                kind=SpanKind(kind),
+                status=Status(StatusCode(status_code), description),
+                start_time=start_time,
+                end_time=end_time,
+            )
+        )
+    return spans
+
+
+def encode_frame(message: tuple) -> bytes:
+    data = pickle.dumps(message, protocol=pickle.HIGHEST_PROTOCOL)
+    return _LENGTH.pack(len(data)) + data
+
+
+def write_until(fd: int, data: memoryview, deadline: float) -> int:
+    """Write to a non-blocking file descriptor until done or past the deadline.
+
+    Returns:
+        Number of bytes written
+    """
+    written = 0
+    while written < len(data):
+        try:
+            written += os.write(fd, data[written:])
+            continue
+        except BlockingIOError:
+            pass
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        select.select([], [fd], [], remaining)
+    return written
+
+
+def read_frame(stream: BinaryIO) -> tuple | None:
+    """Read the next frame, None at EOF."""
+    header = stream.read(_LENGTH.size)
+    if len(header) < _LENGTH.size:
+        return None
+    (length,) = _LENGTH.unpack(header)
+    data = stream.read(length)
+    if len(data) < length:
+        return None
+    return pickle.loads(data)
+
+
+class ProcessSpanExporter(SpanExporter):
+    """Hands spans over to an export worker process."""
+
+    def __init__(
+        self,
+        *,
+        clickhouse: bool = True,
+        prometheus: bool = False,
+        restart_interval: float = 5.0,
+        write_timeout: float = 10.0,
+    ):
+        """
+        Args:
+            clickhouse: Whether the worker writes spans to ClickHouse
+            prometheus: Whether the worker pushes metrics to Prometheus
+            restart_interval: Min seconds between starts of the worker
+            write_timeout: Max seconds to wait for the worker to read a batch
+        """
+        self._args = [sys.executable, "-m", "alphatrion.tracing"]
+        if clickhouse:
+            self._args.append("--clickhouse")
+        if prometheus:
+            self._args.append("--prometheus")
+        self._restart_interval = restart_interval
+        self._write_timeout = write_timeout
+        self._process: subprocess.Popen | None = None
+        # Rest of a frame the worker started reading but didn't finish in time
+        self._pending = memoryview(b"")
+        self._started_at = float("-inf")
+        self._seq = 0
+        self._lock = threading.Lock()
+        self._shutdown = False
+
+    def export(self, spans: Sequence[ReadableSpan]) -> SpanExportResult:
+        if not spans or self._shutdown:
+            return SpanExportResult.SUCCESS
+        try:
+            message = ("spans", *pack_spans(spans))
+        except Exception as e:
+            logger.error(f"Failed to pack spans for the export worker: {e}")
+            return SpanExportResult.FAILURE
+
+        with self._lock:
+            if not self._send(message):
+                DROPPED_SPANS.inc(len(spans))
+                return SpanExportResult.FAILURE
+        return SpanExportResult.SUCCESS
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        with self._lock:
+            process = self._process
+            if process is None or process.poll() is not None:
+                return True
+            self._seq += 1
+            seq = self._seq
+            if not self._send(("flush", seq)):
+                return False
+            # A worker that died since was restarted by _send
+            process = self._process
+
+            deadline = time.monotonic() + timeout_millis / 1000
+            fd = process.stdout.fileno()
+            while (remaining := deadline - time.monotonic()) > 0:
+                ready, _, _ = select.select([fd], [], [], remaining)
+                if not ready:
+                    break
+                data = os.read(fd, _SEQ.size)
+                if len(data) < _SEQ.size:
+                    # The worker died
+                    return False
+                # Acks of earlier flushes that timed out are skipped
+                if _SEQ.unpack(data)[0] >= seq:
+                    return True
+            logger.warning("Timed out flushing the export worker")
+            return False
+
+    def shutdown(self) -> None:
+        with self._lock:
+            self._shutdown = True
+            process = self._process
+            pending = self._pending
+            self._process = None
+            self._pending = memoryview(b"")
+        if process is None:
+            return
+        try:
+            if pending:
+                write_until(
+                    process.stdin.fileno(),
+                    pending,
+                    time.monotonic() + self._write_timeout,
+                )
+            # EOF makes the worker flush its exporters and exit
+            process.stdin.close()
+            process.wait(timeout=30)
+        except Exception as e:
+            logger.warning(f"Export worker didn't exit, killing it: {e}")
+            process.kill()
+            process.wait()
+        finally:
+            _close_pipes(process)
+
+    def _send(self, message: tuple) -> bool:
+        """Write a frame to the worker, started if needed. Called with the lock held.
+
+        Returns:
+            False if the frame was dropped
+        """
+        data = memoryview(encode_frame(message))
+        for _ in range(2):
+            if not self._ensure_process():
+                return False
+            fd = self._process.stdin.fileno()
+            deadline = time.monotonic() + self._write_timeout
+            try:
+                if self._pending:
+                    self._pending = self._pending[
+                        write_until(fd, self._pending, deadline) :
+                    ]
+                written = 0 if self._pending else write_until(fd, data, deadline)
+            except OSError as e:
+                logger.warning(f"Export worker exited: {e}")
+                self._discard_process()
+                continue
+            if written == 0:
+                logger.warning("Export worker stalled, dropping a batch")
+                STALLED_BATCHES.inc()
+                return False
+            # Frames can't be interleaved, the rest goes before the next one
+            self._pending = data[written:]
+            return True
+        return False
+
+    def _discard_process(self) -> None:
+        """Close the pipes of the worker, killed if still running, and reap it."""
+        process = self._process
+        self._process = None
+        self._pending = memoryview(b"")
+        if process is None:
+            return
+        _close_pipes(process)
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+
+    def _ensure_process(self) -> bool:
+        if self._process is not None:
+            if self._process.poll() is None:
+                return True
+            self._discard_process()
+        now = time.monotonic()
+        if now - self._started_at < self._restart_interval:
+            return False
+        self._started_at = now
+        try:
+            self._process = subprocess.Popen(
+                self._args, stdin=subprocess.PIPE, stdout=subprocess.PIPE
+            )
+        except OSError as e:
+            logger.error(f"Failed to start the export worker: {e}")
+            self._process = None
+            return False
+        os.set_blocking(self._process.stdin.fileno(), False)
+        STARTS.inc()
+        return True
+
+
+def _close_pipes(process: subprocess.Popen) -> None:
+    for stream in (process.stdin, process.stdout):
+        with contextlib.suppress(OSError):
+            stream.close()
+
+
+def _exporters(*, clickhouse: bool, prometheus: bool) -> list[SpanExporter]:
+    # Imported here, the runtime imports this module to export in process mode
+    from alphatrion.storage.runtime import (
+        prometheus_exporter_from_env,
+        tracestore_from_env,
+    )
+    from alphatrion.tracing.clickhouse_exporter import ClickHouseSpanExporter
+
+    exporters = []
+    if clickhouse:
+        try:
+            exporters.append(ClickHouseSpanExporter(tracestore_from_env()))
+        except Exception as e:
+            logger.warning(f"Failed to initialize ClickHouse TraceStore: {e}")
+    if prometheus:
+        exporters.append(prometheus_exporter_from_env())
+    return exporters
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="AlphaTrion span export worker")
+    parser.add_argument("--clickhouse", action="store_true")
+    parser.add_argument("--prometheus", action="store_true")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    # Keep stdout for flush acks, anything printed goes to stderr
+    acks = os.fdopen(os.dup(sys.stdout.fileno()), "wb", buffering=0)
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    frames = sys.stdin.buffer
+
+    exporters = _exporters(clickhouse=args.clickhouse, prometheus=args.prometheus)
+    try:
+        while (message := read_frame(frames)) is not None:
+            if message[0] == "flush":
+                for exporter in exporters:
+                    exporter.force_flush()
+                acks.write(_SEQ.pack(message[1]))
+                continue
+
+            spans = unpack_spans(message[1], message[2])
+            for span in spans:
+                try:
+                    costs = cost_attributes(span._attributes)
+                    if costs:
+                        span._attributes.update(costs)
+                except Exception as e:
+                    logger.warning(f"Failed to enrich span with cost: {e}")
+            for exporter in exporters:
+                exporter.export(spans)
+    finally:
+        for exporter in exporters:
+            exporter.shutdown()
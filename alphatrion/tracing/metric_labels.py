@@ -0,0 +1,194 @@
+"""Label cardinality control for the Prometheus LLM metrics.
+
+Every distinct set of label values is a series, kept by the exporter, the
+push gateway and Prometheus until the process ends. Labeling by experiment
+and user makes their number grow without bound, so a LabelPolicy bounds it:
+- labels: the dimensions metrics are labeled by, the others are dropped
+- allowlists: per dimension, the values kept, others are labeled OTHER
+- top_n: per dimension, only the n values with the most tokens over the
+  last rank_interval keep their own label, others are labeled OTHER. Slots
+  the last ranking left free, all of them before the first one, go to the
+  values with the most tokens so far in the current interval
+- series_ttl: series not updated for this many seconds are removed, e.g.
+  the ones of finished experiments
+
+Values moving in or out of the top n start or stop updating their series,
+so sums across series stay right.
+"""
+
+import heapq
+import json
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+
+from prometheus_client.metrics import MetricWrapperBase
+
+from alphatrion import envs
+
+# Dimensions LLM metrics can be labeled by
+LABEL_DIMENSIONS = ("org_id", "team_id", "user_id", "experiment_id", "model")
+
+# Label of the values bucketed together
+OTHER = "other"
+
+
+@dataclass
+class LabelPolicy:
+    """Which dimensions and values LLM metrics are labeled by."""
+
+    labels: tuple[str, ...] = LABEL_DIMENSIONS
+    allowlists: dict[str, frozenset[str]] = field(default_factory=dict)
+    top_n: dict[str, int] = field(
+        default_factory=lambda: {"experiment_id": 50, "user_id": 100}
+    )
+    # Seconds without updates after which a series is removed, 0 keeps them
+    series_ttl: float = 3600.0
+    # Seconds of token usage the top values are ranked by
+    rank_interval: float = 300.0
+
+    def __post_init__(self):
+        unknown = set(self.labels) - set(LABEL_DIMENSIONS)
+        if unknown:
+            raise ValueError(f"Unsupported metric labels: {sorted(unknown)}")
+
+    @classmethod
+    def from_env(cls) -> "LabelPolicy":
+        policy = cls()
+        labels = os.getenv(envs.PROMETHEUS_LABELS)
+        if labels:
+            policy.labels = tuple(
+                label.strip() for label in labels.split(",") if label.strip()
+            )
+        allowlists = json.loads(os.getenv(envs.PROMETHEUS_LABEL_ALLOWLISTS) or "{}")
+        policy.allowlists = {
+            label: frozenset(values) for label, values in allowlists.items()
+        }
+        top_n = os.getenv(envs.PROMETHEUS_LABEL_TOP_N)
+        if top_n:
+            policy.top_n = {label: int(n) for label, n in json.loads(top_n).items()}
+        policy.series_ttl = float(os.getenv(envs.PROMETHEUS_SERIES_TTL, "3600"))
+        policy.__post_init__()
+        return policy
+
+
+class TopValues:
+    """Values of a dimension labeled as themselves: the top n by weight."""
+
+    def __init__(self, n: int, rank_interval: float):
+        self._n = n
+        self._rank_interval = rank_interval
+        # Weights of the current interval, of at most 10 * n values
+        self._weights: dict[str, float] = {}
+        # Top n of the last interval
+        self._ranked: set[str] = set()
+        # Min-heap of [weight, value] of the values holding the slots the
+        # ranking left free, the heaviest others of the current interval
+        self._rising: list[list] = []
+        self._rising_entries: dict[str, list] = {}
+        self._ranked_at: float | None = None
+
+    def label(self, value: str, weight: float, now: float) -> str:
+        if self._ranked_at is None:
+            self._ranked_at = now
+        elif now - self._ranked_at >= self._rank_interval:
+            self._ranked = set(
+                heapq.nlargest(self._n, self._weights, self._weights.get)
+            )
+            self._weights = {}
+            self._rising = []
+            self._rising_entries = {}
+            self._ranked_at = now
+
+        if value in self._weights or len(self._weights) < 10 * self._n:
+            self._weights[value] = self._weights.get(value, 0) + weight
+        if value in self._ranked or self._rise(value):
+            return value
+        return OTHER
+
+    def _rise(self, value: str) -> bool:
+        """Rank a value not in the last top n among the others, on insert."""
+        weight = self._weights.get(value)
+        free = self._n - len(self._ranked)
+        if weight is None or free <= 0:
+            return False
+        entry = self._rising_entries.get(value)
+        if entry is not None:
+            entry[0] = weight
+            heapq.heapify(self._rising)
+            return True
+        if len(self._rising) >= free:
+            if weight <= self._rising[0][0]:
+                return False
+            # The lightest value gives its slot up
+            _, evicted = heapq.heappop(self._rising)
+            del self._rising_entries[evicted]
+        entry = [weight, value]
+        heapq.heappush(self._rising, entry)
+        self._rising_entries[value] = entry
+        return True
+
+
+class MetricLabels:
+    """Labels LLM metrics by a LabelPolicy, and removes their stale series."""
+
+    def __init__(self, policy: LabelPolicy | None = None):
+        self.policy = policy or LabelPolicy()
+        self._top = {
+            label: TopValues(n, self.policy.rank_interval)
+            for label, n in self.policy.top_n.items()
+            if label in self.policy.labels and label not in self.policy.allowlists
+        }
+        # metric -> label values -> last update
+        self._updated: dict[MetricWrapperBase, dict[tuple[str, ...], float]] = {}
+        self._expired_at = time.monotonic()
+        self._lock = threading.Lock()
+
+    def labels(self, values: dict[str, str], weight: float) -> dict[str, str]:
+        """Labels of the given dimension values, weighted by their token usage."""
+        now = time.monotonic()
+        labels = {}
+        with self._lock:
+            for label in self.policy.labels:
+                value = values.get(label, "unknown")
+                allowlist = self.policy.allowlists.get(label)
+                if allowlist is not None:
+                    value = value if value in allowlist else OTHER
+                elif label in self._top:
+                    value = self._top[label].label(value, weight, now)
+                labels[label] = value
+        return labels
+
+    def child(self, metric: MetricWrapperBase, **labels: str):
+        """The series of a metric with these labels, marked as updated."""
+        child = metric.labels(**labels)
+        if self.policy.series_ttl > 0:
+            with self._lock:
+                self._updated.setdefault(metric, {})[
+                    tuple(labels[name] for name in metric._labelnames)
+                ] = time.monotonic()
+        return child
+
+    def expire(self) -> int:
+        """Remove the series not updated for series_ttl, at most every tenth of it.
+
+        Returns:
+            Number of series removed
+        """
+        ttl = self.policy.series_ttl
+        now = time.monotonic()
+        with self._lock:
+            if ttl <= 0 or now - self._expired_at < ttl / 10:
+                return 0
+            self._expired_at = now
+            removed = 0
+            for metric, updated in self._updated.items():
+                for values in [v for v, at in updated.items() if now - at >= ttl]:
+                    del updated[values]
+                    try:
+                        metric.remove(*values)
+                        removed += 1
+                    except KeyError:
+                        pass
+            return removed
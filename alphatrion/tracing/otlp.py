@@ -0,0 +1,257 @@
+"""Span export through the AlphaTrion server over OTLP/HTTP.
+
+With ALPHATRION_TRACE_EXPORT_MODE=server, SDK processes and Claude hooks
+don't connect to ClickHouse. Their spans are sent as OTLP protobuf to the
+server's /v1/traces endpoint, authenticated by the user's JWT, and the
+server writes the spans of all its clients through its own TraceStore, in
+large columnar inserts.
+
+Claude hooks build TraceStore rows rather than OTel spans, ServerSpanWriter
+turns them back into spans for the OTLP exporter. Their semantic kind is
+carried by the SEMANTIC_KIND_ATTRIBUTE attribute.
+"""
+
+import logging
+import os
+from collections.abc import Iterable, Mapping
+from datetime import UTC, datetime, timedelta
+from typing import Any
+
+from opentelemetry.exporter.otlp.proto.http import Compression
+from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
+    ExportTraceServiceRequest,
+)
+from opentelemetry.proto.common.v1.common_pb2 import AnyValue, KeyValue
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import Event, ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExporter
+from opentelemetry.trace import (
+    Link,
+    SpanContext,
+    SpanKind,
+    Status,
+    StatusCode,
+    TraceFlags,
+)
+
+from alphatrion import envs
+from alphatrion.tracing.span_encoder import (
+    SEMANTIC_KIND_ATTRIBUTE,
+    SPAN_KINDS,
+    STATUS_CODES,
+)
+
+logger = logging.getLogger(__name__)
+
+_SAMPLED = TraceFlags(TraceFlags.SAMPLED)
+_EPOCH = datetime(1970, 1, 1, tzinfo=UTC)
+
+# Columns of TraceStore rows carried by span attributes
+ROW_ATTRIBUTES = {
+    "OrgId": "org_id",
+    "TeamId": "team_id",
+    "UserId": "user_id",
+    "RunId": "run_id",
+    "ExperimentId": "experiment_id",
+    "SessionId": "session_id",
+    "AgentId": "agent_id",
+    "AgentType": "agent_type",
+    "SemanticKind": SEMANTIC_KIND_ATTRIBUTE,
+}
+
+_SPAN_KINDS_BY_NAME = {name: kind for kind, name in SPAN_KINDS.items()}
+_STATUS_CODES_BY_NAME = {name: code for code, name in STATUS_CODES.items()}
+
+
+def _value(value: AnyValue) -> Any:
+    kind = value.WhichOneof("value")
+    if kind is None:
+        return None
+    if kind == "array_value":
+        return tuple(_value(v) for v in value.array_value.values)
+    if kind == "kvlist_value":
+        return _attributes(value.kvlist_value.values)
+    return getattr(value, kind)
+
+
+def _attributes(key_values: Iterable[KeyValue]) -> dict[str, Any]:
+    return {kv.key: _value(kv.value) for kv in key_values}
+
+
+def spans_from_otlp(
+    request: ExportTraceServiceRequest, overrides: Mapping[str, str] | None = None
+) -> list[ReadableSpan]:
+    """Spans of an OTLP export request.
+
+    Args:
+        request: The decoded OTLP export request
+        overrides: Attributes set on every span, e.g. the org of the client
+    """
+    spans = []
+    for resource_spans in request.resource_spans:
+        resource = Resource(_attributes(resource_spans.resource.attributes))
+        for scope_spans in resource_spans.scope_spans:
+            for span in scope_spans.spans:
+                trace_id = int.from_bytes(span.trace_id, "big")
+                attributes = _attributes(span.attributes)
+                if overrides:
+                    attributes.update(overrides)
+                spans.append(
+                    ReadableSpan(
+                        name=span.name,
+                        context=SpanContext(
+                            trace_id,
+                            int.from_bytes(span.span_id, "big"),
+                            is_remote=True,
+                            trace_flags=_SAMPLED,
+                        ),
+                        parent=SpanContext(
+                            trace_id,
+                            int.from_bytes(span.parent_span_id, "big"),
+                            is_remote=True,
+                        )
+                        if span.parent_span_id
+                        else None,
+                        resource=resource,
+                        attributes=attributes,
+                        events=[
+                            Event(
+                                event.name,
+                                _attributes(event.attributes),
+                                timestamp=event.time_unix_nano,
+                            )
+                            for event in span.events
+                        ],
+                        links=[
+                            Link(
+                                SpanContext(
+                                    int.from_bytes(link.trace_id, "big"),
+                                    int.from_bytes(link.span_id, "big"),
+                                    is_remote=True,
+                                ),
+                                _attributes(link.attributes),
+                            )
+                            for link in span.links
+                        ],
+                        # OTLP kinds are shifted by SPAN_KIND_UNSPECIFIED
+                        kind=SpanKind(max(span.kind - 1, 0)),
+                        status=Status(
+                            StatusCode(span.status.code), span.status.message or None
+                        ),
+                        start_time=span.start_time_unix_nano,
+                        end_time=span.end_time_unix_nano,
+                    )
+                )
+    return spans
+
+
+def _to_ns(value: datetime) -> int:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=UTC)
+    return (value - _EPOCH) // timedelta(microseconds=1) * 1000
+
+
+def spans_from_rows(rows: Iterable[dict[str, Any]]) -> list[ReadableSpan]:
+    """Spans encoding into the given TraceStore rows."""
+    spans = []
+    resources = {}
+    for row in rows:
+        attributes = dict(row.get("SpanAttributes") or {})
+        for column, key in ROW_ATTRIBUTES.items():
+            if row.get(column) and key not in attributes:
+                attributes[key] = row[column]
+
+        resource_attributes = dict(row.get("ResourceAttributes") or {})
+        if row.get("ServiceName"):
+            resource_attributes.setdefault("service.name", row["ServiceName"])
+        resource_key = tuple(sorted(resource_attributes.items()))
+        if resource_key not in resources:
+            resources[resource_key] = Resource(resource_attributes)
+
+        trace_id = int(row["TraceId"], 16)
+        start_time = _to_ns(row["Timestamp"])
+        spans.append(
+            ReadableSpan(
+                name=row.get("SpanName", ""),
+                context=SpanContext(
+                    trace_id,
+                    int(row["SpanId"], 16),
+                    is_remote=False,
+                    trace_flags=_SAMPLED,
+                ),
+                parent=SpanContext(
+                    trace_id, int(row["ParentSpanId"], 16), is_remote=False
+                )
+                if row.get("ParentSpanId")
+                else None,
+                resource=resources[resource_key],
+                attributes=attributes,
+                events=[
+                    Event(name, event_attributes, timestamp=_to_ns(timestamp))
+                    for timestamp, name, event_attributes in zip(
+                        row.get("Events.Timestamp", []),
+                        row.get("Events.Name", []),
+                        row.get("Events.Attributes", []),
+                        strict=True,
+                    )
+                ],
+                links=[
+                    Link(
+                        SpanContext(
+                            int(link_trace_id, 16),
+                            int(link_span_id, 16),
+                            is_remote=True,
+                        ),
+                        link_attributes,
+                    )
+                    for link_trace_id, link_span_id, link_attributes in zip(
+                        row.get("Links.TraceId", []),
+                        row.get("Links.SpanId", []),
+                        row.get("Links.Attributes", []),
+                        strict=True,
+                    )
+                ],
+                kind=_SPAN_KINDS_BY_NAME.get(row.get("SpanKind"), SpanKind.INTERNAL),
+                status=Status(
+                    _STATUS_CODES_BY_NAME.get(row.get("StatusCode"), StatusCode.UNSET),
+                    row.get("StatusMessage") or None,
+                ),
+                start_time=start_time,
+                end_time=start_time + int(row.get("Duration", 0)),
+            )
+        )
+    return spans
+
+
+class ServerSpanWriter:
+    """Writes TraceStore rows through the AlphaTrion server, in place of a TraceStore."""
+
+    def __init__(self, exporter: SpanExporter):
+        self._exporter = exporter
+
+    def insert_spans(self, spans: list[dict[str, Any]]) -> None:
+        """Send spans to the server.
+
+        Args:
+            spans: List of span dictionaries as passed to TraceStore.insert_spans
+        """
+        if not spans:
+            return
+        try:
+            self._exporter.export(spans_from_rows(spans))
+        except Exception as e:
+            logger.error(f"Failed to send spans to the server: {e}")
+            # Don't raise - we don't want to crash the application if tracing fails
+
+
+def server_exporter_from_env() -> OTLPSpanExporter:
+    """Create the OTLP exporter sending spans to the AlphaTrion server."""
+    url = os.getenv(envs.SERVER_URL, "http://localhost:8000").rstrip("/")
+    headers = {}
+    token = os.getenv(envs.SERVER_TOKEN)
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    return OTLPSpanExporter(
+        endpoint=f"{url}/v1/traces", headers=headers, compression=Compression.Gzip
+    )
@@ -1,11 +1,17 @@
 """
 Prometheus Span Exporter.
 
-Exports OpenTelemetry span metrics to Prometheus push gateway.
+Exports OpenTelemetry span metrics to Prometheus, in one of two modes:
+- push: metrics are pushed to a push gateway by a background thread, every
+  push_interval seconds if spans were exported since the last push. Exports
+  only update the metrics, so they never wait for the push gateway.
+- pull: metrics are scraped from a local /metrics endpoint on metrics_port,
+  or from the AlphaTrion server's /metrics when it runs the exporter.
 """
 
 import logging
 import socket
+import threading
 import uuid
 
 from opentelemetry.sdk.trace import ReadableSpan
@@ -15,32 +21,52 @@ from prometheus_client import (
     Counter,
     Histogram,
     pushadd_to_gateway,
+    start_http_server,
 )
 
+from alphatrion.tracing.metric_labels import LabelPolicy, MetricLabels
+from alphatrion.utils.metrics import RegistryCollector
+
 logger = logging.getLogger(__name__)
 
 
+PUSH_MODE = "push"
+PULL_MODE = "pull"
+
+
 class PrometheusExporter(SpanExporter):
     """
-    Span exporter that exports metrics to Prometheus push gateway.
+    Span exporter that exports metrics to Prometheus push gateway, or serves
+    them to be scraped.
     """
 
     def __init__(
         self,
-        pushgateway_url: str,
+        pushgateway_url: str | None,
         job_name: str = "alphatrion",
         grouping_key: dict[str, str] | None = None,
+        *,
+        push_interval: float = 15.0,
+        metrics_port: int | None = None,
+        metrics_addr: str = "0.0.0.0",
+        label_policy: LabelPolicy | None = None,
     ):
         """
         Initialize the Prometheus exporter.
 
         Args:
-            pushgateway_url: URL of the Prometheus push gateway
+            pushgateway_url: URL of the Prometheus push gateway, None for pull mode
             job_name: Job name for the metrics in Prometheus
             grouping_key: Additional grouping labels
+            push_interval: Min seconds between pushes to the push gateway
+            metrics_port: Port of a local /metrics endpoint, None for none
+            metrics_addr: Address the local /metrics endpoint listens on
+            label_policy: Labels of the LLM metrics, bounding their number of
+                series (see metric_labels.py)
         """
         self.pushgateway_url = pushgateway_url
         self.job_name = job_name
+        self.push_interval = push_interval
 
         if grouping_key is None:
             try:
@@ -55,20 +81,46 @@ class PrometheusExporter(SpanExporter):
         else:
             self.grouping_key = grouping_key
 
+        self.metric_labels = MetricLabels(label_policy)
         self.registry = CollectorRegistry()
+        # Push AlphaTrion's own health metrics (e.g. span buffer) along with LLM metrics
+        self.registry.register(RegistryCollector())
         self._init_metrics()
 
+        # Whether spans were exported since the last push
+        self._changed = threading.Event()
+        self._stopped = threading.Event()
+        self._push_lock = threading.Lock()
+        self._push_thread = None
+        if pushgateway_url:
+            self._push_thread = threading.Thread(
+                target=self._push_loop, name="alphatrion-prometheus-push", daemon=True
+            )
+            self._push_thread.start()
+
+        self._metrics_server = None
+        if metrics_port is not None:
+            try:
+                self._metrics_server, _ = start_http_server(
+                    metrics_port, addr=metrics_addr, registry=self.registry
+                )
+            except OSError as e:
+                logger.error(f"Failed to serve metrics on port {metrics_port}: {e}")
+
         logger.info(
-            f"PrometheusExporter initialized: pushgateway={pushgateway_url}, job={job_name}"
+            f"PrometheusExporter initialized: pushgateway={pushgateway_url}, "
+            f"metrics_port={metrics_port}, job={job_name}"
         )
 
     def _init_metrics(self):
         """Initialize Prometheus metrics."""
+        labels = list(self.metric_labels.policy.labels)
+
         # Token metrics - single metric with token_type label
         self.llm_tokens_total = Counter(
             "llm_tokens_total",
             "Total LLM tokens consumed by type",
-            ["org_id", "team_id", "user_id", "experiment_id", "model", "token_type"],
+            [*labels, "token_type"],
             registry=self.registry,
         )
 
@@ -76,7 +128,7 @@ class PrometheusExporter(SpanExporter):
         self.llm_cost_total = Counter(
             "llm_cost_total",
             "Total LLM cost in USD by token type",
-            ["org_id", "team_id", "user_id", "experiment_id", "model", "token_type"],
+            [*labels, "token_type"],
             registry=self.registry,
         )
 
@@ -84,7 +136,7 @@ class PrometheusExporter(SpanExporter):
         self.llm_requests_total = Counter(
             "llm_requests_total",
             "Total number of LLM requests",
-            ["org_id", "team_id", "user_id", "experiment_id", "model", "status"],
+            [*labels, "status"],
             registry=self.registry,
         )
 
@@ -92,7 +144,7 @@ class PrometheusExporter(SpanExporter):
         self.llm_request_duration_seconds = Histogram(
             "llm_request_duration_seconds",
             "LLM request duration in seconds",
-            ["org_id", "team_id", "user_id", "experiment_id", "model"],
+            labels,
             buckets=[0.1, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0],
             registry=self.registry,
         )
@@ -107,7 +159,7 @@ class PrometheusExporter(SpanExporter):
 
     def export(self, spans: list[ReadableSpan]) -> SpanExportResult:
         """
-        Export spans to Prometheus push gateway.
+        Update the metrics of spans, pushed later by the push thread.
 
         Args:
             spans: List of spans to export
@@ -118,8 +170,10 @@ class PrometheusExporter(SpanExporter):
         try:
             for span in spans:
                 self._process_span(span)
+            # Series of finished experiments and inactive users
+            self.metric_labels.expire()
 
-            self._push_metrics()
+            self._changed.set()
             return SpanExportResult.SUCCESS
 
         except Exception as e:
@@ -133,10 +187,6 @@ class PrometheusExporter(SpanExporter):
                 return
 
             attributes = {k: str(v) for k, v in span.attributes.items()}
-            org_id = attributes.get("org_id", "unknown")
-            team_id = attributes.get("team_id", "unknown")
-            user_id = attributes.get("user_id", "unknown")
-            experiment_id = attributes.get("experiment_id", "unknown")
 
             # Check if this is an LLM span by looking for token usage attributes
             if "gen_ai.usage.input_tokens" not in attributes:
@@ -150,16 +200,7 @@ class PrometheusExporter(SpanExporter):
                 error_type = self._classify_error(span, attributes)
                 self.llm_errors_total.labels(error_type=error_type).inc()
 
-            self._process_llm_span(
-                span,
-                attributes,
-                org_id,
-                team_id,
-                user_id,
-                experiment_id,
-                duration,
-                status,
-            )
+            self._process_llm_span(span, attributes, duration, status)
 
         except Exception as e:
             logger.error(f"Failed to process span: {e}", exc_info=True)
@@ -189,10 +230,6 @@ class PrometheusExporter(SpanExporter):
         self,
         span: ReadableSpan,
         attributes: dict[str, str],
-        org_id: str,
-        team_id: str,
-        user_id: str,
-        experiment_id: str,
         duration: float,
         status: str,
     ):
@@ -202,153 +239,124 @@ class PrometheusExporter(SpanExporter):
         )
 
         # Token metrics
-        input_tokens = int(attributes.get("gen_ai.usage.input_tokens", 0))
-        output_tokens = int(attributes.get("gen_ai.usage.output_tokens", 0))
-        cache_read_input_tokens = int(
-            attributes.get("gen_ai.usage.cache_read_input_tokens", 0)
-        )
-        cache_creation_input_tokens = int(
-            attributes.get("gen_ai.usage.cache_creation_input_tokens", 0)
-        )
+        token_counts = {
+            "input": int(attributes.get("gen_ai.usage.input_tokens", 0)),
+            "output": int(attributes.get("gen_ai.usage.output_tokens", 0)),
+            "cache_read_input": int(
+                attributes.get("gen_ai.usage.cache_read_input_tokens", 0)
+            ),
+            "cache_creation_input": int(
+                attributes.get("gen_ai.usage.cache_creation_input_tokens", 0)
+            ),
+        }
 
         # Calculate total tokens
-        total_tokens = (
-            input_tokens
-            + output_tokens
-            + cache_read_input_tokens
-            + cache_creation_input_tokens
-        )
+        total_tokens = sum(token_counts.values())
 
         # Skip if no token data
         if total_tokens == 0:
             return
 
-        base_labels = {
-            "org_id": org_id,
-            "team_id": team_id,
-            "user_id": user_id,
-            "experiment_id": experiment_id,
-            "model": model,
-        }
+        # Dimensions of the policy, with experiments and users bucketed by
+        # their token usage
+        base_labels = self.metric_labels.labels(
+            {
+                "org_id": attributes.get("org_id", "unknown"),
+                "team_id": attributes.get("team_id", "unknown"),
+                "user_id": attributes.get("user_id", "unknown"),
+                "experiment_id": attributes.get("experiment_id", "unknown"),
+                "model": model,
+            },
+            weight=total_tokens,
+        )
+        child = self.metric_labels.child
 
         # Export total tokens
-        self.llm_tokens_total.labels(
-            **base_labels,
-            token_type="total",
-        ).inc(total_tokens)
+        child(self.llm_tokens_total, **base_labels, token_type="total").inc(
+            total_tokens
+        )
 
         # Export individual token types
-        if input_tokens > 0:
-            self.llm_tokens_total.labels(
-                **base_labels,
-                token_type="input",
-            ).inc(input_tokens)
-
-        if output_tokens > 0:
-            self.llm_tokens_total.labels(
-                **base_labels,
-                token_type="output",
-            ).inc(output_tokens)
-
-        if cache_read_input_tokens > 0:
-            self.llm_tokens_total.labels(
-                **base_labels,
-                token_type="cache_read_input",
-            ).inc(cache_read_input_tokens)
-
-        if cache_creation_input_tokens > 0:
-            self.llm_tokens_total.labels(
-                **base_labels,
-                token_type="cache_creation_input",
-            ).inc(cache_creation_input_tokens)
+        for token_type, tokens in token_counts.items():
+            if tokens > 0:
+                child(self.llm_tokens_total, **base_labels, token_type=token_type).inc(
+                    tokens
+                )
 
         # Cost metrics - read from enriched attributes
         try:
-            input_cost = float(attributes.get("alphatrion.cost.input_tokens", 0))
-            output_cost = float(attributes.get("alphatrion.cost.output_tokens", 0))
-            cache_read_cost = float(
-                attributes.get("alphatrion.cost.cache_read_input_tokens", 0)
-            )
-            cache_creation_cost = float(
-                attributes.get("alphatrion.cost.cache_creation_input_tokens", 0)
-            )
+            costs = {
+                "input": float(attributes.get("alphatrion.cost.input_tokens", 0)),
+                "output": float(attributes.get("alphatrion.cost.output_tokens", 0)),
+                "cache_read_input": float(
+                    attributes.get("alphatrion.cost.cache_read_input_tokens", 0)
+                ),
+                "cache_creation_input": float(
+                    attributes.get("alphatrion.cost.cache_creation_input_tokens", 0)
+                ),
+            }
 
             # Calculate total cost
-            total_cost = (
-                input_cost + output_cost + cache_read_cost + cache_creation_cost
-            )
+            total_cost = sum(costs.values())
 
             # Export total cost
             if total_cost > 0:
-                self.llm_cost_total.labels(
-                    **base_labels,
-                    token_type="total",
-                ).inc(total_cost)
+                child(self.llm_cost_total, **base_labels, token_type="total").inc(
+                    total_cost
+                )
 
             # Export individual cost types
-            if input_cost > 0:
-                self.llm_cost_total.labels(
-                    **base_labels,
-                    token_type="input",
-                ).inc(input_cost)
-
-            if output_cost > 0:
-                self.llm_cost_total.labels(
-                    **base_labels,
-                    token_type="output",
-                ).inc(output_cost)
-
-            if cache_read_cost > 0:
-                self.llm_cost_total.labels(
-                    **base_labels,
-                    token_type="cache_read_input",
-                ).inc(cache_read_cost)
-
-            if cache_creation_cost > 0:
-                self.llm_cost_total.labels(
-                    **base_labels,
-                    token_type="cache_creation_input",
-                ).inc(cache_creation_cost)
+            for token_type, cost in costs.items():
+                if cost > 0:
+                    child(
+                        self.llm_cost_total, **base_labels, token_type=token_type
+                    ).inc(cost)
 
         except (ValueError, TypeError) as e:
             logger.debug(f"No cost data available for span: {e}")
 
         # Request count
-        self.llm_requests_total.labels(
-            org_id=org_id,
-            team_id=team_id,
-            user_id=user_id,
-            experiment_id=experiment_id,
-            model=model,
-            status=status,
-        ).inc()
+        child(self.llm_requests_total, **base_labels, status=status).inc()
 
         # Duration
-        self.llm_request_duration_seconds.labels(
-            org_id=org_id,
-            team_id=team_id,
-            user_id=user_id,
-            experiment_id=experiment_id,
-            model=model,
-        ).observe(duration)
-
-    def _push_metrics(self):
+        child(self.llm_request_duration_seconds, **base_labels).observe(duration)
+
+    def _push_loop(self):
+        """Push the metrics every push_interval, if spans were exported since."""
+        while not self._stopped.wait(self.push_interval):
+            if self._changed.is_set():
+                self._push_metrics()
+
+    def _push_metrics(self, timeout: float | None = 30.0):
         """Push metrics to Prometheus push gateway."""
-        try:
-            pushadd_to_gateway(
-                self.pushgateway_url,
-                job=self.job_name,
-                registry=self.registry,
-                grouping_key=self.grouping_key,
-            )
-            logger.debug("Successfully pushed metrics to Prometheus push gateway")
-        except Exception as e:
-            logger.warning(f"Failed to push metrics to Prometheus: {e}")
+        if not self.pushgateway_url:
+            return
+        with self._push_lock:
+            # Spans exported during the push are pushed the next time
+            self._changed.clear()
+            try:
+                pushadd_to_gateway(
+                    self.pushgateway_url,
+                    job=self.job_name,
+                    registry=self.registry,
+                    grouping_key=self.grouping_key,
+                    timeout=timeout,
+                )
+                logger.debug("Successfully pushed metrics to Prometheus push gateway")
+            except Exception as e:
+                self._changed.set()
+                logger.warning(f"Failed to push metrics to Prometheus: {e}")
 
     def shutdown(self):
         """Shutdown the exporter and perform final push."""
         try:
+            self._stopped.set()
+            if self._push_thread is not None:
+                self._push_thread.join()
             self._push_metrics()
+            if self._metrics_server is not None:
+                self._metrics_server.shutdown()
+                self._metrics_server.server_close()
             logger.info("PrometheusExporter shut down successfully")
         except Exception as e:
             logger.error(f"Error during PrometheusExporter shutdown: {e}")
@@ -356,7 +364,8 @@ class PrometheusExporter(SpanExporter):
     def force_flush(self, timeout_millis: int = 30000) -> bool:
         """Force flush metrics to push gateway."""
         try:
-            self._push_metrics()
+            if self._changed.is_set():
+                self._push_metrics(timeout=timeout_millis / 1000)
             return True
         except Exception as e:
             logger.error(f"Failed to force flush metrics: {e}")
@@ -0,0 +1,131 @@
+"""Sampler deciding at span start which spans are recorded and exported.
+
+ClickHouseSpanExporter only stores spans of agent runs (with a session_id)
+and Traceloop workflow spans, and the Prometheus exporter only reads the
+latter. Every other span, e.g. the DB and HTTP auto-instrumentation of an
+experiment, used to be recorded, enriched and queued only to be discarded
+at export. Dropping them at start makes them non-recording: no attributes
+are kept and no span processor sees them.
+
+The policy is evaluated on what is known at start: the attributes passed to
+start_span, the session tracing.agent_session enters, and the workflow name
+Traceloop attaches to the context before starting the spans of a workflow.
+
+Exported spans are then head sampled, by a rate per experiment or agent,
+the agent ID given to tracing.agent or tracing.agent_session. The decision
+only depends on the trace ID, so traces are kept or dropped as a whole.
+Spans of dropped traces are still recorded, just not sampled, so
+SamplingSpanProcessor can forward the token usage they carry (see
+tail_sampling.py).
+"""
+
+import json
+import os
+from collections.abc import Sequence
+
+from opentelemetry.context import Context, get_value
+from opentelemetry.sdk.trace.sampling import Decision, Sampler, SamplingResult
+from opentelemetry.trace import Link, SpanKind, get_current_span
+from opentelemetry.trace.span import TraceState
+from opentelemetry.util.types import Attributes
+
+from alphatrion import envs
+from alphatrion.runtime.contextvars import (
+    current_agent_id,
+    current_exp_id,
+    current_session_id,
+)
+
+WORKFLOW_NAME_ATTRIBUTE = "traceloop.workflow.name"
+# Context key of the workflow name, set by Traceloop's workflow decorator
+WORKFLOW_NAME_CONTEXT_KEY = "workflow_name"
+
+_TRACE_ID_LIMIT = 1 << 64
+
+
+def is_exported(attributes: Attributes, context: Context | None = None) -> bool:
+    """Whether a span starting with these attributes in this context is exported."""
+    if attributes:
+        if attributes.get("session_id"):
+            return True
+        if WORKFLOW_NAME_ATTRIBUTE in attributes:
+            return True
+    if current_session_id.get():
+        # ContextAttributesSpanProcessor sets its session_id
+        return True
+    return get_value(WORKFLOW_NAME_CONTEXT_KEY, context) is not None
+
+
+def trace_id_sampled(trace_id: int, rate: float) -> bool:
+    """Whether a trace falls within the rate, the same for every span of the trace."""
+    return (trace_id & (_TRACE_ID_LIMIT - 1)) < rate * _TRACE_ID_LIMIT
+
+
+class ExportPolicySampler(Sampler):
+    """Records only the spans the exporters would keep, head sampled by rate."""
+
+    def __init__(
+        self,
+        *,
+        drop_unexported: bool = True,
+        rate: float = 1.0,
+        rates: dict[str, float] | None = None,
+    ):
+        """
+        Args:
+            drop_unexported: Drop the spans no exporter keeps
+            rate: Fraction of traces sampled
+            rates: Fractions of traces sampled by experiment or agent ID,
+                overriding rate
+        """
+        self._drop_unexported = drop_unexported
+        self._rate = rate
+        self._rates = rates or {}
+
+    def should_sample(  # noqa: PLR0917
+        self,
+        parent_context: Context | None,
+        trace_id: int,
+        name: str,
+        kind: SpanKind | None = None,
+        attributes: Attributes = None,
+        links: Sequence[Link] | None = None,
+        trace_state: TraceState | None = None,
+    ) -> SamplingResult:
+        if self._drop_unexported and not is_exported(attributes, parent_context):
+            return SamplingResult(Decision.DROP)
+
+        decision = Decision.RECORD_AND_SAMPLE
+        if not trace_id_sampled(trace_id, self._rate_of(attributes)):
+            # Recorded but not exported, so its token usage still counts
+            decision = Decision.RECORD_ONLY
+        return SamplingResult(
+            decision,
+            attributes,
+            get_current_span(parent_context).get_span_context().trace_state,
+        )
+
+    def get_description(self) -> str:
+        return f"ExportPolicySampler{{rate={self._rate}}}"
+
+    def _rate_of(self, attributes: Attributes) -> float:
+        if not self._rates:
+            return self._rate
+        agent_id = attributes.get("agent_id") if attributes else None
+        agent_id = agent_id or current_agent_id.get()
+        if agent_id and str(agent_id) in self._rates:
+            return self._rates[str(agent_id)]
+        exp_id = current_exp_id.get()
+        if exp_id is not None and str(exp_id) in self._rates:
+            return self._rates[str(exp_id)]
+        return self._rate
+
+
+def sampler_from_env() -> Sampler | None:
+    """Create the sampler configured by the environment, None if every span is kept."""
+    drop_unexported = os.getenv(envs.TRACE_DROP_AT_START, "true").lower() == "true"
+    rate = float(os.getenv(envs.TRACE_SAMPLE_RATE, "1"))
+    rates = json.loads(os.getenv(envs.TRACE_SAMPLE_RATES) or "{}")
+    if not drop_unexported and rate >= 1 and not rates:
+        return None
+    return ExportPolicySampler(drop_unexported=drop_unexported, rate=rate, rates=rates)
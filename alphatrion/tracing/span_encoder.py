@@ -0,0 +1,228 @@
+"""Batch conversion of OpenTelemetry spans into TraceStore rows.
+
+Exporting is on the hot path of every traced process, so the conversion
+avoids per-span work that's the same for the whole batch:
+- span kinds and status codes are mapped through module-level tables
+- resource attributes are stringified once per Resource, spans of a process
+  all share the same one
+- attributes are read from the dict backing BoundedAttributes, iterating it
+  through the Mapping ABC costs a lock and two method calls per key
+"""
+
+from collections.abc import Iterable, Mapping, Sequence
+from datetime import UTC, datetime
+from typing import Any
+
+from opentelemetry.attributes import BoundedAttributes
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.trace import SpanKind, StatusCode
+
+from alphatrion.tracing.span_processor import (
+    SEMANTIC_KIND_DB,
+    SEMANTIC_KIND_HTTP,
+    SEMANTIC_KIND_MESSAGING,
+    SEMANTIC_KIND_REASONING,
+    SEMANTIC_KIND_RPC,
+    SEMANTIC_KIND_UNKNOWN,
+)
+
+SPAN_KINDS = {
+    SpanKind.INTERNAL: "INTERNAL",
+    SpanKind.SERVER: "SERVER",
+    SpanKind.CLIENT: "CLIENT",
+    SpanKind.PRODUCER: "PRODUCER",
+    SpanKind.CONSUMER: "CONSUMER",
+}
+
+STATUS_CODES = {
+    StatusCode.UNSET: "UNSET",
+    StatusCode.OK: "OK",
+    StatusCode.ERROR: "ERROR",
+}
+
+DEFAULT_SERVICE_NAME = "unknown_service"
+
+# Semantic kind set explicitly, e.g. by spans rebuilt from TraceStore rows
+SEMANTIC_KIND_ATTRIBUTE = "alphatrion.semantic_kind"
+
+# Max number of distinct resources remembered by a SpanEncoder
+MAX_CACHED_RESOURCES = 64
+
+
+def attribute_items(attributes: Mapping[str, Any] | None) -> Iterable[tuple[str, Any]]:
+    """Items of span, event or link attributes."""
+    if not attributes:
+        return ()
+    if isinstance(attributes, BoundedAttributes):
+        return attributes._dict.items()
+    return attributes.items()
+
+
+def nano_to_datetime(nanoseconds: int) -> datetime:
+    return datetime.fromtimestamp(nanoseconds / 1_000_000_000, tz=UTC)
+
+
+class SpanEncoder:
+    """Converts batches of ReadableSpans into TraceStore span rows."""
+
+    def __init__(self):
+        # id(Resource) -> (Resource, attributes, service name). The Resource is
+        # kept so its id can't be reused while cached.
+        self._resources = {}
+
+    def encode(self, spans: Sequence[ReadableSpan]) -> list[dict[str, Any]]:
+        """Convert spans into rows for TraceStore.insert_spans."""
+        rows = []
+        append = rows.append
+        for span in spans:
+            context = span.context
+            parent = span.parent
+            start_time = span.start_time
+            end_time = span.end_time
+            status = span.status
+            resource_attrs, service_name = self._resource(span.resource)
+
+            # ReadableSpan.attributes wraps them into a new proxy on each access
+            span_attributes = {k: str(v) for k, v in attribute_items(span._attributes)}
+            get = span_attributes.get
+
+            event_timestamps = []
+            event_names = []
+            event_attributes = []
+            for event in span.events:
+                event_timestamps.append(nano_to_datetime(event.timestamp))
+                event_names.append(event.name)
+                event_attributes.append(
+                    {k: str(v) for k, v in attribute_items(event.attributes)}
+                )
+
+            link_trace_ids = []
+            link_span_ids = []
+            link_attributes = []
+            for link in span.links:
+                link_trace_ids.append(f"{link.context.trace_id:032x}")
+                link_span_ids.append(f"{link.context.span_id:016x}")
+                link_attributes.append(
+                    {k: str(v) for k, v in attribute_items(link.attributes)}
+                )
+
+            append(
+                {
+                    # OTel Core (required)
+                    "Timestamp": nano_to_datetime(start_time),
+                    "TraceId": f"{context.trace_id:032x}",
+                    "SpanId": f"{context.span_id:016x}",
+                    "ParentSpanId": f"{parent.span_id:016x}" if parent else "",
+                    "SpanName": span.name,
+                    "SpanKind": SPAN_KINDS.get(span.kind, "INTERNAL"),
+                    "Duration": end_time - start_time if end_time else 0,
+                    "StatusCode": STATUS_CODES.get(status.status_code, "UNSET"),
+                    # OTel Optional (recommended)
+                    "StatusMessage": status.description or "",
+                    "SpanAttributes": span_attributes,
+                    "ResourceAttributes": resource_attrs,
+                    "Events.Timestamp": event_timestamps,
+                    "Events.Name": event_names,
+                    "Events.Attributes": event_attributes,
+                    "Links.TraceId": link_trace_ids,
+                    "Links.SpanId": link_span_ids,
+                    "Links.Attributes": link_attributes,
+                    # Custom Alphatrion fields
+                    "SemanticKind": determine_semantic_kind(span_attributes),
+                    "ServiceName": service_name,
+                    "OrgId": get("org_id", ""),
+                    "TeamId": get("team_id", ""),
+                    "UserId": get("user_id", ""),
+                    "RunId": get("run_id", ""),
+                    "ExperimentId": get("experiment_id", ""),
+                    "SessionId": get("session_id", ""),
+                    "AgentId": get("agent_id", ""),
+                    "AgentType": get("agent_type", ""),
+                }
+            )
+        return rows
+
+    def _resource(self, resource: Resource | None) -> tuple[dict[str, str], str]:
+        """Stringified attributes and service name of a resource, shared by its spans."""
+        if resource is None:
+            return {}, DEFAULT_SERVICE_NAME
+        cached = self._resources.get(id(resource))
+        if cached is not None and cached[0] is resource:
+            return cached[1], cached[2]
+
+        attributes = {k: str(v) for k, v in attribute_items(resource.attributes)}
+        service_name = attributes.get("service.name", DEFAULT_SERVICE_NAME)
+        if len(self._resources) >= MAX_CACHED_RESOURCES:
+            self._resources.clear()
+        self._resources[id(resource)] = (resource, attributes, service_name)
+        return attributes, service_name
+
+
+def determine_semantic_kind(attributes: dict[str, str]) -> str:
+    """Determine the semantic kind of a span.
+
+    Priority order:
+    0. Semantic kind set explicitly by SEMANTIC_KIND_ATTRIBUTE
+    1. Extended thinking/reasoning (LLM with reasoning tokens)
+    2. Traceloop decorators (workflow, task, tool, agent)
+    3. LLM operations (chat, completion, embeddings)
+    4. Database operations
+    5. HTTP operations
+    6. Message queue operations
+    7. Unknown fallback
+
+    Args:
+        attributes: Span attributes
+
+    Returns:
+        Semantic kind string (workflow, task, tool, agent, chat, completion,
+        embeddings, reasoning, db, http, messaging, rpc, unknown)
+    """
+    if not attributes:
+        return SEMANTIC_KIND_UNKNOWN
+
+    if SEMANTIC_KIND_ATTRIBUTE in attributes:
+        return attributes[SEMANTIC_KIND_ATTRIBUTE]
+
+    # Priority 1: Extended thinking/reasoning
+    # Check for LLM operations with reasoning tokens (o1, Claude extended thinking)
+    if "gen_ai.usage.reasoning_tokens" in attributes:
+        return SEMANTIC_KIND_REASONING
+
+    # Priority 2: Traceloop decorators (@workflow, @task, @tool)
+    # These are explicitly decorated by developers and should take precedence
+    if "traceloop.span.kind" in attributes:
+        traceloop_kind = attributes["traceloop.span.kind"]
+        # Valid values: workflow, task, tool, agent
+        if traceloop_kind in ("workflow", "task", "tool", "agent"):
+            return traceloop_kind
+
+    # Priority 3: LLM operations (auto-instrumented by Traceloop)
+    # Check for GenAI operations from OpenTelemetry semantic conventions
+    if "gen_ai.operation.name" in attributes:
+        operation = attributes["gen_ai.operation.name"]
+        # Common values: chat, completion, embeddings
+        return operation
+
+    # Priority 4: Database operations
+    # Auto-instrumented by OpenTelemetry (psycopg2, SQLAlchemy, etc.)
+    if "db.system" in attributes or "db.statement" in attributes:
+        return SEMANTIC_KIND_DB
+
+    # Priority 5: HTTP operations
+    # Auto-instrumented by OpenTelemetry (requests, httpx, urllib3, etc.)
+    if "http.method" in attributes or "http.request.method" in attributes:
+        return SEMANTIC_KIND_HTTP
+
+    # Priority 6: Messaging/Queue operations
+    # Auto-instrumented by OpenTelemetry (RabbitMQ, Kafka, SQS, etc.)
+    if "messaging.system" in attributes:
+        return SEMANTIC_KIND_MESSAGING
+
+    # Priority 7: RPC operations
+    if "rpc.system" in attributes:
+        return SEMANTIC_KIND_RPC
+
+    # Default: unknown
+    return SEMANTIC_KIND_UNKNOWN
@@ -1,11 +1,17 @@
+import functools
 import logging
+import uuid
+from collections.abc import Mapping
+from types import MappingProxyType
 
 from opentelemetry.context import Context
 from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
 
 from alphatrion.runtime.contextvars import (
+    current_agent_id,
     current_exp_id,
     current_run_id,
+    current_session_id,
 )
 
 logger = logging.getLogger(__name__)
@@ -33,49 +39,84 @@ SEMANTIC_KIND_RPC = "rpc"
 SEMANTIC_KIND_UNKNOWN = "unknown"
 
 
+# Max number of contexts whose span attributes are remembered
+MAX_CACHED_CONTEXTS = 1024
+
+
+@functools.lru_cache(maxsize=MAX_CACHED_CONTEXTS)
+def context_attributes(
+    runtime,
+    run_id: uuid.UUID | None,
+    exp_id: uuid.UUID | None,
+    session_id: uuid.UUID | str | None,
+    agent_id: uuid.UUID | str | None,
+) -> Mapping[str, str]:
+    """Span attributes of a context, shared between calls so it's immutable.
+
+    Run and experiment IDs are only set together, org, team and user IDs
+    along with any other ID, when the runtime is initialized.
+    """
+    attributes = {}
+    if run_id is not None and exp_id is not None:
+        attributes["experiment_id"] = str(exp_id)
+        attributes["run_id"] = str(run_id)
+    if session_id is not None:
+        attributes["session_id"] = str(session_id)
+    if agent_id is not None:
+        attributes["agent_id"] = str(agent_id)
+    if attributes and runtime is not None:
+        attributes["org_id"] = str(runtime.org_id)
+        attributes["team_id"] = str(runtime.team_id)
+        attributes["user_id"] = str(runtime.user_id)
+    return MappingProxyType(attributes)
+
+
+def _current_runtime():
+    # Imported here, the runtime imports this module through the storage runtime
+    from alphatrion.runtime.runtime import global_runtime
+
+    try:
+        return global_runtime()
+    except RuntimeError:
+        return None
+
+
 class ContextAttributesSpanProcessor(SpanProcessor):
-    """SpanProcessor that adds run_id, org_id, team_id, user_id, experiment_id to all spans.
+    """SpanProcessor that adds run_id, org_id, team_id, user_id, experiment_id,
+    session_id and agent_id to all spans.
 
     This ensures all spans in the trace have these attributes, including
     child spans created by instrumented libraries (OpenAI, database drivers, etc.).
+    The attributes of each context are computed once, see context_attributes.
     """
 
     def on_start(self, span: Span, parent_context: Context | None = None) -> None:
         """Called when a span is started.
 
-        Adds context attributes (run_id, org_id, team_id, user_id, experiment_id) to the span.
+        Adds context attributes (run_id, org_id, team_id, user_id, experiment_id,
+        session_id, agent_id) to the span.
 
         Args:
             span: The span that was just started
             parent_context: The parent context (unused)
         """
         try:
-            # Add context attributes to span
             run_id = current_run_id.get(None)
             exp_id = current_exp_id.get(None)
-
-            if run_id is None:
-                # No run context, skip setting attributes
-                logger.debug(
-                    "Span started with no run_id in context, skipping attribute injection"
-                )
-                return
-
-            if exp_id is None:
+            if run_id is not None and exp_id is None:
                 logger.debug(
                     f"Span started with run_id {run_id} but no exp_id in context"
                 )
-                return
-
-            from alphatrion.runtime.runtime import global_runtime
-
-            runtime = global_runtime()
 
-            span.set_attribute("experiment_id", str(exp_id))
-            span.set_attribute("run_id", str(run_id))
-            span.set_attribute("org_id", str(runtime.org_id))
-            span.set_attribute("team_id", str(runtime.team_id))
-            span.set_attribute("user_id", str(runtime.user_id))
+            attributes = context_attributes(
+                _current_runtime(),
+                run_id,
+                exp_id,
+                current_session_id.get(None),
+                current_agent_id.get(None),
+            )
+            if attributes:
+                span.set_attributes(attributes)
 
         except (RuntimeError, AttributeError) as e:
             logger.debug(f"Could not set span attributes in processor: {e}")
@@ -0,0 +1,270 @@
+"""Tail sampling of traces, keeping token usage of every span.
+
+SamplingSpanProcessor sits in front of the export processors. With a
+TailSamplingPolicy, it buffers the spans of each trace until its local root
+span ends, then keeps the whole trace if any of these holds:
+- a span has an ERROR status
+- the trace took at least latency_threshold seconds
+- its LLM calls cost at least cost_threshold USD
+- it falls within rate, decided on the trace ID
+
+Traces whose root never ends in this process are decided with the spans
+seen so far once they waited decision_wait seconds, at the next span end
+or flush.
+
+Spans of dropped traces, by head or tail sampling, that carry token usage
+are forwarded as slim spans instead: only their usage, cost, model and
+context attributes, marked with alphatrion.sampled = "false". So token and
+cost rollups in ClickHouse and Prometheus still count every LLM call.
+"""
+
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from collections.abc import Sequence
+from dataclasses import dataclass
+
+from opentelemetry.context import Context
+from opentelemetry.sdk.trace import ReadableSpan, Span, SpanProcessor
+from opentelemetry.trace import SpanContext, StatusCode, TraceFlags
+from prometheus_client import Counter
+
+from alphatrion import envs
+from alphatrion.storage.tracestore import SUMMARY_ATTRIBUTE_PREFIXES
+from alphatrion.tracing.cost_enrichment_processor import cost_attributes
+from alphatrion.tracing.sampler import trace_id_sampled
+from alphatrion.tracing.span_encoder import attribute_items
+from alphatrion.utils.metrics import REGISTRY
+
+logger = logging.getLogger(__name__)
+
+SAMPLED_ATTRIBUTE = "alphatrion.sampled"
+
+# Attributes kept on slim spans besides SUMMARY_ATTRIBUTE_PREFIXES
+CONTEXT_ATTRIBUTES = frozenset(
+    (
+        "org_id",
+        "team_id",
+        "user_id",
+        "run_id",
+        "experiment_id",
+        "session_id",
+        "agent_id",
+        "agent_type",
+    )
+)
+
+USAGE_PREFIXES = ("gen_ai.usage.", "alphatrion.cost.")
+
+TRACES_SAMPLED = Counter(
+    "alphatrion_trace_sampling_decisions_total",
+    "Tail sampling decisions of traces",
+    ["decision"],
+    registry=REGISTRY,
+)
+SLIM_SPANS = Counter(
+    "alphatrion_trace_sampling_slim_spans_total",
+    "Spans of dropped traces forwarded with their token usage only",
+    registry=REGISTRY,
+)
+
+
+@dataclass
+class TailSamplingPolicy:
+    """When to keep a trace, evaluated once its spans are all known."""
+
+    # Fraction of the remaining traces kept
+    rate: float = 0.1
+    # Traces taking at least this many seconds are kept
+    latency_threshold: float = 10.0
+    # Traces costing at least this many USD are kept
+    cost_threshold: float = 0.1
+
+    def reason(self, spans: list[ReadableSpan]) -> str | None:
+        """Why a trace is kept, None if it's dropped."""
+        if any(span.status.status_code == StatusCode.ERROR for span in spans):
+            return "error"
+        start = min(span.start_time for span in spans)
+        end = max(span.end_time or span.start_time for span in spans)
+        if (end - start) / 1_000_000_000 >= self.latency_threshold:
+            return "slow"
+        if self.cost_threshold > 0 and trace_cost(spans) >= self.cost_threshold:
+            return "cost"
+        # High bits of the trace ID, independent of the head sampling decision
+        if trace_id_sampled(spans[0].context.trace_id >> 64, self.rate):
+            return "rate"
+        return None
+
+
+def span_usage(span: ReadableSpan) -> dict[str, str] | None:
+    """Usage and cost attributes of a span, None if it carries no token usage."""
+    attributes = span.attributes
+    if not attributes or not any(k.startswith(USAGE_PREFIXES) for k in attributes):
+        return None
+    usage = {k: str(v) for k, v in attribute_items(span._attributes)}
+    # The cost enrichment may not have run yet, e.g. for the root span
+    usage.update(cost_attributes(usage) or {})
+    return usage
+
+
+def trace_cost(spans: list[ReadableSpan]) -> float:
+    total = 0.0
+    for span in spans:
+        usage = span_usage(span)
+        if usage:
+            total += sum(
+                float(v) for k, v in usage.items() if k.startswith("alphatrion.cost.")
+            )
+    return total
+
+
+def slim_span(span: ReadableSpan, usage: dict[str, str]) -> ReadableSpan:
+    """Copy of a span with only its usage, cost, model and context attributes."""
+    attributes = {
+        k: v
+        for k, v in usage.items()
+        if k in CONTEXT_ATTRIBUTES or k.startswith(SUMMARY_ATTRIBUTE_PREFIXES)
+    }
+    attributes[SAMPLED_ATTRIBUTE] = "false"
+    context = span.context
+    return ReadableSpan(
+        name=span.name,
+        # Sampled, so export processors don't skip it
+        context=SpanContext(
+            context.trace_id,
+            context.span_id,
+            is_remote=False,
+            trace_flags=TraceFlags(TraceFlags.SAMPLED),
+            trace_state=context.trace_state,
+        ),
+        parent=span.parent,
+        resource=span.resource,
+        attributes=attributes,
+        kind=span.kind,
+        status=span.status,
+        start_time=span.start_time,
+        end_time=span.end_time,
+        instrumentation_scope=span.instrumentation_scope,
+    )
+
+
+class SamplingSpanProcessor(SpanProcessor):
+    """Forwards sampled spans to export processors, and usage of the others."""
+
+    def __init__(
+        self,
+        processors: Sequence[SpanProcessor],
+        *,
+        policy: TailSamplingPolicy | None = None,
+        decision_wait: float = 30.0,
+        max_traces: int = 10_000,
+    ):
+        """
+        Args:
+            processors: Export processors receiving kept and slim spans
+            policy: Tail sampling policy, None forwards every sampled span
+            decision_wait: Seconds after which a trace whose root didn't end
+                is decided anyway
+            max_traces: Max number of traces buffered, the oldest are decided
+                early beyond it
+        """
+        self._processors = list(processors)
+        self._policy = policy
+        self._decision_wait = decision_wait
+        self._max_traces = max_traces
+        # trace_id -> (time first seen, spans)
+        self._traces: OrderedDict[int, tuple[float, list[ReadableSpan]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def on_start(self, span: Span, parent_context: Context | None = None) -> None:
+        for processor in self._processors:
+            processor.on_start(span, parent_context)
+
+    def on_end(self, span: ReadableSpan) -> None:
+        if not span.context.trace_flags.sampled:
+            # Dropped by head sampling
+            self._forward_usage([span])
+            return
+        if self._policy is None:
+            self._forward([span])
+            return
+
+        now = time.monotonic()
+        trace_id = span.context.trace_id
+        with self._lock:
+            if trace_id not in self._traces:
+                self._traces[trace_id] = (now, [])
+            self._traces[trace_id][1].append(span)
+            ready = []
+            if span.parent is None or span.parent.is_remote:
+                ready.append(self._traces.pop(trace_id)[1])
+            while self._traces and (
+                len(self._traces) > self._max_traces
+                or now - next(iter(self._traces.values()))[0] >= self._decision_wait
+            ):
+                ready.append(self._traces.popitem(last=False)[1][1])
+
+        for spans in ready:
+            self._decide(spans)
+
+    def shutdown(self) -> None:
+        self._decide_all()
+        for processor in self._processors:
+            processor.shutdown()
+
+    def force_flush(self, timeout_millis: int = 30000) -> bool:
+        self._decide_all()
+        return all(
+            processor.force_flush(timeout_millis) for processor in self._processors
+        )
+
+    def _decide_all(self) -> None:
+        with self._lock:
+            pending = [spans for _, spans in self._traces.values()]
+            self._traces.clear()
+        for spans in pending:
+            self._decide(spans)
+
+    def _decide(self, spans: list[ReadableSpan]) -> None:
+        try:
+            reason = self._policy.reason(spans)
+        except Exception as e:
+            logger.warning(f"Failed to evaluate tail sampling, keeping trace: {e}")
+            reason = "error"
+        TRACES_SAMPLED.labels(reason or "dropped").inc()
+        if reason is None:
+            self._forward_usage(spans)
+        else:
+            self._forward(spans)
+
+    def _forward(self, spans: list[ReadableSpan]) -> None:
+        for span in spans:
+            for processor in self._processors:
+                processor.on_end(span)
+
+    def _forward_usage(self, spans: list[ReadableSpan]) -> None:
+        slim = []
+        for span in spans:
+            try:
+                usage = span_usage(span)
+            except Exception as e:
+                logger.warning(f"Failed to read usage of span {span.name}: {e}")
+                continue
+            if usage:
+                slim.append(slim_span(span, usage))
+        SLIM_SPANS.inc(len(slim))
+        self._forward(slim)
+
+
+def tail_sampling_policy_from_env() -> TailSamplingPolicy | None:
+    """Create the tail sampling policy configured by the environment, None if disabled."""
+    rate = float(os.getenv(envs.TRACE_TAIL_SAMPLE_RATE, "1"))
+    if rate >= 1:
+        return None
+    return TailSamplingPolicy(
+        rate=rate,
+        latency_threshold=float(os.getenv(envs.TRACE_TAIL_LATENCY_THRESHOLD, "10")),
+        cost_threshold=float(os.getenv(envs.TRACE_TAIL_COST_THRESHOLD, "0.1")),
+    )
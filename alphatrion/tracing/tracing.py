@@ -1,9 +1,15 @@
+import functools
+import inspect
+from contextlib import contextmanager
+
 from opentelemetry.semconv_ai import TraceloopSpanKindValues
 from traceloop.sdk.decorators import agent as _agent
 from traceloop.sdk.decorators import task as _task
 from traceloop.sdk.decorators import tool as _tool
 from traceloop.sdk.decorators import workflow as _workflow
 
+from alphatrion.runtime.contextvars import current_agent_id, current_session_id
+
 
 def task(
     version: int | None = None,
@@ -73,17 +79,71 @@ def tool(
 def agent(
     version: int | None = None,
     method_name: str | None = None,
+    agent_id: str | None = None,
 ):
     """Agent decorator for tracing.
 
     Attributes (run_id, team_id, experiment_id) are automatically
-    added to all spans by ContextAttributesSpanProcessor.
+    added to all spans by ContextAttributesSpanProcessor, and agent_id
+    when given, which also selects the agent's sample rate.
+
+    :param agent_id: The agent ID, not supported on generator functions,
+        use agent_session around their iteration instead
     """
 
     def decorator(func):
-        return _agent(
+        traced = _agent(
             version=version,
             method_name=method_name,
         )(func)
+        if agent_id is None:
+            return traced
+        if inspect.isgeneratorfunction(func) or inspect.isasyncgenfunction(func):
+            raise TypeError(
+                f"agent_id isn't supported on generator function {func.__qualname__}"
+            )
+
+        if inspect.iscoroutinefunction(func):
+
+            @functools.wraps(func)
+            async def async_wrap(*args, **kwargs):
+                token = current_agent_id.set(agent_id)
+                try:
+                    return await traced(*args, **kwargs)
+                finally:
+                    current_agent_id.reset(token)
+
+            return async_wrap
+
+        @functools.wraps(func)
+        def wrap(*args, **kwargs):
+            token = current_agent_id.set(agent_id)
+            try:
+                return traced(*args, **kwargs)
+            finally:
+                current_agent_id.reset(token)
+
+        return wrap
 
     return decorator
+
+
+@contextmanager
+def agent_session(session_id: str, agent_id: str | None = None):
+    """Attribute the spans started in the block to an agent session.
+
+    Spans get session_id, and agent_id when given, from
+    ContextAttributesSpanProcessor, and are exported whatever their kind.
+    Tasks created in the block inherit the session.
+
+    :param session_id: The agent session ID
+    :param agent_id: The agent ID, also set by the agent decorator
+    """
+    session_token = current_session_id.set(session_id)
+    agent_token = current_agent_id.set(agent_id) if agent_id is not None else None
+    try:
+        yield
+    finally:
+        if agent_token is not None:
+            current_agent_id.reset(agent_token)
+        current_session_id.reset(session_token)
@@ -0,0 +1,24 @@
+"""Prometheus registry for AlphaTrion's own health metrics.
+
+Components like the span buffer register their gauges and counters here, so
+they can be exported alongside the LLM metrics without depending on the
+Prometheus exporter being enabled.
+"""
+
+from prometheus_client import CollectorRegistry
+
+REGISTRY = CollectorRegistry()
+
+
+class RegistryCollector:
+    """Collector that exposes every metric of another registry.
+
+    Registering it into a second registry (e.g. the one pushed by the
+    PrometheusExporter) makes the internal metrics part of that export.
+    """
+
+    def __init__(self, registry: CollectorRegistry = REGISTRY):
+        self._registry = registry
+
+    def collect(self):
+        return self._registry.collect()
@@ -1,6 +1,8 @@
 """LLM pricing utilities for cost calculation."""
 
+import functools
 import logging
+import re
 from importlib import resources
 from pathlib import Path
 from typing import Any
@@ -59,6 +61,128 @@ def load_pricing_config() -> dict[str, Any]:
         raise
 
 
+# Pricing of unknown models, anthropic/claude-4-sonnet
+DEFAULT_PRICING = {
+    "input_tokens_price": 3.3,
+    "output_tokens_price": 16.5,
+    "cache_creation_input_tokens_price": 3.3,
+    "cache_read_input_tokens_price": 3.3,
+}
+
+PRICE_FIELDS = tuple(DEFAULT_PRICING)
+
+# Max number of (provider, model) pairs whose resolved pricing is remembered
+MAX_CACHED_MODELS = 1024
+
+# Release suffixes of model names, e.g. "-20250929", "@20250929", "-2024-08-06",
+# "-v1:0" or "-latest", dropped to find the priced model
+RELEASE_SUFFIX_PATTERN = r"([-@](\d{8}|\d{4}-\d{2}-\d{2}|latest)|-v\d+(:\d+)?)$"
+_RELEASE_SUFFIX = re.compile(RELEASE_SUFFIX_PATTERN)
+# Separators after which a priced model name may continue, see _by_prefix
+_NAME_SEPARATORS = "-.:@/"
+
+
+def normalize_model(model: str) -> str:
+    """Lookup key of a model name: lowercase, without release suffixes."""
+    key = model.strip().lower()
+    while True:
+        stripped = _RELEASE_SUFFIX.sub("", key)
+        if stripped == key:
+            return key
+        key = stripped
+
+
+def model_keys(model: str, model_config: dict[str, Any]) -> list[str]:
+    """Lookup keys of a priced model: its name and aliases, with and without organization."""
+    keys = []
+    for name in (model, *(model_config.get("aliases") or [])):
+        key = normalize_model(name)
+        for k in (key, key.rsplit("/", 1)[-1]):
+            if k not in keys:
+                keys.append(k)
+    return keys
+
+
+class PricingIndex:
+    """Pricing config compiled for lookups by provider and model name.
+
+    Model names are matched after normalize_model, then by their name
+    without the organization (e.g. "GLM-4.7-Flash" for "zai-org/GLM-4.7-Flash"),
+    then as an extension of a priced model (e.g. "gpt-4o-mini-audio" priced as
+    "gpt-4o-mini"). Models may also list other names in their "aliases".
+    Providers without a match fall back to the models of every provider.
+    Resolved pricings are memoized, so a lookup costs a dict access.
+    """
+
+    def __init__(self, config: dict[str, Any]):
+        self.config = config
+        # provider ("" for all) -> model key -> pricing
+        self._models: dict[str, dict[str, dict[str, float]]] = {"": {}}
+        for provider, provider_config in config.items():
+            models = (provider_config or {}).get("models") or {}
+            provider_models = self._models.setdefault(provider, {})
+            for model, model_config in models.items():
+                pricing = {field: float(model_config[field]) for field in PRICE_FIELDS}
+                for key in model_keys(model, model_config):
+                    for models_of in (provider_models, self._models[""]):
+                        models_of.setdefault(key, pricing)
+        self.lookup = functools.lru_cache(maxsize=MAX_CACHED_MODELS)(self._lookup)
+
+    def _lookup(self, provider: str, model: str) -> dict[str, float] | None:
+        """Pricing of a model, None if it isn't priced.
+
+        The returned dict is shared, it must not be modified.
+        """
+        key = normalize_model(model)
+        for models in (self._models.get(provider), self._models[""]):
+            if not models:
+                continue
+            pricing = (
+                models.get(key)
+                or models.get(key.rsplit("/", 1)[-1])
+                or self._by_prefix(models, key)
+            )
+            if pricing is not None:
+                return pricing
+        return None
+
+    @staticmethod
+    def _by_prefix(
+        models: dict[str, dict[str, float]], key: str
+    ) -> dict[str, float] | None:
+        # Longest priced model that the name extends
+        best = None
+        for priced in models:
+            if (
+                len(priced) < len(key)
+                and key.startswith(priced)
+                and key[len(priced)] in _NAME_SEPARATORS
+                and (best is None or len(priced) > len(best))
+            ):
+                best = priced
+        return models[best] if best is not None else None
+
+
+_PRICING_INDEX: PricingIndex | None = None
+
+
+@functools.lru_cache(maxsize=MAX_CACHED_MODELS)
+def _warn_unpriced(model: str) -> None:
+    """Warn about a model without pricing, once while it's among the recent ones."""
+    logger.warning(f"No pricing found for model '{model}', using default")
+
+
+def pricing_index() -> PricingIndex:
+    """Index of the loaded pricing config."""
+    global _PRICING_INDEX
+
+    config = load_pricing_config()
+    index = _PRICING_INDEX
+    if index is None or index.config is not config:
+        index = _PRICING_INDEX = PricingIndex(config)
+    return index
+
+
 def get_model_pricing(provider: str, model: str) -> dict[str, float]:
     """Get pricing for a specific model.
 
@@ -67,36 +191,16 @@ def get_model_pricing(provider: str, model: str) -> dict[str, float]:
         model: Model name (e.g., "claude-4-sonnet", "GLM-4.7-Flash")
 
     Returns:
-        Dict with keys: input, output, cache_creation, cache_read (all in USD per MTok)
+        Dict with keys: input, output, cache_creation, cache_read (all in USD per MTok).
+        It's shared between calls and must not be modified.
     """
-    config = load_pricing_config()
-
-    # Search through all providers
-    provider_config = config.get(provider, {})
-    models = provider_config.get("models", {})
-    if model in models:
-        model_config = models[model]
-        # Map new field names to expected names
-        return {
-            "input_tokens_price": model_config["input_tokens_price"],
-            "output_tokens_price": model_config["output_tokens_price"],
-            "cache_creation_input_tokens_price": model_config[
-                "cache_creation_input_tokens_price"
-            ],
-            "cache_read_input_tokens_price": model_config[
-                "cache_read_input_tokens_price"
-            ],
-        }
+    pricing = pricing_index().lookup(provider, model)
+    if pricing is not None:
+        return pricing
 
     # Fall back to default
-    logger.warning(f"No pricing found for model '{model}', using default")
-    # default to anthropic/claude-4-sonnet.
-    return {
-        "input_tokens_price": 3.3,
-        "output_tokens_price": 16.5,
-        "cache_creation_input_tokens_price": 3.3,
-        "cache_read_input_tokens_price": 3.3,
-    }
+    _warn_unpriced(model)
+    return DEFAULT_PRICING
 
 
 def calculate_cost(
@@ -18,14 +18,16 @@ interface GetDailyCostUsageResponse {
 /**
  * Hook to fetch daily cost usage for a team
  * Only includes LLM calls (spans with alphatrion.cost.total_tokens)
+ * Days are aligned to the browser's timezone
  */
 export function useDailyCostUsage(teamId: string, days = 30) {
+  const timezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
   return useQuery({
-    queryKey: ['dailyCostUsage', teamId, days],
+    queryKey: ['dailyCostUsage', teamId, days, timezone],
     queryFn: async () => {
       const data = await graphqlQuery<GetDailyCostUsageResponse>(
         queries.getDailyCostUsage,
-        { teamId, days }
+        { teamId, days, timezone }
       );
       return data.dailyCostUsage;
     },
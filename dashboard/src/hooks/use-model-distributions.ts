@@ -1,4 +1,5 @@
 import { useQuery } from '@tanstack/react-query';
+import { subDays } from 'date-fns';
 import { graphqlQuery } from '../lib/graphql-client';
 
 export interface ModelDistribution {
@@ -13,10 +14,10 @@ interface GetModelDistributionsResponse {
 }
 
 const GET_MODEL_DISTRIBUTIONS = `
-  query GetModelDistributions($teamId: ID!) {
+  query GetModelDistributions($teamId: ID!, $startTime: DateTime) {
     team(id: $teamId) {
       id
-      modelDistributions {
+      modelDistributions(startTime: $startTime) {
         model
         count
       }
@@ -24,14 +25,18 @@ const GET_MODEL_DISTRIBUTIONS = `
   }
 `;
 
-export function useModelDistributions(teamId: string) {
+/**
+ * Hook to fetch the model distribution of a team over the last `days` days
+ */
+export function useModelDistributions(teamId: string, days = 30) {
   return useQuery<ModelDistribution[]>({
-    queryKey: ['model-distributions', teamId],
+    queryKey: ['model-distributions', teamId, days],
     queryFn: async () => {
       if (!teamId) return [];
+      const startTime = subDays(new Date(), days).toISOString();
       const data = await graphqlQuery<GetModelDistributionsResponse>(
         GET_MODEL_DISTRIBUTIONS,
-        { teamId }
+        { teamId, startTime }
       );
       return data.team?.modelDistributions || [];
     },
@@ -0,0 +1,52 @@
+import { useQuery } from '@tanstack/react-query';
+import { graphqlQuery, queries } from '../lib/graphql-client';
+import type { AggregatedUsage } from '../types';
+import type { DailyCostUsage } from './use-cost-usage';
+import type { ModelDistribution } from './use-model-distributions';
+
+export interface TeamOverview {
+  usage: AggregatedUsage;
+  modelDistributions: ModelDistribution[];
+  dailyCostUsage: DailyCostUsage[];
+  traceStats: {
+    totalSpans: number;
+    successSpans: number;
+    errorSpans: number;
+  };
+}
+
+interface GetTeamOverviewResponse {
+  teamOverview: (Omit<TeamOverview, 'dailyCostUsage'> & {
+    costUsage: (Omit<DailyCostUsage, 'date'> & { bucket: string })[];
+  }) | null;
+}
+
+/**
+ * Hook to fetch the usage, model distribution, daily cost and trace stats
+ * of a team over the last `days` days, computed by a single query
+ * Days are aligned to the browser's timezone
+ */
+export function useTeamOverview(teamId: string, days = 30) {
+  const timezone = Intl.DateTimeFormat().resolvedOptions().timeZone;
+  return useQuery<TeamOverview | null>({
+    queryKey: ['teamOverview', teamId, days, timezone],
+    queryFn: async () => {
+      const data = await graphqlQuery<GetTeamOverviewResponse>(
+        queries.getTeamOverview,
+        { teamId, days, timezone }
+      );
+      if (!data.teamOverview) return null;
+      const { costUsage, ...overview } = data.teamOverview;
+      return {
+        ...overview,
+        // Buckets start at local midnight, so their date part is the day
+        dailyCostUsage: costUsage.map(({ bucket, ...usage }) => ({
+          date: bucket.slice(0, 10),
+          ...usage,
+        })),
+      };
+    },
+    enabled: !!teamId,
+    staleTime: 5 * 60 * 1000, // 5 minutes
+  });
+}
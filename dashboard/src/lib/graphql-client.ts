@@ -450,8 +450,8 @@ export const queries = {
   `,
 
   getDailyCostUsage: `
-    query GetDailyCostUsage($teamId: ID!, $days: Int = 30) {
-      dailyCostUsage(teamId: $teamId, days: $days) {
+    query GetDailyCostUsage($teamId: ID!, $days: Int = 30, $timezone: String = "UTC") {
+      dailyCostUsage(teamId: $teamId, days: $days, timezone: $timezone) {
         date
         totalCost
         totalTokens
@@ -463,6 +463,39 @@ export const queries = {
     }
   `,
 
+  getTeamOverview: `
+    query GetTeamOverview($teamId: ID!, $days: Int = 30, $timezone: String = "UTC") {
+      teamOverview(teamId: $teamId, days: $days, timezone: $timezone) {
+        usage {
+          totalTokens
+          inputTokens
+          outputTokens
+          cacheReadInputTokens
+          cacheCreationInputTokens
+          totalCost
+        }
+        modelDistributions {
+          model
+          count
+        }
+        costUsage {
+          bucket
+          totalCost
+          totalTokens
+          inputTokens
+          outputTokens
+          cacheReadInputTokens
+          cacheCreationInputTokens
+        }
+        traceStats {
+          totalSpans
+          successSpans
+          errorSpans
+        }
+      }
+    }
+  `,
+
   listDatasets: `
     query ListDatasets($teamId: ID!, $page: Int, $pageSize: Int) {
       datasets(teamId: $teamId, page: $page, pageSize: $pageSize) {
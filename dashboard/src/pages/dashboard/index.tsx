@@ -2,8 +2,7 @@ import { useState, useMemo } from 'react';
 import { useTeamContext } from '../../context/team-context';
 import { useTeam } from '../../hooks/use-teams';
 import { useTeamExperiments } from '../../hooks/use-team-experiments';
-import { useDailyCostUsage } from '../../hooks/use-cost-usage';
-import { useModelDistributions } from '../../hooks/use-model-distributions';
+import { useTeamOverview } from '../../hooks/use-team-overview';
 import {
   Card,
   CardContent,
@@ -39,14 +38,13 @@ export function DashboardPage() {
   // Get days for selected time range
   const days = TIME_RANGE_OPTIONS.find((opt) => opt.value === timeRange)?.days || 30;
 
-  const { data: dailyCostUsage, isLoading: costUsageLoading } = useDailyCostUsage(
+  // Usage, model distribution and daily cost of the range, in one query
+  const { data: overview, isLoading: overviewLoading } = useTeamOverview(
     selectedTeamId || '',
     days
   );
-
-  const { data: modelDistributions, isLoading: modelDistributionsLoading } = useModelDistributions(
-    selectedTeamId || ''
-  );
+  const dailyCostUsage = overview?.dailyCostUsage;
+  const modelDistributions = overview?.modelDistributions;
 
   // Filter experiments based on selected time range
   const filteredExperiments = useMemo(() => {
@@ -144,9 +142,9 @@ export function DashboardPage() {
                 <div className="space-y-0.5">
                   <p className="text-[10px] font-medium text-muted-foreground">TOKENS</p>
                   <p className="text-base font-bold tabular-nums text-foreground">
-                    {(team?.aggregatedUsage?.totalTokens || 0).toLocaleString()}
+                    {(overview?.usage?.totalTokens || 0).toLocaleString()}
                     <span className="text-muted-foreground text-[10px] ml-1 font-normal">
-                      ({(team?.aggregatedUsage?.inputTokens || 0).toLocaleString()}↓ {(team?.aggregatedUsage?.outputTokens || 0).toLocaleString()}↑)
+                      ({(overview?.usage?.inputTokens || 0).toLocaleString()}↓ {(overview?.usage?.outputTokens || 0).toLocaleString()}↑)
                     </span>
                   </p>
                 </div>
@@ -164,7 +162,7 @@ export function DashboardPage() {
                 <div className="space-y-0.5">
                   <p className="text-[10px] font-medium text-muted-foreground">COST</p>
                   <p className="text-base font-bold tabular-nums text-foreground">
-                    ${(team?.aggregatedUsage?.totalCost || 0).toFixed(4)}
+                    ${(overview?.usage?.totalCost || 0).toFixed(4)}
                   </p>
                 </div>
                 <div className="p-1.5 bg-emerald-100 rounded-lg">
@@ -229,7 +227,7 @@ export function DashboardPage() {
           {/* Model Distribution Pie Chart */}
           <Card>
             <CardContent className="p-3">
-              {modelDistributionsLoading ? (
+              {overviewLoading ? (
                 <Skeleton className="h-60 w-full" />
               ) : (
                 <ModelDistributionChart data={modelDistributions || []} />
@@ -240,7 +238,7 @@ export function DashboardPage() {
           {/* Combined Cost & Token Usage Chart */}
           <Card>
             <CardContent className="p-3">
-              {costUsageLoading ? (
+              {overviewLoading ? (
                 <Skeleton className="h-60 w-full" />
               ) : dailyCostUsage ? (
                 <DailyCostUsageChart data={dailyCostUsage} timeRange={timeRange} />
@@ -0,0 +1,146 @@
+#!/usr/bin/env python3
+"""Benchmark the conversion of OpenTelemetry spans into ClickHouse inserts.
+
+Runs ClickHouseSpanExporter.export on batches of typical workflow and LLM
+spans, down to TraceStore.write_spans with a client that drops the insert,
+and prints spans/sec for each kind:
+
+    python hack/bench_span_export.py [--batch-size 512] [--batches 200]
+"""
+
+import argparse
+import time
+import uuid
+from unittest import mock
+
+from opentelemetry.attributes import BoundedAttributes
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import Event, ReadableSpan
+from opentelemetry.trace import SpanContext, SpanKind, Status, StatusCode
+
+from alphatrion.storage.tracestore import TraceStore
+from alphatrion.tracing.clickhouse_exporter import ClickHouseSpanExporter
+
+RESOURCE = Resource.create(
+    {
+        "service.name": "alphatrion",
+        "service.version": "0.3.0",
+        "host.name": "bench-host",
+        "process.pid": 4242,
+        "process.runtime.name": "cpython",
+        "process.runtime.version": "3.12.8",
+    }
+)
+
+CONTEXT_ATTRIBUTES = {
+    "org_id": str(uuid.uuid4()),
+    "team_id": str(uuid.uuid4()),
+    "user_id": str(uuid.uuid4()),
+    "experiment_id": str(uuid.uuid4()),
+    "run_id": str(uuid.uuid4()),
+}
+
+WORKFLOW_ATTRIBUTES = {
+    **CONTEXT_ATTRIBUTES,
+    "traceloop.span.kind": "task",
+    "traceloop.workflow.name": "summarize_documents",
+    "traceloop.entity.name": "fetch_document",
+    "traceloop.entity.path": "summarize_documents.fetch_document",
+    "traceloop.entity.input": '{"args": ["doc-42"], "kwargs": {"max_pages": 10}}',
+    "traceloop.entity.output": '"' + "lorem ipsum " * 20 + '"',
+}
+
+LLM_ATTRIBUTES = {
+    **CONTEXT_ATTRIBUTES,
+    "traceloop.workflow.name": "summarize_documents",
+    "llm.request.type": "chat",
+    "gen_ai.operation.name": "chat",
+    "gen_ai.system": "openai",
+    "gen_ai.request.model": "gpt-4o-mini",
+    "gen_ai.response.model": "gpt-4o-mini-2024-07-18",
+    "gen_ai.request.temperature": 0.2,
+    "gen_ai.request.max_tokens": 1024,
+    "gen_ai.prompt.0.role": "system",
+    "gen_ai.prompt.0.content": "You are a helpful assistant. " * 20,
+    "gen_ai.prompt.1.role": "user",
+    "gen_ai.prompt.1.content": "Summarize the following document. " * 40,
+    "gen_ai.completion.0.role": "assistant",
+    "gen_ai.completion.0.content": "The document describes " * 30,
+    "gen_ai.completion.0.finish_reason": "stop",
+    "gen_ai.usage.input_tokens": 1843,
+    "gen_ai.usage.output_tokens": 312,
+    "llm.usage.total_tokens": 2155,
+    "alphatrion.cost.input_tokens": 0.00027645,
+    "alphatrion.cost.output_tokens": 0.0001872,
+    "alphatrion.cost.total_tokens": 0.00046365,
+}
+
+
+class NullClient:
+    """ClickHouse client dropping inserts."""
+
+    def insert(self, *args, **kwargs):
+        pass
+
+
+def make_spans(attributes: dict, count: int, *, llm: bool) -> list[ReadableSpan]:
+    start = time.time_ns()
+    trace_id = uuid.uuid4().int
+    spans = []
+    for i in range(count):
+        context = SpanContext(trace_id, i + 2, is_remote=False)
+        parent = SpanContext(trace_id, 1, is_remote=False)
+        events = (
+            [Event("gen_ai.content.completion", {"index": 0}, timestamp=start + 5)]
+            if llm
+            else []
+        )
+        spans.append(
+            ReadableSpan(
+                name="openai.chat" if llm else "fetch_document.task",
+                context=context,
+                parent=parent,
+                resource=RESOURCE,
+                # As set by the SDK on the spans it ends
+                attributes=BoundedAttributes(attributes=attributes, immutable=True),
+                events=events,
+                kind=SpanKind.CLIENT if llm else SpanKind.INTERNAL,
+                status=Status(StatusCode.OK),
+                start_time=start + i * 1000,
+                end_time=start + i * 1000 + 1_250_000,
+            )
+        )
+    return spans
+
+
+def bench(
+    exporter: ClickHouseSpanExporter, spans: list[ReadableSpan], batches: int
+) -> float:
+    exporter.export(spans)  # warm up
+    began = time.perf_counter()
+    for _ in range(batches):
+        exporter.export(spans)
+    return len(spans) * batches / (time.perf_counter() - began)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=512)
+    parser.add_argument("--batches", type=int, default=200)
+    args = parser.parse_args()
+
+    with mock.patch("clickhouse_connect.get_client", return_value=NullClient()):
+        store = TraceStore("localhost:8123", "bench", "bench", "bench")
+    exporter = ClickHouseSpanExporter(store)
+
+    for name, attributes, llm in (
+        ("workflow", WORKFLOW_ATTRIBUTES, False),
+        ("llm", LLM_ATTRIBUTES, True),
+    ):
+        spans = make_spans(attributes, args.batch_size, llm=llm)
+        rate = bench(exporter, spans, args.batches)
+        print(f"{name:>8}: {rate:>10,.0f} spans/sec")
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,11 @@ Usage:
     python -m migrations.clickhouse.cli status     # Show migration status
     python -m migrations.clickhouse.cli migrate    # Run pending migrations
     python -m migrations.clickhouse.cli rollback   # Rollback last migration (not implemented)
+    python -m migrations.clickhouse.cli retention preview [ORG_ID]   # Estimate space freed by retention
+    python -m migrations.clickhouse.cli retention set ORG_ID FULL_DAYS RETENTION_DAYS
+    python -m migrations.clickhouse.cli retention apply   # Re-apply retention defaults from env
+    python -m migrations.clickhouse.cli pricing sync      # Sync model prices from modelspec.yaml
+    python -m migrations.clickhouse.cli pricing compare ORG_ID TEAM_ID [DAYS]   # Ingest vs current costs
 """
 import os
 import sys
@@ -14,11 +19,15 @@ from pathlib import Path
 import clickhouse_connect
 from dotenv import load_dotenv
 
+from alphatrion.utils.pricing import load_pricing_config
+from migrations.clickhouse import pricing, retention
 from migrations.clickhouse.runner import ClickHouseMigrationRunner
 
 # Load environment variables
 load_dotenv()
 
+KIB = 1024
+
 
 def get_client() -> clickhouse_connect.driver.Client:
     """Get ClickHouse client from environment variables."""
@@ -106,6 +115,103 @@ def run_migrate(runner: ClickHouseMigrationRunner, migrations_dir: Path):
     print("Migration complete!")
 
 
+def _format_bytes(size: float) -> str:
+    for unit in ("B", "KiB", "MiB", "GiB"):
+        if size < KIB:
+            return f"{size:.1f} {unit}"
+        size /= KIB
+    return f"{size:.1f} TiB"
+
+
+def run_retention(client: clickhouse_connect.driver.Client, database: str, args: list[str]):
+    """Preview, override or re-apply span retention."""
+    config = retention.RetentionConfig.from_env()
+    action = args[0] if args else "preview"
+
+    if action == "preview":
+        org_id = args[1] if len(args) > 1 else None
+        rows = retention.preview(client, database, config, org_id=org_id)
+        print(
+            f"Defaults: full spans for {config.full_days} days, "
+            f"retention {config.retention_days or 'forever'} days, "
+            f"cold volume {config.cold_volume or 'none'}"
+        )
+        print()
+        print(
+            f"{'Org':<38} {'Spans':>10} {'On disk':>11} {'Slimmed':>11} {'Deleted':>11} "
+            f"{'To cold':>11} {'Contents':>11} {'Expired':>11}"
+        )
+        print("-" * 121)
+        for row in rows:
+            print(
+                f"{row['org_id']:<38} {row['spans']:>10} "
+                f"{_format_bytes(row['bytes_on_disk']):>11} "
+                f"{_format_bytes(row['slim_freed_bytes']):>11} "
+                f"{_format_bytes(row['delete_freed_bytes']):>11} "
+                f"{_format_bytes(row['cold_bytes']):>11} "
+                f"{_format_bytes(row['contents_bytes']):>11} "
+                f"{_format_bytes(row['contents_freed_bytes']):>11}"
+            )
+        print()
+        freed = sum(
+            r["slim_freed_bytes"] + r["delete_freed_bytes"] + r["contents_freed_bytes"]
+            for r in rows
+        )
+        print(f"Estimated space freed: {_format_bytes(freed)}")
+
+    elif action == "set":
+        try:
+            _, org_id, full_days, retention_days = args
+        except ValueError:
+            print(__doc__)
+            sys.exit(1)
+        retention.set_org_retention(
+            client, database, config, org_id, int(full_days), int(retention_days)
+        )
+        print(f"Retention of org {org_id} set, applies to new spans.")
+        print("Run `retention apply` to apply it to existing spans too.")
+
+    elif action == "apply":
+        retention.apply_ttl(client, database, config, materialize=True)
+        retention.apply_contents_ttl(client, database, config, materialize=True)
+        print("Retention rules applied, existing spans are rewritten in the background.")
+
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
+def run_pricing(client: clickhouse_connect.driver.Client, database: str, args: list[str]):
+    """Sync model prices or compare costs at ingest and current prices."""
+    action = args[0] if args else None
+
+    if action == "sync":
+        rows = pricing.sync(client, database, load_pricing_config())
+        print(f"Synced {rows} model prices.")
+
+    elif action == "compare" and len(args) in (3, 4):
+        days = int(args[3]) if len(args) == 4 else 30
+        rows = pricing.compare(client, database, args[1], args[2], days=days)
+        print(f"Costs of the last {days} days, in USD")
+        print()
+        print(f"{'Model':<48} {'Spans':>10} {'Ingest':>12} {'Current':>12} {'Change':>12}")
+        print("-" * 98)
+        for row in rows:
+            print(
+                f"{row['model']:<48} {row['spans']:>10} "
+                f"{row['ingest_cost']:>12.4f} {row['current_cost']:>12.4f} "
+                f"{row['current_cost'] - row['ingest_cost']:>+12.4f}"
+            )
+        print()
+        ingest = sum(r["ingest_cost"] for r in rows)
+        current = sum(r["current_cost"] for r in rows)
+        print(f"Total: {ingest:.4f} at ingest, {current:.4f} at current prices")
+
+    else:
+        print(__doc__)
+        sys.exit(1)
+
+
 def main():
     """Main CLI entry point."""
     if len(sys.argv) < 2:
@@ -137,6 +243,12 @@ def main():
         runner = ClickHouseMigrationRunner(client, database)
         run_migrate(runner, migrations_dir)
 
+    elif command == "retention":
+        run_retention(get_client(), database, sys.argv[2:])
+
+    elif command == "pricing":
+        run_pricing(get_client(), database, sys.argv[2:])
+
     elif command == "rollback":
         print("Rollback not implemented yet")
         print("To manually rollback, run the downgrade() method from the migration file")
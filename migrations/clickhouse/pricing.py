@@ -0,0 +1,137 @@
+"""Model prices for costs computed at query time.
+
+The alphatrion.cost.* attributes of spans are computed at ingest, with the
+prices of config/modelspec.yaml at that time. The model_prices table keeps
+every version of those prices, by model and the date it's effective from,
+and the model_prices_dict dictionary serves them to the cost aggregates of
+TraceStore when ALPHATRION_COST_PRICING=current. A span is priced with the
+latest version effective on its day.
+
+Migration 007 creates both, empty. Prices are synced from modelspec.yaml:
+a model's optional `effective_from` date (default 1970-01-01) versions its
+prices, so a price change with a new `effective_from` adds a version and
+keeps the earlier ones for older spans.
+
+Usage:
+    python -m migrations.clickhouse.cli pricing sync
+    python -m migrations.clickhouse.cli pricing compare ORG_ID TEAM_ID [DAYS]
+"""
+
+import logging
+from datetime import date
+from typing import Any
+
+import clickhouse_connect
+
+from alphatrion.storage.tracestore import (
+    COST_COMPONENTS,
+    MODEL_EXPR,
+    PRICED_MODEL_EXPR,
+    PRICES_DICT,
+    PRICING_CURRENT,
+    PRICING_INGEST,
+    cost_expr,
+)
+from alphatrion.utils.pricing import model_keys
+
+logger = logging.getLogger(__name__)
+
+PRICES_TABLE = "model_prices"
+
+# Effective date of models without effective_from
+DEFAULT_EFFECTIVE_FROM = date(1970, 1, 1)
+
+# Price columns of PRICES_TABLE, by field of the pricing config
+PRICE_COLUMNS = {
+    f"{component}_price": column for component, column in COST_COMPONENTS.items()
+}
+
+
+def price_rows(config: dict[str, Any]) -> list[list[Any]]:
+    """Rows of PRICES_TABLE for a pricing config.
+
+    Models are keyed like alphatrion.utils.pricing.PricingIndex does, across
+    providers: spans are priced by model name only, the first model of a key
+    wins.
+
+    Returns:
+        Rows of Model, EffectiveFrom and the PRICE_COLUMNS
+    """
+    rows = {}
+    for provider_config in config.values():
+        models = (provider_config or {}).get("models") or {}
+        for model, model_config in models.items():
+            effective_from = model_config.get("effective_from") or DEFAULT_EFFECTIVE_FROM
+            if isinstance(effective_from, str):
+                effective_from = date.fromisoformat(effective_from)
+            prices = [float(model_config[field]) for field in PRICE_COLUMNS]
+            for key in model_keys(model, model_config):
+                rows.setdefault((key, effective_from), [key, effective_from, *prices])
+    return list(rows.values())
+
+
+def sync(
+    client: clickhouse_connect.driver.Client, database: str, config: dict[str, Any]
+) -> int:
+    """Insert the prices of a pricing config, replacing the same versions.
+
+    Returns:
+        Number of rows inserted
+    """
+    rows = price_rows(config)
+    if rows:
+        client.insert(
+            f"{database}.{PRICES_TABLE}",
+            rows,
+            column_names=["Model", "EffectiveFrom", *PRICE_COLUMNS.values()],
+        )
+    client.command(f"SYSTEM RELOAD DICTIONARY {database}.{PRICES_DICT}")
+    return len(rows)
+
+
+def compare(
+    client: clickhouse_connect.driver.Client,
+    database: str,
+    org_id: str,
+    team_id: str,
+    days: int = 30,
+) -> list[dict]:
+    """Costs of a team's spans per model, at ingest and at current prices.
+
+    Returns:
+        List of dicts with model, spans, ingest_cost and current_cost, most
+        expensive at current prices first
+    """
+    components = list(COST_COMPONENTS)
+
+    def total(pricing: str) -> str:
+        return " + ".join(
+            f"sum({cost_expr(database, component, pricing)})" for component in components
+        )
+
+    result = client.query(
+        f"""
+        SELECT
+            {PRICED_MODEL_EXPR} as model,
+            count() as spans,
+            {total(PRICING_INGEST)} as ingest_cost,
+            {total(PRICING_CURRENT)} as current_cost
+        FROM {database}.otel_spans FINAL
+        WHERE OrgId = {{org_id:String}}
+          AND TeamId = {{team_id:String}}
+          AND Timestamp >= now() - toIntervalDay({{days:UInt32}})
+          AND {MODEL_EXPR} != ''
+        GROUP BY model
+        ORDER BY current_cost DESC
+        """,
+        parameters={"org_id": org_id, "team_id": team_id, "days": days},
+    )
+    return [
+        {
+            "model": row["model"],
+            "spans": int(row["spans"]),
+            "ingest_cost": float(row["ingest_cost"]),
+            "current_cost": float(row["current_cost"]),
+        }
+        for row in result.named_results()
+    ]
@@ -0,0 +1,343 @@
+"""Span retention and tiered storage rules.
+
+Spans go through up to three stages, driven by TTL rules on the spans table:
+1. Full spans for ALPHATRION_SPAN_FULL_DAYS days (default 30)
+2. Slim spans: typed columns plus the attributes needed for usage, cost and
+   model statistics, prompts/completions and other large attributes dropped
+3. Deleted after ALPHATRION_SPAN_RETENTION_DAYS days (default 0, keep forever)
+
+Both durations can be overridden per org in the span_retention table. TTL
+expressions must be deterministic, so they can't look overrides up in a
+dictionary: the rules list every overridden org instead, and are rebuilt
+from the table when an override is set. Parts independently move to the
+ALPHATRION_CLICKHOUSE_COLD_VOLUME volume after ALPHATRION_SPAN_COLD_AFTER_DAYS
+days, when a cold volume is configured in the table's storage policy.
+
+Large attribute values live in the span_contents table, referenced by full
+spans only. TraceStore writes a content again at least once a day while spans
+reference it, so contents are deleted CONTENTS_GRACE_DAYS after their org's
+full days past their last write.
+
+Usage:
+    python -m migrations.clickhouse.cli retention preview [ORG_ID]
+    python -m migrations.clickhouse.cli retention set ORG_ID FULL_DAYS RETENTION_DAYS
+    python -m migrations.clickhouse.cli retention apply
+"""
+
+import logging
+import os
+from dataclasses import dataclass
+
+import clickhouse_connect
+
+from alphatrion.storage.tracestore import SUMMARY_ATTRIBUTE_PREFIXES
+from migrations.clickhouse.runner import (
+    local_contents_table,
+    local_spans_table,
+    on_cluster,
+)
+
+logger = logging.getLogger(__name__)
+
+RETENTION_TABLE = "span_retention"
+
+# Days contents outlive the full spans referencing them: one for the daily
+# refresh of their InsertedAt, one for TTL merges of the spans lagging behind
+CONTENTS_GRACE_DAYS = 2
+
+# Attributes kept by slim spans, the same the summary projection returns
+SLIM_ATTRIBUTE_FILTER = " OR ".join(
+    f"startsWith(k, '{prefix}')" for prefix in SUMMARY_ATTRIBUTE_PREFIXES
+)
+
+
+@dataclass
+class RetentionConfig:
+    """Default retention, for orgs without a span_retention row."""
+
+    full_days: int = 30
+    retention_days: int = 0  # 0 keeps spans forever
+    cold_volume: str | None = None
+    cold_after_days: int = 30
+
+    @classmethod
+    def from_env(cls) -> "RetentionConfig":
+        return cls(
+            full_days=int(os.getenv("ALPHATRION_SPAN_FULL_DAYS", "30")),
+            retention_days=int(os.getenv("ALPHATRION_SPAN_RETENTION_DAYS", "0")),
+            cold_volume=os.getenv("ALPHATRION_CLICKHOUSE_COLD_VOLUME") or None,
+            cold_after_days=int(os.getenv("ALPHATRION_SPAN_COLD_AFTER_DAYS", "30")),
+        )
+
+
+@dataclass
+class OrgRetention:
+    """Retention of an org overriding the defaults."""
+
+    full_days: int
+    retention_days: int
+
+
+def org_overrides(
+    client: clickhouse_connect.driver.Client, database: str
+) -> dict[str, OrgRetention]:
+    """Retention overrides of the span_retention table, by org ID."""
+    result = client.query(
+        f"SELECT OrgId, FullDays, RetentionDays FROM {database}.{RETENTION_TABLE} FINAL"
+    )
+    return {
+        org_id: OrgRetention(int(full_days), int(retention_days))
+        for org_id, full_days, retention_days in result.result_rows
+    }
+
+
+def _org_days_expr(days: dict[str, int], default: int) -> str:
+    """Days of the org of a row, a constant when no org overrides them."""
+    if not days:
+        return f"toUInt32({int(default)})"
+    orgs = ", ".join(_quote(org_id) for org_id in days)
+    values = ", ".join(str(int(value)) for value in days.values())
+    return f"transform(OrgId, [{orgs}], [{values}], toUInt32({int(default)}))"
+
+
+def _quote(value: str) -> str:
+    return "'" + value.replace("\\", "\\\\").replace("'", "\\'") + "'"
+
+
+def full_days_expr(config: RetentionConfig, overrides: dict[str, OrgRetention]) -> str:
+    return _org_days_expr(
+        {org_id: org.full_days for org_id, org in overrides.items()}, config.full_days
+    )
+
+
+def retention_days_expr(
+    config: RetentionConfig, overrides: dict[str, OrgRetention]
+) -> str:
+    return _org_days_expr(
+        {org_id: org.retention_days for org_id, org in overrides.items()},
+        config.retention_days,
+    )
+
+
+def ttl_rules(config: RetentionConfig, overrides: dict[str, OrgRetention]) -> str:
+    """TTL rules of the spans table for the given defaults and org overrides."""
+    full_days = full_days_expr(config, overrides)
+    retention_days = retention_days_expr(config, overrides)
+    rules = [
+        # One group per span, so this only rewrites the attributes. Columns
+        # nesting LowCardinality are set explicitly, their implicit any()
+        # fails the merge
+        f"""toDateTime(Timestamp) + toIntervalDay({full_days})
+            GROUP BY OrgId, TeamId, Timestamp, TraceId, SpanId
+            SET SpanAttributes = mapFilter((k, v) -> {SLIM_ATTRIBUTE_FILTER}, any(SpanAttributes)),
+                InsertedAt = max(InsertedAt),
+                ResourceAttributes = any(ResourceAttributes),
+                `Events.Name` = any(`Events.Name`),
+                `Events.Attributes` = any(`Events.Attributes`),
+                `Links.Attributes` = any(`Links.Attributes`)""",
+    ]
+    if config.cold_volume:
+        rules.append(
+            f"toDateTime(Timestamp) + INTERVAL {int(config.cold_after_days)} DAY "
+            f"TO VOLUME '{config.cold_volume}'"
+        )
+    rules.append(
+        f"toDateTime(Timestamp) + toIntervalDay({retention_days}) "
+        f"DELETE WHERE {retention_days} > 0"
+    )
+    return ",\n".join(rules)
+
+
+def contents_ttl_rule(config: RetentionConfig, overrides: dict[str, OrgRetention]) -> str:
+    """TTL rule of the span_contents table for the given defaults and org overrides."""
+    return (
+        f"InsertedAt + toIntervalDay({full_days_expr(config, overrides)} "
+        f"+ {CONTENTS_GRACE_DAYS})"
+    )
+
+
+def apply_ttl(
+    client: clickhouse_connect.driver.Client,
+    database: str,
+    config: RetentionConfig,
+    *,
+    materialize: bool = False,
+) -> None:
+    """Set the TTL rules of the spans table, with the current org overrides.
+
+    New parts use the rules right away. Existing parts are only rewritten
+    with materialize, which is as expensive as a full merge of the table.
+    """
+    table = local_spans_table(database)
+    rules = ttl_rules(config, org_overrides(client, database))
+    client.command(
+        f"ALTER TABLE {table} {on_cluster()} MODIFY TTL {rules}",
+        settings={"materialize_ttl_after_modify": int(materialize)},
+    )
+
+
+def apply_contents_ttl(
+    client: clickhouse_connect.driver.Client,
+    database: str,
+    config: RetentionConfig,
+    *,
+    materialize: bool = False,
+) -> None:
+    """Set the TTL rule of the span_contents table, see apply_ttl."""
+    rule = contents_ttl_rule(config, org_overrides(client, database))
+    client.command(
+        f"ALTER TABLE {local_contents_table(database)} {on_cluster()} MODIFY TTL {rule}",
+        settings={"materialize_ttl_after_modify": int(materialize)},
+    )
+
+
+def set_org_retention(
+    client: clickhouse_connect.driver.Client,
+    database: str,
+    config: RetentionConfig,
+    org_id: str,
+    full_days: int,
+    retention_days: int,
+) -> None:
+    """Override the retention of an org, 0 retention days keeps spans forever.
+
+    The TTL rules of the spans and span_contents tables are rebuilt with the
+    given defaults and applied to new parts, see apply_ttl.
+    """
+    client.insert(
+        f"{database}.{RETENTION_TABLE}",
+        [[org_id, full_days, retention_days]],
+        column_names=["OrgId", "FullDays", "RetentionDays"],
+    )
+    apply_ttl(client, database, config)
+    apply_contents_ttl(client, database, config)
+
+
+def _compression_ratios(
+    client: clickhouse_connect.driver.Client, table: str, column: str
+) -> tuple[float, float]:
+    """Compression ratios of a table, and of one of its columns."""
+    database, table_name = table.split(".", 1)
+    ratios = client.query(
+        """
+        SELECT
+            sum(data_compressed_bytes) / greatest(sum(data_uncompressed_bytes), 1) as ratio,
+            sumIf(data_compressed_bytes, column = {column:String})
+                / greatest(sumIf(data_uncompressed_bytes, column = {column:String}), 1) as column_ratio
+        FROM system.parts_columns
+        WHERE database = {database:String} AND table = {table:String} AND active
+        """,
+        parameters={"database": database, "table": table_name, "column": column},
+    ).first_row
+    return float(ratios[0]), float(ratios[1])
+
+
+def preview(
+    client: clickhouse_connect.driver.Client,
+    database: str,
+    config: RetentionConfig,
+    org_id: str | None = None,
+) -> list[dict]:
+    """Estimate, per org, the disk space the retention rules free.
+
+    Sizes are estimated from the uncompressed size of the affected spans and
+    contents and the current compression ratio of their tables, so they're
+    approximations.
+
+    Returns:
+        List of dicts with org_id, spans, bytes_on_disk, slimmed_spans,
+        slim_freed_bytes, deleted_spans, delete_freed_bytes, cold_bytes,
+        contents_bytes and contents_freed_bytes
+    """
+    table = local_spans_table(database)
+    ratio, attributes_ratio = _compression_ratios(client, table, "SpanAttributes")
+
+    overrides = org_overrides(client, database)
+    full_days = full_days_expr(config, overrides)
+    retention_days = retention_days_expr(config, overrides)
+    # Spans deleted by the retention rule aren't counted as slimmed too
+    deleted = f"({retention_days} > 0 AND Timestamp < now() - toIntervalDay({retention_days}))"
+    slimmed = f"(NOT {deleted} AND Timestamp < now() - toIntervalDay({full_days}))"
+    cold = (
+        f"Timestamp < now() - INTERVAL {int(config.cold_after_days)} DAY"
+        if config.cold_volume
+        else "0"
+    )
+    org_filter = "WHERE OrgId = {org_id:String}" if org_id else ""
+    parameters = {"org_id": org_id} if org_id else None
+
+    # The spans table of the connected node, so per shard in cluster mode
+    result = client.query(
+        f"""
+        SELECT
+            OrgId as org_id,
+            count() as spans,
+            sum(byteSize(*)) as bytes,
+            countIf({slimmed}) as slimmed_spans,
+            sumIf(
+                byteSize(SpanAttributes)
+                    - byteSize(mapFilter((k, v) -> {SLIM_ATTRIBUTE_FILTER}, SpanAttributes)),
+                {slimmed}
+            ) as slim_bytes,
+            countIf({deleted}) as deleted_spans,
+            sumIf(byteSize(*), {deleted}) as deleted_bytes,
+            sumIf(byteSize(*), {cold}) as cold_bytes
+        FROM {table} FINAL
+        {org_filter}
+        GROUP BY OrgId
+        ORDER BY bytes DESC
+        """,
+        parameters=parameters,
+    )
+    rows = {
+        row["org_id"]: {
+            "org_id": row["org_id"],
+            "spans": int(row["spans"]),
+            "bytes_on_disk": int(row["bytes"] * ratio),
+            "slimmed_spans": int(row["slimmed_spans"]),
+            "slim_freed_bytes": int(row["slim_bytes"] * attributes_ratio),
+            "deleted_spans": int(row["deleted_spans"]),
+            "delete_freed_bytes": int(row["deleted_bytes"] * ratio),
+            "cold_bytes": int(row["cold_bytes"] * ratio),
+            "contents_bytes": 0,
+            "contents_freed_bytes": 0,
+        }
+        for row in result.named_results()
+    }
+
+    contents_table = local_contents_table(database)
+    contents_ratio, _ = _compression_ratios(client, contents_table, "Content")
+    contents = client.query(
+        f"""
+        SELECT
+            OrgId as org_id,
+            sum(byteSize(*)) as bytes,
+            sumIf(byteSize(*), {contents_ttl_rule(config, overrides)} < now()) as freed_bytes
+        FROM {contents_table} FINAL
+        {org_filter}
+        GROUP BY OrgId
+        """,
+        parameters=parameters,
+    )
+    for row in contents.named_results():
+        org = rows.setdefault(
+            row["org_id"],
+            {
+                "org_id": row["org_id"],
+                "spans": 0,
+                "bytes_on_disk": 0,
+                "slimmed_spans": 0,
+                "slim_freed_bytes": 0,
+                "deleted_spans": 0,
+                "delete_freed_bytes": 0,
+                "cold_bytes": 0,
+            },
+        )
+        org["contents_bytes"] = int(row["bytes"] * contents_ratio)
+        org["contents_freed_bytes"] = int(row["freed_bytes"] * contents_ratio)
+
+    return sorted(
+        rows.values(),
+        key=lambda row: row["bytes_on_disk"] + row["contents_bytes"],
+        reverse=True,
+    )
@@ -6,6 +6,7 @@ migrations and runs pending ones in order.
 
 import importlib.util
 import logging
+import os
 from abc import ABC, abstractmethod
 from pathlib import Path
 
@@ -14,6 +15,43 @@ import clickhouse_connect
 logger = logging.getLogger(__name__)
 
 
+def cluster_name() -> str | None:
+    """Name of the ClickHouse cluster, None in single-node mode."""
+    return os.getenv("ALPHATRION_CLICKHOUSE_CLUSTER_NAME") or None
+
+
+def on_cluster() -> str:
+    """ON CLUSTER clause for DDL, empty in single-node mode."""
+    name = cluster_name()
+    return f"ON CLUSTER {name}" if name else ""
+
+
+def local_spans_table(database: str) -> str:
+    """Table storing the spans.
+
+    In cluster mode otel_spans is a Distributed table over otel_spans_local
+    (see migration 003), so engine level changes like indexes, TTLs and
+    settings must target the local table.
+    """
+    if cluster_name():
+        return f"{database}.otel_spans_local"
+    return f"{database}.otel_spans"
+
+
+def local_contents_table(database: str) -> str:
+    """Table storing the span contents, span_contents_local in cluster mode."""
+    if cluster_name():
+        return f"{database}.span_contents_local"
+    return f"{database}.span_contents"
+
+
+def spans_tables(database: str) -> list[str]:
+    """Tables to alter when changing the span columns, local table first."""
+    if cluster_name():
+        return [f"{database}.otel_spans_local", f"{database}.otel_spans"]
+    return [f"{database}.otel_spans"]
+
+
 class Migration(ABC):
     """Base class for ClickHouse migrations.
 
@@ -0,0 +1,155 @@
+"""Deduplicate otel_spans with ReplacingMergeTree.
+
+Revision: 002
+Created: 2026-10-19
+"""
+import logging
+import os
+
+import clickhouse_connect
+
+from migrations.clickhouse.runner import Migration
+
+logger = logging.getLogger(__name__)
+
+
+class ReplacingOtelSpansTable(Migration):
+    """Make span ingestion idempotent.
+
+       Exporters, the span buffer and the agent hooks deliver spans at least once,
+       so a retried insert must not double count tokens and costs. The table is
+       rebuilt as a ReplacingMergeTree keyed by (TraceId, SpanId), keeping the
+       latest delivery by InsertedAt:
+       - Duplicates share Timestamp, so they always land in the same partition
+       - Reads use FINAL to collapse duplicates not merged yet
+       - Identical retried batches are dropped at insert time via
+         insert_deduplication_token, so most duplicates are never written
+
+       The sorting key can't be altered in place, so the new table is swapped in
+       first (new spans go straight to it) and existing spans are copied afterwards.
+
+       In cluster mode an INSERT ... SELECT only copies the shard of the node
+       running it, so the migration only runs while no node holds spans yet.
+       Otherwise it fails before changing anything, and clusters with spans
+       migrate by hand:
+       1. Run the ALTER, CREATE and EXCHANGE statements below with ON CLUSTER
+       2. On one replica of each shard, run
+          `INSERT INTO otel_spans SELECT * FROM otel_spans_migrating`
+       3. `DROP TABLE otel_spans_migrating ON CLUSTER <cluster> SYNC`
+       4. `INSERT INTO schema_migrations (version) VALUES ('002')`, then
+          migrate again for the following migrations
+    """
+
+    version = "002"
+    name = "replacing_otel_spans_table"
+
+    def upgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Rebuild otel_spans as a ReplacingMergeTree."""
+        logger.info("Rebuilding otel_spans as ReplacingMergeTree")
+
+        cluster_name = os.getenv("ALPHATRION_CLICKHOUSE_CLUSTER_NAME")
+        if cluster_name:
+            spans = self._cluster_spans(client, database, cluster_name, "otel_spans")
+            if spans:
+                raise RuntimeError(
+                    f"otel_spans holds {spans} spans across cluster {cluster_name}, "
+                    "they can't be copied shard by shard from this node. Migrate "
+                    "by hand as described in migration 002."
+                )
+            engine = (
+                "ReplicatedReplacingMergeTree("
+                "'/clickhouse/tables/{shard}/otel_spans_replacing', '{replica}', InsertedAt)"
+            )
+            on_cluster = f"ON CLUSTER {cluster_name}"
+        else:
+            engine = "ReplacingMergeTree(InsertedAt)"
+            on_cluster = ""
+
+        # Version column for ReplacingMergeTree, the latest delivery of a span wins
+        client.command(f"""
+            ALTER TABLE {database}.otel_spans {on_cluster}
+            ADD COLUMN IF NOT EXISTS InsertedAt DateTime64(3) DEFAULT now64(3) CODEC(Delta, ZSTD(1))
+        """)
+
+        client.command(f"""
+            CREATE TABLE IF NOT EXISTS {database}.otel_spans_migrating {on_cluster}
+            AS {database}.otel_spans
+            ENGINE = {engine}
+            PARTITION BY toYYYYMM(Timestamp)
+            ORDER BY (OrgId, TeamId, Timestamp, TraceId, SpanId)
+            SETTINGS index_granularity = 8192, non_replicated_deduplication_window = 1000
+        """)
+
+        client.command(
+            f"EXCHANGE TABLES {database}.otel_spans AND {database}.otel_spans_migrating {on_cluster}"
+        )
+        if not cluster_name:
+            logger.info("✓ ReplacingMergeTree table swapped in, copying existing spans")
+            client.command(
+                f"INSERT INTO {database}.otel_spans SELECT * FROM {database}.otel_spans_migrating"
+            )
+            client.command(f"DROP TABLE IF EXISTS {database}.otel_spans_migrating SYNC")
+        elif self._cluster_spans(client, database, cluster_name, "otel_spans_migrating"):
+            # Spans written before the swap, copy them by hand (step 2 above)
+            logger.warning(
+                f"Spans were written during the migration, keeping "
+                f"{database}.otel_spans_migrating, see migration 002 to copy them"
+            )
+        else:
+            client.command(
+                f"DROP TABLE IF EXISTS {database}.otel_spans_migrating {on_cluster} SYNC"
+            )
+
+        logger.info(f"✓ Table {database}.otel_spans now deduplicates spans")
+
+    @staticmethod
+    def _cluster_spans(
+        client: clickhouse_connect.driver.Client, database: str, cluster_name: str, table: str
+    ) -> int:
+        """Number of spans in a table, over one replica of every shard."""
+        return client.query(
+            f"SELECT count() FROM cluster('{cluster_name}', {database}.{table})"
+        ).result_rows[0][0]
+
+    def downgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Rebuild otel_spans as a plain MergeTree."""
+        logger.info("Rebuilding otel_spans as MergeTree")
+
+        cluster_name = os.getenv("ALPHATRION_CLICKHOUSE_CLUSTER_NAME")
+        if cluster_name:
+            spans = self._cluster_spans(client, database, cluster_name, "otel_spans")
+            if spans:
+                raise RuntimeError(
+                    f"otel_spans holds {spans} spans across cluster {cluster_name}, "
+                    "they can't be copied shard by shard from this node"
+                )
+            engine = "ReplicatedMergeTree('/clickhouse/tables/{shard}/otel_spans_merge', '{replica}')"
+            on_cluster = f"ON CLUSTER {cluster_name}"
+        else:
+            engine = "MergeTree()"
+            on_cluster = ""
+
+        client.command(f"""
+            CREATE TABLE IF NOT EXISTS {database}.otel_spans_migrating {on_cluster}
+            AS {database}.otel_spans
+            ENGINE = {engine}
+            PARTITION BY toYYYYMM(Timestamp)
+            ORDER BY (OrgId, TeamId, Timestamp)
+            SETTINGS index_granularity = 8192
+        """)
+        client.command(
+            f"EXCHANGE TABLES {database}.otel_spans AND {database}.otel_spans_migrating {on_cluster}"
+        )
+        client.command(
+            f"INSERT INTO {database}.otel_spans SELECT * FROM {database}.otel_spans_migrating FINAL"
+        )
+        client.command(f"DROP TABLE IF EXISTS {database}.otel_spans_migrating {on_cluster} SYNC")
+        client.command(
+            f"ALTER TABLE {database}.otel_spans {on_cluster} DROP COLUMN IF EXISTS InsertedAt"
+        )
+
+        logger.info("✓ Table rebuilt")
+
+
+# Export migration instance
+migration = ReplacingOtelSpansTable()
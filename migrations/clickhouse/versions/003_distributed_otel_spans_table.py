@@ -0,0 +1,77 @@
+"""Shard otel_spans across the cluster with a Distributed table.
+
+Revision: 003
+Created: 2026-10-19
+"""
+import logging
+
+import clickhouse_connect
+
+from migrations.clickhouse.runner import Migration, cluster_name
+
+logger = logging.getLogger(__name__)
+
+
+class DistributedOtelSpansTable(Migration):
+    """Spread spans over the shards of the cluster.
+
+       The replicated table is renamed to otel_spans_local and otel_spans becomes
+       a Distributed table over it, sharded by cityHash64(OrgId, TeamId):
+       - Queries and inserts keep using otel_spans, on any node of the cluster
+       - A team's spans, and so all duplicates of a span, live on one shard, so
+         FINAL and team-scoped aggregations are answered by that shard alone
+       - Column changes must be applied to both tables, engine level changes
+         (indexes, TTLs, settings) to otel_spans_local only
+
+       Spans written before stay on the shard of the node that received them,
+       which isn't necessarily their team's shard, and queries only ask the
+       team's shard. On clusters with several shards and existing spans,
+       re-insert them once through otel_spans, e.g. by moving the old
+       partitions of each shard into a staging table and running
+       `INSERT INTO otel_spans SELECT * FROM staging`.
+
+       Nothing changes in single-node mode.
+    """
+
+    version = "003"
+    name = "distributed_otel_spans_table"
+
+    def upgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Put a Distributed table in front of the replicated otel_spans."""
+        cluster = cluster_name()
+        if not cluster:
+            logger.info("Single-node mode, otel_spans stays a local table")
+            return
+
+        logger.info(f"Sharding otel_spans across cluster {cluster}")
+        client.command(
+            f"RENAME TABLE {database}.otel_spans TO {database}.otel_spans_local "
+            f"ON CLUSTER {cluster}"
+        )
+        client.command(f"""
+            CREATE TABLE IF NOT EXISTS {database}.otel_spans ON CLUSTER {cluster}
+            AS {database}.otel_spans_local
+            ENGINE = Distributed({cluster}, {database}, otel_spans_local, cityHash64(OrgId, TeamId))
+        """)
+
+        logger.info(f"✓ Table {database}.otel_spans now distributes spans by team")
+
+    def downgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Drop the Distributed table and restore the replicated otel_spans."""
+        cluster = cluster_name()
+        if not cluster:
+            return
+
+        logger.info("Dropping Distributed otel_spans table")
+        client.command(
+            f"DROP TABLE IF EXISTS {database}.otel_spans ON CLUSTER {cluster} SYNC"
+        )
+        client.command(
+            f"RENAME TABLE {database}.otel_spans_local TO {database}.otel_spans "
+            f"ON CLUSTER {cluster}"
+        )
+        logger.info("✓ Table restored")
+
+
+# Export migration instance
+migration = DistributedOtelSpansTable()
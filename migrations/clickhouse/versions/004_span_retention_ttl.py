@@ -0,0 +1,130 @@
+"""Add TTL based retention and tiered storage to otel_spans.
+
+Revision: 004
+Created: 2026-10-19
+"""
+import logging
+import os
+
+import clickhouse_connect
+
+from migrations.clickhouse.runner import (
+    Migration,
+    cluster_name,
+    local_spans_table,
+    on_cluster,
+)
+
+logger = logging.getLogger(__name__)
+
+# Attributes kept by slim spans when this migration was written, later
+# changes are applied by `retention apply`
+SLIM_ATTRIBUTE_FILTER = (
+    "startsWith(k, 'gen_ai.usage.') OR startsWith(k, 'alphatrion.cost.') "
+    "OR startsWith(k, 'gen_ai.system') OR startsWith(k, 'gen_ai.request.model') "
+    "OR startsWith(k, 'gen_ai.response.model') OR startsWith(k, 'llm.request.type') "
+    "OR startsWith(k, 'traceloop.span.kind') OR startsWith(k, 'traceloop.entity.name') "
+    "OR startsWith(k, 'traceloop.workflow.name')"
+)
+
+
+class SpanRetentionTTL(Migration):
+    """Bound how long spans, and their large attributes, are kept.
+
+       See migrations/clickhouse/retention.py for the rules. Defaults come from
+       the environment when the migration runs. Per org overrides are kept in
+       the span_retention table, `python -m migrations.clickhouse.cli
+       retention set` adds them to the rules and `retention apply` re-applies
+       changed defaults. TTL expressions must be deterministic, so the rules
+       list overridden orgs rather than looking them up in a dictionary.
+
+       Moving parts to a cold volume needs a storage policy with that volume,
+       set ALPHATRION_CLICKHOUSE_STORAGE_POLICY to switch the table to it. The
+       policy must keep the current disks, i.e. extend the default policy.
+    """
+
+    version = "004"
+    name = "span_retention_ttl"
+
+    def upgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Create the retention table and set the TTL rules."""
+        logger.info("Adding span retention TTL rules")
+
+        if cluster_name():
+            # Same rows on every node, whatever its shard
+            engine = (
+                "ReplicatedReplacingMergeTree("
+                "'/clickhouse/tables/all/span_retention', '{replica}', UpdatedAt)"
+            )
+        else:
+            engine = "ReplacingMergeTree(UpdatedAt)"
+        client.command(f"""
+            CREATE TABLE IF NOT EXISTS {database}.span_retention {on_cluster()} (
+                OrgId String,
+                FullDays UInt32,
+                RetentionDays UInt32,
+                UpdatedAt DateTime DEFAULT now()
+            ) ENGINE = {engine}
+            ORDER BY OrgId
+        """)
+        # Left behind by an earlier version of this migration, whose TTL
+        # rules ClickHouse rejected
+        client.command(
+            f"DROP DICTIONARY IF EXISTS {database}.span_retention_dict {on_cluster()}"
+        )
+
+        storage_policy = os.getenv("ALPHATRION_CLICKHOUSE_STORAGE_POLICY")
+        if storage_policy:
+            client.command(
+                f"ALTER TABLE {local_spans_table(database)} {on_cluster()} "
+                f"MODIFY SETTING storage_policy = '{storage_policy}'"
+            )
+            logger.info(f"✓ Using storage policy {storage_policy}")
+
+        full_days = int(os.getenv("ALPHATRION_SPAN_FULL_DAYS", "30"))
+        retention_days = int(os.getenv("ALPHATRION_SPAN_RETENTION_DAYS", "0"))
+        cold_volume = os.getenv("ALPHATRION_CLICKHOUSE_COLD_VOLUME")
+        cold_after_days = int(os.getenv("ALPHATRION_SPAN_COLD_AFTER_DAYS", "30"))
+
+        # Defaults only, `retention set` adds the org overrides
+        rules = [
+            # One group per span, so this only rewrites the attributes. Columns
+            # nesting LowCardinality are set explicitly, their implicit any()
+            # fails the merge
+            f"""toDateTime(Timestamp) + toIntervalDay({full_days})
+                GROUP BY OrgId, TeamId, Timestamp, TraceId, SpanId
+                SET SpanAttributes = mapFilter((k, v) -> {SLIM_ATTRIBUTE_FILTER}, any(SpanAttributes)),
+                    InsertedAt = max(InsertedAt),
+                    ResourceAttributes = any(ResourceAttributes),
+                    `Events.Name` = any(`Events.Name`),
+                    `Events.Attributes` = any(`Events.Attributes`),
+                    `Links.Attributes` = any(`Links.Attributes`)""",
+        ]
+        if cold_volume:
+            rules.append(
+                f"toDateTime(Timestamp) + INTERVAL {cold_after_days} DAY "
+                f"TO VOLUME '{cold_volume}'"
+            )
+        if retention_days:
+            rules.append(
+                f"toDateTime(Timestamp) + toIntervalDay({retention_days}) DELETE"
+            )
+        client.command(
+            f"ALTER TABLE {local_spans_table(database)} {on_cluster()} "
+            f"MODIFY TTL {', '.join(rules)}",
+            settings={"materialize_ttl_after_modify": 0},
+        )
+        logger.info(
+            f"✓ Spans kept in full for {full_days} days, "
+            + (f"deleted after {retention_days} days" if retention_days else "never deleted")
+        )
+
+    def downgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Remove the TTL rules and the retention table."""
+        client.command(f"ALTER TABLE {local_spans_table(database)} {on_cluster()} REMOVE TTL")
+        client.command(f"DROP TABLE IF EXISTS {database}.span_retention {on_cluster()} SYNC")
+        logger.info("✓ Span retention removed")
+
+
+# Export migration instance
+migration = SpanRetentionTTL()
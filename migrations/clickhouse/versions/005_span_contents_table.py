@@ -0,0 +1,85 @@
+"""Create span_contents table for large attribute values.
+
+Revision: 005
+Created: 2026-10-19
+"""
+import logging
+
+import clickhouse_connect
+
+from migrations.clickhouse.runner import Migration, cluster_name
+
+logger = logging.getLogger(__name__)
+
+
+class SpanContentsTable(Migration):
+    """Store large span attribute values once, keyed by their hash.
+
+       See alphatrion/storage/span_contents.py. Contents are scoped by team and
+       sharded like the spans, so they live on the shard of the spans
+       referencing them. Repeated inserts of a content collapse on merge.
+
+       Contents aren't removed with the spans referencing them, a content may
+       still be referenced by newer spans than the one that wrote it. Migration
+       008 expires them by their last use instead.
+    """
+
+    version = "005"
+    name = "span_contents_table"
+
+    def upgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Create span_contents table."""
+        logger.info("Creating span_contents table")
+
+        cluster = cluster_name()
+        if cluster:
+            engine = (
+                "ReplicatedReplacingMergeTree("
+                "'/clickhouse/tables/{shard}/span_contents', '{replica}', InsertedAt)"
+            )
+            table = f"{database}.span_contents_local ON CLUSTER {cluster}"
+        else:
+            engine = "ReplacingMergeTree(InsertedAt)"
+            table = f"{database}.span_contents"
+
+        client.command(f"""
+            CREATE TABLE IF NOT EXISTS {table} (
+                OrgId String CODEC(ZSTD(1)),
+                TeamId String CODEC(ZSTD(1)),
+                Hash String CODEC(ZSTD(1)),
+                Content String CODEC(ZSTD(3)),
+                InsertedAt DateTime DEFAULT now() CODEC(Delta, ZSTD(1))
+            ) ENGINE = {engine}
+            ORDER BY (OrgId, TeamId, Hash)
+            SETTINGS index_granularity = 1024, non_replicated_deduplication_window = 1000
+        """)
+
+        if cluster:
+            # Sharded like otel_spans, contents live on the shard of their spans
+            client.command(f"""
+                CREATE TABLE IF NOT EXISTS {database}.span_contents ON CLUSTER {cluster}
+                AS {database}.span_contents_local
+                ENGINE = Distributed({cluster}, {database}, span_contents_local, cityHash64(OrgId, TeamId))
+            """)
+
+        logger.info(f"✓ Table {database}.span_contents created")
+
+    def downgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Drop span_contents table.
+
+        Spans written meanwhile keep their references, restore the contents
+        before downgrading if they're needed.
+        """
+        cluster = cluster_name()
+        if cluster:
+            client.command(f"DROP TABLE IF EXISTS {database}.span_contents ON CLUSTER {cluster} SYNC")
+            client.command(
+                f"DROP TABLE IF EXISTS {database}.span_contents_local ON CLUSTER {cluster} SYNC"
+            )
+        else:
+            client.command(f"DROP TABLE IF EXISTS {database}.span_contents SYNC")
+        logger.info("✓ Table dropped")
+
+
+# Export migration instance
+migration = SpanContentsTable()
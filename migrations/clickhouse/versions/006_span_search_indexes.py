@@ -0,0 +1,95 @@
+"""Add skip indexes for full-text search of spans.
+
+Revision: 006
+Created: 2026-10-19
+"""
+import logging
+
+import clickhouse_connect
+
+from migrations.clickhouse.runner import (
+    Migration,
+    local_contents_table,
+    local_spans_table,
+    on_cluster,
+)
+
+logger = logging.getLogger(__name__)
+
+# SEARCH_TEXT_EXPR and CONTENT_REFS_EXPR of alphatrion/storage/tracestore.py
+# when this migration was written. Queries only use an index built on the
+# exact same expression, changing them needs a new migration.
+SEARCH_TEXT_EXPR = (
+    "lowerUTF8(concat(StatusMessage, ' ', arrayStringConcat(mapValues(mapFilter((k, v) -> "
+    "startsWith(k, 'gen_ai.prompt.') OR startsWith(k, 'gen_ai.completion.') "
+    "OR startsWith(k, 'traceloop.entity.input') OR startsWith(k, 'traceloop.entity.output') "
+    "OR startsWith(k, 'exception.message'), SpanAttributes)), ' ')))"
+)
+CONTENT_REFS_EXPR = (
+    "arrayFilter(v -> startsWith(v, 'alphatrion.content:'), mapValues(SpanAttributes))"
+)
+
+
+class SpanSearchIndexes(Migration):
+    """Index the text searched by TraceStore.search_spans.
+
+       - idx_search_text: ngram bloom filter over the lowercased StatusMessage
+         and prompt/completion attribute values (SEARCH_TEXT_EXPR), so a LIKE
+         '%term%' only reads the granules that may contain every 3-gram of term
+       - idx_content_refs: bloom filter over the span_contents references of a
+         span, so spans referencing a matching content are found without
+         reading their attributes
+       - idx_content_text: ngram bloom filter over the lowercased span_contents
+
+       Parts written before the migration are indexed by a background mutation,
+       search works meanwhile but skips fewer granules until it's done.
+    """
+
+    version = "006"
+    name = "span_search_indexes"
+
+    def upgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Add and materialize the search indexes."""
+        logger.info("Adding span search indexes")
+
+        spans = local_spans_table(database)
+        contents = local_contents_table(database)
+        indexes = [
+            (
+                spans,
+                "idx_search_text",
+                f"{SEARCH_TEXT_EXPR} TYPE ngrambf_v1(3, 65536, 3, 0) GRANULARITY 1",
+            ),
+            (
+                spans,
+                "idx_content_refs",
+                f"{CONTENT_REFS_EXPR} TYPE bloom_filter(0.01) GRANULARITY 1",
+            ),
+            (
+                contents,
+                "idx_content_text",
+                "lowerUTF8(Content) TYPE ngrambf_v1(3, 65536, 3, 0) GRANULARITY 1",
+            ),
+        ]
+        for table, index, definition in indexes:
+            client.command(
+                f"ALTER TABLE {table} {on_cluster()} ADD INDEX IF NOT EXISTS {index} {definition}"
+            )
+            client.command(f"ALTER TABLE {table} {on_cluster()} MATERIALIZE INDEX {index}")
+
+        logger.info("✓ Search indexes added, existing parts are indexed in the background")
+
+    def downgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Drop the search indexes."""
+        spans = local_spans_table(database)
+        for index in ("idx_search_text", "idx_content_refs"):
+            client.command(f"ALTER TABLE {spans} {on_cluster()} DROP INDEX IF EXISTS {index}")
+        client.command(
+            f"ALTER TABLE {local_contents_table(database)} {on_cluster()} "
+            "DROP INDEX IF EXISTS idx_content_text"
+        )
+        logger.info("✓ Search indexes dropped")
+
+
+# Export migration instance
+migration = SpanSearchIndexes()
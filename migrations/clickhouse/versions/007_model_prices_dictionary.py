@@ -0,0 +1,85 @@
+"""Add the model prices dictionary for costs computed at query time.
+
+Revision: 007
+Created: 2026-10-19
+"""
+import logging
+
+import clickhouse_connect
+
+from migrations.clickhouse.runner import Migration, cluster_name, on_cluster
+
+logger = logging.getLogger(__name__)
+
+
+class ModelPricesDictionary(Migration):
+    """Keep versioned model prices in ClickHouse.
+
+       See migrations/clickhouse/pricing.py. The migration creates an empty
+       prices table, `python -m migrations.clickhouse.cli pricing sync` fills
+       it from config/modelspec.yaml. Cost aggregates use it with
+       ALPHATRION_COST_PRICING=current.
+    """
+
+    version = "007"
+    name = "model_prices_dictionary"
+
+    def upgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Create the prices table and the dictionary cost aggregates read it through."""
+        logger.info("Adding model prices dictionary")
+        if cluster_name():
+            # Same rows on every node, whatever its shard
+            engine = (
+                "ReplicatedReplacingMergeTree("
+                "'/clickhouse/tables/all/model_prices', '{replica}', UpdatedAt)"
+            )
+        else:
+            engine = "ReplacingMergeTree(UpdatedAt)"
+
+        client.command(f"""
+            CREATE TABLE IF NOT EXISTS {database}.model_prices {on_cluster()} (
+                Model String,
+                EffectiveFrom Date,
+                InputPrice Float64,
+                OutputPrice Float64,
+                CacheReadPrice Float64,
+                CacheCreationPrice Float64,
+                UpdatedAt DateTime DEFAULT now()
+            ) ENGINE = {engine}
+            ORDER BY (Model, EffectiveFrom)
+        """)
+        # Open ended ranges, the 'max' strategy picks the latest version
+        # effective on the looked up date
+        client.command(f"""
+            CREATE DICTIONARY IF NOT EXISTS {database}.model_prices_dict {on_cluster()} (
+                Model String,
+                EffectiveFrom Date,
+                EffectiveTo Date,
+                InputPrice Float64,
+                OutputPrice Float64,
+                CacheReadPrice Float64,
+                CacheCreationPrice Float64
+            )
+            PRIMARY KEY Model
+            SOURCE(CLICKHOUSE(
+                -- Local source without host or credentials, none end up in the DDL
+                QUERY 'SELECT Model, EffectiveFrom, toDate(\\'2149-06-06\\') AS EffectiveTo, InputPrice, OutputPrice, CacheReadPrice, CacheCreationPrice FROM {database}.model_prices FINAL'
+            ))
+            LIFETIME(MIN 60 MAX 300)
+            LAYOUT(COMPLEX_KEY_RANGE_HASHED(range_lookup_strategy 'max'))
+            RANGE(MIN EffectiveFrom MAX EffectiveTo)
+        """)
+        logger.info(
+            "✓ Model prices dictionary added, run "
+            "`python -m migrations.clickhouse.cli pricing sync` to load the prices"
+        )
+
+    def downgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Drop the prices dictionary and table."""
+        client.command(f"DROP DICTIONARY IF EXISTS {database}.model_prices_dict {on_cluster()}")
+        client.command(f"DROP TABLE IF EXISTS {database}.model_prices {on_cluster()} SYNC")
+        logger.info("✓ Model prices dictionary dropped")
+
+
+# Export migration instance
+migration = ModelPricesDictionary()
@@ -0,0 +1,65 @@
+"""Expire span contents no full span references anymore.
+
+Revision: 008
+Created: 2026-10-19
+"""
+import logging
+import os
+
+import clickhouse_connect
+
+from migrations.clickhouse.runner import Migration, local_contents_table, on_cluster
+
+logger = logging.getLogger(__name__)
+
+
+class SpanContentsTTL(Migration):
+    """Delete span contents along with the full spans referencing them.
+
+       Only full spans reference contents, slim spans drop those attributes.
+       TraceStore writes a content again at least once a day while spans
+       reference it, so InsertedAt is its last use and contents expire a few
+       days after their org's full days past it, the rule contents_ttl_rule
+       of migrations/clickhouse/retention.py generated when this migration
+       was written. TTL expressions must be deterministic, so orgs overriding
+       their full days in span_retention are listed in the rule. `retention
+       set` and `retention apply` rebuild it later.
+    """
+
+    version = "008"
+    name = "span_contents_ttl"
+
+    def upgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Set the TTL rule of span_contents."""
+        logger.info("Adding span contents TTL rule")
+        full_days = int(os.getenv("ALPHATRION_SPAN_FULL_DAYS", "30"))
+        org_full_days = f"toUInt32({full_days})"
+        overrides = client.query(
+            f"SELECT OrgId, FullDays FROM {database}.span_retention FINAL"
+        ).result_rows
+        if overrides:
+            orgs = ", ".join(
+                "'" + org_id.replace("\\", "\\\\").replace("'", "\\'") + "'"
+                for org_id, _ in overrides
+            )
+            days = ", ".join(str(int(days)) for _, days in overrides)
+            org_full_days = f"transform(OrgId, [{orgs}], [{days}], {org_full_days})"
+        # Two days of grace past the org's full days, for contents whose
+        # daily refresh is late
+        client.command(
+            f"ALTER TABLE {local_contents_table(database)} {on_cluster()} "
+            f"MODIFY TTL InsertedAt + toIntervalDay({org_full_days} + 2)",
+            settings={"materialize_ttl_after_modify": 0},
+        )
+        logger.info(f"✓ Contents kept for {full_days} days past their last use")
+
+    def downgrade(self, client: clickhouse_connect.driver.Client, database: str) -> None:
+        """Remove the TTL rule of span_contents."""
+        client.command(
+            f"ALTER TABLE {local_contents_table(database)} {on_cluster()} REMOVE TTL"
+        )
+        logger.info("✓ Span contents TTL removed")
+
+
+# Export migration instance
+migration = SpanContentsTTL()
@@ -5,7 +5,7 @@
 import asyncio
 import os
 import uuid
-from datetime import datetime, timedelta
+from datetime import UTC, datetime, timedelta
 
 import pytest
 from openai import OpenAI
@@ -387,6 +387,311 @@ async def test_query_single_run(
     assert obj.meta is None
 
 
+@pytest.mark.asyncio
+async def test_query_run_spans_paginated(
+    execute_graphql, test_org_id, test_user_id, test_team_id
+):
+    init(team_id=test_team_id, user_id=test_user_id)
+
+    async with CraftExperiment.start(
+        name="Test Experiment",
+    ) as exp:
+        run = exp.run(create_joke)
+        run_id = run.id
+        await exp.wait()
+
+    def spans_page(after: str | None):
+        after_arg = f', after: "{after}"' if after else ""
+        response = execute_graphql(
+            query=f"""
+            query {{
+                spansByRunId(runId: "{run_id}", limit: 1, summary: true{after_arg}) {{
+                    traceId
+                    spanId
+                    teamId
+                    cursor
+                }}
+            }}
+            """,
+            org_id=test_org_id,
+            user_id=test_user_id,
+        )
+        assert response.errors is None
+        return response.data["spansByRunId"]
+
+    all_spans = execute_graphql(
+        query=f'query {{ spansByRunId(runId: "{run_id}") {{ spanId }} }}',
+        org_id=test_org_id,
+        user_id=test_user_id,
+    ).data["spansByRunId"]
+    assert len(all_spans) > 1
+
+    paged = []
+    after = None
+    while page := spans_page(after):
+        assert len(page) == 1
+        paged.extend(page)
+        after = page[-1]["cursor"]
+    assert sorted(s["spanId"] for s in paged) == sorted(s["spanId"] for s in all_spans)
+
+    # Full attributes are loaded on demand per span
+    first = paged[0]
+    response = execute_graphql(
+        query=f"""
+        query {{
+            span(teamId: "{first["teamId"]}", traceId: "{first["traceId"]}", spanId: "{first["spanId"]}") {{
+                spanId
+                spanAttributes
+            }}
+        }}
+        """,
+        org_id=test_org_id,
+        user_id=test_user_id,
+    )
+    assert response.errors is None
+    assert response.data["span"]["spanId"] == first["spanId"]
+
+
+@pytest.mark.asyncio
+async def test_query_experiment_span_profile(
+    execute_graphql, test_org_id, test_user_id, test_team_id
+):
+    init(team_id=test_team_id, user_id=test_user_id)
+
+    async with CraftExperiment.start(
+        name="Test Experiment",
+    ) as exp:
+        exp.run(create_joke)
+        exp.run(create_joke)
+        exp_id = exp.id
+        await exp.wait()
+
+    response = execute_graphql(
+        query=f"""
+        query {{
+            experiment(id: "{exp_id}") {{
+                spanProfile {{
+                    spanName
+                    semanticKind
+                    parentPath
+                    count
+                    totalDuration
+                    selfDuration
+                    p50
+                    p95
+                    p99
+                }}
+            }}
+        }}
+        """,
+        org_id=test_org_id,
+        user_id=test_user_id,
+    )
+
+    assert response.errors is None
+    profile = response.data["experiment"]["spanProfile"]
+    assert len(profile) > 0
+    # Both runs execute the same steps, so they're aggregated together
+    assert max(entry["count"] for entry in profile) >= 2
+    for entry in profile:
+        assert entry["selfDuration"] <= entry["totalDuration"]
+        assert entry["p50"] <= entry["p99"]
+
+
+@pytest.mark.asyncio
+async def test_query_latency_percentiles(
+    execute_graphql, test_org_id, test_user_id, test_team_id
+):
+    init(team_id=test_team_id, user_id=test_user_id)
+
+    async with CraftExperiment.start(
+        name="Test Experiment",
+    ) as exp:
+        exp.run(create_joke)
+        exp_id = exp.id
+        await exp.wait()
+
+    response = execute_graphql(
+        query=f"""
+        query {{
+            team(id: "{test_team_id}") {{
+                latencyPercentiles(groupBy: MODEL) {{
+                    key
+                    count
+                    p50
+                    p99
+                    tokensPerSecond
+                }}
+            }}
+            experiment(id: "{exp_id}") {{
+                latencyPercentiles(groupBy: SPAN_NAME) {{
+                    key
+                    count
+                    p50
+                    p95
+                }}
+            }}
+        }}
+        """,
+        org_id=test_org_id,
+        user_id=test_user_id,
+    )
+
+    assert response.errors is None
+    by_model = response.data["team"]["latencyPercentiles"]
+    assert len(by_model) > 0
+    assert all(stats["p50"] <= stats["p99"] for stats in by_model)
+    by_span_name = response.data["experiment"]["latencyPercentiles"]
+    assert len(by_span_name) > 0
+    assert sum(stats["count"] for stats in by_span_name) > 0
+
+
+@pytest.mark.asyncio
+async def test_query_cost_usage(
+    execute_graphql, test_org_id, test_user_id, test_team_id
+):
+    init(team_id=test_team_id, user_id=test_user_id)
+
+    async with CraftExperiment.start(
+        name="Test Experiment",
+    ) as exp:
+        exp.run(create_joke)
+        await exp.wait()
+
+    now = datetime.now(UTC)
+    start = (now - timedelta(hours=5)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    end = (now + timedelta(minutes=1)).strftime("%Y-%m-%dT%H:%M:%SZ")
+    response = execute_graphql(
+        query=f"""
+        query {{
+            costUsage(teamId: "{test_team_id}", startTime: "{start}", endTime: "{end}", bucket: HOUR) {{
+                bucket
+                totalCost
+                totalTokens
+            }}
+            team(id: "{test_team_id}") {{
+                aggregatedUsage(startTime: "{start}", endTime: "{end}") {{
+                    totalTokens
+                }}
+            }}
+        }}
+        """,
+        org_id=test_org_id,
+        user_id=test_user_id,
+    )
+
+    assert response.errors is None
+    usage = response.data["costUsage"]
+    # Empty hours are filled in, so the series covers the whole range
+    assert len(usage) >= 5
+    assert (
+        sum(u["totalTokens"] for u in usage)
+        == (response.data["team"]["aggregatedUsage"]["totalTokens"])
+    )
+
+
+@pytest.mark.asyncio
+async def test_query_team_overview(
+    execute_graphql, test_org_id, test_user_id, test_team_id
+):
+    init(team_id=test_team_id, user_id=test_user_id)
+
+    async with CraftExperiment.start(
+        name="Test Experiment",
+    ) as exp:
+        exp.run(create_joke)
+        await exp.wait()
+
+    response = execute_graphql(
+        query=f"""
+        query {{
+            teamOverview(teamId: "{test_team_id}", days: 7) {{
+                usage {{
+                    totalTokens
+                    totalCost
+                }}
+                modelDistributions {{
+                    model
+                    count
+                }}
+                costUsage {{
+                    bucket
+                    totalTokens
+                }}
+                traceStats {{
+                    totalSpans
+                    successSpans
+                    errorSpans
+                }}
+            }}
+            team(id: "{test_team_id}") {{
+                modelDistributions {{
+                    model
+                    count
+                }}
+            }}
+        }}
+        """,
+        org_id=test_org_id,
+        user_id=test_user_id,
+    )
+
+    assert response.errors is None
+    overview = response.data["teamOverview"]
+    # One bucket per day, including the empty ones
+    assert len(overview["costUsage"]) == 7
+    assert overview["usage"]["totalTokens"] > 0
+    assert (
+        sum(u["totalTokens"] for u in overview["costUsage"])
+        == overview["usage"]["totalTokens"]
+    )
+    by_model = sorted(overview["modelDistributions"], key=lambda d: d["model"])
+    assert by_model == sorted(
+        response.data["team"]["modelDistributions"], key=lambda d: d["model"]
+    )
+    stats = overview["traceStats"]
+    assert stats["totalSpans"] >= stats["successSpans"] + stats["errorSpans"]
+    assert stats["totalSpans"] > 0
+
+
+@pytest.mark.asyncio
+async def test_search_spans(execute_graphql, test_org_id, test_user_id, test_team_id):
+    init(team_id=test_team_id, user_id=test_user_id)
+
+    async with CraftExperiment.start(
+        name="Test Experiment",
+    ) as exp:
+        exp.run(create_joke)
+        await exp.wait()
+
+    response = execute_graphql(
+        query=f"""
+        query {{
+            found: searchSpans(teamId: "{test_team_id}", query: "JOKE OpenTelemetry") {{
+                spanId
+                spanAttributes
+            }}
+            missing: searchSpans(teamId: "{test_team_id}", query: "joke 100%") {{
+                spanId
+            }}
+        }}
+        """,
+        org_id=test_org_id,
+        user_id=test_user_id,
+    )
+
+    assert response.errors is None
+    found = response.data["found"]
+    assert len(found) > 0
+    for span in found:
+        assert any(
+            "opentelemetry" in value.lower()
+            for value in span["spanAttributes"].values()
+        )
+    # Wildcards are matched literally
+    assert response.data["missing"] == []
+
+
 def test_query_runs(execute_graphql, test_org_id, test_user_id, test_team_id):
     runtime.init()
     metadb = runtime.storage_runtime().metadb
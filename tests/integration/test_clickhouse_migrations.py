@@ -0,0 +1,164 @@
+# Run the ClickHouse migrations against a real server, see migrations/clickhouse
+
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+
+import pytest
+
+from alphatrion.storage.tracestore import PRICING_CURRENT, cost_expr
+from migrations.clickhouse import pricing, retention
+from migrations.clickhouse.cli import get_client
+from migrations.clickhouse.runner import ClickHouseMigrationRunner
+
+VERSIONS_DIR = Path(__file__).parents[2] / "migrations" / "clickhouse" / "versions"
+
+
+@pytest.fixture(scope="module")
+def database():
+    client = get_client()
+    # A database of its own, so the migrations run from scratch
+    database = f"alphatrion_migrations_{uuid.uuid4().hex[:8]}"
+    client.command(f"CREATE DATABASE {database}")
+    ClickHouseMigrationRunner(client, database).run_pending_migrations(VERSIONS_DIR)
+
+    yield client, database
+
+    client.command(f"DROP DATABASE IF EXISTS {database} SYNC")
+
+
+def _table_ttl(client, database: str, table: str) -> str:
+    return client.query(
+        "SELECT create_table_query FROM system.tables "
+        "WHERE database = {database:String} AND name = {table:String}",
+        parameters={"database": database, "table": table},
+    ).first_row[0]
+
+
+def test_migrations_set_retention_ttl(database):
+    client, db = database
+
+    ttl = _table_ttl(client, db, "otel_spans")
+    assert "TTL" in ttl
+    assert "GROUP BY OrgId, TeamId, Timestamp, TraceId, SpanId" in ttl
+    assert "TTL InsertedAt + toIntervalDay(toUInt32(30) + 2)" in _table_ttl(
+        client, db, "span_contents"
+    )
+
+
+def test_org_retention_slims_and_deletes_spans(database):
+    client, db = database
+    org_id = str(uuid.uuid4())
+    other_org_id = str(uuid.uuid4())
+    retention.set_org_retention(
+        client, db, retention.RetentionConfig(), org_id, full_days=5, retention_days=8
+    )
+    assert org_id in _table_ttl(client, db, "otel_spans")
+
+    now = datetime.now()
+    attributes = {"gen_ai.usage.input_tokens": "10", "gen_ai.prompt.0.content": "hi"}
+    rows = [
+        [
+            now - timedelta(days=days),
+            f"trace-{days}",
+            f"span-{days}",
+            org,
+            "team",
+            attributes,
+        ]
+        for org in (org_id, other_org_id)
+        for days in (1, 6, 10)
+    ]
+    client.insert(
+        f"{db}.otel_spans",
+        rows,
+        column_names=[
+            "Timestamp",
+            "TraceId",
+            "SpanId",
+            "OrgId",
+            "TeamId",
+            "SpanAttributes",
+        ],
+    )
+    client.command(f"OPTIMIZE TABLE {db}.otel_spans FINAL")
+
+    spans = {
+        (org, trace_id): span_attributes
+        for org, trace_id, span_attributes in client.query(
+            f"SELECT OrgId, TraceId, SpanAttributes FROM {db}.otel_spans"
+        ).result_rows
+    }
+    # Overridden org: full for 5 days, slim until 8, then deleted
+    assert spans[(org_id, "trace-1")] == attributes
+    assert spans[(org_id, "trace-6")] == {"gen_ai.usage.input_tokens": "10"}
+    assert (org_id, "trace-10") not in spans
+    # Other orgs keep the defaults, 30 full days and no deletion
+    for days in (1, 6, 10):
+        assert spans[(other_org_id, f"trace-{days}")] == attributes
+
+
+def test_org_retention_expires_contents(database):
+    client, db = database
+    org_id = str(uuid.uuid4())
+    other_org_id = str(uuid.uuid4())
+    retention.set_org_retention(
+        client, db, retention.RetentionConfig(), org_id, full_days=3, retention_days=0
+    )
+    assert org_id in _table_ttl(client, db, "span_contents")
+
+    now = datetime.now()
+    rows = [
+        [org, "team", f"hash-{days}", "content", now - timedelta(days=days)]
+        for org in (org_id, other_org_id)
+        for days in (1, 4, 7)
+    ]
+    client.insert(
+        f"{db}.span_contents",
+        rows,
+        column_names=["OrgId", "TeamId", "Hash", "Content", "InsertedAt"],
+    )
+    client.command(f"OPTIMIZE TABLE {db}.span_contents FINAL")
+
+    contents = set(
+        client.query(f"SELECT OrgId, Hash FROM {db}.span_contents").result_rows
+    )
+    # Overridden org: kept 2 days past its 3 full days
+    assert contents >= {(org_id, "hash-1"), (org_id, "hash-4")}
+    assert (org_id, "hash-7") not in contents
+    # Other orgs keep the defaults, 30 full days
+    assert contents >= {(other_org_id, f"hash-{days}") for days in (1, 4, 7)}
+
+
+@pytest.mark.parametrize(
+    "model",
+    [
+        "GLM-4.7-Flash",
+        "zai-org/GLM-4.7-Flash",
+        "glm-4.7-flash-20250101-latest",
+        "other-org/glm-4.7-flash@20250101",
+    ],
+)
+def test_prices_dictionary_prices_model_variants(database, model):
+    client, db = database
+    prices = {
+        "input_tokens_price": 1.0,
+        "output_tokens_price": 2.0,
+        "cache_creation_input_tokens_price": 1.0,
+        "cache_read_input_tokens_price": 0.5,
+    }
+    pricing.sync(client, db, {"zai-org": {"models": {"zai-org/GLM-4.7-Flash": prices}}})
+
+    cost = client.query(
+        f"""
+        SELECT {cost_expr(db, "output_tokens", PRICING_CURRENT)}
+        FROM (
+            SELECT
+                map('gen_ai.response.model', {{model:String}},
+                    'gen_ai.usage.output_tokens', '1000000') as SpanAttributes,
+                now64(9) as Timestamp
+        )
+        """,
+        parameters={"model": model},
+    ).first_row[0]
+    assert cost == 2.0
@@ -979,3 +979,35 @@ async def test_task_decorator_tracking(
         assert traceloop_kind == "task", f"Span {span_id}: wrong traceloop kind"
         assert team_id == str(test_team_id), f"Span {span_id}: wrong team_id"
         assert exp_id == str(experiment_id), f"Span {span_id}: wrong experiment_id"
+
+
+def test_resent_span_replaces_earlier_content(
+    test_org_id: uuid.UUID,
+    test_team_id: uuid.UUID,
+):
+    """Test that re-sending a span with the same IDs stores its new content."""
+    from datetime import UTC, datetime
+
+    runtime.init()
+    tracestore = runtime.storage_runtime().tracestore
+    assert tracestore is not None, "Tracestore not initialized"
+
+    span = {
+        "Timestamp": datetime.now(UTC),
+        "TraceId": uuid.uuid4().hex,
+        "SpanId": uuid.uuid4().hex[:16],
+        "SpanName": "turn",
+        "OrgId": str(test_org_id),
+        "TeamId": str(test_team_id),
+        "SpanAttributes": {"gen_ai.completion.0.content": "partial"},
+    }
+    tracestore.write_spans([span])
+    tracestore.write_spans(
+        [{**span, "SpanAttributes": {"gen_ai.completion.0.content": "final"}}]
+    )
+
+    stored = tracestore.get_span(
+        test_org_id, test_team_id, span["TraceId"], span["SpanId"]
+    )
+    assert stored is not None
+    assert stored["SpanAttributes"]["gen_ai.completion.0.content"] == "final"
@@ -0,0 +1,91 @@
+import pytest
+from clickhouse_connect.driver.exceptions import DatabaseError, OperationalError
+
+from alphatrion.storage.circuit_breaker import (
+    CIRCUIT_STATE,
+    CLOSED,
+    HALF_OPEN,
+    OPEN,
+    CircuitBreaker,
+    CircuitOpenError,
+)
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _fail():
+    raise OperationalError("Connection refused")
+
+
+def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker("test-open", failure_threshold=3, clock=FakeClock())
+
+    for _ in range(2):
+        with pytest.raises(OperationalError):
+            breaker.call(_fail)
+    assert breaker.state == CLOSED
+
+    # A success resets the count
+    assert breaker.call(lambda: 1) == 1
+    for _ in range(3):
+        with pytest.raises(OperationalError):
+            breaker.call(_fail)
+    assert breaker.state == OPEN
+    assert CIRCUIT_STATE.labels("test-open")._value.get() == 2
+
+    calls = []
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: calls.append(1))
+    assert calls == []
+
+
+def test_half_open_probe():
+    clock = FakeClock()
+    breaker = CircuitBreaker(
+        "test-probe", failure_threshold=1, reset_timeout=10, clock=clock
+    )
+    with pytest.raises(OperationalError):
+        breaker.call(_fail)
+
+    # Failed probe opens the circuit again
+    clock.now = 10
+    with pytest.raises(OperationalError):
+        breaker.call(_fail)
+    assert breaker.state == OPEN
+
+    # One probe at a time
+    clock.now = 20
+    breaker.before_call()
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        breaker.call(lambda: 1)
+
+    breaker.on_success()
+    assert breaker.state == CLOSED
+    assert breaker.call(lambda: 1) == 1
+
+
+def test_server_errors_dont_open():
+    breaker = CircuitBreaker("test-server-error", failure_threshold=1)
+
+    def _rejected():
+        raise DatabaseError("Code: 159. Timeout exceeded (TIMEOUT_EXCEEDED)")
+
+    for _ in range(3):
+        with pytest.raises(DatabaseError):
+            breaker.call(_rejected)
+    assert breaker.state == CLOSED
+
+
+def test_disabled():
+    breaker = CircuitBreaker("test-disabled", failure_threshold=0)
+    for _ in range(10):
+        with pytest.raises(OperationalError):
+            breaker.call(_fail)
+    assert breaker.state == CLOSED
@@ -0,0 +1,46 @@
+import time
+
+from alphatrion.storage.query_cache import InMemoryQueryCache, cache_key
+
+
+def test_cache_evicts_least_recently_used():
+    cache = InMemoryQueryCache(max_entries=2)
+    cache.set("a", [1])
+    cache.set("b", [2])
+    assert cache.get("a") == [1]
+
+    cache.set("c", [3])
+    assert cache.get("b") is None
+    assert cache.get("a") == [1]
+    assert cache.get("c") == [3]
+
+
+def test_cache_entries_expire():
+    cache = InMemoryQueryCache(ttl=0.01)
+    cache.set("a", [1])
+    time.sleep(0.02)
+    assert cache.get("a") is None
+
+
+def test_watermark_invalidates_team_entries():
+    cache = InMemoryQueryCache()
+    query, params = "SELECT count() FROM otel_spans", {"team_id": "t1"}
+
+    key = cache_key(query, params, cache.watermark("o1:t1"))
+    cache.set(key, [{"count": 1}])
+    assert cache.get(cache_key(query, params, cache.watermark("o1:t1"))) == [
+        {"count": 1}
+    ]
+
+    cache.advance_watermark("o1:t2")
+    assert cache.get(cache_key(query, params, cache.watermark("o1:t1"))) is not None
+    cache.advance_watermark("o1:t1")
+    assert cache.get(cache_key(query, params, cache.watermark("o1:t1"))) is None
+
+
+def test_cache_key_depends_on_parameters():
+    query = "SELECT 1"
+    assert cache_key(query, {"a": 1, "b": 2}, 0) == cache_key(
+        query, {"b": 2, "a": 1}, 0
+    )
+    assert cache_key(query, {"a": 1}, 0) != cache_key(query, {"a": 2}, 0)
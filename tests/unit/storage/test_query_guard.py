@@ -0,0 +1,55 @@
+import pytest
+
+from alphatrion.storage.query_guard import (
+    QUERY_KIND_AGGREGATE,
+    QUERY_KIND_SEARCH,
+    QueryGuard,
+    query_tag,
+)
+
+
+def test_settings_by_kind_and_org():
+    guard = QueryGuard(
+        overrides={QUERY_KIND_AGGREGATE: {"max_execution_time": 60}},
+        org_settings={"org-1": {"max_memory_usage": 1000}},
+    )
+
+    settings = guard.settings(QUERY_KIND_AGGREGATE, "org-2")
+    assert settings["max_execution_time"] == 60
+    assert settings["max_memory_usage"] > 1000
+    assert "query_id" not in settings
+
+    # Org settings apply to every kind
+    assert guard.settings(QUERY_KIND_AGGREGATE, "org-1")["max_memory_usage"] == 1000
+    assert guard.settings(QUERY_KIND_SEARCH, "org-1")["max_memory_usage"] == 1000
+
+
+def test_tagged_queries_get_unique_ids():
+    guard = QueryGuard()
+    token = query_tag.set("request-1")
+    try:
+        first = guard.settings(QUERY_KIND_SEARCH)["query_id"]
+        second = guard.settings(QUERY_KIND_SEARCH)["query_id"]
+    finally:
+        query_tag.reset(token)
+
+    assert first.startswith("request-1:")
+    assert second.startswith("request-1:")
+    assert first != second
+
+
+def test_unknown_kind_is_rejected():
+    with pytest.raises(ValueError):
+        QueryGuard(overrides={"dashboards": {"max_execution_time": 1}})
+
+
+def test_from_env(monkeypatch):
+    monkeypatch.setenv(
+        "ALPHATRION_CLICKHOUSE_QUERY_SETTINGS", '{"search": {"max_execution_time": 3}}'
+    )
+    monkeypatch.setenv(
+        "ALPHATRION_CLICKHOUSE_ORG_QUERY_SETTINGS", '{"org-1": {"priority": 10}}'
+    )
+    guard = QueryGuard.from_env()
+    assert guard.settings(QUERY_KIND_SEARCH, "org-1")["max_execution_time"] == 3
+    assert guard.settings(QUERY_KIND_SEARCH, "org-1")["priority"] == 10
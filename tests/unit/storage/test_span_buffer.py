@@ -0,0 +1,164 @@
+import threading
+import time
+from datetime import UTC, datetime
+
+from alphatrion.storage.span_buffer import SpanBuffer
+
+
+class FlakyWriter:
+    def __init__(self, failures: int = 0):
+        self.failures = failures
+        self.written = []
+        self.lock = threading.Lock()
+
+    def __call__(self, spans):
+        with self.lock:
+            if self.failures > 0:
+                self.failures -= 1
+                raise ConnectionError("clickhouse unavailable")
+            self.written.extend(spans)
+
+
+def make_spans(n, start=0):
+    return [
+        {
+            "Timestamp": datetime(2026, 1, 1, tzinfo=UTC),
+            "SpanId": f"span-{i}",
+            "SpanAttributes": {"llm.usage.total_tokens": "10"},
+        }
+        for i in range(start, start + n)
+    ]
+
+
+def test_buffer_writes_spans(tmp_path):
+    writer = FlakyWriter()
+    buffer = SpanBuffer(writer, spill_dir=str(tmp_path), flush_interval=0.01)
+
+    buffer.put(make_spans(10))
+    assert buffer.flush(timeout=5)
+    assert [s["SpanId"] for s in writer.written] == [f"span-{i}" for i in range(10)]
+    assert buffer.depth == 0
+    buffer.close()
+
+
+def test_buffer_retries_failed_writes(tmp_path):
+    writer = FlakyWriter(failures=2)
+    buffer = SpanBuffer(
+        writer, spill_dir=str(tmp_path), flush_interval=0.01, initial_backoff=0.01
+    )
+
+    buffer.put(make_spans(5))
+    assert buffer.flush(timeout=5)
+    assert len(writer.written) == 5
+    buffer.close()
+
+
+def test_buffer_spills_overflow_and_replays(tmp_path):
+    writer = FlakyWriter(failures=1)
+    buffer = SpanBuffer(
+        writer,
+        spill_dir=str(tmp_path),
+        max_spans=3,
+        flush_interval=0.01,
+        initial_backoff=0.01,
+    )
+
+    buffer.put(make_spans(10))
+    assert buffer.flush(timeout=5)
+
+    deadline = datetime.now().timestamp() + 5
+    while len(writer.written) < 10 and datetime.now().timestamp() < deadline:
+        buffer.flush(timeout=0.1)
+
+    assert sorted(s["SpanId"] for s in writer.written) == sorted(
+        f"span-{i}" for i in range(10)
+    )
+    # Datetimes survive the round trip through the spill segment
+    assert all(isinstance(s["Timestamp"], datetime) for s in writer.written)
+    buffer.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_buffer_replays_segments_after_restart(tmp_path):
+    down = FlakyWriter(failures=1_000_000)
+    buffer = SpanBuffer(down, spill_dir=str(tmp_path), initial_backoff=10)
+    buffer.put(make_spans(4))
+    buffer.close(timeout=1)
+    assert down.written == []
+    assert len(list(tmp_path.glob("segment-*.jsonl"))) == 1
+
+    writer = FlakyWriter()
+    buffer = SpanBuffer(writer, spill_dir=str(tmp_path), flush_interval=0.01)
+    deadline = datetime.now().timestamp() + 5
+    while len(writer.written) < 4 and datetime.now().timestamp() < deadline:
+        buffer.flush(timeout=0.1)
+
+    assert len(writer.written) == 4
+    buffer.close()
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_replay_keeps_segment_when_spill_is_full(tmp_path):
+    down = FlakyWriter(failures=1_000_000)
+    buffer = SpanBuffer(down, spill_dir=str(tmp_path), initial_backoff=10)
+    buffer.put(make_spans(6))
+    buffer.close(timeout=1)
+
+    # The first replay of the second chunk fails while the spill directory is full
+    writer = FlakyWriter()
+    calls = []
+
+    def flaky_replay(spans):
+        calls.append(len(spans))
+        if len(calls) == 2:
+            raise ConnectionError("clickhouse unavailable")
+        writer(spans)
+
+    buffer = SpanBuffer(
+        flaky_replay,
+        spill_dir=str(tmp_path),
+        batch_size=3,
+        flush_interval=0.01,
+        initial_backoff=0.01,
+        max_spill_bytes=1,
+    )
+    deadline = datetime.now().timestamp() + 5
+    while len(writer.written) < 6 and datetime.now().timestamp() < deadline:
+        buffer.flush(timeout=0.1)
+    buffer.close()
+
+    assert [s["SpanId"] for s in writer.written] == [f"span-{i}" for i in range(6)]
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_failed_batch_requeue_is_bounded(tmp_path):
+    writer = FlakyWriter(failures=1)
+    started = threading.Event()
+    release = threading.Event()
+
+    def slow_failing_writer(spans):
+        started.set()
+        release.wait(5)
+        writer(spans)
+
+    buffer = SpanBuffer(
+        slow_failing_writer,
+        spill_dir=str(tmp_path),
+        max_spans=4,
+        batch_size=4,
+        flush_interval=0.01,
+        initial_backoff=10,
+    )
+    buffer.put(make_spans(4))
+    assert started.wait(5)
+    # Queued while the first batch is in flight, then it fails
+    buffer.put(make_spans(4, start=4))
+    release.set()
+
+    deadline = datetime.now().timestamp() + 5
+    while writer.failures and datetime.now().timestamp() < deadline:
+        time.sleep(0.01)
+    time.sleep(0.05)
+    assert buffer.depth <= 4
+    buffer.close(timeout=1)
+    assert len(list(tmp_path.glob("segment-*.jsonl"))) >= 1
@@ -0,0 +1,57 @@
+from alphatrion.storage.span_contents import (
+    CONTENT_REF_PREFIX,
+    content_hash,
+    content_refs,
+    extract_contents,
+    rehydrate,
+)
+
+PROMPT = "You are a helpful assistant. " * 100
+
+
+def make_span(span_id, **attributes):
+    return {
+        "OrgId": "org",
+        "TeamId": "team",
+        "SpanId": span_id,
+        "SpanAttributes": {"gen_ai.usage.input_tokens": "10", **attributes},
+    }
+
+
+def test_extract_contents_stores_each_value_once():
+    spans = [
+        make_span("s1", **{"gen_ai.prompt.0.content": PROMPT}),
+        make_span("s2", **{"gen_ai.prompt.0.content": PROMPT}),
+        make_span("s3"),
+    ]
+
+    extracted, contents = extract_contents(spans, threshold=1024)
+
+    ref = CONTENT_REF_PREFIX + content_hash(PROMPT)
+    assert contents == {("org", "team", content_hash(PROMPT)): PROMPT}
+    assert [s["SpanAttributes"].get("gen_ai.prompt.0.content") for s in extracted] == [
+        ref,
+        ref,
+        None,
+    ]
+    # Small values stay inline, and the input spans aren't modified
+    assert extracted[0]["SpanAttributes"]["gen_ai.usage.input_tokens"] == "10"
+    assert spans[0]["SpanAttributes"]["gen_ai.prompt.0.content"] == PROMPT
+    assert extracted[2] is spans[2]
+
+
+def test_rehydrate_restores_values():
+    spans = [make_span("s1", **{"gen_ai.completion.0.content": PROMPT})]
+    extracted, contents = extract_contents(spans, threshold=1024)
+
+    assert content_refs(extracted) == {content_hash(PROMPT)}
+    rehydrate(extracted, {digest: value for (_, _, digest), value in contents.items()})
+    assert extracted == spans
+
+
+def test_rehydrate_keeps_unknown_refs():
+    ref = CONTENT_REF_PREFIX + "0" * 32
+    spans = [make_span("s1", prompt=ref)]
+
+    rehydrate(spans, {})
+    assert spans[0]["SpanAttributes"]["prompt"] == ref
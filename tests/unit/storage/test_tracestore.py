@@ -0,0 +1,261 @@
+from datetime import UTC, datetime
+
+import pytest
+
+from alphatrion.storage import tracestore
+from alphatrion.storage.tracestore import (
+    CONTENT_REFRESH_SECONDS,
+    PRICING_CURRENT,
+    PRICING_INGEST,
+    SEARCH_TEXT_EXPR,
+    TimeWindow,
+    TraceStore,
+    _like_pattern,
+    client_settings,
+    cost_expr,
+    decode_cursor,
+    dedup_token,
+    encode_cursor,
+)
+
+
+def test_dedup_token_is_order_independent():
+    spans = [
+        {"TraceId": "t1", "SpanId": "s1"},
+        {"TraceId": "t1", "SpanId": "s2"},
+        {"TraceId": "t2", "SpanId": "s1"},
+    ]
+    assert dedup_token(spans) == dedup_token(list(reversed(spans)))
+
+
+def test_dedup_token_differs_per_batch():
+    a = [{"TraceId": "t1", "SpanId": "s1"}]
+    b = [{"TraceId": "t1", "SpanId": "s2"}]
+    assert dedup_token(a) != dedup_token(b)
+    assert dedup_token(a) != dedup_token(a + b)
+
+
+def test_dedup_token_differs_per_content():
+    span = {"TraceId": "t1", "SpanId": "s1", "SpanAttributes": {"a": "1", "b": "2"}}
+    resent = {**span, "SpanAttributes": {"b": "2", "a": "1"}}
+    updated = {**span, "SpanAttributes": {"a": "1", "b": "3"}}
+    assert dedup_token([span]) == dedup_token([resent])
+    assert dedup_token([span]) != dedup_token([updated])
+
+
+def test_cursor_round_trip():
+    cursor = encode_cursor({"TimestampNs": 1760000000123456789, "SpanId": "ab:cd"})
+    assert decode_cursor(cursor) == (1760000000123456789, "ab:cd")
+
+
+def test_decode_malformed_cursor():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_time_window_bounds_timestamp():
+    window = TimeWindow(
+        start=datetime(2026, 1, 1, tzinfo=UTC), end=datetime(2026, 1, 2, 0, 0, 0, 5)
+    )
+    assert window.parameters() == {
+        "tz": "UTC",
+        "start_ns": 1767225600_000_000_000,
+        # Naive datetimes are UTC
+        "end_ns": 1767312000_000_005_000,
+    }
+    conditions = window.conditions()
+    assert "Timestamp >= fromUnixTimestamp64Nano({start_ns:Int64})" in conditions
+    assert "Timestamp < fromUnixTimestamp64Nano({end_ns:Int64})" in conditions
+    assert window.bucket_select() == ""
+    assert window.group_by() == ""
+    assert window.order_by("count DESC") == "ORDER BY count DESC"
+
+
+def test_time_window_unbounded():
+    window = TimeWindow()
+    assert window.conditions() == ""
+    assert window.parameters() == {"tz": "UTC"}
+    assert window.bucket_of({"bucket": 1}) == {}
+
+
+def test_time_window_bucket_series_is_filled():
+    window = TimeWindow(
+        start=datetime(2026, 1, 1, tzinfo=UTC),
+        end=datetime(2026, 2, 1, tzinfo=UTC),
+        bucket="week",
+        timezone="Asia/Shanghai",
+    )
+    assert "INTERVAL 1 WEEK" in window.bucket_select()
+    assert "{tz:String}" in window.bucket_select()
+    assert window.bucket_select() == f"{window.align('Timestamp')} as bucket,"
+    assert window.group_by() == "GROUP BY bucket"
+    order_by = window.order_by()
+    assert "WITH FILL FROM" in order_by
+    assert "TO toDateTime(fromUnixTimestamp64Nano({end_ns:Int64})" in order_by
+    assert order_by.endswith("STEP INTERVAL 1 WEEK")
+
+    # Rows grouped by more keys aren't filled
+    assert window.group_by("model") == "GROUP BY bucket, model"
+    assert window.order_by("model") == "ORDER BY bucket ASC, model"
+
+
+def test_time_window_bucket_starts():
+    window = TimeWindow(
+        start=datetime(2026, 3, 7, 15, tzinfo=UTC),
+        end=datetime(2026, 3, 10, tzinfo=UTC),
+        bucket="day",
+        timezone="America/New_York",
+    )
+    # The 8th is 23 hours long in New York
+    assert [s.isoformat() for s in window.bucket_starts()] == [
+        "2026-03-07T00:00:00-05:00",
+        "2026-03-08T00:00:00-05:00",
+        "2026-03-09T00:00:00-04:00",
+    ]
+
+    window = TimeWindow(
+        start=datetime(2026, 1, 1, tzinfo=UTC),
+        end=datetime(2026, 1, 15, tzinfo=UTC),
+        bucket="week",
+    )
+    # Weeks start on Monday, the first one before the range
+    assert [s.day for s in window.bucket_starts()] == [29, 5, 12]
+
+    window = TimeWindow(
+        start=datetime(2026, 1, 1, 10, 30, tzinfo=UTC),
+        end=datetime(2026, 1, 1, 12, 30, tzinfo=UTC),
+        bucket="hour",
+        timezone="Asia/Kolkata",
+    )
+    # Local hours, at half past in UTC
+    assert [s.isoformat() for s in window.bucket_starts()] == [
+        "2026-01-01T16:00:00+05:30",
+        "2026-01-01T17:00:00+05:30",
+    ]
+
+    assert TimeWindow(bucket="day").bucket_starts() == []
+    with pytest.raises(ValueError):
+        TimeWindow().align("Timestamp")
+
+
+@pytest.mark.parametrize(
+    "kwargs",
+    [
+        {"bucket": "fortnight"},
+        {"timezone": "Mars/Olympus_Mons"},
+        {
+            "start": datetime(2026, 1, 2, tzinfo=UTC),
+            "end": datetime(2026, 1, 1, tzinfo=UTC),
+        },
+    ],
+)
+def test_time_window_rejects_invalid_arguments(kwargs):
+    with pytest.raises(ValueError):
+        TimeWindow(**kwargs)
+
+
+def test_client_settings_route_by_shard_in_cluster_mode():
+    assert "optimize_skip_unused_shards" not in client_settings()
+
+    settings = client_settings("alphatrion_cluster")
+    assert settings["optimize_skip_unused_shards"] == 1
+    assert settings["insert_distributed_sync"] == 1
+    assert settings["do_not_merge_across_partitions_select_final"] == 1
+
+
+def test_search_terms_match_literally():
+    assert _like_pattern("rate") == "%rate%"
+    assert _like_pattern("100%_done\\") == "%100\\%\\_done\\\\%"
+
+
+def test_search_text_covers_prompts_and_status():
+    assert "StatusMessage" in SEARCH_TEXT_EXPR
+    assert "startsWith(k, 'gen_ai.prompt.')" in SEARCH_TEXT_EXPR
+    assert "startsWith(k, 'gen_ai.completion.')" in SEARCH_TEXT_EXPR
+
+
+def test_cost_expr_reprices_with_the_prices_dictionary():
+    ingest = "toFloat64OrZero(SpanAttributes['alphatrion.cost.output_tokens'])"
+    assert cost_expr("db", "output_tokens", PRICING_INGEST) == ingest
+
+    current = cost_expr("db", "output_tokens", PRICING_CURRENT)
+    assert "dictGetOrNull('db.model_prices_dict', 'OutputPrice'" in current
+    assert "toDate(Timestamp)" in current
+    # Unpriced models keep their ingest cost
+    assert current.startswith("ifNull(") and current.endswith(f", {ingest})")
+
+
+class FakeClient:
+    def __init__(self):
+        self.inserts = []
+
+    def insert(self, table, data, **kwargs):
+        self.inserts.append((table, data))
+
+
+def test_referenced_contents_are_written_again_after_refresh(monkeypatch):
+    client = FakeClient()
+    monkeypatch.setattr(
+        tracestore.clickhouse_connect, "get_client", lambda **kwargs: client
+    )
+    now = 1000.0
+    monkeypatch.setattr(tracestore.time, "monotonic", lambda: now)
+    store = TraceStore("localhost:8123", "db", "user", "password", content_threshold=8)
+    span = {"OrgId": "o", "TeamId": "t", "SpanAttributes": {"prompt": "x" * 16}}
+
+    def content_writes():
+        return [data for table, data in client.inserts if table == "db.span_contents"]
+
+    store.write_spans([span])
+    store.write_spans([span])
+    assert len(content_writes()) == 1
+
+    now += CONTENT_REFRESH_SECONDS
+    store.write_spans([span])
+    assert len(content_writes()) == 2
+
+
+def test_insert_spans_raises_on_error_when_asked(monkeypatch):
+    class FailingClient:
+        def insert(self, table, data, **kwargs):
+            raise OSError("ClickHouse is down")
+
+    monkeypatch.setattr(
+        tracestore.clickhouse_connect, "get_client", lambda **kwargs: FailingClient()
+    )
+    store = TraceStore("localhost:8123", "db", "user", "password")
+    span = {"TraceId": "t1", "SpanId": "s1"}
+
+    store.insert_spans([span])
+    with pytest.raises(OSError):
+        store.insert_spans([span], raise_on_error=True)
+
+
+def test_search_spans_merges_text_and_content_matches(monkeypatch):
+    monkeypatch.setattr(
+        tracestore.clickhouse_connect, "get_client", lambda **kwargs: FakeClient()
+    )
+    store = TraceStore("localhost:8123", "db", "user", "password")
+    conditions = []
+
+    def span(ts):
+        return {
+            "Timestamp": datetime(2026, 1, 1, ts, tzinfo=UTC),
+            "TraceId": "t",
+            "SpanId": f"s{ts}",
+        }
+
+    def query_spans(*, condition, **kwargs):
+        conditions.append(condition)
+        if "hasAny" in condition:
+            return [span(2), span(3)]
+        return [span(1), span(3)]
+
+    monkeypatch.setattr(store, "_query_spans", query_spans)
+    monkeypatch.setattr(store, "_search_contents", lambda *args: ["ref"])
+
+    spans = store.search_spans("org", "team", "timeout", limit=3)
+    assert [s["SpanId"] for s in spans] == ["s1", "s2", "s3"]
+    # Each query is pruned by its own index
+    assert "LIKE" in conditions[0] and "hasAny" not in conditions[0]
+    assert "hasAny" in conditions[1] and "LIKE" not in conditions[1]
@@ -0,0 +1,107 @@
+from datetime import UTC, datetime
+
+from alphatrion.storage.tracetree import build_span_profile, build_trace_trees
+
+
+def row(span_id, parent, start, duration, *, tokens=0, cost=0.0, trace_id="t1"):
+    return {
+        "TraceId": trace_id,
+        "SpanId": span_id,
+        "ParentSpanId": parent,
+        "SpanName": span_id,
+        "SemanticKind": "task",
+        "StatusCode": "OK",
+        "Timestamp": datetime(2026, 1, 1, tzinfo=UTC),
+        "StartNs": start,
+        "Duration": duration,
+        "Tokens": tokens,
+        "Cost": cost,
+    }
+
+
+def test_build_trace_tree():
+    # root [0, 100)
+    # ├── a [10, 40)    overlaps b
+    # │   └── a1 [10, 20)
+    # ├── b [30, 60)
+    # └── c [70, 90)
+    rows = [
+        row("root", "", 0, 100),
+        row("c", "root", 70, 20, tokens=5, cost=0.5),
+        row("a", "root", 10, 30),
+        row("b", "root", 30, 30, tokens=10, cost=1.0),
+        row("a1", "a", 10, 10, tokens=1, cost=0.1),
+    ]
+
+    [tree] = build_trace_trees(rows)
+    nodes = {n["span_id"]: n for n in tree["nodes"]}
+
+    assert [n["span_id"] for n in tree["nodes"]] == ["root", "a", "a1", "b", "c"]
+    assert [n["depth"] for n in tree["nodes"]] == [0, 1, 2, 1, 1]
+    assert nodes["root"]["child_span_ids"] == ["a", "b", "c"]
+
+    # Children cover [10, 60) and [70, 90) of the root
+    assert nodes["root"]["self_time"] == 30
+    assert nodes["a"]["self_time"] == 20
+    assert nodes["a1"]["self_time"] == 10
+
+    assert nodes["root"]["subtree_tokens"] == 16
+    assert nodes["a"]["subtree_tokens"] == 1
+    assert abs(nodes["root"]["subtree_cost"] - 1.6) < 1e-9
+    assert tree["total_tokens"] == 16
+
+    # c ends last, then b (a overlaps b and is skipped)
+    assert tree["critical_path"] == ["root", "b", "c"]
+    assert not nodes["a"]["on_critical_path"]
+    assert tree["duration"] == 100
+
+
+def test_build_trace_trees_orphans_and_multiple_traces():
+    rows = [
+        row("x", "missing-parent", 50, 10, trace_id="t2"),
+        row("root", "", 0, 10, trace_id="t1"),
+    ]
+
+    trees = build_trace_trees(rows)
+    assert [t["trace_id"] for t in trees] == ["t1", "t2"]
+    assert trees[1]["nodes"][0]["depth"] == 0
+    assert trees[1]["critical_path"] == ["x"]
+
+
+def test_build_span_profile():
+    # Two traces of the same workflow, children overlapping in the first
+    rows = [
+        row("root", "", 0, 100),
+        row("a", "root", 10, 30),
+        row("b", "root", 30, 30),
+        row("a1", "a", 10, 10),
+        row("root", "", 0, 50, trace_id="t2"),
+        row("a", "root", 0, 20, trace_id="t2"),
+        row("a1", "a", 0, 40, trace_id="t2"),
+    ]
+
+    profile = {(e["span_name"], e["parent_path"]): e for e in build_span_profile(rows)}
+
+    assert set(profile) == {
+        ("root", ""),
+        ("a", "root"),
+        ("b", "root"),
+        ("a1", "root;a"),
+    }
+    root = profile[("root", "")]
+    assert root["count"] == 2
+    assert root["total_duration"] == 150
+    # Children cover [10, 60) of the first root and [0, 20) of the second
+    assert root["self_duration"] == 50 + 30
+    # a1 outlives a in the second trace, it covers a up to its end only
+    assert profile[("a", "root")]["self_duration"] == 20 + 0
+    assert profile[("a1", "root;a")]["p50"] == 25
+    assert build_span_profile(rows)[0]["span_name"] == "root"
+
+
+def test_build_span_profile_parent_cycle():
+    rows = [row("x", "y", 0, 10), row("y", "x", 0, 10)]
+
+    paths = {e["span_name"]: e["parent_path"] for e in build_span_profile(rows)}
+
+    assert paths == {"x": "y", "y": ""}
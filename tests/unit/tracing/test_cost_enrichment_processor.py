@@ -0,0 +1,31 @@
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+
+from alphatrion.tracing.cost_enrichment_processor import CostEnrichmentProcessor
+
+
+def test_costs_are_added_to_ended_spans():
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider()
+    provider.add_span_processor(CostEnrichmentProcessor())
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracer = provider.get_tracer("test")
+
+    with tracer.start_as_current_span(
+        "openai.chat",
+        attributes={
+            "gen_ai.system": "openai",
+            "gen_ai.request.model": "gpt-4o-mini",
+            "gen_ai.usage.input_tokens": 1000,
+            "gen_ai.usage.output_tokens": 100,
+        },
+    ):
+        pass
+
+    [span] = exporter.get_finished_spans()
+    assert float(span.attributes["alphatrion.cost.input_tokens"]) > 0
+    assert float(span.attributes["alphatrion.cost.output_tokens"]) > 0
+    assert "alphatrion.cost.cache_read_input_tokens" in span.attributes
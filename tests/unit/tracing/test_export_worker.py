@@ -0,0 +1,107 @@
+import pickle
+import sys
+import time
+
+from opentelemetry.attributes import BoundedAttributes
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import Event, ReadableSpan
+from opentelemetry.sdk.trace.export import SpanExportResult
+from opentelemetry.trace import Link, SpanContext, SpanKind, Status, StatusCode
+
+from alphatrion.tracing.export_worker import (
+    STALLED_BATCHES,
+    ProcessSpanExporter,
+    pack_spans,
+    unpack_spans,
+)
+from alphatrion.tracing.span_encoder import SpanEncoder
+
+RESOURCE = Resource.create({"service.name": "svc"})
+START_NS = 1_760_000_000_000_000_000
+
+
+def _span(span_id: int) -> ReadableSpan:
+    return ReadableSpan(
+        name="openai.chat",
+        context=SpanContext(0xABC, span_id, is_remote=False),
+        parent=SpanContext(0xABC, 1, is_remote=False),
+        resource=RESOURCE,
+        attributes=BoundedAttributes(
+            attributes={"session_id": "s-1", "gen_ai.usage.input_tokens": 12},
+            immutable=True,
+        ),
+        events=[Event("retry", {"attempt": 2}, timestamp=START_NS + 10)],
+        links=[Link(SpanContext(0xDEF, 3, is_remote=True), {"reason": "batch"})],
+        kind=SpanKind.CLIENT,
+        status=Status(StatusCode.ERROR, "rate limited"),
+        start_time=START_NS,
+        end_time=START_NS + 1500,
+    )
+
+
+def test_packed_spans_encode_the_same():
+    spans = [_span(2), _span(3)]
+    resources, packed = pack_spans(spans)
+    assert len(resources) == 1
+
+    resources, packed = pickle.loads(pickle.dumps((resources, packed)))
+    unpacked = unpack_spans(resources, packed)
+
+    assert SpanEncoder().encode(unpacked) == SpanEncoder().encode(spans)
+    assert unpacked[0].context.trace_flags.sampled
+
+
+def test_worker_acks_flush():
+    exporter = ProcessSpanExporter(clickhouse=False, prometheus=False)
+    try:
+        assert exporter.force_flush()  # Not started yet
+        assert exporter.export([_span(2)]) == SpanExportResult.SUCCESS
+        assert exporter.force_flush(timeout_millis=30000)
+    finally:
+        exporter.shutdown()
+    assert exporter._process is None
+
+
+def _large_span(span_id: int) -> ReadableSpan:
+    # Larger than a pipe buffer
+    span = _span(span_id)
+    span._attributes = {"gen_ai.prompt.0.content": "x" * 1_000_000}
+    return span
+
+
+def test_stalled_worker_drops_batches():
+    exporter = ProcessSpanExporter(
+        clickhouse=False, prometheus=False, write_timeout=0.2
+    )
+    # Never reads its stdin
+    exporter._args = [sys.executable, "-c", "import time; time.sleep(60)"]
+    dropped = STALLED_BATCHES._value.get()
+    try:
+        start = time.monotonic()
+        # Partly written, the rest is kept for the next frame
+        assert exporter.export([_large_span(2)]) == SpanExportResult.SUCCESS
+        assert exporter._pending
+        assert exporter.export([_span(3)]) == SpanExportResult.FAILURE
+        assert time.monotonic() - start < 5
+        assert STALLED_BATCHES._value.get() == dropped + 1
+    finally:
+        exporter._process.kill()
+        exporter.shutdown()
+
+
+def test_restart_closes_pipes_of_dead_worker():
+    exporter = ProcessSpanExporter(
+        clickhouse=False, prometheus=False, restart_interval=0
+    )
+    try:
+        assert exporter.export([_span(2)]) == SpanExportResult.SUCCESS
+        dead = exporter._process
+        dead.kill()
+        dead.wait()
+
+        assert exporter.export([_span(3)]) == SpanExportResult.SUCCESS
+        assert exporter._process is not dead
+        assert dead.stdin.closed and dead.stdout.closed
+        assert exporter.force_flush(timeout_millis=30000)
+    finally:
+        exporter.shutdown()
@@ -0,0 +1,94 @@
+import pytest
+from prometheus_client import CollectorRegistry, Counter
+
+from alphatrion.tracing import metric_labels
+from alphatrion.tracing.metric_labels import OTHER, LabelPolicy, MetricLabels, TopValues
+
+
+def test_top_values_are_ranked_by_weight():
+    top = TopValues(2, rank_interval=10)
+    assert top.label("a", 1, now=1) == "a"
+    assert top.label("b", 5, now=1) == "b"
+    # Ranked on insert until the first ranking, the lightest gives its slot up
+    assert top.label("c", 100, now=2) == "c"
+    assert top.label("a", 1, now=2) == OTHER
+
+    # Ranked by the weights of the last interval
+    assert top.label("c", 1, now=20) == "c"
+    assert top.label("b", 1, now=20) == "b"
+    assert top.label("a", 1, now=20) == OTHER
+
+
+def test_heavy_value_arriving_late_gets_a_slot():
+    top = TopValues(3, rank_interval=10)
+    for value in ("a", "b", "c"):
+        assert top.label(value, 1, now=1) == value
+    assert top.label("heavy", 1000, now=2) == "heavy"
+    assert top.label("light", 1, now=2) == OTHER
+
+    # Slots the ranking leaves free go to the heaviest newcomers too
+    top.label("heavy", 1, now=11)
+    assert top.label("heavy", 1, now=21) == "heavy"
+    assert top.label("d", 1, now=21) == "d"
+    assert top.label("e", 50, now=21) == "e"
+    assert top.label("f", 2, now=21) == "f"
+    assert top.label("d", 1, now=21) == OTHER
+    assert top.label("heavy", 1, now=21) == "heavy"
+
+
+def test_labels_follow_the_policy():
+    labels = MetricLabels(
+        LabelPolicy(
+            labels=("team_id", "experiment_id", "model"),
+            allowlists={"model": frozenset({"gpt-4o"})},
+            top_n={"experiment_id": 1},
+        )
+    )
+
+    def label(experiment_id, model):
+        values = {"user_id": "u", "experiment_id": experiment_id, "model": model}
+        return labels.labels(values, weight=10)
+
+    assert label("exp-1", "gpt-4o") == {
+        "team_id": "unknown",
+        "experiment_id": "exp-1",
+        "model": "gpt-4o",
+    }
+    assert label("exp-2", "llama") == {
+        "team_id": "unknown",
+        "experiment_id": OTHER,
+        "model": OTHER,
+    }
+
+    with pytest.raises(ValueError):
+        LabelPolicy(labels=("run_id",))
+
+
+def test_stale_series_expire(monkeypatch):
+    now = 1000.0
+    monkeypatch.setattr(metric_labels.time, "monotonic", lambda: now)
+    labels = MetricLabels(LabelPolicy(series_ttl=100))
+    registry = CollectorRegistry()
+    counter = Counter("tokens", "Tokens", ["experiment_id", "type"], registry=registry)
+
+    labels.child(counter, experiment_id="exp-1", type="input").inc()
+    now = 1080.0
+    labels.child(counter, experiment_id="exp-2", type="input").inc()
+    now = 1150.0
+
+    assert labels.expire() == 1
+    assert (
+        registry.get_sample_value(
+            "tokens_total", {"experiment_id": "exp-1", "type": "input"}
+        )
+        is None
+    )
+    assert (
+        registry.get_sample_value(
+            "tokens_total", {"experiment_id": "exp-2", "type": "input"}
+        )
+        == 1
+    )
+    # At most every tenth of the TTL
+    now = 1155.0
+    assert labels.expire() == 0
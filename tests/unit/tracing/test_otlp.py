@@ -0,0 +1,104 @@
+from datetime import UTC, datetime
+
+from opentelemetry.attributes import BoundedAttributes
+from opentelemetry.exporter.otlp.proto.common.trace_encoder import encode_spans
+from opentelemetry.proto.collector.trace.v1.trace_service_pb2 import (
+    ExportTraceServiceRequest,
+)
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import Event, ReadableSpan
+from opentelemetry.sdk.util.instrumentation import InstrumentationScope
+from opentelemetry.trace import Link, SpanContext, SpanKind, Status, StatusCode
+
+from alphatrion.tracing.otlp import spans_from_otlp, spans_from_rows
+from alphatrion.tracing.span_encoder import SpanEncoder
+
+START_NS = 1_760_000_000_000_000_000
+
+
+def test_spans_from_otlp():
+    span = ReadableSpan(
+        name="openai.chat",
+        context=SpanContext(0xABC, 2, is_remote=False),
+        parent=SpanContext(0xABC, 1, is_remote=False),
+        resource=Resource.create({"service.name": "svc"}),
+        attributes=BoundedAttributes(
+            attributes={
+                "org_id": "spoofed",
+                "session_id": "s-1",
+                "gen_ai.usage.input_tokens": 12,
+                "tags": ("a", "b"),
+            },
+            immutable=True,
+        ),
+        events=[Event("retry", {"attempt": 2}, timestamp=START_NS + 10)],
+        links=[Link(SpanContext(0xDEF, 3, is_remote=True), {"reason": "batch"})],
+        kind=SpanKind.CLIENT,
+        status=Status(StatusCode.ERROR, "rate limited"),
+        start_time=START_NS,
+        end_time=START_NS + 1500,
+        instrumentation_scope=InstrumentationScope("test"),
+    )
+    body = encode_spans([span]).SerializeToString()
+
+    spans = spans_from_otlp(
+        ExportTraceServiceRequest.FromString(body), {"org_id": "org-1"}
+    )
+
+    [expected] = SpanEncoder().encode([span])
+    [row] = SpanEncoder().encode(spans)
+    assert row["OrgId"] == "org-1"
+    expected["OrgId"] = "org-1"
+    expected["SpanAttributes"]["org_id"] = "org-1"
+    assert row == expected
+
+
+def test_spans_from_rows():
+    row = {
+        "Timestamp": datetime(2025, 10, 9, 8, 0, 0, 123456, tzinfo=UTC),
+        "TraceId": f"{0xABC:032x}",
+        "SpanId": f"{0x2:016x}",
+        "ParentSpanId": "",
+        "SpanName": "processing",
+        "SpanKind": "INTERNAL",
+        "SemanticKind": "processing",
+        "ServiceName": "claude",
+        "Duration": 2_000_000_000,
+        "StatusCode": "OK",
+        "StatusMessage": "",
+        "OrgId": "org-1",
+        "TeamId": "team-1",
+        "UserId": "user-1",
+        "RunId": "run-1",
+        "SessionId": "session-1",
+        "AgentId": "agent-1",
+        "AgentType": "CLAUDE",
+        "ExperimentId": "",
+        "SpanAttributes": {},
+        "ResourceAttributes": {"service.name": "claude", "agent.type": "CLAUDE"},
+        "Events.Timestamp": [],
+        "Events.Name": [],
+        "Events.Attributes": [],
+        "Links.TraceId": [],
+        "Links.SpanId": [],
+        "Links.Attributes": [],
+    }
+
+    [encoded] = SpanEncoder().encode(spans_from_rows([row]))
+
+    for column in (
+        "Timestamp",
+        "TraceId",
+        "SpanId",
+        "ParentSpanId",
+        "SpanName",
+        "SemanticKind",
+        "ServiceName",
+        "Duration",
+        "StatusCode",
+        "OrgId",
+        "SessionId",
+        "AgentType",
+        "ResourceAttributes",
+    ):
+        assert encoded[column] == row[column], column
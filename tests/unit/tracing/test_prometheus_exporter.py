@@ -0,0 +1,68 @@
+import time
+import urllib.request
+
+from opentelemetry.sdk.trace import ReadableSpan
+from opentelemetry.trace import SpanContext
+
+from alphatrion.tracing import prometheus_exporter
+from alphatrion.tracing.prometheus_exporter import PrometheusExporter
+
+START_NS = 1_760_000_000_000_000_000
+
+
+def _span() -> ReadableSpan:
+    return ReadableSpan(
+        name="openai.chat",
+        context=SpanContext(0xABC, 2, is_remote=False),
+        attributes={
+            "traceloop.workflow.name": "pipeline",
+            "team_id": "team-1",
+            "gen_ai.request.model": "gpt-4o-mini",
+            "gen_ai.usage.input_tokens": 12,
+        },
+        start_time=START_NS,
+        end_time=START_NS + 1500,
+    )
+
+
+def test_pushes_are_coalesced(monkeypatch):
+    pushes = []
+    monkeypatch.setattr(
+        prometheus_exporter, "pushadd_to_gateway", lambda *a, **kw: pushes.append(kw)
+    )
+    exporter = PrometheusExporter(
+        "localhost:9091", grouping_key={"instance": "test"}, push_interval=0.05
+    )
+    try:
+        for _ in range(10):
+            exporter.export([_span()])
+        assert pushes == []
+
+        deadline = time.monotonic() + 5
+        while not pushes and time.monotonic() < deadline:
+            time.sleep(0.01)
+        assert len(pushes) == 1
+        # Nothing exported since, nothing pushed
+        time.sleep(0.2)
+        assert len(pushes) == 1
+    finally:
+        exporter.shutdown()
+    assert len(pushes) == 2
+
+
+def test_pull_mode_serves_metrics(monkeypatch):
+    monkeypatch.setattr(
+        prometheus_exporter,
+        "pushadd_to_gateway",
+        lambda *a, **kw: (_ for _ in ()).throw(AssertionError("pushed")),
+    )
+    exporter = PrometheusExporter(None, metrics_port=0, metrics_addr="127.0.0.1")
+    try:
+        exporter.export([_span()])
+        port = exporter._metrics_server.server_port
+        with urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics") as response:
+            body = response.read().decode()
+        assert 'llm_tokens_total{experiment_id="unknown"' in body
+        assert exporter.force_flush()
+    finally:
+        exporter.shutdown()
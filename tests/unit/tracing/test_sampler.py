@@ -0,0 +1,64 @@
+from opentelemetry.context import attach, detach, set_value
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+
+from alphatrion import tracing
+from alphatrion.tracing.sampler import ExportPolicySampler
+
+
+def _tracer(**sampler_args):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=ExportPolicySampler(**sampler_args))
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    return provider.get_tracer("test"), exporter
+
+
+def test_spans_outside_workflows_are_dropped():
+    tracer, exporter = _tracer()
+
+    with tracer.start_as_current_span("postgresql.query") as span:
+        assert not span.is_recording()
+    with tracer.start_as_current_span("agent.step", attributes={"session_id": "s-1"}):
+        pass
+    # Empty session IDs aren't agent runs
+    with tracer.start_as_current_span("http.get", attributes={"session_id": ""}):
+        pass
+
+    assert [span.name for span in exporter.get_finished_spans()] == ["agent.step"]
+
+
+def test_spans_of_workflows_are_recorded():
+    tracer, exporter = _tracer()
+
+    token = attach(set_value("workflow_name", "pipeline"))
+    try:
+        with tracer.start_as_current_span("pipeline.workflow"):
+            with tracer.start_as_current_span("postgresql.query") as child:
+                assert child.is_recording()
+    finally:
+        detach(token)
+
+    assert {span.name for span in exporter.get_finished_spans()} == {
+        "pipeline.workflow",
+        "postgresql.query",
+    }
+
+
+def test_agents_are_sampled_by_their_rate():
+    tracer, exporter = _tracer(rates={"a-1": 0.0})
+
+    @tracing.agent(agent_id="a-1")
+    def step():
+        with tracer.start_as_current_span("agent.llm") as span:
+            # Dropped by the rate, still recorded for its token usage
+            assert span.is_recording()
+
+    with tracing.agent_session("s-1"):
+        step()
+        with tracer.start_as_current_span("session.step"):
+            pass
+
+    assert [span.name for span in exporter.get_finished_spans()] == ["session.step"]
@@ -0,0 +1,84 @@
+from datetime import UTC, datetime
+
+from opentelemetry.attributes import BoundedAttributes
+from opentelemetry.sdk.resources import Resource
+from opentelemetry.sdk.trace import Event, ReadableSpan
+from opentelemetry.trace import Link, SpanContext, SpanKind, Status, StatusCode
+
+from alphatrion.tracing.span_encoder import SpanEncoder
+
+RESOURCE = Resource.create({"service.name": "svc", "process.pid": 42})
+START_NS = 1_760_000_000_000_000_000
+
+
+def _span(span_id: int, resource: Resource = RESOURCE, **kwargs) -> ReadableSpan:
+    return ReadableSpan(
+        name="openai.chat",
+        context=SpanContext(0xABC, span_id, is_remote=False),
+        resource=resource,
+        start_time=START_NS,
+        end_time=START_NS + 1500,
+        **kwargs,
+    )
+
+
+def test_encode_span():
+    span = _span(
+        2,
+        parent=SpanContext(0xABC, 1, is_remote=False),
+        attributes=BoundedAttributes(
+            attributes={
+                "org_id": "org-1",
+                "session_id": "session-1",
+                "gen_ai.operation.name": "chat",
+                "gen_ai.usage.input_tokens": 12,
+            },
+            immutable=True,
+        ),
+        events=[Event("retry", {"attempt": 2}, timestamp=START_NS + 10)],
+        links=[Link(SpanContext(0xDEF, 3, is_remote=True), {"reason": "batch"})],
+        kind=SpanKind.CLIENT,
+        status=Status(StatusCode.ERROR, "rate limited"),
+    )
+
+    [row] = SpanEncoder().encode([span])
+
+    assert row["Timestamp"] == datetime.fromtimestamp(1_760_000_000, tz=UTC)
+    assert row["TraceId"] == f"{0xABC:032x}"
+    assert row["SpanId"] == "0000000000000002"
+    assert row["ParentSpanId"] == "0000000000000001"
+    assert row["SpanKind"] == "CLIENT"
+    assert row["Duration"] == 1500
+    assert row["StatusCode"] == "ERROR"
+    assert row["StatusMessage"] == "rate limited"
+    assert row["SpanAttributes"]["gen_ai.usage.input_tokens"] == "12"
+    assert row["SemanticKind"] == "chat"
+    assert row["ServiceName"] == "svc"
+    assert row["ResourceAttributes"]["process.pid"] == "42"
+    assert (row["OrgId"], row["TeamId"], row["SessionId"]) == ("org-1", "", "session-1")
+    assert row["Events.Name"] == ["retry"]
+    assert row["Events.Attributes"] == [{"attempt": "2"}]
+    assert row["Links.TraceId"] == [f"{0xDEF:032x}"]
+    assert row["Links.Attributes"] == [{"reason": "batch"}]
+
+
+def test_encode_minimal_span():
+    [row] = SpanEncoder().encode([_span(2)])
+
+    assert row["ParentSpanId"] == ""
+    assert row["SpanKind"] == "INTERNAL"
+    assert row["StatusCode"] == "UNSET"
+    assert row["SpanAttributes"] == {}
+    assert row["SemanticKind"] == "unknown"
+    assert row["Events.Name"] == []
+
+
+def test_resource_attributes_shared_per_resource():
+    encoder = SpanEncoder()
+    first, second = encoder.encode([_span(2), _span(3)])
+    assert first["ResourceAttributes"] is second["ResourceAttributes"]
+
+    [other] = encoder.encode(
+        [_span(4, resource=Resource.create({"service.name": "b"}))]
+    )
+    assert other["ServiceName"] == "b"
@@ -0,0 +1,75 @@
+import asyncio
+import uuid
+
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+
+from alphatrion import tracing
+from alphatrion.runtime.contextvars import (
+    current_agent_id,
+    current_exp_id,
+    current_run_id,
+    current_session_id,
+)
+from alphatrion.tracing.sampler import ExportPolicySampler
+from alphatrion.tracing.span_processor import (
+    ContextAttributesSpanProcessor,
+    context_attributes,
+)
+
+
+class _Runtime:
+    org_id = uuid.UUID(int=1)
+    team_id = uuid.UUID(int=2)
+    user_id = uuid.UUID(int=3)
+
+
+def test_context_attributes_are_computed_once():
+    runtime = _Runtime()
+    run_id, exp_id = uuid.uuid4(), uuid.uuid4()
+
+    attributes = context_attributes(runtime, run_id, exp_id, None, None)
+    assert attributes == {
+        "experiment_id": str(exp_id),
+        "run_id": str(run_id),
+        "org_id": str(runtime.org_id),
+        "team_id": str(runtime.team_id),
+        "user_id": str(runtime.user_id),
+    }
+    assert context_attributes(runtime, run_id, exp_id, None, None) is attributes
+
+    # Runs without an experiment aren't attributed
+    assert context_attributes(runtime, run_id, None, None, None) == {}
+    assert context_attributes(None, None, None, "s-1", "a-1") == {
+        "session_id": "s-1",
+        "agent_id": "a-1",
+    }
+
+
+def test_session_spans_are_attributed():
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=ExportPolicySampler())
+    provider.add_span_processor(ContextAttributesSpanProcessor())
+    provider.add_span_processor(SimpleSpanProcessor(exporter))
+    tracer = provider.get_tracer("test")
+
+    @tracing.agent(agent_id="a-1")
+    async def step():
+        with tracer.start_as_current_span("agent.step"):
+            pass
+
+    with tracing.agent_session("s-1"):
+        with tracer.start_as_current_span("session.start"):
+            pass
+        asyncio.run(step())
+    assert current_session_id.get() is None and current_agent_id.get() is None
+    assert current_run_id.get() is None and current_exp_id.get() is None
+
+    start, agent_step = exporter.get_finished_spans()
+    assert start.attributes["session_id"] == "s-1"
+    assert "agent_id" not in start.attributes
+    assert agent_step.attributes["session_id"] == "s-1"
+    assert agent_step.attributes["agent_id"] == "a-1"
@@ -0,0 +1,100 @@
+from opentelemetry.context import attach, detach, set_value
+from opentelemetry.sdk.trace import TracerProvider
+from opentelemetry.sdk.trace.export import SimpleSpanProcessor
+from opentelemetry.sdk.trace.export.in_memory_span_exporter import (
+    InMemorySpanExporter,
+)
+from opentelemetry.trace import Status, StatusCode, set_span_in_context
+
+from alphatrion.tracing.sampler import ExportPolicySampler
+from alphatrion.tracing.tail_sampling import (
+    SAMPLED_ATTRIBUTE,
+    SamplingSpanProcessor,
+    TailSamplingPolicy,
+)
+
+LLM_ATTRIBUTES = {
+    "gen_ai.system": "openai",
+    "gen_ai.request.model": "gpt-4o-mini",
+    "gen_ai.usage.input_tokens": 1000,
+    "gen_ai.usage.output_tokens": 100,
+    "gen_ai.prompt.0.content": "a long prompt",
+}
+
+
+def _tracer(*, rate: float = 1.0, policy: TailSamplingPolicy | None = None):
+    exporter = InMemorySpanExporter()
+    provider = TracerProvider(sampler=ExportPolicySampler(rate=rate))
+    provider.add_span_processor(
+        SamplingSpanProcessor([SimpleSpanProcessor(exporter)], policy=policy)
+    )
+    return provider.get_tracer("test"), exporter
+
+
+def _run_workflow(tracer, *, error: bool = False) -> None:
+    token = attach(set_value("workflow_name", "pipeline"))
+    try:
+        with tracer.start_as_current_span("pipeline.workflow") as root:
+            with tracer.start_as_current_span("openai.chat", attributes=LLM_ATTRIBUTES):
+                pass
+            with tracer.start_as_current_span("fetch.task"):
+                pass
+            if error:
+                root.set_status(Status(StatusCode.ERROR, "failed"))
+    finally:
+        detach(token)
+
+
+def test_head_dropped_traces_keep_usage():
+    tracer, exporter = _tracer(rate=0)
+    _run_workflow(tracer)
+
+    [span] = exporter.get_finished_spans()
+    assert span.name == "openai.chat"
+    assert span.context.trace_flags.sampled
+    attributes = span.attributes
+    assert attributes[SAMPLED_ATTRIBUTE] == "false"
+    assert attributes["gen_ai.usage.input_tokens"] == "1000"
+    assert attributes["gen_ai.request.model"] == "gpt-4o-mini"
+    # Costs are computed even though the cost enrichment processor didn't run
+    assert float(attributes["alphatrion.cost.input_tokens"]) > 0
+    assert "gen_ai.prompt.0.content" not in attributes
+
+
+def test_tail_sampling_keeps_errors():
+    policy = TailSamplingPolicy(rate=0, latency_threshold=60, cost_threshold=0)
+    tracer, exporter = _tracer(policy=policy)
+
+    _run_workflow(tracer, error=True)
+    assert len(exporter.get_finished_spans()) == 3
+
+    exporter.clear()
+    _run_workflow(tracer)
+    [span] = exporter.get_finished_spans()
+    assert span.attributes[SAMPLED_ATTRIBUTE] == "false"
+
+
+def test_tail_sampling_keeps_costly_traces():
+    policy = TailSamplingPolicy(rate=0, latency_threshold=60, cost_threshold=1e-9)
+    tracer, exporter = _tracer(policy=policy)
+
+    _run_workflow(tracer)
+    assert len(exporter.get_finished_spans()) == 3
+
+
+def test_pending_traces_are_decided_on_flush():
+    policy = TailSamplingPolicy(rate=1, latency_threshold=60, cost_threshold=0)
+    exporter = InMemorySpanExporter()
+    processor = SamplingSpanProcessor([SimpleSpanProcessor(exporter)], policy=policy)
+    provider = TracerProvider(sampler=ExportPolicySampler(drop_unexported=False))
+    provider.add_span_processor(processor)
+    tracer = provider.get_tracer("test")
+
+    root = tracer.start_span("root")
+    with tracer.start_as_current_span("child", context=set_span_in_context(root)):
+        pass
+    assert exporter.get_finished_spans() == ()
+
+    processor.force_flush()
+    assert [span.name for span in exporter.get_finished_spans()] == ["child"]
+    root.end()
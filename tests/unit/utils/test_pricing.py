@@ -203,3 +203,66 @@ def test_calculate_cost_precision():
         if "." in str_value:
             decimal_places = len(str_value.split(".")[1])
             assert decimal_places <= 8, f"{key} has {decimal_places} decimal places"
+
+
+def test_normalize_model():
+    """Test that release suffixes are dropped from model names."""
+    assert pricing.normalize_model("claude-sonnet-4-5-20250929") == "claude-sonnet-4-5"
+    assert pricing.normalize_model("claude-sonnet-4-5@20250929") == "claude-sonnet-4-5"
+    assert pricing.normalize_model("GPT-4o-2024-08-06") == "gpt-4o"
+    assert pricing.normalize_model("claude-3-haiku-20240307-v1:0") == "claude-3-haiku"
+    assert pricing.normalize_model("claude-3-7-sonnet-latest") == "claude-3-7-sonnet"
+    assert pricing.normalize_model("gpt-4.1") == "gpt-4.1"
+
+
+def test_get_model_pricing_resolves_model_names():
+    """Test that dated, prefixed and aliased model names find their pricing."""
+    price = {
+        "input_tokens_price": 3,
+        "output_tokens_price": 15,
+        "cache_creation_input_tokens_price": 3.75,
+        "cache_read_input_tokens_price": 0.3,
+    }
+    pricing._PRICING_CACHE = {
+        "anthropic": {
+            "models": {
+                "claude-sonnet-4-5": {**price, "aliases": ["claude-4.5-sonnet"]},
+                "claude-sonnet-4": {**price, "input_tokens_price": 2},
+            }
+        },
+        "deepinfra": {"models": {"zai-org/GLM-4.7-Flash": price}},
+    }
+
+    def input_price(provider, model):
+        return pricing.get_model_pricing(provider, model)["input_tokens_price"]
+
+    assert input_price("anthropic", "claude-sonnet-4-5-20250929") == 3
+    assert input_price("anthropic", "Claude-4.5-Sonnet") == 3
+    assert input_price("anthropic", "claude-sonnet-4-20250514") == 2
+    # Longest priced model the name extends
+    assert input_price("anthropic", "claude-sonnet-4-5-thinking") == 3
+    assert input_price("anthropic", "claude-sonnet-45") == 3.3
+    # Without organization, and from another provider
+    assert input_price("deepinfra", "GLM-4.7-Flash") == 3
+    assert input_price("unknown", "zai-org/GLM-4.7-Flash") == 3
+
+
+def test_get_model_pricing_warns_once_per_model(caplog):
+    """Test that unknown models are only warned about once."""
+    pricing._warn_unpriced.cache_clear()
+
+    with caplog.at_level("WARNING", logger="alphatrion.utils.pricing"):
+        for _ in range(3):
+            pricing.get_model_pricing("unknown-provider", "unknown-model")
+            pricing.get_model_pricing("unknown-provider", "other-model")
+
+    assert len(caplog.records) == 2
+    # Warned models are bounded like the other caches of the module
+    assert pricing._warn_unpriced.cache_info().maxsize == pricing.MAX_CACHED_MODELS
+
+
+def test_model_keys():
+    """Test the lookup keys of a priced model."""
+    assert pricing.model_keys(
+        "zai-org/GLM-4.7-Flash", {"aliases": ["glm-4.7-flash-20260101", "GLM-Flash"]}
+    ) == ["zai-org/glm-4.7-flash", "glm-4.7-flash", "glm-flash"]